@@ -9,7 +9,6 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 import traceback
 import sys
 import base64
-import tempfile
 
 from flask import Flask, jsonify, request, send_file
 from flask_cors import CORS
@@ -80,6 +79,7 @@ app = Flask(__name__)
 CORS(app) 
 app.config['Chinese2TLPA'] = None
 app.config['TTS_Synthesizer'] = None
+app.config['TTS_Cache'] = None
 
 # --- TTS 模型載入 ---
 def load_tts_model():
@@ -139,6 +139,17 @@ def load_tts_model():
         synthesizer = han2tts.Synthesizer(tacotron_ckpt, waveglow_ckpt)
         app.config['TTS_Synthesizer'] = synthesizer
         
+        # 合成快取：重複的數字調文本直接回傳，不再跑 Tacotron2 + WaveGlow
+        try:
+            from synthesis_cache import SynthesisCache
+            cache_dir = os.environ.get("TTS_CACHE_DIR", os.path.join(tts_repo_root, "tts_cache")) or None
+            app.config['TTS_Cache'] = SynthesisCache(
+                cache_dir=cache_dir,
+                max_disk_mb=float(os.environ.get("TTS_CACHE_MB", "256") or 256))
+            logging.info('✓ TTS 合成快取啟用: %s', cache_dir or '僅記憶體')
+        except Exception as cache_err:
+            logging.warning('TTS 合成快取無法啟用: %s', str(cache_err)[:200])
+        
         device = 'GPU' if gpu_available else 'CPU'
         logging.info('✓ TTS Synthesizer 載入成功（運行在 %s）。', device)
         
@@ -481,29 +492,35 @@ def synthesize_tonal_number():
                 "note": "備選方案：聲調合成（TTS模型不可用）"
             })
         
+        cache = app.config.get('TTS_Cache')
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(tonal_number_text, synthesizer.sigma,
+                                       synthesizer.denoiser_strength, synthesizer.hparams.sampling_rate)
+            wav_data = cache.get(cache_key)
+            if wav_data is not None:
+                logging.info('TTS 快取命中，音訊大小: %d bytes', len(wav_data))
+                return jsonify({
+                    "tonal_number_text": tonal_number_text,
+                    "audio": base64.b64encode(wav_data).decode('utf-8'),
+                    "status": "success",
+                    "mode": "real_tts_gpu",
+                    "cached": True,
+                    "note": "真實 Tacotron2 + WaveGlow 語音合成（快取）"
+                })
+        
         try:
             # 使用真實 TTS 模型合成
             logging.info("使用真實 Tacotron2 + WaveGlow 模型合成（GPU）...")
             
-            # 建立臨時輸出檔案
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-                temp_wav_path = tmp_file.name
-            
-            # 呼叫 TTS 合成
-            output_path = synthesizer.tts(tonal_number_text, temp_wav_path)
-            
-            # 讀取生成的 WAV 檔案
-            with open(output_path, 'rb') as f:
-                wav_data = f.read()
-            
-            # 清理臨時檔案
-            try:
-                os.remove(output_path)
-            except:
-                pass
+            # 直接在記憶體中合成並組成 WAV（不經暫存檔）
+            audio_utils = _import_audio_utils()
+            samples = synthesizer.synthesize(tonal_number_text)
+            wav_data = audio_utils.to_wav_bytes(samples, synthesizer.hparams.sampling_rate)
             
             logging.info(f'GPU TTS 合成成功，音訊大小: {len(wav_data)} bytes')
+            if cache_key is not None:
+                cache.put(cache_key, wav_data)
             
             # Base64 編碼
             audio_base64 = base64.b64encode(wav_data).decode('utf-8')
@@ -537,6 +554,15 @@ def synthesize_tonal_number():
         logging.error('合成處理時發生內部錯誤:\n%s', traceback.format_exc())
         return jsonify({"error": "Internal server error."}), 500
 
+def _import_audio_utils():
+    """匯入 TTS 專案的共用音訊工具（必要時把專案目錄加入 sys.path）"""
+    project_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "taiwanese_tonal_tlpa_tacotron2_hsien1")
+    if project_dir not in sys.path:
+        sys.path.insert(0, project_dir)
+    import audio_utils
+    return audio_utils
+
 def generate_tonal_audio(text):
     """根據台語數字調文本生成高質量模擬音訊。
     
@@ -551,22 +577,20 @@ def generate_tonal_audio(text):
     8. 高停調 - 高平調（停頓）
     """
     try:
-        import struct
-        import math
+        import numpy as np
+        audio_utils = _import_audio_utils()
         
         sample_rate = 22050
         duration = 1  # 總時長 1 秒
         num_samples = sample_rate * duration
-        
-        audio_data = bytearray()
         amplitude = int(32767 * 0.4)
         
         # 解析台語數字調
         words = text.split()
         samples_per_word = num_samples // max(len(words), 1)
         
-        total_sample_index = 0
-        
+        chunks = []
+        gaps = []
         for word in words:
             # 提取最後一個數字作為聲調
             tone = None
@@ -582,7 +606,7 @@ def generate_tonal_audio(text):
             tone_samples = int(samples_per_word * 0.8)  # 80% 為音調部分
             pause_samples = int(samples_per_word * 0.2)  # 20% 為停頓
             
-            # 聲調頻率曲線
+            # 聲調頻率曲線（t 為樣本索引陣列）
             if tone == 1:  # 高平調
                 freq_fn = lambda t: 350
             elif tone == 2:  # 上升調
@@ -602,53 +626,19 @@ def generate_tonal_audio(text):
             else:
                 freq_fn = lambda t: 300
             
-            # 生成聲調樣本
-            for i in range(tone_samples):
-                frequency = freq_fn(i)
-                # 添加淡入效果
-                envelope = min(1.0, i / 100)  # 前 100 個樣本淡入
-                sample = amplitude * envelope * math.sin(2 * math.pi * frequency * i / sample_rate)
-                sample_int = int(sample) & 0xFFFF
-                audio_data.extend(struct.pack('<h', sample_int - 65536 if sample_int > 32767 else sample_int))
-                total_sample_index += 1
-            
-            # 生成停頓（靜音）
-            for i in range(pause_samples):
-                audio_data.extend(struct.pack('<h', 0))
-                total_sample_index += 1
-        
-        # 確保達到預期的總樣本數
-        while total_sample_index < num_samples:
-            audio_data.extend(struct.pack('<h', 0))
-            total_sample_index += 1
-        
-        # 限制音訊長度為預期值
-        if len(audio_data) > num_samples * 2:
-            audio_data = audio_data[:num_samples * 2]
-        
-        # 構建WAV檔案頭
-        wav_header = bytearray()
-        wav_header.extend(b'RIFF')
-        
-        file_size = 36 + len(audio_data)
-        wav_header.extend(struct.pack('<I', file_size))
-        wav_header.extend(b'WAVE')
-        
-        # fmt子塊
-        wav_header.extend(b'fmt ')
-        wav_header.extend(struct.pack('<I', 16))  # Subchunk1Size
-        wav_header.extend(struct.pack('<H', 1))   # AudioFormat (PCM)
-        wav_header.extend(struct.pack('<H', 1))   # NumChannels (mono)
-        wav_header.extend(struct.pack('<I', sample_rate))
-        wav_header.extend(struct.pack('<I', sample_rate * 2))  # ByteRate
-        wav_header.extend(struct.pack('<H', 2))   # BlockAlign
-        wav_header.extend(struct.pack('<H', 16))  # BitsPerSample
-        
-        # data子塊
-        wav_header.extend(b'data')
-        wav_header.extend(struct.pack('<I', len(audio_data)))
-        
-        wav_file = wav_header + audio_data
+            # 生成聲調樣本（整段一次向量化計算），前 100 個樣本淡入
+            t = np.arange(tone_samples, dtype=np.float64)
+            envelope = np.minimum(1.0, t / 100)
+            chunks.append((amplitude * envelope * np.sin(2 * np.pi * freq_fn(t) * t / sample_rate)).astype(np.int16))
+            # 停頓（靜音）
+            gaps.append(pause_samples)
+        
+        # 補齊或截斷到預期的總樣本數
+        audio = audio_utils.concat(chunks, gaps)[:num_samples]
+        if len(audio) < num_samples:
+            audio = audio_utils.concat([audio], [num_samples - len(audio)])
+        
+        wav_file = audio_utils.to_wav_bytes(audio, sample_rate)
         
         logging.info('台語聲調音頻生成完成，大小: %d bytes', len(wav_file))
         
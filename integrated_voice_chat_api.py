@@ -6,30 +6,36 @@
 
 端點:
 - POST /api/stt - 語音轉文字
-- POST /api/chat - 發送訊息給 LLM 並獲得回應
+- POST /api/chat - 發送訊息給 LLM 並獲得回應（stream=true 時以 SSE / NDJSON 逐句串流）
 - POST /api/tts - 文字轉台語語音
+- POST /api/tts_stream - 文字轉台語語音（SSE 逐段串流 PCM）
+- POST /api/voice_turn - 語音進、文字與語音串流出（STT → LLM → TTS 管線）
 - GET /api/health - 健康檢查
 """
 
 import os
 import sys
-import tempfile
 import time
 import json
+import re
+import queue
+import threading
+from difflib import SequenceMatcher
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import base64
 import wave
-import requests
-from websocket import create_connection, ABNF
-import audioop
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
 
 # 添加模組路徑
 BASE_DIR = Path(__file__).parent
 sys.path.insert(0, str(BASE_DIR / "yating1"))
 sys.path.insert(0, str(BASE_DIR / "wadija_llm"))
 sys.path.insert(0, str(BASE_DIR / "taiwanese_tonal_tlpa_tacotron2_hsien1"))
+PROFILE_PATH = BASE_DIR / "wadija_llm" / "profile_db.json"
+
+import audio_utils
 
 # ============================================================================
 # 初始化 Flask 應用
@@ -70,9 +76,36 @@ YATING_PIPELINE = "asr-zh-en-nan"
 YATING_TOKEN_URL = "https://asr.api.yating.tw/v1/token"
 YATING_WS_URL = "wss://asr.api.yating.tw/ws/v1/"
 
+# Yating 用戶端：token 快取到期前重複使用，錄音全速上傳（Flask 與 ASGI 版共用）
+from yating_client import YatingClient
+yating_client = YatingClient(
+    YATING_API_KEY, YATING_PIPELINE, YATING_TOKEN_URL, YATING_WS_URL,
+    token_ttl=float(os.getenv("YATING_TOKEN_TTL", "300") or 300)
+)
+
 # STT 信心度門檻（Google 低於此值才切到 Yating 台語 STT）
 GOOGLE_CONF_MIN = 0.80
 
+# STT 路由模式：
+# - sequential: Google 完成且信心不足才送 Yating（兩者延遲相加）
+# - parallel: 同時送出 Google 與 Yating
+# - hedged: 先送 Google，STT_HEDGE_DELAY 秒內沒有高信心結果再同時送 Yating
+# Google 高信心即採用並取消 Yating；否則採用 Yating，最差延遲約為兩者較慢者
+STT_ROUTING = os.getenv("STT_ROUTING", "hedged")
+STT_HEDGE_DELAY = float(os.getenv("STT_HEDGE_DELAY", "0.8") or 0)
+stt_executor = ThreadPoolExecutor(max_workers=int(os.getenv("STT_THREADS", "8") or 8), thread_name_prefix="stt")
+
+# 上傳音訊的 VAD 前處理：去除首尾靜音、全靜音直接拒絕（不呼叫任何 STT），
+# 長錄音在停頓處切成不超過 VAD_MAX_CHUNK_SEC 的視窗（須低於 Google 同步辨識約 55 秒的上限），
+# 各視窗在 STT_CHUNK_WORKERS 個工作的池內同時辨識，總延遲約為一個視窗而非相加；
+# 在語音中間切開的視窗與前一視窗重疊 STT_CHUNK_OVERLAP_SEC 秒，合併時去除重複文字
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") != "0"
+VAD_MAX_CHUNK_SEC = float(os.getenv("VAD_MAX_CHUNK_SEC", "20") or 20)
+STT_CHUNK_OVERLAP_SEC = float(os.getenv("STT_CHUNK_OVERLAP_SEC", "1.0") or 0)
+STT_CHUNK_WORKERS = int(os.getenv("STT_CHUNK_WORKERS", "4") or 4)
+# 視窗辨識另用一個池：recognize_speech 在 stt_executor 內等待 Google / Yating，共用會互等而卡死
+chunk_executor = ThreadPoolExecutor(max_workers=STT_CHUNK_WORKERS, thread_name_prefix="stt-chunk")
+
 # 設定 Google Cloud 認證
 CREDS_PATH = str(BASE_DIR / "yating1" / "newproject0901-470807-038aaaad5572.json")
 if os.path.exists(CREDS_PATH):
@@ -99,18 +132,19 @@ try:
         sys.path.insert(0, wadija_path)
     
     try:
-        from rag_tools_v2 import load_elder_profile, build_system_prompt
+        from rag_tools_v2 import (load_elder_profile, build_system_prompt, with_dynamic_vocab,
+                                  reload_changed_dictionaries, resolve_dict_path, KNOWLEDGE_FILES)
         
         # 載入長輩資料
-        profile_path = BASE_DIR / "wadija_llm" / "profile_db.json"
-        if profile_path.exists():
-            profile_data = load_elder_profile(str(profile_path))
+        if PROFILE_PATH.exists():
+            profile_data = load_elder_profile(str(PROFILE_PATH))
         else:
-            print(f"⚠️ 找不到長輩資料: {profile_path}，使用預設")
+            print(f"⚠️ 找不到長輩資料: {PROFILE_PATH}，使用預設")
             profile_data = None
     except ImportError as e:
         print(f"⚠️ RAG 工具載入失敗: {e}，使用簡化模式")
         build_system_prompt = None
+        with_dynamic_vocab = None
         profile_data = None
     
     # 微調模型 ID
@@ -122,49 +156,203 @@ except Exception as e:
     llm_client = None
     profile_data = None
     build_system_prompt = None
+    with_dynamic_vocab = None
 
 try:
     # TTS 模組
     from taiwanese_tts_v2 import TaiwaneseTextToSpeech
+    from synthesis_pool import SynthesisQueueFull
+    from synthesis_cache import SynthesisCache
     
-    # 初始化 TTS 系統
+    # 合成快取：重複的台羅句直接回傳（TTS_CACHE_DIR 設為空字串則只用記憶體層）
+    tts_cache = SynthesisCache(
+        cache_dir=os.getenv("TTS_CACHE_DIR", str(BASE_DIR / "tts_cache")) or None,
+        max_disk_mb=float(os.getenv("TTS_CACHE_MB", "256") or 256)
+    )
+    # 子句快取：長回覆中與先前重複的子句（開場白、結尾語）不再重新合成
+    tts_segment_cache = SynthesisCache(
+        cache_dir=os.getenv("TTS_SEGMENT_CACHE_DIR", str(BASE_DIR / "tts_cache_segments")) or None,
+        max_memory_items=1024,
+        max_disk_mb=float(os.getenv("TTS_SEGMENT_CACHE_MB", "256") or 256),
+        suffix=".pcm"
+    )
+    
+    # 初始化 TTS 系統（TTS_WORKERS>0 時改用常駐合成子行程池）
     tts_system = TaiwaneseTextToSpeech(
-        enable_chinese_conversion=True
+        enable_chinese_conversion=True,
+        num_workers=int(os.getenv("TTS_WORKERS", "0") or 0),
+        max_queue=int(os.getenv("TTS_MAX_QUEUE", "16") or 16),
+        max_batch=int(os.getenv("TTS_MAX_BATCH", "4") or 4),
+        cache=tts_cache,
+        segment_cache=tts_segment_cache
     )
     
+    # 台語辭典為行程共用、第一次轉換時才載入；啟動後先在背景預熱，避免第一個請求等待
+    try:
+        from tlpa_dictionary import get_dictionary_service, dictionary_stats
+        threading.Thread(target=get_dictionary_service, daemon=True).start()
+    except ImportError:
+        dictionary_stats = None
+    
     print("✓ TTS 模組載入成功")
 except Exception as e:
     print(f"⚠️ TTS 模組載入失敗: {e}")
     tts_system = None
+    dictionary_stats = None
+
+    class SynthesisQueueFull(RuntimeError):
+        pass
 
 # ============================================================================
 # 對話歷史管理
 # ============================================================================
-# 使用字典儲存每個會話的對話歷史
-conversation_sessions = {}
+DEFAULT_SYSTEM_PROMPT = "你是一個友善的台灣台語 AI 助手。請用台語（台羅漢字或台灣台語漢字）直接回答用戶的問題。"
+
+# 會話儲存：LRU 容量上限 + 閒置逾時 + 歷史則數 / Token 預算；SESSION_DB 指定 SQLite 檔案則重啟後可接續
+try:
+    from session_store import SessionStore
+except ImportError:
+    from wadija_llm.session_store import SessionStore
+
+session_store = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "1000") or 1000),
+    idle_ttl=float(os.getenv("SESSION_TTL", "3600") or 0),
+    max_messages=int(os.getenv("SESSION_MAX_HISTORY", "20") or 20),
+    max_history_tokens=int(os.getenv("SESSION_MAX_TOKENS", "3000") or 0) or None,
+    db_path=os.getenv("SESSION_DB") or None
+)
+
+# 滾動摘要：歷史超過 Token 預算時，背景以 LLM 把較舊的對話濃縮成記憶筆記（SUMMARY_ENABLED=0 停用）
+try:
+    from conversation_memory import ConversationSummarizer, with_summary
+except ImportError:
+    from wadija_llm.conversation_memory import ConversationSummarizer, with_summary
+
+summarizer = None
+if llm_client and os.getenv("SUMMARY_ENABLED", "1") != "0":
+    summarizer = ConversationSummarizer(
+        llm_client,
+        model=os.getenv("SUMMARY_MODEL", "gpt-4o-mini"),
+        trigger_tokens=int(os.getenv("SUMMARY_TRIGGER_TOKENS", "1500") or 1500),
+        trigger_messages=max(4, session_store.max_messages - 6),
+        keep_messages=int(os.getenv("SUMMARY_KEEP_MESSAGES", "6") or 6)
+    )
+
+def _new_system_prompt():
+    """新會話的 System Prompt（靜態部分依個資與字典內容快取，每個會話逐字相同）"""
+    if llm_client and profile_data and build_system_prompt:
+        try:
+            return build_system_prompt(profile_data)
+        except Exception as e:
+            print(f"⚠️ 無法生成系統提示詞: {e}")
+    return DEFAULT_SYSTEM_PROMPT
 
 def get_or_create_session(session_id):
     """獲取或創建會話"""
-    if session_id not in conversation_sessions:
-        # 初始化新會話
-        if llm_client and profile_data and build_system_prompt:
-            try:
-                system_prompt = build_system_prompt(profile_data)
-            except Exception as e:
-                print(f"⚠️ 無法生成系統提示詞: {e}")
-                system_prompt = "你是一個友善的台灣台語 AI 助手。請用台語（台羅漢字或台灣台語漢字）直接回答用戶的問題。"
-            
-            conversation_sessions[session_id] = {
-                "messages": [{"role": "system", "content": system_prompt}],
-                "created_at": time.time()
-            }
-        else:
-            conversation_sessions[session_id] = {
-                "messages": [{"role": "system", "content": "你是一個友善的台灣台語 AI 助手。請用台語（台羅漢字或台灣台語漢字）直接回答用戶的問題。"}],
-                "created_at": time.time()
-            }
-    
-    return conversation_sessions[session_id]
+    return session_store.get_or_create(session_id, _new_system_prompt)
+
+def _llm_messages(session, user_message):
+    """
+    本輪送給 LLM 的訊息：System Prompt → 記憶筆記 → 近期對話 → 即時詞彙 → 本輪輸入
+    摘要、即時詞彙與本輪輸入都不寫回歷史（有回覆才由 _finish_turn 一起寫入），維持可快取的前綴
+    """
+    # 先取歷史再取摘要：摘要工作先換上摘要才移除舊對話，兩者至少看得到其一
+    history = list(session["messages"]) + [{"role": "user", "content": user_message}]
+    messages = with_summary(history, session.get("summary"))
+    if with_dynamic_vocab and profile_data:
+        try:
+            return with_dynamic_vocab(messages, user_message)
+        except Exception as e:
+            print(f"⚠️ 動態詞彙檢索失敗: {e}")
+    return messages
+
+def _finish_turn(session_id, session, user_message, reply):
+    """
+    一輪對話結束：使用者訊息與回覆一起寫入歷史，必要時送出背景摘要，再裁切並保存
+    LLM 失敗、逾時或客戶端中斷時不呼叫，歷史不會留下沒有回覆的使用者訊息（Flask 與 ASGI 版共用）
+    """
+    with session_store.lock:
+        session["messages"].extend([
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": reply},
+        ])
+    if summarizer is not None:
+        summarizer.maybe_summarize(session, on_done=lambda: session_store.commit(session_id),
+                                   lock=session_store.lock)
+    session_store.commit(session_id)
+
+# ============================================================================
+# 熱更新：個資與字典修改後在背景重新載入，不需重啟（模型保持常駐）
+# ============================================================================
+HOT_RELOAD_INTERVAL = float(os.getenv("HOT_RELOAD_INTERVAL", "5") or 0)  # 0 表示停用
+
+def _current_system_prompt():
+    """目前個資與字典對應的靜態 System Prompt（依內容雜湊快取，通常不需重新組裝）"""
+    if llm_client and profile_data and build_system_prompt:
+        return build_system_prompt(profile_data)
+    return None
+
+def _refresh_session_prompts(old_prompt):
+    """沿用舊 System Prompt 的會話換成新版本（對話歷史保留）"""
+    new_prompt = _current_system_prompt()
+    if old_prompt is None or new_prompt is None or new_prompt == old_prompt:
+        return
+    updated = 0
+    # 與背景摘要共用同一把鎖：摘要以 messages[:] 整批換掉歷史，不加鎖時這裡換上的 Prompt 可能被蓋回舊版
+    with session_store.lock:
+        for session in session_store.sessions():
+            messages = session["messages"]
+            if messages and messages[0].get("content") == old_prompt:
+                messages[0] = {"role": "system", "content": new_prompt}
+                updated += 1
+    print(f"✓ System Prompt 已更新 ({updated} 個會話)")
+
+def _reload_profile():
+    """重新讀取長輩個資；新個資與 Prompt 都準備好才換上"""
+    global profile_data
+    old_prompt = _current_system_prompt()
+    new_profile = load_elder_profile(str(PROFILE_PATH))
+    if not new_profile:
+        raise RuntimeError("個資讀取失敗，沿用舊資料")
+    if build_system_prompt:
+        build_system_prompt(new_profile)  # 先組好並快取，換上後的第一個請求不必等待
+    profile_data = new_profile
+    _refresh_session_prompts(old_prompt)
+
+def _reload_rag_dictionaries():
+    old_prompt = _current_system_prompt()
+    reload_changed_dictionaries()
+    _refresh_session_prompts(old_prompt)
+
+def _start_hot_reload():
+    """登記要監看的檔案並啟動背景輪詢；任何元件不可用時就略過該組"""
+    if HOT_RELOAD_INTERVAL <= 0:
+        return None
+    try:
+        from file_watcher import FileWatcher
+    except ImportError as e:
+        print(f"⚠️ 熱更新停用: {e}")
+        return None
+    watcher = FileWatcher(interval=HOT_RELOAD_INTERVAL)
+    if llm_client and build_system_prompt:
+        watcher.watch("profile", [str(PROFILE_PATH)], _reload_profile)
+        watcher.watch("rag_dictionaries",
+                      [resolve_dict_path(filename) for _, filename in KNOWLEDGE_FILES],
+                      _reload_rag_dictionaries)
+    if tts_system is not None:
+        try:
+            from tlpa_dictionary import dictionary_source_files, reload_dictionary_service
+            watcher.watch("tts_dictionary", list(dictionary_source_files()), reload_dictionary_service)
+        except ImportError as e:
+            print(f"⚠️ 台語辭典熱更新停用: {e}")
+        converter = getattr(tts_system.text_processor, "chinese_converter", None)
+        if getattr(converter, "csv_path", None):
+            watcher.watch("chinese_converter", [converter.csv_path],
+                          tts_system.text_processor.reload_chinese_converter)
+    watcher.start()
+    return watcher
+
+hot_reloader = _start_hot_reload()
 
 # =========================================================================
 # STT 工具：Google / Yating（自動落地切換）
@@ -195,84 +383,313 @@ def google_stt_linear16(audio_bytes: bytes, rate: int = 16000, max_seconds: int
     return (alt.transcript or "").strip(), float(alt.confidence or 0.0)
 
 
-def _yating_get_token():
-    if not YATING_API_KEY:
-        raise RuntimeError("缺少 YATING_API_KEY")
-    r = requests.post(
-        YATING_TOKEN_URL,
-        headers={"key": YATING_API_KEY, "Content-Type": "application/json"},
-        json={"pipeline": YATING_PIPELINE},
-        timeout=10,
-    )
-    r.raise_for_status()
-    token = r.json().get("auth_token")
-    if not token:
-        raise RuntimeError("Yating 無 auth_token 回應")
-    return token
+def _to_16k_mono(audio_bytes: bytes, rate: int) -> bytes:
+    # 假設 int16/mono，如果取樣率不同則以多相濾波重採樣（audioop 已於 Python 3.13 移除）
+    if rate == 16000:
+        return audio_bytes
+    samples = audio_utils.pcm16_from_bytes(audio_bytes)
+    return audio_utils.resample(samples, rate, 16000).tobytes()
 
 
-def _to_16k_mono(audio_bytes: bytes, rate: int) -> bytes:
-    data = audio_bytes
-    # 假設 int16/mono，如果取樣率不同則重採樣
-    if rate != 16000:
-        data, _ = audioop.ratecv(data, 2, 1, rate, 16000, None)
-    return data
+def yating_stt_linear16(audio_bytes: bytes, rate: int = 16000, cancel: threading.Event = None):
+    """
+    呼叫 Yating WS STT，返回台語轉寫（不提供信心度）。
+
+    Args:
+        cancel: 設定後中止上傳與等待並回傳空字串（平行路由中 Google 已勝出時）
+    """
+    return yating_client.recognize(_to_16k_mono(audio_bytes, rate), cancel=cancel)
+
+
+def speech_chunks(audio_bytes: bytes, rate: int = 16000):
+    """
+    VAD 前處理（Flask 與 ASGI 版共用）：去除首尾靜音，長錄音在停頓處切成辨識視窗
+
+    Returns:
+        (chunks, vad)：chunks 為各視窗 PCM bytes，沒有偵測到語音時為空串列；
+        vad 為統計 dict(input_sec, speech_sec, chunks, windows=[[起秒, 迄秒], ...])
+    """
+    samples = audio_utils.pcm16_from_bytes(audio_bytes)
+    input_sec = round(len(samples) / rate, 3) if rate else 0.0
+    if not VAD_ENABLED:
+        windows = [(0, len(samples))] if len(samples) else []
+    else:
+        ranges = audio_utils.split_on_pauses(samples, rate, max_chunk_sec=VAD_MAX_CHUNK_SEC)
+        windows = audio_utils.overlap_windows(ranges, int(STT_CHUNK_OVERLAP_SEC * rate))
+    chunks = [samples[start:end].tobytes() for start, end in windows]
+    speech_sec = round(sum(len(chunk) // 2 for chunk in chunks) / rate, 3) if rate else 0.0
+    return chunks, {
+        "input_sec": input_sec,
+        "speech_sec": speech_sec,
+        "chunks": len(chunks),
+        "windows": [[round(start / rate, 3), round(end / rate, 3)] for start, end in windows],
+    }
+
+
+_TRANSCRIPT_PUNCT = re.compile(r"[\s，。！？、；：,.!?;:]")
+
+
+def _join_transcripts(left: str, right: str) -> str:
+    """串接兩段辨識文字；前後都是英數字時補空白"""
+    if left and right and left[-1].isascii() and left[-1].isalnum() and right[0].isascii() and right[0].isalnum():
+        return left + " " + right
+    return left + right
 
 
-def yating_stt_linear16(audio_bytes: bytes, rate: int = 16000, chunk_samples: int = 1000):
-    """呼叫 Yating WS STT，返回台語轉寫（不提供信心度）。"""
-    token = _yating_get_token()
-    ws = create_connection(f"{YATING_WS_URL}?token={token}")
-    ws.settimeout(6.0)
+def _merge_overlap(left: str, right: str, max_chars: int = 24, min_match: int = 2) -> str:
+    """
+    合併重疊視窗的辨識文字：在 left 結尾與 right 開頭各 max_chars 字內找最長相同片段，
+    去掉 right 中重複的部分（切點附近不完整的字也一併捨棄）；找不到足夠長的相同片段則直接串接
+    """
+    tail, head = left[-max_chars:], right[:max_chars]
+    norm_tail = _TRANSCRIPT_PUNCT.sub("", tail)
+    norm_head = _TRANSCRIPT_PUNCT.sub("", head)
+    match = SequenceMatcher(None, norm_tail, norm_head, autojunk=False).find_longest_match(
+        0, len(norm_tail), 0, len(norm_head))
+    if match.size < min_match:
+        return _join_transcripts(left, right)
+
+    # 正規化後的位置換回原字串位置（跳過標點與空白）
+    def original_index(text, norm_pos):
+        seen = 0
+        for i, ch in enumerate(text):
+            if not _TRANSCRIPT_PUNCT.match(ch):
+                if seen == norm_pos:
+                    return i
+                seen += 1
+        return len(text)
+
+    cut_left = len(left) - len(tail) + original_index(tail, match.a + match.size - 1) + 1
+    cut_right = original_index(head, match.b + match.size - 1) + 1
+    return left[:cut_left] + right[cut_right:]
+
+
+def merge_stt_results(results, windows=None):
+    """
+    合併各視窗 recognize_speech 的結果（Flask 與 ASGI 版共用）
+
+    Args:
+        windows: speech_chunks 回傳的 vad["windows"]；與前一視窗重疊者合併時去除重複文字
+
+    Returns:
+        單段時原樣回傳；多段時 provider 依出現順序以 + 串接、confidence 取最低者；全部失敗時回傳 None
+    """
+    windows = windows or [None] * len(results)
+    pairs = [(r, w) for r, w in zip(results, windows) if r is not None]
+    if len(pairs) <= 1:
+        return pairs[0][0] if pairs else None
+
+    transcript, prev_window = "", None
+    for result, window in pairs:
+        text = result["transcript"]
+        if prev_window and window and window[0] < prev_window[1]:
+            transcript = _merge_overlap(transcript, text)
+        else:
+            transcript = _join_transcripts(transcript, text)
+        prev_window = window
+
+    providers = list(dict.fromkeys(r["provider"] for r, _ in pairs))
+    confidences = [r["confidence"] for r, _ in pairs if r.get("confidence") is not None]
+    return {
+        "provider": "+".join(providers),
+        "transcript": transcript,
+        "confidence": min(confidences) if confidences else None,
+    }
+
+
+def _read_audio_payload():
+    """
+    從請求取出音訊資料（可接受 multipart 或 base64 JSON），預設 16k/mono/16-bit
+
+    Returns:
+        (audio_bytes, sample_rate)；未提供音訊時 audio_bytes 為 None
+    """
+    if 'audio' not in request.files:
+        data = request.get_json(silent=True) or {}
+        if 'audio' not in data:
+            return None, 16000
+        audio_data = base64.b64decode(data['audio'])
+        sample_rate = int(data.get('sample_rate', 16000) or 16000)
+    else:
+        audio_file = request.files['audio']
+        audio_data = audio_file.read()
+        sample_rate = int(request.form.get('sample_rate', 16000) or 16000)
+    return audio_data, sample_rate
+
+
+def google_confident(text: str, confidence: float) -> bool:
+    """Google 結果是否可直接採用"""
+    return bool(text) and confidence >= GOOGLE_CONF_MIN
+
+
+def stt_result(google_text: str, google_conf: float, yating_text: str):
+    """
+    依兩家結果決定回傳內容（Flask 與 ASGI 版共用）
+
+    Returns:
+        dict(provider, transcript, confidence, ...)；全部失敗時回傳 None
+    """
+    # 信心度高 → 直接用 Google (中文/台語雙模)
+    if google_confident(google_text, google_conf):
+        return {
+            "provider": "google",
+            "transcript": google_text,
+            "confidence": google_conf
+        }
+
+    # 低信心 → 用 Yating 台語 STT
+    if yating_text:
+        return {
+            "provider": "yating",
+            "transcript": yating_text,
+            "confidence": None,
+            "google_confidence": google_conf
+        }
+
+    # 若 Yating 失敗但 Google 有文字，回傳 Google 低信心結果
+    if google_text:
+        return {
+            "provider": "google_low_conf",
+            "transcript": google_text,
+            "confidence": google_conf
+        }
+
+    return None
 
+
+def _google_or_empty(audio_data: bytes, sample_rate: int):
+    if speech is None:
+        return "", 0.0
     try:
-        payload = _to_16k_mono(audio_bytes, rate)
-        chunk_bytes = max(1, chunk_samples * 2)
-        for i in range(0, len(payload), chunk_bytes):
-            ws.send(payload[i:i+chunk_bytes], opcode=ABNF.OPCODE_BINARY)
-            time.sleep(chunk_bytes / 2 / 16000.0)
-
-        # EOS x2
-        ws.send(b"", opcode=ABNF.OPCODE_BINARY)
-        time.sleep(0.1)
-        ws.send(b"", opcode=ABNF.OPCODE_BINARY)
-
-        # 等待最終 asr_final
-        deadline = time.time() + 6.0
-        text = ""
-        while time.time() < deadline:
-            try:
-                frame = ws.recv_frame()
-                if frame and frame.opcode == ABNF.OPCODE_TEXT:
-                    payload_json = json.loads(frame.data.decode("utf-8"))
-                    pipe = payload_json.get("pipe", {})
-                    if pipe.get("asr_final"):
-                        text = pipe.get("asr_sentence") or ""
-                        break
-            except Exception:
-                break
-        return text.strip()
-    finally:
-        try:
-            ws.close()
-        except Exception:
-            pass
+        return google_stt_linear16(audio_data, rate=sample_rate)
+    except Exception as e:
+        print(f"STT Google 錯誤: {e}")
+        return "", 0.0
+
+
+def _yating_or_empty(audio_data: bytes, sample_rate: int, cancel: threading.Event = None) -> str:
+    try:
+        return yating_stt_linear16(audio_data, rate=sample_rate, cancel=cancel)
+    except Exception as e:
+        print(f"STT Yating 錯誤: {e}")
+        return ""
+
+
+def recognize_speech(audio_data: bytes, sample_rate: int = 16000, routing: str = None):
+    """
+    Google 優先、低信心改用 Yating 台語 STT（路由模式見 STT_ROUTING）
+
+    Returns:
+        dict(provider, transcript, confidence, ...)；全部失敗時回傳 None
+    """
+    routing = routing or STT_ROUTING
+    start = time.time()
+    if routing == "sequential" or speech is None or not YATING_API_KEY:
+        google_text, google_conf = _google_or_empty(audio_data, sample_rate)
+        yating_text = ""
+        if not google_confident(google_text, google_conf):
+            yating_text = _yating_or_empty(audio_data, sample_rate)
+        result = stt_result(google_text, google_conf, yating_text)
+    else:
+        result = _recognize_concurrent(audio_data, sample_rate, 0.0 if routing == "parallel" else STT_HEDGE_DELAY)
+    if result is not None:
+        print(f"STT [{routing}] {result['provider']}: {time.time() - start:.2f}s")
+    return result
+
+
+def _recognize_concurrent(audio_data: bytes, sample_rate: int, hedge_delay: float):
+    """Google 與 Yating 同時辨識；Google 高信心即回傳並取消 Yating"""
+    cancel = threading.Event()
+    google_future = stt_executor.submit(_google_or_empty, audio_data, sample_rate)
+    if hedge_delay > 0:
+        wait_futures([google_future], timeout=hedge_delay)
+        if google_future.done() and google_confident(*google_future.result()):
+            return stt_result(*google_future.result(), "")
+    yating_future = stt_executor.submit(_yating_or_empty, audio_data, sample_rate, cancel)
+
+    pending = {google_future, yating_future}
+    while pending:
+        _, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+        if google_future.done():
+            google_text, google_conf = google_future.result()
+            if google_confident(google_text, google_conf):
+                cancel.set()
+                return stt_result(google_text, google_conf, "")
+    return stt_result(*google_future.result(), yating_future.result())
+
+
+def recognize_upload(audio_data: bytes, sample_rate: int = 16000):
+    """
+    上傳音訊的完整辨識：VAD 前處理後各視窗同時 recognize_speech（chunk_executor），依序合併
+
+    Returns:
+        (result, vad)：沒有偵測到語音時 result 為 None 且 vad["chunks"] == 0
+    """
+    chunks, vad = speech_chunks(audio_data, sample_rate)
+    if len(chunks) <= 1:
+        results = [recognize_speech(chunk, sample_rate) for chunk in chunks]
+    else:
+        results = list(chunk_executor.map(recognize_speech, chunks, [sample_rate] * len(chunks)))
+    result = merge_stt_results(results, vad["windows"])
+    if result is not None:
+        result["vad"] = vad
+    return result, vad
+
+
+def _no_speech_error(vad: dict) -> dict:
+    """沒有偵測到語音時的錯誤內容（未呼叫任何 STT）"""
+    return {"error": "未偵測到語音", "vad": vad}
 
 # ============================================================================
 # API 端點
 # ============================================================================
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """健康檢查"""
-    return jsonify({
+def health_status():
+    """各服務狀態與統計（Flask 與 ASGI 版閘道共用）"""
+    health = {
         "status": "ok",
         "services": {
             "stt": speech is not None,
             "llm": llm_client is not None,
             "tts": tts_system is not None
         }
-    })
+    }
+    if tts_system is not None and tts_system.pool is not None:
+        health["tts_pool"] = tts_system.pool.metrics()
+    if tts_system is not None and tts_system.cache is not None:
+        health["tts_cache"] = tts_system.cache.stats()
+    if tts_system is not None and tts_system.segment_cache is not None:
+        health["tts_segment_cache"] = tts_system.segment_cache.stats()
+    if dictionary_stats is not None:
+        health["dictionary"] = dictionary_stats()
+    health["yating"] = yating_client.stats()
+    health["sessions"] = session_store.stats()
+    if summarizer is not None:
+        health["summarizer"] = summarizer.stats()
+    if hot_reloader is not None:
+        health["hot_reload"] = hot_reloader.stats()
+    return health
+
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    """健康檢查"""
+    return jsonify(health_status())
+
+
+def _tts_busy_response():
+    """合成佇列已滿時的 503 回應"""
+    return jsonify({
+        "success": False,
+        "error": "語音合成忙碌中，請稍後再試"
+    }), 503, {"Retry-After": "2"}
+
+def _tts_saturated(tlpa_text, segmented=False):
+    """
+    合成子行程池已滿且這段台羅有快取未命中的內容（Flask 與 ASGI 版共用）
+    快取命中的招呼語、提醒不需合成，池滿時照常回應
+    """
+    pool = tts_system.pool
+    return pool is not None and pool.is_saturated() and tts_system.needs_synthesis(tlpa_text, segmented)
 
 @app.route('/api/stt', methods=['POST'])
 def speech_to_text():
@@ -287,64 +704,20 @@ def speech_to_text():
                 "error": "STT 未初始化，缺少 Google 或 Yating 配置"
             }), 503
 
-        # 取得音訊資料（可接受 multipart 或 base64 JSON），預設 16k/mono/16-bit
-        sample_rate = 16000
-        if 'audio' not in request.files:
-            data = request.get_json() or {}
-            if 'audio' not in data:
-                return jsonify({"error": "未提供音頻數據"}), 400
-            audio_data = base64.b64decode(data['audio'])
-            sample_rate = int(data.get('sample_rate', 16000) or 16000)
-        else:
-            audio_file = request.files['audio']
-            audio_data = audio_file.read()
-            sample_rate = int(request.form.get('sample_rate', 16000) or 16000)
+        audio_data, sample_rate = _read_audio_payload()
+        if audio_data is None:
+            return jsonify({"error": "未提供音頻數據"}), 400
 
-        google_text, google_conf = "", 0.0
-        if speech is not None:
-            try:
-                google_text, google_conf = google_stt_linear16(audio_data, rate=sample_rate)
-            except Exception as e:
-                print(f"STT Google 錯誤: {e}")
-
-        # 信心度高 → 直接用 Google (中文/台語雙模)
-        if google_text and google_conf >= GOOGLE_CONF_MIN:
-            return jsonify({
-                "success": True,
-                "provider": "google",
-                "transcript": google_text,
-                "confidence": google_conf
-            })
-
-        # 低信心 → 切 Yating 台語 STT
-        yating_text = ""
-        try:
-            yating_text = yating_stt_linear16(audio_data, rate=sample_rate)
-        except Exception as e:
-            print(f"STT Yating 錯誤: {e}")
-
-        if yating_text:
+        result, vad = recognize_upload(audio_data, sample_rate)
+        if not vad["chunks"]:
+            return jsonify({"success": False, **_no_speech_error(vad)}), 400
+        if result is None:
             return jsonify({
-                "success": True,
-                "provider": "yating",
-                "transcript": yating_text,
-                "confidence": None,
-                "google_confidence": google_conf
-            })
-
-        # 若 Yating 失敗但 Google 有文字，回傳 Google 低信心結果
-        if google_text:
-            return jsonify({
-                "success": True,
-                "provider": "google_low_conf",
-                "transcript": google_text,
-                "confidence": google_conf
-            })
+                "success": False,
+                "error": "無法識別語音"
+            }), 400
 
-        return jsonify({
-            "success": False,
-            "error": "無法識別語音"
-        }), 400
+        return jsonify({"success": True, **result})
 
     except Exception as e:
         print(f"STT 錯誤: {e}")
@@ -358,6 +731,17 @@ def chat():
     """
     LLM 對話
     接收用戶訊息，返回 AI 回應
+
+    請求帶 "stream": true（或 Accept: text/event-stream / application/x-ndjson）時改為串流：
+    LLM 以 stream=True 邊生成邊切句，每句完成即轉台羅送出，
+    前端與 TTS 不必等整段回覆。"format": "ndjson" 改以每行一筆 JSON 輸出（預設 SSE）。
+
+    串流事件:
+    - delta: LLM 回覆片段
+    - sentence: 完整句子與台羅 (index, text, tlpa)
+    - reply: 完整回覆與台羅
+    - done: 首字、首句與總耗時
+    - error: LLM 失敗
     """
     try:
         if not llm_client:
@@ -369,38 +753,25 @@ def chat():
         
         if not user_message:
             return jsonify({"error": "訊息不能為空"}), 400
+
+        accept = request.headers.get('Accept', '')
+        stream_format = data.get('format') or ('ndjson' if 'application/x-ndjson' in accept else 'sse')
+        if data.get('stream') or 'text/event-stream' in accept or 'application/x-ndjson' in accept:
+            return _chat_stream(session_id, user_message, stream_format)
         
-        # 獲取會話
+        # 獲取會話（本輪訊息等有回覆才寫入歷史）
         session = get_or_create_session(session_id)
-        messages = session["messages"]
         
-        # 添加用戶訊息
-        messages.append({"role": "user", "content": user_message})
-        
-        # 呼叫 OpenAI API
-        response = llm_client.chat.completions.create(
-            model=FINE_TUNED_MODEL,
-            messages=messages,
-            temperature=0.8,
-            max_tokens=150,
-            presence_penalty=0.4
-        )
-        
-        # 提取 AI 回應
-        ai_reply = response.choices[0].message.content.strip()
+        # 呼叫 OpenAI API（串流接收後組回完整回覆）
+        ai_reply = "".join(delta for event, delta in _iter_llm_reply(session, user_message) if event == "delta").strip()
         
         # 完整轉換為台羅數字調（add_pauses=True 確保生成可直接合成的完整台羅文本）
         tlpa_text = tts_system.text_processor.process_text(ai_reply, add_pauses=True, convert_chinese=True) if tts_system else ai_reply
         log_terminal(f"\n[台羅轉換] 原文: {ai_reply}")
         log_terminal(f"[台羅轉換] 台羅: {tlpa_text}\n")
         
-        # 添加到對話歷史
-        messages.append({"role": "assistant", "content": ai_reply})
-        
-        # 記憶體管理：限制對話歷史長度
-        MAX_HISTORY = 20
-        if len(messages) > MAX_HISTORY:
-            messages = [messages[0]] + messages[-(MAX_HISTORY-1):]
+        # 本輪訊息與回覆加入對話歷史，依則數與 Token 預算就地裁切並保存
+        _finish_turn(session_id, session, user_message, ai_reply)
         
         return jsonify({
             "success": True,
@@ -416,6 +787,56 @@ def chat():
             "error": str(e)
         }), 500
 
+def _chat_stream(session_id, user_message, stream_format):
+    """/api/chat 的串流回應：逐句轉台羅，句子完成即送出"""
+    encode = _ndjson_event if stream_format == 'ndjson' else _sse_event
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'text/event-stream'
+
+    def generate():
+        start = time.time()
+        timings = {}
+        session = get_or_create_session(session_id)
+
+        reply_parts = []
+        tlpa_parts = []
+        index = 0
+        try:
+            for event, text in _iter_llm_reply(session, user_message):
+                if event == "delta":
+                    if not reply_parts:
+                        timings["first_token"] = round(time.time() - start, 3)
+                    reply_parts.append(text)
+                    yield encode("delta", {"text": text})
+                    continue
+                tlpa = text
+                if tts_system is not None:
+                    tlpa = tts_system.text_processor.process_text(text, add_pauses=True, convert_chinese=True)
+                if index == 0:
+                    timings["first_sentence"] = round(time.time() - start, 3)
+                tlpa_parts.append(tlpa)
+                yield encode("sentence", {"index": index, "text": text, "tlpa": tlpa})
+                index += 1
+        except Exception as e:
+            log_terminal(f"Chat 串流錯誤: {e}")
+            yield encode("error", {"stage": "llm", "error": str(e)})
+
+        reply = "".join(reply_parts).strip()
+        if reply:
+            _finish_turn(session_id, session, user_message, reply)
+        reply_tlpa = " ".join(tlpa_parts)
+        log_terminal(f"\n[台羅轉換] 原文: {reply}")
+        log_terminal(f"[台羅轉換] 台羅: {reply_tlpa}\n")
+
+        timings["total"] = round(time.time() - start, 3)
+        yield encode("reply", {"reply": reply, "reply_tlpa": reply_tlpa, "session_id": session_id})
+        yield encode("done", {"sentences": index, "timings": timings})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/api/tts', methods=['POST'])
 def text_to_speech():
     """
@@ -438,10 +859,6 @@ def text_to_speech():
             log_terminal(f"⚠️ 跳過純標點句子: {text}")
             return jsonify({"error": "句子必須包含有意義的文字"}), 400
         
-        # 創建臨時文件
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            output_path = temp_file.name
-        
         # 合成語音 - 顯示詳細處理過程
         log_terminal("\n" + "="*60)
         log_terminal(f"📝 TTS 請求")
@@ -460,41 +877,36 @@ def text_to_speech():
             tlpa_text = tts_system.text_processor.process_text(text, add_pauses=True, convert_chinese=True)
             log_terminal(f"原始文字: {text}")
             log_terminal(f"轉換台羅: {tlpa_text}")
+
+        # 背壓只擋需要合成的請求：先查快取
+        if _tts_saturated(tlpa_text):
+            return _tts_busy_response()
         
-        # 使用台羅文本進行合成（convert_chinese=False 因為已經是台羅）
-        result = tts_system.synthesize(tlpa_text, output_path, convert_chinese=False)
+        # 使用台羅文本直接在記憶體中合成 WAV（不經暫存檔）
+        wav_data = tts_system.synthesize_wav_bytes(tlpa_text)
         
-        if result and os.path.exists(output_path):
-            # 檢查檔案大小（太小可能是合成失敗）
-            file_size = os.path.getsize(output_path)
-            if file_size < 1000:  # 小於 1KB 可能有問題
-                log_terminal(f"⚠️ 音檔過小 ({file_size} bytes)，可能合成失敗")
-                log_terminal("="*60 + "\n")
-                os.remove(output_path)
-                return jsonify({"error": "語音合成失敗（音檔過小）"}), 500
-            
-            log_terminal(f"✓ 音檔已生成: {file_size} bytes")
+        # 檢查音檔大小（太小可能是合成失敗）
+        file_size = len(wav_data)
+        if file_size < 1000:  # 小於 1KB 可能有問題
+            log_terminal(f"⚠️ 音檔過小 ({file_size} bytes)，可能合成失敗")
             log_terminal("="*60 + "\n")
+            return jsonify({"error": "語音合成失敗（音檔過小）"}), 500
+        
+        log_terminal(f"✓ 音檔已生成: {file_size} bytes")
+        log_terminal("="*60 + "\n")
+        
+        # 返回 JSON 包含台羅拼音與音檔（base64 以便在一個 JSON 回應中同時傳回）
+        return jsonify({
+            "success": True,
+            "text": text,
+            "tlpa": tlpa_text,
+            "audio": base64.b64encode(wav_data).decode('utf-8'),
+            "file_size": file_size
+        })
             
-            # 讀取音檔並轉為 base64（以便在一個 JSON 回應中同時傳回台羅拼音與音檔）
-            with open(output_path, 'rb') as f:
-                audio_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # 清理臨時文件
-            os.remove(output_path)
-            
-            # 返回 JSON 包含台羅拼音與音檔
-            return jsonify({
-                "success": True,
-                "text": text,
-                "tlpa": tlpa_text,
-                "audio": audio_data,
-                "file_size": file_size
-            })
-        else:
-            log_terminal(f"✗ 語音合成失敗，未生成檔案")
-            return jsonify({"error": "語音合成失敗"}), 500
-            
+    except SynthesisQueueFull:
+        log_terminal("⚠️ 合成佇列已滿，回應 503")
+        return _tts_busy_response()
     except Exception as e:
         import traceback
         log_terminal(f"TTS 錯誤: {e}")
@@ -504,6 +916,326 @@ def text_to_speech():
             "error": f"語音合成失敗: {str(e)}"
         }), 500
 
+def _sse_event(event: str, payload: dict) -> str:
+    """組成一筆 Server-Sent Events 訊息"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def _ndjson_event(event: str, payload: dict) -> str:
+    """組成一行 JSON（NDJSON 串流）：事件名稱放在 event 欄位"""
+    return json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+
+@app.route('/api/tts_stream', methods=['POST'])
+def text_to_speech_stream():
+    """
+    文字轉語音（串流版）
+    依標點切段，每段 WaveGlow 完成即以 SSE 送出該段 PCM（16bit/mono，little-endian），
+    客戶端不必等整段回覆合成完畢即可開始播放。
+
+    事件:
+    - meta: 台羅文本與音訊格式
+    - audio: 單段音訊 (index, tlpa, pcm=base64)
+    - done: 全部段落完成
+    - error: 合成失敗
+    """
+    if not tts_system or not tts_system.available:
+        return jsonify({"error": "TTS 服務未初始化"}), 500
+
+    data = request.get_json() or {}
+    text = data.get('text', '').strip()
+    segment_pause_sec = float(data.get('segment_pause_sec', 0.18))
+
+    if not text:
+        return jsonify({"error": "文字不能為空"}), 400
+
+    import re
+    if not re.search(r'[\u4e00-\u9fa5a-zA-Z0-9]', text):
+        log_terminal(f"⚠️ 跳過純標點句子: {text}")
+        return jsonify({"error": "句子必須包含有意義的文字"}), 400
+
+    # 檢測是否已經是台羅數字調格式（包含數字 0-9）
+    if re.search(r'[0-9]', text):
+        tlpa_text = text
+    else:
+        tlpa_text = tts_system.text_processor.process_text(text, add_pauses=False, convert_chinese=True)
+
+    # 背壓只擋需要合成的請求：每段都在段落快取中就照常串流
+    if _tts_saturated(tlpa_text, segmented=True):
+        return _tts_busy_response()
+
+    log_terminal(f"\n📡 TTS 串流請求: {text}")
+    log_terminal(f"轉換台羅: {tlpa_text}")
+
+    def generate():
+        start = time.time()
+        count = 0
+        yield _sse_event("meta", {
+            "text": text,
+            "tlpa": tlpa_text,
+            "sample_rate": tts_system.sample_rate,
+            "channels": 1,
+            "sample_width": 2,
+        })
+        try:
+            for segment in tts_system.iter_segment_audio(tlpa_text, segment_pause_sec=segment_pause_sec):
+                if count == 0:
+                    log_terminal(f"⏱ 首段音訊: {time.time() - start:.2f}s")
+                count += 1
+                yield _sse_event("audio", {
+                    "index": segment["index"],
+                    "tlpa": segment["tlpa"],
+                    "pcm": base64.b64encode(segment["samples"].tobytes()).decode('utf-8'),
+                    "sample_rate": segment["sample_rate"],
+                })
+        except SynthesisQueueFull:
+            log_terminal("⚠️ 合成佇列已滿，串流中止")
+            yield _sse_event("error", {"error": "語音合成忙碌中，請稍後再試", "busy": True})
+            return
+        except Exception as e:
+            log_terminal(f"TTS 串流錯誤: {e}")
+            yield _sse_event("error", {"error": f"語音合成失敗: {str(e)}"})
+            return
+        log_terminal(f"✓ 串流完成: {count} 段, {time.time() - start:.2f}s")
+        yield _sse_event("done", {"segments": count, "elapsed": round(time.time() - start, 3)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============================================================================
+# 語音對話管線：STT → LLM（串流）→ TTS（逐句）一次完成
+# ============================================================================
+
+class SentenceBuffer:
+    """累積 LLM 串流片段，遇到句尾標點即切出完整句子"""
+
+    SENTENCE_END = re.compile(r'[。！？!?\n]+|(?<![0-9])\.(?![0-9])')
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, delta: str) -> list:
+        """加入新片段，回傳已完整的句子（可能為空）"""
+        self._buffer += delta
+        sentences = []
+        while True:
+            match = self.SENTENCE_END.search(self._buffer)
+            if not match:
+                break
+            sentence = self._buffer[:match.end()].strip()
+            self._buffer = self._buffer[match.end():]
+            if re.search(r'[\u4e00-\u9fa5a-zA-Z0-9]', sentence):
+                sentences.append(sentence)
+        return sentences
+
+    def flush(self) -> list:
+        """串流結束時取出剩餘文字"""
+        sentence = self._buffer.strip()
+        self._buffer = ""
+        if sentence and re.search(r'[\u4e00-\u9fa5a-zA-Z0-9]', sentence):
+            return [sentence]
+        return []
+
+
+def _iter_llm_reply(session, user_message):
+    """
+    以 stream=True 呼叫 LLM，依序產生 ("delta", 片段) 與 ("sentence", 完整句子)
+    產生器被關閉（客戶端中斷）時一併關閉 HTTP 串流，不再接收剩餘 token
+    """
+    stream = llm_client.chat.completions.create(
+        model=FINE_TUNED_MODEL,
+        messages=_llm_messages(session, user_message),
+        temperature=0.8,
+        max_tokens=150,
+        presence_penalty=0.4,
+        stream=True
+    )
+    buffer = SentenceBuffer()
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            yield "delta", delta
+            for sentence in buffer.feed(delta):
+                yield "sentence", sentence
+        for sentence in buffer.flush():
+            yield "sentence", sentence
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+@app.route('/api/voice_turn', methods=['POST'])
+def voice_turn():
+    """
+    一次完成一輪語音對話（SSE 串流）
+    LLM 以 stream=True 邊生成邊切句，第一句完成即開始台語合成，
+    不必等整段回覆產生完畢。
+
+    事件:
+    - transcript: 語音辨識結果
+    - delta: LLM 回覆片段
+    - sentence: 已送入合成的完整句子 (index, text, tlpa)
+    - audio: 單段音訊 (sentence, index, tlpa, pcm=base64, sample_rate)
+    - reply: 完整回覆與台羅
+    - done: 本輪完成與各階段耗時
+    - error: 任一階段失敗
+    """
+    if (speech is None) and (not YATING_API_KEY):
+        return jsonify({"success": False, "error": "STT 未初始化，缺少 Google 或 Yating 配置"}), 503
+    if not llm_client:
+        return jsonify({"error": "LLM 服務未初始化"}), 500
+
+    try:
+        audio_data, sample_rate = _read_audio_payload()
+    except (ValueError, TypeError) as e:
+        # base64 錯誤（binascii.Error 為 ValueError 子類別）或 sample_rate 不是整數
+        return jsonify({"success": False, "error": f"音頻數據格式錯誤: {e}"}), 400
+    if audio_data is None:
+        return jsonify({"error": "未提供音頻數據"}), 400
+
+    if 'audio' in request.files:
+        session_id = request.form.get('session_id', 'default')
+        with_audio = request.form.get('tts', 'true').lower() != 'false'
+    else:
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id', 'default')
+        with_audio = bool(data.get('tts', True))
+    with_audio = with_audio and tts_system is not None and tts_system.available
+
+    def generate():
+        start = time.time()
+        timings = {}
+
+        # 1. 語音轉文字
+        try:
+            result, vad = recognize_upload(audio_data, sample_rate)
+        except Exception as e:
+            log_terminal(f"語音對話 STT 錯誤: {e}")
+            yield _sse_event("error", {"stage": "stt", "error": str(e)})
+            return
+        timings["stt"] = round(time.time() - start, 3)
+        if not vad["chunks"]:
+            yield _sse_event("error", {"stage": "stt", **_no_speech_error(vad)})
+            return
+        if result is None:
+            yield _sse_event("error", {"stage": "stt", "error": "無法識別語音"})
+            return
+        user_message = result["transcript"]
+        yield _sse_event("transcript", result)
+        log_terminal(f"\n🎙 語音對話 [{session_id}] 辨識 ({result['provider']}): {user_message}")
+
+        session = get_or_create_session(session_id)
+
+        # LLM 與 TTS 各自在背景執行緒，事件統一匯入 events 由本產生器依序送出
+        events = queue.Queue()
+        sentences = queue.Queue()
+        stop = threading.Event()
+
+        def llm_worker():
+            reply_parts = []
+            index = 0
+            replies = _iter_llm_reply(session, user_message)
+            try:
+                for event, text in replies:
+                    if stop.is_set():
+                        break
+                    if event == "sentence":
+                        sentences.put((index, text))
+                        index += 1
+                        continue
+                    if not reply_parts:
+                        timings["first_token"] = round(time.time() - start, 3)
+                    reply_parts.append(text)
+                    events.put(("delta", {"text": text}))
+                events.put(("_reply", "".join(reply_parts).strip()))
+            except Exception as e:
+                log_terminal(f"語音對話 LLM 錯誤: {e}")
+                events.put(("error", {"stage": "llm", "error": str(e)}))
+            finally:
+                replies.close()
+                sentences.put(None)
+                events.put(("_llm_done", None))
+
+        def tts_worker():
+            try:
+                while not stop.is_set():
+                    item = sentences.get()
+                    if item is None:
+                        break
+                    index, sentence = item
+                    tlpa = sentence
+                    if tts_system is not None:
+                        tlpa = tts_system.text_processor.process_text(sentence, add_pauses=False, convert_chinese=True)
+                    events.put(("sentence", {"index": index, "text": sentence, "tlpa": tlpa}))
+                    if not with_audio:
+                        continue
+                    try:
+                        for segment in tts_system.iter_segment_audio(tlpa):
+                            if stop.is_set():
+                                break
+                            if "first_audio" not in timings:
+                                timings["first_audio"] = round(time.time() - start, 3)
+                            events.put(("audio", {
+                                "sentence": index,
+                                "index": segment["index"],
+                                "tlpa": segment["tlpa"],
+                                "pcm": base64.b64encode(segment["samples"].tobytes()).decode('utf-8'),
+                                "sample_rate": segment["sample_rate"],
+                            }))
+                    except SynthesisQueueFull:
+                        events.put(("error", {"stage": "tts", "sentence": index, "error": "語音合成忙碌中", "busy": True}))
+                    except Exception as e:
+                        log_terminal(f"語音對話 TTS 錯誤: {e}")
+                        events.put(("error", {"stage": "tts", "sentence": index, "error": str(e)}))
+            finally:
+                events.put(("_tts_done", None))
+
+        threading.Thread(target=llm_worker, daemon=True).start()
+        threading.Thread(target=tts_worker, daemon=True).start()
+
+        reply = ""
+        tlpa_parts = []
+        pending = 2
+        try:
+            while pending:
+                event, payload = events.get()
+                if event in ("_llm_done", "_tts_done"):
+                    pending -= 1
+                    continue
+                if event == "_reply":
+                    reply = payload
+                    continue
+                if event == "sentence":
+                    tlpa_parts.append(payload["tlpa"])
+                yield _sse_event(event, payload)
+        finally:
+            # 客戶端中斷時通知背景執行緒停止
+            stop.set()
+
+        # 客戶端中途離開時不會執行到這裡：本輪不寫入歷史
+        if reply:
+            _finish_turn(session_id, session, user_message, reply)
+        reply_tlpa = " ".join(tlpa_parts)
+        log_terminal(f"[台羅轉換] 原文: {reply}")
+        log_terminal(f"[台羅轉換] 台羅: {reply_tlpa}\n")
+
+        timings["total"] = round(time.time() - start, 3)
+        yield _sse_event("reply", {"reply": reply, "reply_tlpa": reply_tlpa, "session_id": session_id})
+        yield _sse_event("done", {"timings": timings})
+        log_terminal(f"✓ 語音對話完成: {timings}")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/api/reset_session', methods=['POST'])
 def reset_session():
     """重置會話"""
@@ -511,8 +1243,7 @@ def reset_session():
         data = request.get_json()
         session_id = data.get('session_id', 'default')
         
-        if session_id in conversation_sessions:
-            del conversation_sessions[session_id]
+        session_store.delete(session_id)
         
         return jsonify({
             "success": True,
@@ -537,6 +1268,8 @@ if __name__ == '__main__':
     print("  - POST /api/stt           - 語音轉文字")
     print("  - POST /api/chat          - LLM 對話")
     print("  - POST /api/tts           - 文字轉語音")
+    print("  - POST /api/tts_stream    - 文字轉語音（逐段串流）")
+    print("  - POST /api/voice_turn    - 語音對話（STT → LLM → TTS 串流）")
     print("  - POST /api/reset_session - 重置會話")
     print("\n正在啟動服務...")
     print("="*60 + "\n")
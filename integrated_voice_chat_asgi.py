@@ -0,0 +1,969 @@
+# -*- coding: utf-8 -*-
+"""
+整合語音對話 API（非同步 ASGI 版）
+與 integrated_voice_chat_api.py 提供相同端點與回應格式，但網路 I/O 全部以 asyncio 進行：
+- Google STT 使用 SpeechAsyncClient，Yating 以 httpx 取 token（快取）、websockets 全速上傳音訊
+- LLM 使用 AsyncOpenAI 串流
+- 台羅轉換與語音合成（CPU 密集）交給執行緒池；子行程池模式下執行緒只負責等待結果
+- STT / LLM / TTS 各自有逾時，逾時回 504（串流中則送 error 事件）
+等待外部服務的請求不佔用執行緒，單一行程即可同時服務大量對話。
+
+模型、會話、摘要、熱更新與 RAG 等元件直接沿用 integrated_voice_chat_api 的初始化結果。
+
+啟動:
+    uvicorn integrated_voice_chat_asgi:app --host 0.0.0.0 --port 5000
+    或 python integrated_voice_chat_asgi.py
+
+端點:
+- POST /api/stt - 語音轉文字
+- POST /api/chat - 發送訊息給 LLM 並獲得回應（stream=true 時以 SSE / NDJSON 逐句串流）
+- POST /api/tts - 文字轉台語語音
+- POST /api/tts_stream - 文字轉台語語音（SSE 逐段串流 PCM）
+- POST /api/voice_turn - 語音進、文字與語音串流出（STT → LLM → TTS 管線）
+- POST /api/reset_session - 重置會話
+- WS /api/stt_stream - 即時語音辨識（麥克風音框即時轉送 Yating）
+- GET /api/health - 健康檢查
+"""
+
+import os
+import re
+import time
+import base64
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+import integrated_voice_chat_api as gateway
+from integrated_voice_chat_api import SentenceBuffer, SynthesisQueueFull, log_terminal
+from yating_client import parse_message
+
+# ============================================================================
+# 設定
+# ============================================================================
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", "30") or 30)   # 語音辨識（含 Google → Yating 切換）
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60") or 60)   # 一次 LLM 回覆（含串流）
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "60") or 60)   # 一次合成（串流時為每一段）
+TTS_THREADS = int(os.getenv("TTS_THREADS", "4") or 4)       # 等待合成的執行緒數
+STT_FINAL_TIMEOUT = float(os.getenv("STT_FINAL_TIMEOUT", "6") or 6)  # 串流辨識結束後等待最後一句定稿
+
+# 語音合成專用執行緒池（於 lifespan 建立）：長時間合成不會卡住台羅轉換等短工作（使用預設執行緒池）
+tts_executor = None
+
+try:
+    from openai import AsyncOpenAI
+    async_llm_client = AsyncOpenAI(timeout=LLM_TIMEOUT) if gateway.llm_client else None
+except Exception as e:
+    print(f"⚠️ 非同步 LLM 用戶端建立失敗: {e}")
+    async_llm_client = None
+
+# 長錄音各視窗同時辨識的上限
+_chunk_slots = asyncio.Semaphore(gateway.STT_CHUNK_WORKERS)
+
+# 共用的 HTTP 連線池與 Google 非同步用戶端（於事件迴圈啟動後建立）
+http_client = None
+_google_client = None
+
+# ============================================================================
+# 非同步工具
+# ============================================================================
+
+async def _run_blocking(executor, func, *args, timeout=None):
+    """在執行緒池執行阻塞函式；timeout 到期拋 asyncio.TimeoutError（背景工作會自行結束）"""
+    future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    if timeout is None:
+        return await future
+    return await asyncio.wait_for(future, timeout)
+
+
+async def _iterate_blocking(iterator, executor, timeout=None):
+    """在執行緒池逐一取出同步產生器的項目（例如逐段合成），每一項各自計時"""
+    sentinel = object()
+    try:
+        while True:
+            item = await _run_blocking(executor, next, iterator, sentinel, timeout=timeout)
+            if item is sentinel:
+                return
+            yield item
+    finally:
+        try:
+            iterator.close()
+        except (AttributeError, ValueError):
+            # 逾時或中斷時執行緒可能仍在產生下一項，由它自行結束
+            pass
+
+
+async def _iter_with_deadline(agen, timeout):
+    """非同步產生器的整體逾時：超過 timeout 秒拋 asyncio.TimeoutError 並關閉來源"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                item = await asyncio.wait_for(agen.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await agen.aclose()
+
+
+async def _get_session(session_id):
+    """取得會話；設定 SESSION_DB 時可能要從 SQLite 讀回，放到預設執行緒池以免卡住事件迴圈"""
+    return await _run_blocking(None, gateway.get_or_create_session, session_id)
+
+
+async def _finish_turn(session_id, session, user_message, reply):
+    """寫入本輪並保存（SQLite 寫入），同樣放到預設執行緒池"""
+    await _run_blocking(None, gateway._finish_turn, session_id, session, user_message, reply)
+
+
+async def _process_text(text, add_pauses):
+    """華文 / 台文漢字 → 台羅（字典比對為 CPU 工作，放到預設執行緒池）"""
+    if gateway.tts_system is None:
+        return text
+    return await _run_blocking(None, lambda: gateway.tts_system.text_processor.process_text(
+        text, add_pauses=add_pauses, convert_chinese=True))
+
+
+async def _json_body(request: Request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def _read_audio_payload(request: Request):
+    """
+    從請求取出音訊資料（可接受 multipart 或 base64 JSON），預設 16k/mono/16-bit
+
+    Returns:
+        (audio_bytes, sample_rate, 其他欄位)；未提供音訊時 audio_bytes 為 None
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        fields = {k: v for k, v in form.items() if isinstance(v, str)}
+        upload = form.get("audio")
+        if upload is None or isinstance(upload, str):
+            return None, 16000, fields
+        audio_data = await upload.read()
+        return audio_data, int(fields.get("sample_rate", 16000) or 16000), fields
+    data = await _json_body(request)
+    if "audio" not in data:
+        return None, 16000, data
+    audio_data = base64.b64decode(data["audio"])
+    return audio_data, int(data.get("sample_rate", 16000) or 16000), data
+
+
+def _bad_audio_response(error):
+    """音訊欄位無法解析（base64 或 sample_rate 格式錯誤）時的 400 回應"""
+    return JSONResponse({"success": False, "error": f"音頻數據格式錯誤: {error}"}, status_code=400)
+
+
+def _event_stream(generator, mimetype="text/event-stream"):
+    return StreamingResponse(
+        generator,
+        media_type=mimetype,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# =========================================================================
+# STT 工具：Google / Yating（自動落地切換）
+# =========================================================================
+
+async def google_stt_linear16(audio_bytes: bytes, rate: int = 16000, max_seconds: int = 55):
+    """使用 Google STT（nan-TW 為主）回傳 (text, confidence)。"""
+    global _google_client
+    speech = gateway.speech
+    if speech is None:
+        return "", 0.0
+
+    max_frames = max_seconds * rate
+    audio_bytes = audio_bytes[: max_frames * 2]  # int16 * 2 bytes
+
+    if _google_client is None:
+        _google_client = speech.SpeechAsyncClient()
+    audio = speech.RecognitionAudio(content=audio_bytes)
+    config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        sample_rate_hertz=rate,
+        language_code="nan-TW",
+        alternative_language_codes=["zh-TW", "en-US"],
+        enable_automatic_punctuation=True,
+    )
+
+    response = await _google_client.recognize(config=config, audio=audio, timeout=STT_TIMEOUT)
+    if not response.results:
+        return "", 0.0
+    alt = response.results[0].alternatives[0]
+    return (alt.transcript or "").strip(), float(alt.confidence or 0.0)
+
+
+async def yating_stt_linear16(audio_bytes: bytes, rate: int = 16000):
+    """呼叫 Yating WS STT，返回台語轉寫（不提供信心度）。取消此協程即中止上傳並關閉連線。"""
+    payload = await _run_blocking(None, gateway._to_16k_mono, audio_bytes, rate)
+    return await gateway.yating_client.arecognize(payload, http_client)
+
+
+async def _google_or_empty(audio_data: bytes, sample_rate: int):
+    if gateway.speech is None:
+        return "", 0.0
+    try:
+        return await google_stt_linear16(audio_data, rate=sample_rate)
+    except Exception as e:
+        print(f"STT Google 錯誤: {e}")
+        return "", 0.0
+
+
+async def _yating_or_empty(audio_data: bytes, sample_rate: int) -> str:
+    try:
+        return await yating_stt_linear16(audio_data, rate=sample_rate)
+    except Exception as e:
+        print(f"STT Yating 錯誤: {e}")
+        return ""
+
+
+async def recognize_speech(audio_data: bytes, sample_rate: int = 16000, routing: str = None):
+    """
+    Google 優先、低信心改用 Yating 台語 STT（路由模式同 Flask 版 STT_ROUTING）
+
+    Returns:
+        dict(provider, transcript, confidence, ...)；全部失敗時回傳 None
+    """
+    routing = routing or gateway.STT_ROUTING
+    start = time.time()
+    if routing == "sequential" or gateway.speech is None or not gateway.YATING_API_KEY:
+        google_text, google_conf = await _google_or_empty(audio_data, sample_rate)
+        yating_text = ""
+        if not gateway.google_confident(google_text, google_conf):
+            yating_text = await _yating_or_empty(audio_data, sample_rate)
+        result = gateway.stt_result(google_text, google_conf, yating_text)
+    else:
+        hedge_delay = 0.0 if routing == "parallel" else gateway.STT_HEDGE_DELAY
+        result = await _recognize_concurrent(audio_data, sample_rate, hedge_delay)
+    if result is not None:
+        print(f"STT [{routing}] {result['provider']}: {time.time() - start:.2f}s")
+    return result
+
+
+async def _recognize_concurrent(audio_data: bytes, sample_rate: int, hedge_delay: float):
+    """Google 與 Yating 同時辨識；Google 高信心即回傳並取消 Yating（請求被取消時兩者一併取消）"""
+    google_task = asyncio.ensure_future(_google_or_empty(audio_data, sample_rate))
+    yating_task = None
+    try:
+        if hedge_delay > 0:
+            await asyncio.wait([google_task], timeout=hedge_delay)
+            if google_task.done() and gateway.google_confident(*google_task.result()):
+                return gateway.stt_result(*google_task.result(), "")
+        yating_task = asyncio.ensure_future(_yating_or_empty(audio_data, sample_rate))
+
+        pending = {google_task, yating_task}
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if google_task.done() and gateway.google_confident(*google_task.result()):
+                return gateway.stt_result(*google_task.result(), "")
+        return gateway.stt_result(*google_task.result(), yating_task.result())
+    finally:
+        for task in (google_task, yating_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def recognize_upload(audio_data: bytes, sample_rate: int = 16000):
+    """
+    上傳音訊的完整辨識：VAD 前處理（執行緒池）後各視窗同時 recognize_speech，依序合併
+    同時辨識的視窗數由 _chunk_slots 限制（整個行程共用，同 Flask 版 STT_CHUNK_WORKERS）
+
+    Returns:
+        (result, vad)：沒有偵測到語音時 result 為 None 且 vad["chunks"] == 0
+    """
+    chunks, vad = await _run_blocking(None, gateway.speech_chunks, audio_data, sample_rate)
+
+    async def recognize_window(chunk):
+        async with _chunk_slots:
+            return await recognize_speech(chunk, sample_rate)
+
+    results = await asyncio.gather(*[recognize_window(chunk) for chunk in chunks])
+    result = gateway.merge_stt_results(list(results), vad["windows"])
+    if result is not None:
+        result["vad"] = vad
+    return result, vad
+
+
+def _stt_available():
+    return gateway.speech is not None or bool(gateway.YATING_API_KEY)
+
+# ============================================================================
+# LLM 串流
+# ============================================================================
+
+async def _iter_llm_reply(session, user_message):
+    """
+    以 stream=True 呼叫 LLM，依序產生 ("delta", 片段) 與 ("sentence", 完整句子)
+    產生器被關閉（客戶端中斷、逾時）時一併關閉 HTTP 串流
+    """
+    stream = await async_llm_client.chat.completions.create(
+        model=gateway.FINE_TUNED_MODEL,
+        messages=gateway._llm_messages(session, user_message),
+        temperature=0.8,
+        max_tokens=150,
+        presence_penalty=0.4,
+        stream=True
+    )
+    buffer = SentenceBuffer()
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            yield "delta", delta
+            for sentence in buffer.feed(delta):
+                yield "sentence", sentence
+        for sentence in buffer.flush():
+            yield "sentence", sentence
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+
+# ============================================================================
+# API 端點
+# ============================================================================
+
+async def health_check(request: Request):
+    """健康檢查"""
+    health = gateway.health_status()
+    health["services"]["llm"] = async_llm_client is not None
+    health["server"] = {
+        "mode": "asgi",
+        "timeouts": {"stt": STT_TIMEOUT, "llm": LLM_TIMEOUT, "tts": TTS_TIMEOUT},
+        "tts_threads": TTS_THREADS,
+    }
+    return JSONResponse(health)
+
+
+def _tts_busy_response():
+    """合成佇列已滿時的 503 回應"""
+    return JSONResponse({
+        "success": False,
+        "error": "語音合成忙碌中，請稍後再試"
+    }, status_code=503, headers={"Retry-After": "2"})
+
+
+def _timeout_response(error):
+    """外部服務或合成逾時的 504 回應"""
+    return JSONResponse({"success": False, "error": error}, status_code=504)
+
+
+async def speech_to_text(request: Request):
+    """
+    語音轉文字
+    接收音頻數據，返回識別的文字
+    """
+    try:
+        if not _stt_available():
+            return JSONResponse({
+                "success": False,
+                "error": "STT 未初始化，缺少 Google 或 Yating 配置"
+            }, status_code=503)
+
+        try:
+            audio_data, sample_rate, _ = await _read_audio_payload(request)
+        except (ValueError, TypeError) as e:
+            return _bad_audio_response(e)
+        if audio_data is None:
+            return JSONResponse({"error": "未提供音頻數據"}, status_code=400)
+
+        result, vad = await asyncio.wait_for(recognize_upload(audio_data, sample_rate), STT_TIMEOUT)
+        if not vad["chunks"]:
+            return JSONResponse({"success": False, **gateway._no_speech_error(vad)}, status_code=400)
+        if result is None:
+            return JSONResponse({
+                "success": False,
+                "error": "無法識別語音"
+            }, status_code=400)
+
+        return JSONResponse({"success": True, **result})
+
+    except asyncio.TimeoutError:
+        print("STT 逾時")
+        return _timeout_response("STT 逾時")
+    except Exception as e:
+        print(f"STT 錯誤: {e}")
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+
+async def chat(request: Request):
+    """
+    LLM 對話
+    接收用戶訊息，返回 AI 回應；"stream": true 時改為串流（事件同 Flask 版）
+    """
+    try:
+        if not async_llm_client:
+            return JSONResponse({"error": "LLM 服務未初始化"}, status_code=500)
+
+        data = await _json_body(request)
+        user_message = (data.get('message') or '').strip()
+        session_id = data.get('session_id', 'default')
+
+        if not user_message:
+            return JSONResponse({"error": "訊息不能為空"}, status_code=400)
+
+        accept = request.headers.get('accept', '')
+        stream_format = data.get('format') or ('ndjson' if 'application/x-ndjson' in accept else 'sse')
+        if data.get('stream') or 'text/event-stream' in accept or 'application/x-ndjson' in accept:
+            return _chat_stream(session_id, user_message, stream_format)
+
+        # 本輪訊息等有回覆才寫入歷史：逾時或失敗時不留下沒有回覆的使用者訊息
+        session = await _get_session(session_id)
+
+        parts = []
+        try:
+            async for event, text in _iter_with_deadline(_iter_llm_reply(session, user_message), LLM_TIMEOUT):
+                if event == "delta":
+                    parts.append(text)
+        except asyncio.TimeoutError:
+            print("Chat 逾時")
+            return _timeout_response("LLM 逾時")
+        ai_reply = "".join(parts).strip()
+
+        # 完整轉換為台羅數字調（add_pauses=True 確保生成可直接合成的完整台羅文本）
+        tlpa_text = await _process_text(ai_reply, add_pauses=True)
+        log_terminal(f"\n[台羅轉換] 原文: {ai_reply}")
+        log_terminal(f"[台羅轉換] 台羅: {tlpa_text}\n")
+
+        # 本輪訊息與回覆加入對話歷史，依則數與 Token 預算就地裁切並保存
+        await _finish_turn(session_id, session, user_message, ai_reply)
+
+        return JSONResponse({
+            "success": True,
+            "reply": ai_reply,
+            "reply_tlpa": tlpa_text,
+            "session_id": session_id
+        })
+
+    except Exception as e:
+        print(f"Chat 錯誤: {e}")
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+
+def _chat_stream(session_id, user_message, stream_format):
+    """/api/chat 的串流回應：逐句轉台羅，句子完成即送出"""
+    encode = gateway._ndjson_event if stream_format == 'ndjson' else gateway._sse_event
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'text/event-stream'
+
+    async def generate():
+        start = time.time()
+        timings = {}
+        session = await _get_session(session_id)
+
+        reply_parts = []
+        tlpa_parts = []
+        index = 0
+        try:
+            async for event, text in _iter_with_deadline(_iter_llm_reply(session, user_message), LLM_TIMEOUT):
+                if event == "delta":
+                    if not reply_parts:
+                        timings["first_token"] = round(time.time() - start, 3)
+                    reply_parts.append(text)
+                    yield encode("delta", {"text": text})
+                    continue
+                tlpa = await _process_text(text, add_pauses=True)
+                if index == 0:
+                    timings["first_sentence"] = round(time.time() - start, 3)
+                tlpa_parts.append(tlpa)
+                yield encode("sentence", {"index": index, "text": text, "tlpa": tlpa})
+                index += 1
+        except asyncio.TimeoutError:
+            log_terminal("Chat 串流逾時")
+            yield encode("error", {"stage": "llm", "error": "LLM 逾時"})
+        except Exception as e:
+            log_terminal(f"Chat 串流錯誤: {e}")
+            yield encode("error", {"stage": "llm", "error": str(e)})
+
+        reply = "".join(reply_parts).strip()
+        if reply:
+            await _finish_turn(session_id, session, user_message, reply)
+        reply_tlpa = " ".join(tlpa_parts)
+        log_terminal(f"\n[台羅轉換] 原文: {reply}")
+        log_terminal(f"[台羅轉換] 台羅: {reply_tlpa}\n")
+
+        timings["total"] = round(time.time() - start, 3)
+        yield encode("reply", {"reply": reply, "reply_tlpa": reply_tlpa, "session_id": session_id})
+        yield encode("done", {"sentences": index, "timings": timings})
+
+    return _event_stream(generate(), mimetype)
+
+
+def _validate_tts_text(text):
+    """回傳錯誤回應；文字可合成時回傳 None"""
+    if not text:
+        return JSONResponse({"error": "文字不能為空"}, status_code=400)
+    # 過濾純標點符號（至少要有中文字、英文字或數字）
+    if not re.search(r'[\u4e00-\u9fa5a-zA-Z0-9]', text):
+        log_terminal(f"⚠️ 跳過純標點句子: {text}")
+        return JSONResponse({"error": "句子必須包含有意義的文字"}, status_code=400)
+    return None
+
+
+async def text_to_speech(request: Request):
+    """
+    文字轉語音
+    接收文字，返回台羅與 base64 WAV
+    """
+    tts_system = gateway.tts_system
+    try:
+        if not tts_system:
+            return JSONResponse({"error": "TTS 服務未初始化"}, status_code=500)
+
+        data = await _json_body(request)
+        text = (data.get('text') or '').strip()
+        error = _validate_tts_text(text)
+        if error is not None:
+            return error
+
+        log_terminal(f"\n📝 TTS 請求: {text}")
+        # 檢測是否已經是台羅數字調格式（包含數字 0-9）
+        if re.search(r'[0-9]', text):
+            tlpa_text = text
+        else:
+            tlpa_text = await _process_text(text, add_pauses=True)
+            log_terminal(f"轉換台羅: {tlpa_text}")
+
+        # 背壓只擋需要合成的請求：先查快取
+        if gateway._tts_saturated(tlpa_text):
+            return _tts_busy_response()
+
+        wav_data = await _run_blocking(tts_executor, tts_system.synthesize_wav_bytes, tlpa_text,
+                                       timeout=TTS_TIMEOUT)
+
+        # 檢查音檔大小（太小可能是合成失敗）
+        file_size = len(wav_data)
+        if file_size < 1000:
+            log_terminal(f"⚠️ 音檔過小 ({file_size} bytes)，可能合成失敗")
+            return JSONResponse({"error": "語音合成失敗（音檔過小）"}, status_code=500)
+
+        log_terminal(f"✓ 音檔已生成: {file_size} bytes")
+        return JSONResponse({
+            "success": True,
+            "text": text,
+            "tlpa": tlpa_text,
+            "audio": base64.b64encode(wav_data).decode('utf-8'),
+            "file_size": file_size
+        })
+
+    except SynthesisQueueFull:
+        log_terminal("⚠️ 合成佇列已滿，回應 503")
+        return _tts_busy_response()
+    except asyncio.TimeoutError:
+        log_terminal("⚠️ 語音合成逾時")
+        return _timeout_response("語音合成逾時")
+    except Exception as e:
+        log_terminal(f"TTS 錯誤: {e}")
+        return JSONResponse({
+            "success": False,
+            "error": f"語音合成失敗: {str(e)}"
+        }, status_code=500)
+
+
+async def _iter_segments(tlpa_text, segment_pause_sec=0.18):
+    """逐段合成，每段在合成執行緒池完成後交回事件迴圈"""
+    iterator = gateway.tts_system.iter_segment_audio(tlpa_text, segment_pause_sec=segment_pause_sec)
+    async for segment in _iterate_blocking(iterator, tts_executor, timeout=TTS_TIMEOUT):
+        yield segment
+
+
+async def text_to_speech_stream(request: Request):
+    """
+    文字轉語音（串流版）
+    依標點切段，每段 WaveGlow 完成即以 SSE 送出該段 PCM（事件同 Flask 版）
+    """
+    tts_system = gateway.tts_system
+    if not tts_system or not tts_system.available:
+        return JSONResponse({"error": "TTS 服務未初始化"}, status_code=500)
+
+    data = await _json_body(request)
+    text = (data.get('text') or '').strip()
+    segment_pause_sec = float(data.get('segment_pause_sec', 0.18))
+    error = _validate_tts_text(text)
+    if error is not None:
+        return error
+
+    if re.search(r'[0-9]', text):
+        tlpa_text = text
+    else:
+        tlpa_text = await _process_text(text, add_pauses=False)
+
+    # 背壓只擋需要合成的請求：每段都在段落快取中就照常串流
+    if gateway._tts_saturated(tlpa_text, segmented=True):
+        return _tts_busy_response()
+
+    log_terminal(f"\n📡 TTS 串流請求: {text}")
+    log_terminal(f"轉換台羅: {tlpa_text}")
+
+    async def generate():
+        start = time.time()
+        count = 0
+        yield gateway._sse_event("meta", {
+            "text": text,
+            "tlpa": tlpa_text,
+            "sample_rate": tts_system.sample_rate,
+            "channels": 1,
+            "sample_width": 2,
+        })
+        try:
+            async for segment in _iter_segments(tlpa_text, segment_pause_sec):
+                if count == 0:
+                    log_terminal(f"⏱ 首段音訊: {time.time() - start:.2f}s")
+                count += 1
+                yield gateway._sse_event("audio", {
+                    "index": segment["index"],
+                    "tlpa": segment["tlpa"],
+                    "pcm": base64.b64encode(segment["samples"].tobytes()).decode('utf-8'),
+                    "sample_rate": segment["sample_rate"],
+                })
+        except SynthesisQueueFull:
+            log_terminal("⚠️ 合成佇列已滿，串流中止")
+            yield gateway._sse_event("error", {"error": "語音合成忙碌中，請稍後再試", "busy": True})
+            return
+        except asyncio.TimeoutError:
+            log_terminal("⚠️ 語音合成逾時，串流中止")
+            yield gateway._sse_event("error", {"error": "語音合成逾時"})
+            return
+        except Exception as e:
+            log_terminal(f"TTS 串流錯誤: {e}")
+            yield gateway._sse_event("error", {"error": f"語音合成失敗: {str(e)}"})
+            return
+        log_terminal(f"✓ 串流完成: {count} 段, {time.time() - start:.2f}s")
+        yield gateway._sse_event("done", {"segments": count, "elapsed": round(time.time() - start, 3)})
+
+    return _event_stream(generate())
+
+
+async def voice_turn(request: Request):
+    """
+    一次完成一輪語音對話（SSE 串流，事件同 Flask 版）
+    LLM 與 TTS 為同一事件迴圈上的兩個工作：第一句完成即開始合成，不必等整段回覆。
+    """
+    if not _stt_available():
+        return JSONResponse({"success": False, "error": "STT 未初始化，缺少 Google 或 Yating 配置"},
+                            status_code=503)
+    if not async_llm_client:
+        return JSONResponse({"error": "LLM 服務未初始化"}, status_code=500)
+
+    try:
+        audio_data, sample_rate, fields = await _read_audio_payload(request)
+    except (ValueError, TypeError) as e:
+        # base64 錯誤（binascii.Error 為 ValueError 子類別）或 sample_rate 不是整數
+        return _bad_audio_response(e)
+    if audio_data is None:
+        return JSONResponse({"error": "未提供音頻數據"}, status_code=400)
+
+    session_id = fields.get('session_id', 'default')
+    with_audio = fields.get('tts', True)
+    if isinstance(with_audio, str):
+        with_audio = with_audio.lower() != 'false'
+    tts_system = gateway.tts_system
+    with_audio = bool(with_audio) and tts_system is not None and tts_system.available
+
+    async def generate():
+        start = time.time()
+        timings = {}
+
+        # 1. 語音轉文字
+        try:
+            result, vad = await asyncio.wait_for(recognize_upload(audio_data, sample_rate), STT_TIMEOUT)
+        except asyncio.TimeoutError:
+            yield gateway._sse_event("error", {"stage": "stt", "error": "STT 逾時"})
+            return
+        except Exception as e:
+            log_terminal(f"語音對話 STT 錯誤: {e}")
+            yield gateway._sse_event("error", {"stage": "stt", "error": str(e)})
+            return
+        timings["stt"] = round(time.time() - start, 3)
+        if not vad["chunks"]:
+            yield gateway._sse_event("error", {"stage": "stt", **gateway._no_speech_error(vad)})
+            return
+        if result is None:
+            yield gateway._sse_event("error", {"stage": "stt", "error": "無法識別語音"})
+            return
+        user_message = result["transcript"]
+        yield gateway._sse_event("transcript", result)
+        log_terminal(f"\n🎙 語音對話 [{session_id}] 辨識 ({result['provider']}): {user_message}")
+
+        session = await _get_session(session_id)
+
+        # LLM 與 TTS 各為一個工作，事件統一匯入 events 由本產生器依序送出
+        events = asyncio.Queue()
+        sentences = asyncio.Queue()
+
+        async def llm_worker():
+            reply_parts = []
+            index = 0
+            try:
+                async for event, text in _iter_with_deadline(_iter_llm_reply(session, user_message), LLM_TIMEOUT):
+                    if event == "sentence":
+                        sentences.put_nowait((index, text))
+                        index += 1
+                        continue
+                    if not reply_parts:
+                        timings["first_token"] = round(time.time() - start, 3)
+                    reply_parts.append(text)
+                    events.put_nowait(("delta", {"text": text}))
+                events.put_nowait(("_reply", "".join(reply_parts).strip()))
+            except asyncio.TimeoutError:
+                log_terminal("語音對話 LLM 逾時")
+                events.put_nowait(("error", {"stage": "llm", "error": "LLM 逾時"}))
+            except Exception as e:
+                log_terminal(f"語音對話 LLM 錯誤: {e}")
+                events.put_nowait(("error", {"stage": "llm", "error": str(e)}))
+            finally:
+                sentences.put_nowait(None)
+                events.put_nowait(("_llm_done", None))
+
+        async def tts_worker():
+            try:
+                while True:
+                    item = await sentences.get()
+                    if item is None:
+                        break
+                    index, sentence = item
+                    tlpa = await _process_text(sentence, add_pauses=False)
+                    events.put_nowait(("sentence", {"index": index, "text": sentence, "tlpa": tlpa}))
+                    if not with_audio:
+                        continue
+                    try:
+                        async for segment in _iter_segments(tlpa):
+                            if "first_audio" not in timings:
+                                timings["first_audio"] = round(time.time() - start, 3)
+                            events.put_nowait(("audio", {
+                                "sentence": index,
+                                "index": segment["index"],
+                                "tlpa": segment["tlpa"],
+                                "pcm": base64.b64encode(segment["samples"].tobytes()).decode('utf-8'),
+                                "sample_rate": segment["sample_rate"],
+                            }))
+                    except SynthesisQueueFull:
+                        events.put_nowait(("error", {"stage": "tts", "sentence": index, "error": "語音合成忙碌中", "busy": True}))
+                    except asyncio.TimeoutError:
+                        events.put_nowait(("error", {"stage": "tts", "sentence": index, "error": "語音合成逾時"}))
+                    except Exception as e:
+                        log_terminal(f"語音對話 TTS 錯誤: {e}")
+                        events.put_nowait(("error", {"stage": "tts", "sentence": index, "error": str(e)}))
+            finally:
+                events.put_nowait(("_tts_done", None))
+
+        workers = [asyncio.ensure_future(llm_worker()), asyncio.ensure_future(tts_worker())]
+
+        reply = ""
+        tlpa_parts = []
+        pending = 2
+        try:
+            while pending:
+                event, payload = await events.get()
+                if event in ("_llm_done", "_tts_done"):
+                    pending -= 1
+                    continue
+                if event == "_reply":
+                    reply = payload
+                    continue
+                if event == "sentence":
+                    tlpa_parts.append(payload["tlpa"])
+                yield gateway._sse_event(event, payload)
+        finally:
+            # 客戶端中斷時取消尚未完成的工作
+            for worker in workers:
+                worker.cancel()
+
+        # 串流被取消（客戶端中途離開）時不會執行到這裡：本輪不寫入歷史
+        if reply:
+            await _finish_turn(session_id, session, user_message, reply)
+        reply_tlpa = " ".join(tlpa_parts)
+        log_terminal(f"[台羅轉換] 原文: {reply}")
+        log_terminal(f"[台羅轉換] 台羅: {reply_tlpa}\n")
+
+        timings["total"] = round(time.time() - start, 3)
+        yield gateway._sse_event("reply", {"reply": reply, "reply_tlpa": reply_tlpa, "session_id": session_id})
+        yield gateway._sse_event("done", {"timings": timings})
+        log_terminal(f"✓ 語音對話完成: {timings}")
+
+    return _event_stream(generate())
+
+
+async def stt_stream(websocket: WebSocket):
+    """
+    即時語音辨識（WebSocket）
+    瀏覽器邊錄音邊送 16-bit/mono PCM 二進位音框（?sample_rate= 指定取樣率，預設 16000），
+    閘道即時轉送給 Yating，說話者停下後最後一句定稿很快就回來，不必等整段錄音上傳。
+
+    客戶端送出文字 "end"（或空的二進位音框）表示說完。回傳 JSON 訊息:
+    - {"event": "partial", "text"}: 尚未定稿的辨識
+    - {"event": "final", "text"}: 一句定稿
+    - {"event": "done", "transcript", "provider"}: 說完後的完整轉寫
+    - {"event": "error", "error"}
+    """
+    await websocket.accept()
+    if not gateway.yating_client.configured:
+        await websocket.send_json({"event": "error", "error": "缺少 YATING_API_KEY"})
+        await websocket.close()
+        return
+    sample_rate = int(websocket.query_params.get("sample_rate", 16000) or 16000)
+
+    try:
+        upstream = await gateway.yating_client.aconnect(http_client)
+    except Exception as e:
+        log_terminal(f"串流 STT 連線失敗: {e}")
+        await websocket.send_json({"event": "error", "error": f"Yating 連線失敗: {e}"})
+        await websocket.close()
+        return
+
+    finals = []
+    ended = asyncio.Event()
+
+    async def uplink():
+        """瀏覽器 → Yating：音框到了就送"""
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("bytes")
+            if data:
+                if sample_rate != 16000:
+                    data = await _run_blocking(None, gateway._to_16k_mono, data, sample_rate)
+                await upstream.send(data)
+            elif data is not None or (message.get("text") or "").strip() == "end":
+                ended.set()
+                await gateway.yating_client.asend_eos(upstream)
+                return
+
+    async def downlink():
+        """Yating → 瀏覽器：轉送部分與定稿結果；說完後收到定稿即結束"""
+        async for message in upstream:
+            parsed = parse_message(message)
+            if parsed is None:
+                continue
+            text, final = parsed
+            if final:
+                if text:
+                    finals.append(text)
+                    await websocket.send_json({"event": "final", "text": text})
+                if ended.is_set():
+                    return
+            elif text:
+                await websocket.send_json({"event": "partial", "text": text})
+
+    start = time.time()
+    up = asyncio.ensure_future(uplink())
+    down = asyncio.ensure_future(downlink())
+    try:
+        await asyncio.wait({up, down}, return_when=asyncio.FIRST_COMPLETED)
+        if ended.is_set() and not down.done():
+            await asyncio.wait({down}, timeout=STT_FINAL_TIMEOUT)
+        if not ended.is_set():
+            if up.done() and up.exception() is None:
+                return  # 客戶端已離線
+            failed = up if up.done() else down
+            error = failed.exception()
+            await websocket.send_json({"event": "error", "error": str(error or "Yating 連線中斷")})
+            return
+        transcript = "".join(finals)
+        log_terminal(f"🎙 串流辨識完成 ({time.time() - start:.1f}s): {transcript}")
+        await websocket.send_json({"event": "done", "transcript": transcript, "provider": "yating"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in (up, down):
+            if task.done():
+                if not task.cancelled():
+                    task.exception()  # 已處理或不需處理的錯誤，避免未取用警告
+            else:
+                task.cancel()
+        await upstream.close()
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
+
+
+async def reset_session(request: Request):
+    """重置會話"""
+    try:
+        data = await _json_body(request)
+        await _run_blocking(None, gateway.session_store.delete, data.get('session_id', 'default'))
+        return JSONResponse({
+            "success": True,
+            "message": "會話已重置"
+        })
+    except Exception as e:
+        return JSONResponse({
+            "success": False,
+            "error": str(e)
+        }, status_code=500)
+
+# ============================================================================
+# ASGI 應用
+# ============================================================================
+
+@asynccontextmanager
+async def lifespan(app):
+    global http_client, tts_executor
+    http_client = httpx.AsyncClient(timeout=10)
+    # 關閉時會 shutdown 合成執行緒池；每次啟動換新的，同一行程內重新啟動（測試、reload）才能再合成
+    tts_executor = ThreadPoolExecutor(max_workers=TTS_THREADS, thread_name_prefix="tts")
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        http_client = None
+        tts_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/health', health_check, methods=['GET']),
+        Route('/api/stt', speech_to_text, methods=['POST']),
+        Route('/api/chat', chat, methods=['POST']),
+        Route('/api/tts', text_to_speech, methods=['POST']),
+        Route('/api/tts_stream', text_to_speech_stream, methods=['POST']),
+        Route('/api/voice_turn', voice_turn, methods=['POST']),
+        Route('/api/reset_session', reset_session, methods=['POST']),
+        WebSocketRoute('/api/stt_stream', stt_stream),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+# ============================================================================
+# 主程式
+# ============================================================================
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("\n" + "="*60)
+    print("  整合語音對話系統 API（非同步 ASGI）")
+    print("="*60)
+    print(f"逾時: STT {STT_TIMEOUT:g}s / LLM {LLM_TIMEOUT:g}s / TTS {TTS_TIMEOUT:g}s")
+    print("="*60 + "\n")
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv("PORT", "5000") or 5000))
@@ -3,7 +3,9 @@ import csv
 import os
 import re
 import sys
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, List, Optional, Set
+
+from dict_matcher import DictionaryMatcher
 
 # 臺灣言語工具路徑
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "tai5-uan5_gian5-gi2_kang1-ku7"))
@@ -38,6 +40,9 @@ class AdvancedChineseToTaiwaneseConverter:
         self._load_csv_dictionary()
         self._init_taiwan_tools()
         
+        # 四層對照表預先建成單一比對器（短語 > 詞彙 > 手工 > 單字）
+        self.rebuild_matcher()
+        
         print(f"✓ 進階轉換器初始化完成")
         print(f"  - CSV字典條目: {len(self.csv_dict)}")
         print(f"  - 詞彙對照: {len(self.word_dict)}")
@@ -352,24 +357,35 @@ class AdvancedChineseToTaiwaneseConverter:
             '竟然': '竟然',
         }
     
+    # 跳過的字詞 - 避免過度轉換
+    SKIP_WORDS = {
+        '我', '你', '日', '工', '人', '會', '看', '公', '學校', '買', '說', '不', '很', '好', '了', '的', 
+        '她', '他', '它', '在', '去', '來', '和', '多', '少', '是', '有', '無', '都', '也', '還', '但',
+        '可', '要', '能', '大', '小', '高', '低', '新', '舊', '快', '慢', '上', '下', '前', '後',
+        '左', '右', '裡', '外', '中', '同', '不同', '一樣', '對', '錯', '真', '假', '開', '關', '天', '天氣'
+    }
+    
     def _load_csv_dictionary(self):
-        """載入CSV字典檔案"""
+        """載入CSV字典檔案（有編譯好的快照時直接取用，不重新解析 CSV）"""
         if not os.path.exists(self.csv_path):
             print(f"⚠ CSV檔案不存在: {self.csv_path}")
             return
         
+        try:
+            from dictionary_snapshot import snapshot_table
+            table = snapshot_table("chhoetaigi_hoabun", self.csv_path)
+        except ImportError:
+            table = None
+        if table is not None:
+            # 快照已完成拆分與過濾（2字以上、非純數字/英文），同鍵保留原檔先後，後出現者覆蓋
+            for variant, han_lo in table.items():
+                self._add_csv_pair(variant, han_lo)
+            return
+        
         try:
             with open(self.csv_path, 'r', encoding='utf-8', newline='') as csvfile:
                 reader = csv.DictReader(csvfile)
                 
-                # 跳過的字詞 - 避免過度轉換
-                skip_words = {
-                    '我', '你', '日', '工', '人', '會', '看', '公', '學校', '買', '說', '不', '很', '好', '了', '的', 
-                    '她', '他', '它', '在', '去', '來', '和', '多', '少', '是', '有', '無', '都', '也', '還', '但',
-                    '可', '要', '能', '大', '小', '高', '低', '新', '舊', '快', '慢', '上', '下', '前', '後',
-                    '左', '右', '裡', '外', '中', '同', '不同', '一樣', '對', '錯', '真', '假', '開', '關', '天', '天氣'
-                }
-                
                 for row in reader:
                     han_lo = row.get('HanLoTaibunKip', '').strip()  # 台語漢字
                     hoa_bun = row.get('HoaBun', '').strip()  # 華語
@@ -382,20 +398,23 @@ class AdvancedChineseToTaiwaneseConverter:
                             variant = variant.strip()
                             # 過濾掉數字和其他不適合的條目
                             if (variant and variant != han_lo and 
-                                variant not in skip_words and
                                 not re.match(r'^[0-9]+$', variant) and  # 跳過純數字
                                 not re.match(r'^[a-zA-Z]+$', variant) and  # 跳過純英文
                                 len(variant) >= 2):  # 只處理2字以上的詞彙
-                                
-                                # 按長度分類：詞、短語
-                                if len(variant) <= 4:
-                                    self.word_dict[variant] = han_lo
-                                else:
-                                    self.phrase_dict[variant] = han_lo
+                                self._add_csv_pair(variant, han_lo)
                 
         except Exception as e:
             print(f"⚠ 載入CSV檔案失敗: {e}")
     
+    def _add_csv_pair(self, variant: str, han_lo: str):
+        """華語詞 → 台語漢字，按長度分類：詞、短語"""
+        if variant in self.SKIP_WORDS:
+            return
+        if len(variant) <= 4:
+            self.word_dict[variant] = han_lo
+        else:
+            self.phrase_dict[variant] = han_lo
+    
     def _init_taiwan_tools(self):
         """初始化臺灣言語工具"""
         try:
@@ -424,24 +443,8 @@ class AdvancedChineseToTaiwaneseConverter:
         if not text.strip():
             return text
         
-        result = text
-        conversions = []
-        
-        # 1. 先處理短語（最長匹配）
-        result, phrase_conversions = self._convert_with_dict(result, self.phrase_dict, "短語")
-        conversions.extend(phrase_conversions)
-        
-        # 2. 處理詞彙
-        result, word_conversions = self._convert_with_dict(result, self.word_dict, "詞彙")
-        conversions.extend(word_conversions)
-        
-        # 3. 處理手工維護的對照表
-        result, manual_conversions = self._convert_with_dict(result, self.manual_dict, "手工")
-        conversions.extend(manual_conversions)
-        
-        # 4. 處理單字
-        result, char_conversions = self._convert_with_dict(result, self.csv_dict, "單字")
-        conversions.extend(char_conversions)
+        # 單趟由左至右取最長詞條；同一鍵出現在多層時依層級優先：短語 > 詞彙 > 手工 > 單字
+        result, conversions = self._matcher.replace(text)
         
         # 顯示轉換過程
         if verbose and conversions:
@@ -451,31 +454,14 @@ class AdvancedChineseToTaiwaneseConverter:
         
         return result
     
-    def _convert_with_dict(self, text: str, convert_dict: Dict[str, str], dict_type: str) -> Tuple[str, List[Tuple[str, str, str]]]:
-        """
-        使用指定字典進行轉換
-        
-        Args:
-            text: 輸入文本
-            convert_dict: 轉換字典
-            dict_type: 字典類型（用於記錄）
-            
-        Returns:
-            (轉換後文本, 轉換記錄列表)
-        """
-        result = text
-        conversions = []
-        
-        # 按鍵的長度降序排列，確保最長匹配
-        sorted_keys = sorted(convert_dict.keys(), key=len, reverse=True)
-        
-        for original in sorted_keys:
-            converted = convert_dict[original]
-            if original in result and original != converted:
-                result = result.replace(original, converted)
-                conversions.append((dict_type, original, converted))
-        
-        return result, conversions
+    def rebuild_matcher(self):
+        """對照表內容變動後重建比對器"""
+        self._matcher = DictionaryMatcher([
+            ("短語", self.phrase_dict),
+            ("詞彙", self.word_dict),
+            ("手工", self.manual_dict),
+            ("單字", self.csv_dict),
+        ])
     
     def get_conversion_stats(self) -> Dict[str, int]:
         """獲取轉換器統計資訊"""
@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+音訊工具（NumPy）
+合成管線內部一律以 int16 NumPy 陣列傳遞音訊，只在 HTTP / 檔案邊界才組 WAV 標頭。
+淡入淡出、靜音、音量正規化、聲道混合與多相重採樣都以陣列運算完成，不逐樣本跑 Python 迴圈，
+也不依賴 Python 3.13 已移除的 audioop。
+
+用法:
+    samples = audio_utils.pcm16_from_bytes(raw)
+    samples = audio_utils.resample(samples, 48000, 16000)
+    samples = audio_utils.loudness_normalize(samples, target_dbfs=-20.0)
+    wav_bytes = audio_utils.to_wav_bytes(samples, 16000)
+    segments = audio_utils.detect_speech(samples, 16000)   # VAD：[(起, 迄), ...] 樣本位置
+"""
+
+import io
+import struct
+import wave
+from fractions import Fraction
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from scipy.signal import resample_poly as _scipy_resample_poly
+except ImportError:
+    _scipy_resample_poly = None
+
+INT16_MAX = 32767
+
+
+# ============================================================================
+# WAV 邊界
+# ============================================================================
+
+def wav_header(num_samples: int, sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    """產生 44 bytes 的 PCM WAV 標頭"""
+    data_size = num_samples * channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate,
+        sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b'data', data_size,
+    )
+
+
+def to_wav_bytes(samples: np.ndarray, sample_rate: int) -> bytes:
+    """int16 陣列（(n,) 或 (n, channels)）→ WAV bytes"""
+    samples = np.ascontiguousarray(samples, dtype='<i2')
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    return wav_header(samples.shape[0], sample_rate, channels) + samples.tobytes()
+
+
+def from_wav_bytes(data: bytes) -> Tuple[np.ndarray, int]:
+    """WAV bytes → (int16 陣列, 取樣率)；多聲道回傳 (n, channels)"""
+    with wave.open(io.BytesIO(data), 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("只支援 16-bit PCM WAV")
+        channels = wav.getnchannels()
+        sample_rate = wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return samples, sample_rate
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int):
+    """寫出 WAV 檔（只在需要落地檔案時使用）"""
+    with open(path, 'wb') as f:
+        f.write(to_wav_bytes(samples, sample_rate))
+
+
+# ============================================================================
+# 串接
+# ============================================================================
+
+def concat(chunks: Sequence[np.ndarray], gaps: Sequence[int] = None) -> np.ndarray:
+    """
+    預先配置整段長度後依序填入，避免反覆串接 bytes
+
+    Args:
+        chunks: int16 陣列
+        gaps: 每段之後插入的靜音樣本數（可省略）
+    """
+    if gaps is None:
+        gaps = [0] * len(chunks)
+    total = sum(len(chunk) + gap for chunk, gap in zip(chunks, gaps))
+    out = np.zeros(total, dtype=np.int16)
+    pos = 0
+    for chunk, gap in zip(chunks, gaps):
+        out[pos:pos + len(chunk)] = chunk
+        pos += len(chunk) + gap
+    return out
+
+
+def silence(duration_sec: float, sample_rate: int, channels: int = 1) -> np.ndarray:
+    """產生指定秒數的 int16 靜音"""
+    num_samples = max(0, int(round(duration_sec * sample_rate)))
+    shape = (num_samples,) if channels == 1 else (num_samples, channels)
+    return np.zeros(shape, dtype=np.int16)
+
+
+# ============================================================================
+# 格式轉換
+# ============================================================================
+
+def pcm16_from_bytes(data: bytes, channels: int = 1) -> np.ndarray:
+    """16-bit little-endian PCM bytes → int16 陣列（忽略不完整的尾端樣本）"""
+    frame_bytes = 2 * channels
+    usable = len(data) - len(data) % frame_bytes
+    samples = np.frombuffer(data[:usable], dtype='<i2')
+    return samples.reshape(-1, channels) if channels > 1 else samples
+
+
+def to_float(samples: np.ndarray) -> np.ndarray:
+    """int16 → float32（-1.0 ~ 1.0）；已是浮點則直接轉 float32"""
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    return samples.astype(np.float32, copy=False)
+
+
+def to_pcm16(samples: np.ndarray) -> np.ndarray:
+    """浮點（-1.0 ~ 1.0）→ int16，超出範圍截斷；int16 輸入原樣回傳"""
+    if samples.dtype == np.int16:
+        return samples
+    return np.clip(np.asarray(samples, dtype=np.float32) * INT16_MAX, -32768, INT16_MAX).astype(np.int16)
+
+
+# ============================================================================
+# 淡入淡出與音量
+# ============================================================================
+
+def fade(samples: np.ndarray, sample_rate: int, fade_in_ms: float = 10.0,
+         fade_out_ms: float = None, inplace: bool = False) -> np.ndarray:
+    """
+    首尾線性淡入淡出，降低拼接時的爆音
+
+    Args:
+        samples: int16 或浮點陣列（(n,) 或 (n, channels)）
+        fade_in_ms / fade_out_ms: 淡入 / 淡出毫秒數（fade_out_ms 省略時同 fade_in_ms）
+        inplace: True 時直接修改輸入（唯讀陣列仍會複製）
+    """
+    if fade_out_ms is None:
+        fade_out_ms = fade_in_ms
+    if not inplace or not samples.flags.writeable:
+        samples = samples.copy()
+
+    n = len(samples)
+    for length, head in ((int(sample_rate * fade_in_ms / 1000.0), True),
+                         (int(sample_rate * fade_out_ms / 1000.0), False)):
+        length = min(length, n)
+        if length <= 1:
+            continue
+        ramp = np.arange(length, dtype=np.float32) / length
+        if not head:
+            ramp = ramp[::-1]
+        if samples.ndim > 1:
+            ramp = ramp[:, None]
+        region = slice(0, length) if head else slice(n - length, n)
+        samples[region] = (samples[region] * ramp).astype(samples.dtype)
+    return samples
+
+
+def peak_normalize(samples: np.ndarray, peak: float = 0.95, floor: float = 1e-4) -> np.ndarray:
+    """
+    依峰值縮放到 peak（相對滿刻度）；回傳與輸入相同型別
+
+    Args:
+        peak: 目標峰值（0 ~ 1）
+        floor: 峰值下限，避免近乎靜音的訊號被放大成雜訊
+    """
+    x = to_float(samples)
+    current = float(np.max(np.abs(x))) if x.size else 0.0
+    x = x * (peak / max(floor, current))
+    return to_pcm16(x) if samples.dtype == np.int16 else x
+
+
+def rms_dbfs(samples: np.ndarray) -> float:
+    """均方根音量（dBFS）；空陣列或全靜音回傳 -inf"""
+    x = to_float(samples)
+    if not x.size:
+        return float('-inf')
+    rms = float(np.sqrt(np.mean(np.square(x, dtype=np.float64))))
+    return 20.0 * np.log10(rms) if rms > 0 else float('-inf')
+
+
+def loudness_normalize(samples: np.ndarray, target_dbfs: float = -20.0,
+                       max_gain_db: float = 30.0, peak_limit: float = 0.99) -> np.ndarray:
+    """
+    以 RMS 響度正規化到 target_dbfs，並以 peak_limit 避免削波；回傳與輸入相同型別
+
+    Args:
+        target_dbfs: 目標均方根音量
+        max_gain_db: 最大增益，避免把底噪放大
+        peak_limit: 縮放後的峰值上限（相對滿刻度）
+    """
+    current = rms_dbfs(samples)
+    if not np.isfinite(current):
+        return samples.copy()
+    gain = 10.0 ** (min(target_dbfs - current, max_gain_db) / 20.0)
+    x = to_float(samples)
+    peak = float(np.max(np.abs(x))) * gain
+    if peak > peak_limit:
+        gain *= peak_limit / peak
+    x = x * gain
+    return to_pcm16(x) if samples.dtype == np.int16 else x
+
+
+# ============================================================================
+# 聲道
+# ============================================================================
+
+def to_mono(samples: np.ndarray, weights: Sequence[float] = None) -> np.ndarray:
+    """
+    多聲道 (n, channels) 混成單聲道；weights 省略時取平均
+
+    Returns:
+        與輸入相同型別的 (n,) 陣列
+    """
+    if samples.ndim == 1:
+        return samples
+    channels = samples.shape[1]
+    if weights is None:
+        weights = [1.0 / channels] * channels
+    mixed = samples.astype(np.float32) @ np.asarray(weights, dtype=np.float32)
+    if samples.dtype == np.int16:
+        return np.clip(np.round(mixed), -32768, INT16_MAX).astype(np.int16)
+    return mixed
+
+
+def mix(tracks: Sequence[np.ndarray], gains: Sequence[float] = None) -> np.ndarray:
+    """多條單聲道疊加（長度不同時以最長為準），int16 輸入會截斷避免溢位"""
+    if not tracks:
+        return np.zeros(0, dtype=np.int16)
+    if gains is None:
+        gains = [1.0] * len(tracks)
+    out = np.zeros(max(len(track) for track in tracks), dtype=np.float32)
+    for track, gain in zip(tracks, gains):
+        out[:len(track)] += track.astype(np.float32) * gain
+    if all(track.dtype == np.int16 for track in tracks):
+        return np.clip(np.round(out), -32768, INT16_MAX).astype(np.int16)
+    return out
+
+
+# ============================================================================
+# 重採樣
+# ============================================================================
+
+def _design_lowpass(up: int, down: int, half_width: int = 10, beta: float = 5.0) -> np.ndarray:
+    """多相重採樣用的 Kaiser 窗 sinc 低通濾波器（已乘上 up 補償零插值的增益）"""
+    max_rate = max(up, down)
+    num_taps = 2 * half_width * max_rate + 1
+    n = np.arange(num_taps) - half_width * max_rate
+    taps = np.sinc(n / max_rate) * np.kaiser(num_taps, beta)
+    return (taps / taps.sum() * up).astype(np.float64)
+
+
+def _resample_poly_numpy(x: np.ndarray, up: int, down: int) -> np.ndarray:
+    """
+    純 NumPy 多相重採樣：只計算實際輸出的樣本，
+    每個輸出點取對應相位的濾波器係數與輸入做一次內積（不建立零插值序列）
+    """
+    taps = _design_lowpass(up, down)
+    delay = (len(taps) - 1) // 2
+    n_out = -(-len(x) * up // down)
+
+    # 輸出第 k 點對應零插值序列的位置 k*down + delay
+    pos = np.arange(n_out, dtype=np.int64) * down + delay
+    phase = pos % up
+    base = pos // up
+    taps_per_phase = -(-len(taps) // up)
+    padded_taps = np.zeros(taps_per_phase * up)
+    padded_taps[:len(taps)] = taps
+
+    j = np.arange(taps_per_phase)
+    x_idx = base[:, None] - j[None, :]
+    h = padded_taps[phase[:, None] + j[None, :] * up]
+    valid = (x_idx >= 0) & (x_idx < len(x))
+    gathered = np.where(valid, x[np.clip(x_idx, 0, len(x) - 1)], 0.0)
+    return np.einsum('ij,ij->i', gathered, h)
+
+
+def resample(samples: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """
+    多相重採樣（取代 audioop.ratecv）；有 scipy 時用 resample_poly，否則用 NumPy 實作
+
+    Returns:
+        與輸入相同型別的陣列（多聲道逐聲道處理）
+    """
+    if orig_sr == target_sr or len(samples) == 0:
+        return samples
+    ratio = Fraction(int(target_sr), int(orig_sr))
+    up, down = ratio.numerator, ratio.denominator
+
+    x = samples.astype(np.float64)
+    if _scipy_resample_poly is not None:
+        y = _scipy_resample_poly(x, up, down, axis=0)
+    elif x.ndim == 1:
+        y = _resample_poly_numpy(x, up, down)
+    else:
+        y = np.stack([_resample_poly_numpy(x[:, c], up, down) for c in range(x.shape[1])], axis=1)
+
+    if samples.dtype == np.int16:
+        return np.clip(np.round(y), -32768, INT16_MAX).astype(np.int16)
+    return y.astype(samples.dtype, copy=False)
+
+
+# ============================================================================
+# 語音活動偵測（VAD）
+# ============================================================================
+
+def frame_dbfs(samples: np.ndarray, sample_rate: int, frame_ms: float = 20.0) -> np.ndarray:
+    """
+    逐音框的均方根音量（dBFS），以 reshape 一次算完；不足一框的尾端補零
+
+    Returns:
+        (音框數,) float64 陣列，全靜音音框為 -inf
+    """
+    x = to_float(samples)
+    if x.ndim > 1:
+        x = x.mean(axis=1)
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = -(-len(x) // frame)
+    if not n_frames:
+        return np.zeros(0)
+    padded = np.zeros(n_frames * frame, dtype=np.float64)
+    padded[:len(x)] = x
+    rms = np.sqrt(np.mean(np.square(padded.reshape(n_frames, frame)), axis=1))
+    with np.errstate(divide='ignore'):
+        return 20.0 * np.log10(rms)
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """布林陣列中連續 True 的區段 [(起, 迄), ...]（迄為不含）"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def detect_speech(samples: np.ndarray, sample_rate: int, frame_ms: float = 20.0,
+                  threshold_db: float = None, margin_db: float = 12.0,
+                  floor_db: float = -50.0, ceiling_db: float = -35.0,
+                  min_speech_ms: float = 120.0, min_silence_ms: float = 300.0,
+                  pad_ms: float = 150.0) -> List[Tuple[int, int]]:
+    """
+    以音框音量偵測語音區段
+
+    門檻未指定時自動估計：取音框音量第 10 百分位當底噪再加 margin_db，
+    並限制在 [floor_db, ceiling_db]（整段都在說話時底噪會被高估，ceiling_db 避免門檻跟著拉高）。
+    短於 min_silence_ms 的停頓併入前後語音，短於 min_speech_ms 的爆音捨棄，
+    每段前後各保留 pad_ms 以免切掉氣音與尾音。
+
+    Returns:
+        [(起, 迄), ...] 樣本位置（迄為不含）；沒有語音時回傳空串列
+    """
+    db = frame_dbfs(samples, sample_rate, frame_ms)
+    if not db.size:
+        return []
+    if threshold_db is None:
+        finite = db[np.isfinite(db)]
+        noise = float(np.percentile(finite, 10)) if finite.size else floor_db
+        threshold_db = min(max(noise + margin_db, floor_db), ceiling_db)
+
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    runs = _runs(db > threshold_db)
+
+    # 合併短停頓
+    merged = []
+    for start, end in runs:
+        if merged and (start - merged[-1][1]) * frame_ms < min_silence_ms:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    # 捨棄過短區段、換算樣本位置並加上前後保留（重疊者合併）
+    pad = int(sample_rate * pad_ms / 1000)
+    segments = []
+    for start, end in merged:
+        if (end - start) * frame_ms < min_speech_ms:
+            continue
+        start = max(0, start * frame - pad)
+        end = min(len(samples), end * frame + pad)
+        if segments and start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return segments
+
+
+def is_silent(samples: np.ndarray, sample_rate: int, **vad_kwargs) -> bool:
+    """整段沒有偵測到語音"""
+    return not detect_speech(samples, sample_rate, **vad_kwargs)
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int, **vad_kwargs) -> np.ndarray:
+    """去除首尾靜音（保留中間停頓）；沒有語音時回傳空陣列"""
+    segments = detect_speech(samples, sample_rate, **vad_kwargs)
+    if not segments:
+        return samples[:0]
+    return samples[segments[0][0]:segments[-1][1]]
+
+
+def split_on_pauses(samples: np.ndarray, sample_rate: int, max_chunk_sec: float = 50.0,
+                    segments: List[Tuple[int, int]] = None, **vad_kwargs) -> List[Tuple[int, int]]:
+    """
+    依 VAD 停頓把長錄音切成不超過 max_chunk_sec 的區段
+
+    相鄰語音區段依序併入同一段，直到再加一段會超過上限才在兩者間的停頓處切開；
+    單一語音區段本身就超過上限時（一口氣沒停）改在區段內最安靜的音框切開。
+    段與段之間的停頓與首尾靜音都不包含在內。
+
+    Args:
+        segments: 已算好的 detect_speech 結果（省略時重新偵測）
+
+    Returns:
+        [(起, 迄), ...] 樣本位置；沒有語音時回傳空串列
+    """
+    if segments is None:
+        segments = detect_speech(samples, sample_rate, **vad_kwargs)
+    limit = max(1, int(max_chunk_sec * sample_rate))
+
+    pieces = []
+    for start, end in segments:
+        pieces.extend(_split_long_segment(samples, sample_rate, start, end, limit))
+
+    chunks = []
+    for start, end in pieces:
+        if chunks and end - chunks[-1][0] <= limit:
+            chunks[-1] = (chunks[-1][0], end)
+        else:
+            chunks.append((start, end))
+    return chunks
+
+
+def overlap_windows(chunks: List[Tuple[int, int]], overlap: int) -> List[Tuple[int, int]]:
+    """
+    split_on_pauses 的區段轉為辨識視窗：在語音中間切開（與前段相接、沒有停頓）的區段
+    往前延伸 overlap 個樣本，讓切點附近的字兩個視窗都聽得完整；在停頓處切開的不需重疊
+
+    Returns:
+        [(起, 迄), ...] 樣本位置；起點早於前一視窗迄點者即為重疊視窗
+    """
+    windows = []
+    for i, (start, end) in enumerate(chunks):
+        if i and start <= chunks[i - 1][1]:
+            start = max(chunks[i - 1][0], start - overlap)
+        windows.append((start, end))
+    return windows
+
+
+def _split_long_segment(samples: np.ndarray, sample_rate: int, start: int, end: int,
+                        limit: int, frame_ms: float = 20.0) -> List[Tuple[int, int]]:
+    """超過 limit 的語音區段在最後四分之一最安靜的音框處切開（遞迴直到每段都不超過）"""
+    if end - start <= limit:
+        return [(start, end)]
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    # 在 [limit*3/4, limit] 範圍內找最安靜的音框，避免切出過短的片段
+    lo = start + limit * 3 // 4
+    db = frame_dbfs(samples[lo:start + limit], sample_rate, frame_ms)
+    cut = lo + int(np.argmin(db)) * frame if db.size else start + limit
+    cut = min(max(cut, start + 1), start + limit)
+    return [(start, cut)] + _split_long_segment(samples, sample_rate, cut, end, limit, frame_ms)
@@ -6,12 +6,15 @@
 
 from typing import List, Tuple
 
+from dict_matcher import DictionaryMatcher
+
 
 class ChineseToTaiwaneseConverter:
     """華文字轉台語漢字轉換器"""
     
     def __init__(self):
         self.conversion_dict = self._build_conversion_dict()
+        self._matcher = DictionaryMatcher([("對照", self.conversion_dict)])
     
     def _build_conversion_dict(self) -> dict:
         """建立華文字轉台語漢字的對照表"""
@@ -390,19 +393,14 @@ class ChineseToTaiwaneseConverter:
         Returns:
             轉換後的台語漢字文本
         """
-        result = text
-        
-        # 按照詞長從長到短排序，避免部分匹配問題
-        sorted_items = sorted(self.conversion_dict.items(), key=lambda x: len(x[0]), reverse=True)
-        
-        for chinese_word, taiwanese_word in sorted_items:
-            result = result.replace(chinese_word, taiwanese_word)
-        
+        # 單趟由左至右取最長詞條，避免部分匹配與連鎖替換
+        result, _ = self._matcher.replace(text)
         return result
     
     def add_custom_mapping(self, chinese_word: str, taiwanese_word: str):
         """添加自訂對照"""
         self.conversion_dict[chinese_word] = taiwanese_word
+        self._matcher.add(chinese_word, taiwanese_word, "對照")
     
     def get_suggestions(self, text: str) -> List[Tuple[str, str]]:
         """獲取可能的轉換建議"""
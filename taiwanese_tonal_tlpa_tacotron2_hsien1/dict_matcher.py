@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+分層字典比對引擎
+把多個對照表（短語 > 詞彙 > 手工 > 單字）預先建成一棵字元 trie，
+轉換時由左至右掃描一次，每個位置取最長的詞條（leftmost-longest）。
+轉換成本只跟輸入長度與最長詞長有關，與字典大小無關；
+已替換的輸出不會再被其他詞條比對，不會有連鎖替換。
+
+同一個鍵出現在多個層級時，以優先層級（先傳入者）的對照為準。
+
+用法:
+    matcher = DictionaryMatcher([("短語", phrase_dict), ("詞彙", word_dict)])
+    result, matches = matcher.replace("我們明天一起去公園")
+    # matches: [(層級, 原文, 轉換), ...]
+"""
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+_END = ""  # 節點中標記詞尾的鍵（一般鍵都是單一字元，不會衝突）
+
+
+class DictionaryMatcher:
+    """多層對照表的 leftmost-longest 比對器"""
+
+    def __init__(self, tiers: Sequence[Tuple[str, Mapping[str, str]]] = ()):
+        """
+        Args:
+            tiers: (層級名稱, 對照表) 依優先順序排列
+        """
+        self._root: Dict[str, object] = {}
+        self._tier_names: List[str] = []
+        self.entries = 0
+        self.max_key_len = 0
+        for name, mapping in tiers:
+            self.add_tier(name, mapping)
+
+    def add_tier(self, name: str, mapping: Mapping[str, str]):
+        """加入一個優先度低於既有層級的對照表"""
+        tier = len(self._tier_names)
+        self._tier_names.append(name)
+        for key, value in mapping.items():
+            self._insert(key, value, tier, overwrite=False)
+
+    def add(self, key: str, value: str, tier: str = None):
+        """
+        加入或覆寫單一詞條
+
+        Args:
+            tier: 層級名稱（省略時為最後一層；不存在則新增一層）
+        """
+        if tier is None:
+            if not self._tier_names:
+                self._tier_names.append("")
+            index = len(self._tier_names) - 1
+        elif tier in self._tier_names:
+            index = self._tier_names.index(tier)
+        else:
+            index = len(self._tier_names)
+            self._tier_names.append(tier)
+        self._insert(key, value, index, overwrite=True)
+
+    def _insert(self, key: str, value: str, tier: int, overwrite: bool):
+        if not key:
+            return
+        node = self._root
+        for ch in key:
+            node = node.setdefault(ch, {})
+        existing = node.get(_END)
+        if existing is None:
+            self.entries += 1
+            self.max_key_len = max(self.max_key_len, len(key))
+        elif existing[1] < tier or (existing[1] == tier and not overwrite):
+            # 較高優先層級已有此鍵
+            return
+        node[_END] = (value, tier)
+
+    def longest_at(self, text: str, start: int) -> Optional[Tuple[int, str, str]]:
+        """從 start 開始的最長詞條，回傳 (結束位置, 轉換, 層級名稱)；沒有則 None"""
+        node = self._root
+        best = None
+        for pos in range(start, len(text)):
+            node = node.get(text[pos])
+            if node is None:
+                break
+            hit = node.get(_END)
+            if hit is not None:
+                best = (pos + 1, hit[0], self._tier_names[hit[1]])
+        return best
+
+    def replace(self, text: str) -> Tuple[str, List[Tuple[str, str, str]]]:
+        """
+        單趟由左至右替換
+
+        Returns:
+            (轉換後文本, [(層級, 原文, 轉換), ...])；原文與轉換相同的詞條不列入記錄
+        """
+        out: List[str] = []
+        matches: List[Tuple[str, str, str]] = []
+        pos = 0
+        plain_start = 0
+        n = len(text)
+        root = self._root
+        while pos < n:
+            if text[pos] not in root:
+                pos += 1
+                continue
+            hit = self.longest_at(text, pos)
+            if hit is None:
+                pos += 1
+                continue
+            end, converted, tier = hit
+            if plain_start < pos:
+                out.append(text[plain_start:pos])
+            original = text[pos:end]
+            out.append(converted)
+            if original != converted:
+                matches.append((tier, original, converted))
+            pos = plain_start = end
+        if plain_start == 0:
+            return text, matches
+        out.append(text[plain_start:])
+        return "".join(out), matches
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": self.entries, "tiers": len(self._tier_names), "max_key_len": self.max_key_len}
@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+辭典二進位快照
+把 ChhoeTaigi CSV 與 lexicon / phrases / end TSV 事先編譯成單一、有版本、可 mmap 的二進位檔，
+各轉換器啟動時直接映射讀取（毫秒級），多個 API 行程共用同一份作業系統頁面快取。
+來源檔的 mtime / 大小改變（或開啟雜湊驗證時內容改變）會自動重建。
+
+檔案格式（little-endian）:
+    檔頭   '<4sHHI'  magic b"TWDS", 格式版本, 表數, manifest 長度
+    manifest        JSON：來源路徑、mtime_ns、大小、sha256、建置版本
+    表目錄 '<24sIQQQQ' × 表數：表名, 筆數, 鍵索引位移, 鍵字串池位移, 值索引位移, 值字串池位移
+    每張表：uint32 鍵位移陣列(筆數+1) + 鍵字串池 + uint32 值位移陣列(筆數+1) + 值字串池
+鍵依 UTF-8 位元組排序（重複鍵保留來源順序），字串池內每筆以 \\0 結尾。
+
+用法:
+    python dictionary_snapshot.py            # 建置（或確認已是最新）
+    snapshot = load_snapshot()
+    kip = snapshot.table("chhoetaigi_kip").get("食飯")
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+CHHOETAIGI_CSV = os.path.join(BASE, "ChhoeTaigi_KauiokpooTaigiSutian.csv")
+LEXICON_TSV = os.path.join(BASE, "lexicon.tsv")
+PHRASES_TSV = os.path.join(BASE, "phrases.tsv")
+END_TSV = os.path.join(BASE, "end.tsv")
+SNAPSHOT_PATH = os.environ.get("TTS_DICT_SNAPSHOT", os.path.join(BASE, "dictionary.snapshot"))
+
+MAGIC = b"TWDS"
+FORMAT_VERSION = 1
+# 表的解析規則改變時遞增，讓既有快照自動重建
+BUILDER_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHI")
+_TABLE = struct.Struct("<24sIQQQQ")
+
+
+def nfc(s: str) -> str:
+    """Unicode 正規化"""
+    return unicodedata.normalize("NFC", s)
+
+
+# ============================================================================
+# 來源解析（只做與使用端無關的清理，各轉換器的取捨規則仍留在各自模組）
+# ============================================================================
+
+def _read_tsv_pairs(path: str) -> List[Tuple[str, str]]:
+    """TSV 前兩欄（略過空行與 # 註解），第二欄可為空"""
+    pairs = []
+    if not os.path.exists(path):
+        return pairs
+    with open(path, encoding="utf-8") as f:
+        for row in csv.reader(f, delimiter="\t"):
+            if not row:
+                continue
+            key = nfc(row[0].strip())
+            if not key or key.startswith("#"):
+                continue
+            pairs.append((key, nfc(row[1].strip()) if len(row) > 1 else ""))
+    return pairs
+
+
+def _read_chhoetaigi(path: str) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """
+    讀 ChhoeTaigi CSV 一次，產生兩張表：
+    - chhoetaigi_kip: 台語漢字 → KipInput（去掉括號內替代字，後出現者覆蓋，同 turn_number）
+    - chhoetaigi_hoabun: 華語詞 → 台語漢字（頓號 / 逗號拆開，只留 2 字以上、非純數字 / 英文）
+    """
+    kip: Dict[str, str] = {}
+    hoabun: List[Tuple[str, str]] = []
+    if not os.path.exists(path):
+        return [], []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            han_lo = (row.get("HanLoTaibunKip") or "").strip()
+            kipin = (row.get("KipInput") or "").strip()
+            if han_lo and kipin:
+                hanzi = re.sub(r"\([^)]*\)", "", han_lo).strip()
+                kipin = re.sub(r"\([^)]*\)", "", kipin).strip()
+                if hanzi and kipin:
+                    kip[hanzi] = kipin
+
+            hoa_bun = (row.get("HoaBun") or "").strip()
+            if han_lo and hoa_bun and han_lo != hoa_bun:
+                for variant in re.split("[、，,]", hoa_bun):
+                    variant = variant.strip()
+                    if (variant and variant != han_lo and len(variant) >= 2 and
+                            not re.match(r"^[0-9]+$", variant) and
+                            not re.match(r"^[a-zA-Z]+$", variant)):
+                        hoabun.append((variant, han_lo))
+    return list(kip.items()), hoabun
+
+
+def _source_tables(sources: Dict[str, str]) -> Dict[str, List[Tuple[str, str]]]:
+    kip, hoabun = _read_chhoetaigi(sources["chhoetaigi"])
+    return {
+        "chhoetaigi_kip": kip,
+        "chhoetaigi_hoabun": hoabun,
+        "lexicon": _read_tsv_pairs(sources["lexicon"]),
+        "phrases": _read_tsv_pairs(sources["phrases"]),
+        "endings": _read_tsv_pairs(sources["endings"]),
+    }
+
+
+DEFAULT_SOURCES = {
+    "chhoetaigi": CHHOETAIGI_CSV,
+    "lexicon": LEXICON_TSV,
+    "phrases": PHRASES_TSV,
+    "endings": END_TSV,
+}
+
+# 每張表來自哪個來源檔（供使用端確認自己要讀的檔案就是快照的來源）
+TABLE_SOURCES = {
+    "chhoetaigi_kip": "chhoetaigi",
+    "chhoetaigi_hoabun": "chhoetaigi",
+    "lexicon": "lexicon",
+    "phrases": "phrases",
+    "endings": "endings",
+}
+
+
+# ============================================================================
+# 來源指紋
+# ============================================================================
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _fingerprint(path: str, with_hash: bool = True) -> Dict:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {"path": os.path.abspath(path), "missing": True}
+    info = {"path": os.path.abspath(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    if with_hash:
+        info["sha256"] = _sha256(path)
+    return info
+
+
+def _is_fresh(manifest: Dict, sources: Dict[str, str], verify_hash: bool = False) -> bool:
+    """快照是否仍對應目前的來源檔（mtime / 大小；verify_hash 時另比對內容雜湊）"""
+    if manifest.get("builder") != BUILDER_VERSION or manifest.get("byteorder") != sys.byteorder:
+        return False
+    recorded = manifest.get("sources", {})
+    if set(recorded) != set(sources):
+        return False
+    for name, path in sources.items():
+        old = recorded[name]
+        new = _fingerprint(path, with_hash=False)
+        if old.get("path") != new["path"] or old.get("missing") != new.get("missing"):
+            return False
+        if new.get("missing"):
+            continue
+        if old.get("mtime_ns") != new["mtime_ns"] or old.get("size") != new["size"]:
+            return False
+        if verify_hash and old.get("sha256") != _sha256(path):
+            return False
+    return True
+
+
+# ============================================================================
+# 編譯
+# ============================================================================
+
+def _align(buf: bytearray, n: int = 8):
+    buf.extend(b"\0" * (-len(buf) % n))
+
+
+def _pack_strings(buf: bytearray, strings: List[bytes]) -> Tuple[int, int]:
+    """寫入 uint32 位移陣列與 \\0 結尾的字串池，回傳 (索引位移, 字串池位移)"""
+    _align(buf, 4)
+    index_offset = len(buf)
+    offsets = [0]
+    for s in strings:
+        offsets.append(offsets[-1] + len(s) + 1)
+    buf.extend(struct.pack(f"<{len(offsets)}I", *offsets))
+    pool_offset = len(buf)
+    buf.extend(b"".join(s + b"\0" for s in strings))
+    return index_offset, pool_offset
+
+
+def build_snapshot(path: str = SNAPSHOT_PATH, sources: Dict[str, str] = None) -> Dict:
+    """
+    解析所有來源並寫出快照（暫存檔 + rename 原子替換，多行程同時重建也安全）
+
+    Returns:
+        manifest
+    """
+    sources = dict(sources or DEFAULT_SOURCES)
+    start = time.time()
+    manifest = {
+        "format": FORMAT_VERSION,
+        "builder": BUILDER_VERSION,
+        "byteorder": sys.byteorder,
+        "built_at": time.time(),
+        "sources": {name: _fingerprint(p) for name, p in sources.items()},
+    }
+    tables = _source_tables(sources)
+    manifest["tables"] = {name: len(rows) for name, rows in tables.items()}
+
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    body = bytearray()
+    body.extend(_HEADER.pack(MAGIC, FORMAT_VERSION, len(tables), len(manifest_bytes)))
+    body.extend(manifest_bytes)
+    _align(body)
+    directory_offset = len(body)
+    body.extend(b"\0" * (_TABLE.size * len(tables)))
+
+    entries = []
+    for name, rows in tables.items():
+        # 依鍵的 UTF-8 位元組排序（與碼位順序一致），重複鍵保留來源順序
+        encoded = sorted(((k.encode("utf-8"), v.encode("utf-8")) for k, v in rows), key=lambda kv: kv[0])
+        key_index, key_pool = _pack_strings(body, [k for k, _ in encoded])
+        val_index, val_pool = _pack_strings(body, [v for _, v in encoded])
+        entries.append(_TABLE.pack(name.encode("ascii"), len(encoded), key_index, key_pool, val_index, val_pool))
+    body[directory_offset:directory_offset + len(b"".join(entries))] = b"".join(entries)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.chmod(temp_path, 0o644)  # mkstemp 建的是 0600，其他帳號執行的服務也要能讀
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    print(f"✓ 辭典快照已建置: {path} ({len(body) / 1024 / 1024:.1f} MB, {time.time() - start:.2f} 秒)")
+    return manifest
+
+
+# ============================================================================
+# 讀取
+# ============================================================================
+
+class SnapshotTable(Mapping):
+    """映射在快照上的唯讀排序表；查詢以二分搜尋，不必先展開成 dict"""
+
+    def __init__(self, name: str, buf, count: int, key_index: int, key_pool: int,
+                 val_index: int, val_pool: int):
+        self.name = name
+        self._buf = buf
+        self._count = count
+        self._key_offsets = buf[key_index:key_index + 4 * (count + 1)].cast("I")
+        self._val_offsets = buf[val_index:val_index + 4 * (count + 1)].cast("I")
+        self._key_pool = key_pool
+        self._val_pool = val_pool
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _key_bytes(self, i: int) -> bytes:
+        start = self._key_pool + self._key_offsets[i]
+        return bytes(self._buf[start:self._key_pool + self._key_offsets[i + 1] - 1])
+
+    def _value(self, i: int) -> str:
+        start = self._val_pool + self._val_offsets[i]
+        return bytes(self._buf[start:self._val_pool + self._val_offsets[i + 1] - 1]).decode("utf-8")
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __getitem__(self, key: str) -> str:
+        encoded = key.encode("utf-8")
+        i = self._lower_bound(encoded)
+        if i < self._count and self._key_bytes(i) == encoded:
+            return self._value(i)
+        raise KeyError(key)
+
+    def get_all(self, key: str) -> List[str]:
+        """同一個鍵的所有值（lexicon 一字多音時會有多筆）"""
+        encoded = key.encode("utf-8")
+        i = self._lower_bound(encoded)
+        values = []
+        while i < self._count and self._key_bytes(i) == encoded:
+            values.append(self._value(i))
+            i += 1
+        return values
+
+    def _pool_strings(self, pool: int, offsets) -> List[str]:
+        if not self._count:
+            return []
+        return bytes(self._buf[pool:pool + offsets[self._count] - 1]).decode("utf-8").split("\0")
+
+    def keys(self) -> List[str]:
+        """所有鍵（一次解碼整個字串池，比逐筆取快得多）"""
+        return self._pool_strings(self._key_pool, self._key_offsets)
+
+    def values(self) -> List[str]:
+        return self._pool_strings(self._val_pool, self._val_offsets)
+
+    def items(self) -> List[Tuple[str, str]]:
+        return list(zip(self.keys(), self.values()))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def to_dict(self) -> Dict[str, str]:
+        """展開成 dict（重複鍵以最後一筆為準）"""
+        return dict(zip(self.keys(), self.values()))
+
+
+class DictionarySnapshot:
+    """已映射的快照檔"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        magic, version, table_count, manifest_len = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"不支援的辭典快照格式: {magic!r} v{version}")
+        offset = _HEADER.size
+        self.manifest = json.loads(bytes(buf[offset:offset + manifest_len]).decode("utf-8"))
+        offset += manifest_len
+        offset += -offset % 8
+
+        self._tables: Dict[str, SnapshotTable] = {}
+        for i in range(table_count):
+            name, count, key_index, key_pool, val_index, val_pool = _TABLE.unpack_from(buf, offset + i * _TABLE.size)
+            name = name.rstrip(b"\0").decode("ascii")
+            self._tables[name] = SnapshotTable(name, buf, count, key_index, key_pool, val_index, val_pool)
+
+    def table(self, name: str) -> SnapshotTable:
+        return self._tables[name]
+
+    def source_path(self, table_name: str) -> Optional[str]:
+        source = self.manifest["sources"].get(TABLE_SOURCES.get(table_name, ""), {})
+        return source.get("path")
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "bytes": len(self._mmap),
+            "built_at": self.manifest.get("built_at"),
+            "tables": {name: len(table) for name, table in self._tables.items()},
+        }
+
+
+# ============================================================================
+# 行程共用
+# ============================================================================
+
+_snapshots: Dict[str, DictionarySnapshot] = {}
+_snapshot_lock = threading.Lock()
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH, sources: Dict[str, str] = None,
+                  verify_hash: bool = None) -> Optional[DictionarySnapshot]:
+    """
+    取得快照（同一路徑在行程內只映射一次）；過期或不存在時先重建。
+    任何錯誤都回傳 None，呼叫端應退回直接解析來源檔。
+
+    Args:
+        verify_hash: 另比對來源內容雜湊（預設讀 TTS_DICT_SNAPSHOT_VERIFY 環境變數）
+    """
+    sources = dict(sources or DEFAULT_SOURCES)
+    if verify_hash is None:
+        verify_hash = os.environ.get("TTS_DICT_SNAPSHOT_VERIFY", "") not in ("", "0")
+    with _snapshot_lock:
+        snapshot = _snapshots.get(path)
+        if snapshot is not None:
+            return snapshot
+        try:
+            try:
+                snapshot = DictionarySnapshot(path) if os.path.exists(path) else None
+            except (ValueError, struct.error):
+                snapshot = None  # 舊格式版本或損毀的快照：直接重建
+            if snapshot is None or not _is_fresh(snapshot.manifest, sources, verify_hash):
+                build_snapshot(path, sources)
+                snapshot = DictionarySnapshot(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠ 辭典快照無法使用，改為直接解析來源檔: {e}")
+            return None
+        _snapshots[path] = snapshot
+        return snapshot
+
+
+def reset_snapshots():
+    """
+    丟棄行程內已映射的快照，下次 load_snapshot 重新檢查來源並視需要重建
+    （舊快照的 mmap 在仍被引用期間繼續有效；重建是寫新檔再 os.replace，不影響舊映射）
+    """
+    with _snapshot_lock:
+        _snapshots.clear()
+
+
+def snapshot_table(name: str, source_path: str = None) -> Optional[SnapshotTable]:
+    """
+    取得快照中的表；指定 source_path 時只有它正是快照的來源檔才回傳（否則 None，呼叫端自行解析）
+    """
+    snapshot = load_snapshot()
+    if snapshot is None:
+        return None
+    if source_path is not None and os.path.abspath(source_path) != snapshot.source_path(name):
+        return None
+    return snapshot.table(name)
+
+
+def source_pairs(name: str, path: str) -> List[Tuple[str, str]]:
+    """表內容：path 正是快照的來源檔時取自快照，否則直接解析 path"""
+    table = snapshot_table(name, path)
+    if table is not None:
+        return table.items()
+    if TABLE_SOURCES[name] == "chhoetaigi":
+        kip, hoabun = _read_chhoetaigi(path)
+        return kip if name == "chhoetaigi_kip" else hoabun
+    return _read_tsv_pairs(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="編譯台語辭典二進位快照")
+    parser.add_argument("--output", "-o", default=SNAPSHOT_PATH, help="快照輸出路徑")
+    parser.add_argument("--force", action="store_true", help="不論是否過期都重建")
+    parser.add_argument("--verify-hash", action="store_true", help="另以內容雜湊確認來源未變")
+    args = parser.parse_args()
+
+    if args.force:
+        build_snapshot(args.output)
+    start = time.time()
+    snapshot = load_snapshot(args.output, verify_hash=args.verify_hash)
+    if snapshot is None:
+        sys.exit(1)
+    print(f"✓ 快照載入 {(time.time() - start) * 1000:.1f} ms")
+    for name, count in snapshot.stats()["tables"].items():
+        print(f"  - {name}: {count}")
+
+
+if __name__ == "__main__":
+    main()
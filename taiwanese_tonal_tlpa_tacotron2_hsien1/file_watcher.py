@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+檔案變動監看（mtime 輪詢）
+背景執行緒定期比對檔案的 mtime 與大小，變動且已寫完（連續兩次輪詢相同）時呼叫對應的重新載入函式。
+重新載入在監看執行緒中進行：呼叫端應先在旁邊建好新資料、最後一次指派換上，
+處理中的請求繼續使用舊資料，不會被阻塞。
+
+用法:
+    watcher = FileWatcher(interval=5.0)
+    watcher.watch("profile", [PROFILE_PATH], reload_profile)
+    watcher.start()
+    print(watcher.stats())
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+Fingerprint = Tuple[Optional[Tuple[int, int]], ...]
+
+
+def fingerprint(paths: Sequence[str]) -> Fingerprint:
+    """各檔案的 (mtime_ns, size)，不存在的檔案為 None"""
+    result = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            result.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            result.append(None)
+    return tuple(result)
+
+
+class _Watch:
+    def __init__(self, name: str, paths: Sequence[str], callback: Callable[[], None]):
+        self.name = name
+        self.paths = list(paths)
+        self.callback = callback
+        self.current = fingerprint(self.paths)
+        self.pending: Optional[Fingerprint] = None
+        self.reloads = 0
+        self.errors = 0
+        self.last_reload: Optional[float] = None
+        self.last_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+
+class FileWatcher:
+    """以輪詢監看多組檔案，變動時在背景重新載入"""
+
+    def __init__(self, interval: float = 5.0):
+        """
+        Args:
+            interval: 輪詢間隔秒數
+        """
+        self.interval = max(0.1, float(interval))
+        self._watches: Dict[str, _Watch] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, name: str, paths: Sequence[str], callback: Callable[[], None]):
+        """登記一組檔案；以目前狀態為基準，之後的變動才會觸發 callback"""
+        with self._lock:
+            self._watches[name] = _Watch(name, paths, callback)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+        print(f"✓ 檔案監看啟動: {len(self._watches)} 組, 每 {self.interval:g} 秒檢查")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self, force: Sequence[str] = ()) -> List[str]:
+        """
+        檢查一次，回傳這次重新載入的組名
+
+        Args:
+            force: 不論有無變動都重新載入的組名
+        """
+        with self._lock:
+            watches = list(self._watches.values())
+        reloaded = []
+        for watch in watches:
+            latest = fingerprint(watch.paths)
+            if watch.name not in force:
+                if latest == watch.current:
+                    watch.pending = None
+                    continue
+                # 編輯器常分多次寫入：等下一次輪詢狀態不再改變才載入
+                if latest != watch.pending:
+                    watch.pending = latest
+                    continue
+            watch.pending = None
+            watch.current = latest
+            if self._reload(watch):
+                reloaded.append(watch.name)
+        return reloaded
+
+    @staticmethod
+    def _reload(watch: _Watch) -> bool:
+        start = time.time()
+        try:
+            watch.callback()
+        except Exception as e:
+            # 新內容有誤時保留舊資料，等下一次修改再試
+            watch.errors += 1
+            watch.last_error = str(e)
+            print(f"✗ 重新載入失敗 [{watch.name}]: {e}")
+            return False
+        watch.reloads += 1
+        watch.last_reload = time.time()
+        watch.last_seconds = round(watch.last_reload - start, 3)
+        watch.last_error = None
+        print(f"✓ 已重新載入 [{watch.name}] ({watch.last_seconds} 秒)")
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            watches = list(self._watches.values())
+        return {
+            "interval": self.interval,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "watches": {
+                watch.name: {
+                    "files": len(watch.paths),
+                    "reloads": watch.reloads,
+                    "errors": watch.errors,
+                    "last_reload": watch.last_reload,
+                    "last_seconds": watch.last_seconds,
+                    "last_error": watch.last_error,
+                }
+                for watch in watches
+            },
+        }
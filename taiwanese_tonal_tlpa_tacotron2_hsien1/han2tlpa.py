@@ -18,9 +18,14 @@ from 臺灣言語工具.語言模型.實際語言模型 import 實際語言模
 from 臺灣言語工具.辭典.型音辭典 import 型音辭典
 # TLPA（數字調）輸出
 from 臺灣言語工具.音標系統.閩南語.臺灣語言音標 import 臺灣語言音標  # TLPA
+# 編譯好的詞表快照（可選）
+try:
+    from dictionary_snapshot import snapshot_table
+except ImportError:
+    snapshot_table = None
 
 # ===== 路徑都寫在這裡 =====
-BASE = r"D:\Users\User\Desktop\project\0912\taiwanese_tonal_tlpa_tacotron2"
+BASE = os.path.dirname(os.path.abspath(__file__))
 LEXICON_TSV  = os.path.join(BASE, "lexicon.tsv")   # 你的主詞表（可不存在）
 PHRASES_TSV  = os.path.join(BASE, "phrases.tsv")   # 硬指定讀法（整句）
 END_TSV      = os.path.join(BASE, "end.tsv")       # 句尾語氣詞名單（例：咧\t--leh）
@@ -44,6 +49,11 @@ def normalize_lomaji(s: str) -> str:
     return s
 
 def load_lexicon_pairs(tsv_path: str) -> List[Tuple[str, str]]:
+    # 快照來源正是這個檔案時直接取用，省去逐列解析
+    table = snapshot_table("lexicon", tsv_path) if snapshot_table is not None else None
+    if table is not None:
+        return [(han, normalize_lomaji(lomaji)) for han, lomaji in table.items()
+                if han and lomaji and not han.startswith("#")]
     pairs = []
     if not os.path.exists(tsv_path):
         return pairs
@@ -39,9 +39,14 @@ from tacotron2.model import Tacotron2
 from scipy.io.wavfile import write as wavwrite
 from tacotron2.text import text_to_sequence
 
+import audio_utils
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 torch.set_grad_enabled(False)
 
+SIGMA = 0.666
+DENOISER_STRENGTH = 0.01
+
 # —— TTS ——（保持原樣）
 class Synthesizer:
     def __init__(self, tacotron_ckpt: str, waveglow_ckpt: str):
@@ -49,6 +54,9 @@ class Synthesizer:
         self.hparams.sampling_rate = 22050
         self.hparams.max_decoder_steps = 3000
         self.hparams.fp16_run = False
+        # 合成參數（也是合成快取鍵的一部分）
+        self.sigma = SIGMA
+        self.denoiser_strength = DENOISER_STRENGTH
 
         # Resolve checkpoint paths robustly: expand, abspath, realpath; if missing, search repo for basename
         def _resolve_ckpt(path):
@@ -115,52 +123,60 @@ class Synthesizer:
             except Exception: pass
         self.denoiser = Denoiser(self.waveglow, device=device)
 
-    def tts(self, text: str, out_path: str) -> str:
-        import gc
-        seq = np.array(text_to_sequence(text, ['basic_cleaners']))[None, :]
-        seq = torch.from_numpy(seq).to(device=device, dtype=torch.int64)
+    def _text_to_sequence(self, text: str) -> List[int]:
+        """台羅文本轉符號序列，長度不足編碼器卷積核時補 0"""
+        seq = list(text_to_sequence(text, ['basic_cleaners']))
         # Ensure sequence length is at least encoder kernel size to avoid conv kernel > input errors
         try:
             min_len = int(self.hparams.encoder_kernel_size)
         except Exception:
             min_len = 5
-        cur_len = seq.size(1)
-        if cur_len < min_len:
-            pad_amount = min_len - cur_len
-            pad_tensor = torch.zeros((1, pad_amount), dtype=seq.dtype, device=seq.device)
-            seq = torch.cat([seq, pad_tensor], dim=1)
+        if len(seq) < min_len:
+            seq += [0] * (min_len - len(seq))
+        return seq
+
+    def _vocode(self, mel: torch.Tensor) -> np.ndarray:
+        """單一 mel (1, n_mel, T) → 峰值正規化到 ±1 的浮點音訊"""
+        import gc
+        # 確保 mel 幀數足夠，避免 WaveGlow/降噪在極短音訊時出現張量拼接錯誤
+        # WaveGlow 產生音訊長度約為 mel_frames * 256；為了讓 STFT(1024)正常，至少需要 ~4 幀
+        min_mel_frames = 4
+        if mel.size(-1) < min_mel_frames:
+            pad_frames = min_mel_frames - int(mel.size(-1))
+            last = mel[:, :, -1:].repeat(1, 1, pad_frames)
+            mel = torch.cat([mel, last], dim=-1)
+        # 另外盡量讓時間軸對齊到 8 的倍數（對 n_group=8 較穩定），不足則複製最後一幀補齊
+        n_group = 8
+        rem = int(mel.size(-1)) % n_group
+        if rem != 0:
+            add = n_group - rem
+            last = mel[:, :, -1:].repeat(1, 1, add)
+            mel = torch.cat([mel, last], dim=-1)
+        gc.collect()  # Clear memory between steps
+
+        audio = self.waveglow.infer(mel, sigma=self.sigma)
+        gc.collect()
+
+        # 對極短音訊，降噪可能失敗；失敗則退回未降噪音訊
+        try:
+            audio = self.denoiser(audio, strength=self.denoiser_strength)[:, 0]
+        except Exception:
+            audio = audio[:, 0]
+        audio = audio[0].data.cpu().numpy()
+        gc.collect()
+
+        return audio_utils.peak_normalize(audio, peak=1.0, floor=0.01)
+
+    def synthesize(self, text: str) -> np.ndarray:
+        """台羅文本 → int16 音訊陣列（取樣率 self.hparams.sampling_rate），不落地檔案"""
+        import gc
+        seq = np.array(self._text_to_sequence(text))[None, :]
+        seq = torch.from_numpy(seq).to(device=device, dtype=torch.int64)
         
         with torch.no_grad():
             try:
                 _, mel, _, _ = self.tacotron.inference(seq)
-                # 確保 mel 幀數足夠，避免 WaveGlow/降噪在極短音訊時出現張量拼接錯誤
-                # WaveGlow 產生音訊長度約為 mel_frames * 256；為了讓 STFT(1024)正常，至少需要 ~4 幀
-                min_mel_frames = 4
-                if mel.size(-1) < min_mel_frames:
-                    pad_frames = min_mel_frames - int(mel.size(-1))
-                    last = mel[:, :, -1:].repeat(1, 1, pad_frames)
-                    mel = torch.cat([mel, last], dim=-1)
-                # 另外盡量讓時間軸對齊到 8 的倍數（對 n_group=8 較穩定），不足則複製最後一幀補齊
-                n_group = 8
-                rem = int(mel.size(-1)) % n_group
-                if rem != 0:
-                    add = n_group - rem
-                    last = mel[:, :, -1:].repeat(1, 1, add)
-                    mel = torch.cat([mel, last], dim=-1)
-                gc.collect()  # Clear memory between steps
-                
-                audio = self.waveglow.infer(mel, sigma=0.666)
-                gc.collect()
-                
-                # 對極短音訊，降噪可能失敗；失敗則退回未降噪音訊
-                try:
-                    audio = self.denoiser(audio, strength=0.01)[:, 0]
-                except Exception:
-                    audio = audio[:, 0]
-                audio = audio[0].data.cpu().numpy()
-                gc.collect()
-                
-                audio *= 32767 / max(0.01, float(np.max(np.abs(audio))))
+                audio = self._vocode(mel)
             finally:
                 # Ensure cleanup even if error occurs
                 try:
@@ -169,9 +185,62 @@ class Synthesizer:
                     pass
                 gc.collect()
         
-        wavwrite(out_path, self.hparams.sampling_rate, audio.astype(np.int16))
+        return audio_utils.to_pcm16(audio)
+
+    def tts(self, text: str, out_path: str) -> str:
+        wavwrite(out_path, self.hparams.sampling_rate, self.synthesize(text))
         return out_path
 
+    def mels_batch(self, texts: List[str]) -> List[torch.Tensor]:
+        """
+        多句台羅共用一次 Tacotron2 解碼迴圈
+
+        Returns:
+            各句未補齊的 postnet mel，形狀 (1, n_mel, T_i)，順序同輸入
+        """
+        seqs = [self._text_to_sequence(text) for text in texts]
+        lengths = torch.tensor([len(seq) for seq in seqs], dtype=torch.long, device=device)
+        padded = torch.zeros((len(seqs), int(lengths.max())), dtype=torch.int64, device=device)
+        for i, seq in enumerate(seqs):
+            padded[i, :len(seq)] = torch.tensor(seq, dtype=torch.int64, device=device)
+
+        with torch.no_grad():
+            outputs = self.tacotron.inference_batch(padded, lengths)
+        return [mel_postnet for _, mel_postnet, _, _ in outputs]
+
+    def vocode_batch(self, mels: List[torch.Tensor], max_batch: int = 8) -> List[np.ndarray]:
+        """
+        多個 mel 依長度分桶，每桶一次 WaveGlow + 降噪，再各自裁回 frames * hop_length
+
+        Returns:
+            各句峰值正規化到 ±1 的浮點音訊，順序同輸入
+        """
+        import gc
+
+        def _denoise(audio):
+            # 對極短音訊，降噪可能失敗；失敗則退回未降噪音訊
+            try:
+                return self.denoiser(audio, strength=self.denoiser_strength)[:, 0]
+            except Exception:
+                return audio
+
+        with torch.no_grad():
+            audios = self.waveglow.infer_batch(mels, sigma=self.sigma, max_batch=max_batch, postprocess=_denoise)
+        results = [audio_utils.peak_normalize(audio.data.cpu().numpy(), peak=1.0, floor=0.01) for audio in audios]
+        gc.collect()
+        return results
+
+    def synthesize_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """批次合成：Tacotron2 共用解碼迴圈，WaveGlow 依長度分桶批次聲碼，回傳各句 int16 陣列"""
+        if not texts:
+            return []
+        return [audio_utils.to_pcm16(audio) for audio in self.vocode_batch(self.mels_batch(texts))]
+
+    def tts_batch(self, texts: List[str], out_paths: List[str]) -> List[str]:
+        for audio, out_path in zip(self.synthesize_batch(texts), out_paths):
+            wavwrite(out_path, self.hparams.sampling_rate, audio)
+        return out_paths
+
 # —— 輔助：產生輸出檔名（保留原寫法） ——
 def next_out_path() -> str:
     os.makedirs(OUT_DIR, exist_ok=True)
@@ -134,12 +134,9 @@ class IntegratedTaiwaneTTS:
         """使用基本方法轉換（調用原有han2tts邏輯）"""
         if HAN2TTS_AVAILABLE:
             try:
-                # 使用han2tts的轉換邏輯
-                phrases = han2tts.load_phrases(han2tts.PHRASES_TSV)
-                endings = han2tts.load_endings(han2tts.END_TSV) 
-                dictionary = han2tts.build_dictionary()
-                
-                return han2tts.han2tlpa(han_text, dictionary, endings, phrases)
+                # 使用行程共用的台語辭典（只在第一次呼叫時載入）
+                from tlpa_dictionary import get_dictionary_service
+                return get_dictionary_service().han_to_tlpa(han_text)
             except Exception as e:
                 print(f"基本轉換失敗: {e}")
                 return han_text  # fallback
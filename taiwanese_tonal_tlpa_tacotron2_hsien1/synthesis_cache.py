@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+語音合成快取
+以「正規化台羅 + 合成參數」的內容雜湊為鍵，兩層快取合成結果：
+- 記憶體層：LRU（依筆數與位元組上限淘汰）
+- 磁碟層：每筆一個檔案，總容量上限，依最近存取時間淘汰
+
+常用句（問候、吃藥提醒、應答）重複合成時直接回傳，不必再跑 Tacotron2 + WaveGlow。
+
+用法:
+    cache = SynthesisCache("tts_cache", max_disk_mb=256)
+    key = cache.make_key("li2 ho2", sigma=0.666, denoiser_strength=0.01, sample_rate=22050)
+    wav_bytes = cache.get(key)
+    if wav_bytes is None:
+        wav_bytes = synthesize(...)
+        cache.put(key, wav_bytes)
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def normalize_tlpa(text: str) -> str:
+    """與 basic_cleaners 一致：轉小寫並壓縮空白，讓同音文本共用同一筆快取"""
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+class SynthesisCache:
+    """兩層（記憶體 LRU + 磁碟）內容定址合成快取，執行緒安全"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_memory_items: int = 256,
+                 max_memory_mb: float = 64, max_disk_mb: float = 256, suffix: str = ".wav"):
+        """
+        Args:
+            cache_dir: 磁碟層目錄；None 表示只用記憶體層
+            max_memory_items: 記憶體層最多筆數
+            max_memory_mb: 記憶體層位元組上限
+            max_disk_mb: 磁碟層容量上限
+            suffix: 磁碟檔案副檔名
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_items = max(1, int(max_memory_items))
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.suffix = suffix
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            self._load_disk_index()
+
+    # ------------------------------------------------------------------
+    # 鍵
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def make_key(tlpa_text: str, sigma: float, denoiser_strength: float, sample_rate: int,
+                 namespace: str = "utt") -> str:
+        """正規化台羅與合成參數的 SHA-256"""
+        raw = f"{namespace}|{normalize_tlpa(tlpa_text)}|{sigma:.4f}|{denoiser_strength:.4f}|{int(sample_rate)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    # 讀寫
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[bytes]:
+        """依序查記憶體層、磁碟層；磁碟命中時回填記憶體層"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self.memory_hits += 1
+                return data
+            on_disk = key in self._disk
+
+        if on_disk:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path, None)
+            except OSError:
+                with self._lock:
+                    self._drop_disk_entry(key)
+                data = None
+            if data is not None:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._put_memory(key, data)
+                return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def contains(self, key: str) -> bool:
+        """是否在任一層中（不讀檔、不計入命中統計），供合成前判斷是否需要排隊"""
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def put(self, key: str, data: bytes):
+        """寫入兩層；磁碟層以暫存檔 + rename 原子寫入"""
+        if not data:
+            return
+        with self._lock:
+            self._put_memory(key, data)
+            if not self.cache_dir or key in self._disk or len(data) > self.max_disk_bytes:
+                return
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠ 合成快取寫入失敗: {e}")
+            return
+
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def clear(self):
+        """清空兩層快取"""
+        with self._lock:
+            keys = list(self._disk.keys())
+            self._memory.clear()
+            self._memory_bytes = 0
+            for key in keys:
+                self._drop_disk_entry(key)
+
+    def stats(self) -> Dict:
+        """命中率與容量統計"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_items": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    # ------------------------------------------------------------------
+    # 內部
+    # ------------------------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + self.suffix)
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory and (len(self._memory) > self.max_memory_items or
+                                self._memory_bytes > self.max_memory_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _drop_disk_entry(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        while self._disk and self._disk_bytes > self.max_disk_bytes:
+            key = next(iter(self._disk))
+            self._drop_disk_entry(key)
+
+    def _load_disk_index(self):
+        """啟動時掃描磁碟層，依檔案修改時間重建 LRU 順序"""
+        entries = []
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    if name.endswith(".tmp"):
+                        # 上次中斷留下的暫存檔
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                        continue
+                    if not name.endswith(self.suffix):
+                        continue
+                    st = os.stat(path)
+                    entries.append((st.st_mtime, name[:-len(self.suffix)], st.st_size))
+        except OSError as e:
+            print(f"⚠ 合成快取目錄無法讀取: {e}")
+            return
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        if entries:
+            print(f"✓ 合成快取載入: {len(self._disk)} 筆, {self._disk_bytes / 1024 / 1024:.1f} MB")
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+"""
+語音合成排程器
+以 N 個常駐子行程各自載入 Tacotron2 + WaveGlow（CPU），
+前端以有界佇列收件，佇列滿即拒絕（由 API 轉成 503），並回報佇列深度與服務時間。
+每個子行程有自己的工作佇列，請求派給未完成件數最少的子行程；
+子行程異常結束時，派給它的請求立即失敗並重新啟動一個子行程補上。
+
+用法:
+    pool = SynthesisPool(TACOTRON_CKPT, WAVEGLOW_CKPT, num_workers=2, max_queue=16)
+    samples = pool.synthesize("li2 ho2")  # int16 陣列，取樣率 pool.sample_rate
+    print(pool.metrics())
+"""
+
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class SynthesisQueueFull(RuntimeError):
+    """合成佇列已滿，呼叫端應回 503 請客戶端稍後重試"""
+
+
+class SynthesisWorkerError(RuntimeError):
+    """子行程合成失敗或異常結束"""
+
+
+# ============================================================================
+# 子行程
+# ============================================================================
+
+def _synthesize_batch(synth, texts: List[str]) -> List[np.ndarray]:
+    """合成一批台羅文本，回傳各自的 int16 陣列（合成器支援批次時共用一次解碼迴圈）"""
+    if len(texts) > 1 and hasattr(synth, "synthesize_batch"):
+        return synth.synthesize_batch(texts)
+    return [synth.synthesize(text) for text in texts]
+
+
+def _worker_main(worker_id: int, tacotron_ckpt: str, waveglow_ckpt: str,
+                 task_queue, result_queue, max_batch: int, batch_wait: float,
+                 torch_threads: int):
+    """子行程主迴圈：載入模型後持續取件，順手把佇列中已等待的件併成一批"""
+    try:
+        import torch
+        if torch_threads > 0:
+            torch.set_num_threads(torch_threads)
+        import han2tts
+        synth = han2tts.Synthesizer(tacotron_ckpt, waveglow_ckpt)
+    except Exception as e:
+        result_queue.put(("failed", worker_id, str(e)))
+        return
+    result_queue.put(("ready", worker_id, synth.hparams.sampling_rate))
+
+    while True:
+        job = task_queue.get()
+        if job is None:
+            break
+
+        # 微批次：短暫等待同時到達的請求
+        batch = [job]
+        stop = False
+        deadline = time.time() + batch_wait
+        while len(batch) < max_batch:
+            remaining = deadline - time.time()
+            try:
+                extra = task_queue.get(timeout=max(0.0, remaining)) if remaining > 0 else task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if extra is None:
+                stop = True
+                break
+            batch.append(extra)
+
+        start = time.time()
+        job_ids = [job_id for job_id, _ in batch]
+        texts = [text for _, text in batch]
+        try:
+            outputs = _synthesize_batch(synth, texts)
+            elapsed = time.time() - start
+            for job_id, samples in zip(job_ids, outputs):
+                result_queue.put(("done", worker_id, (job_id, True, samples, elapsed, len(batch))))
+        except Exception as e:
+            elapsed = time.time() - start
+            # 整批失敗時逐件重試，避免一句壞文本拖垮同批其他請求
+            if len(batch) > 1:
+                for job_id, text in batch:
+                    try:
+                        samples = _synthesize_batch(synth, [text])[0]
+                        result_queue.put(("done", worker_id, (job_id, True, samples, elapsed, 1)))
+                    except Exception as item_error:
+                        result_queue.put(("done", worker_id, (job_id, False, str(item_error), elapsed, 1)))
+            else:
+                result_queue.put(("done", worker_id, (job_ids[0], False, str(e), elapsed, 1)))
+
+        if stop:
+            break
+
+
+# ============================================================================
+# 排程器
+# ============================================================================
+
+class SynthesisPool:
+    """常駐合成子行程池（有界佇列 + 背壓 + 指標）"""
+
+    def __init__(self, tacotron_ckpt: str, waveglow_ckpt: str, num_workers: int = 2,
+                 max_queue: int = 16, max_batch: int = 4, batch_wait_ms: float = 10.0,
+                 torch_threads: Optional[int] = None, metrics_window: int = 200):
+        """
+        Args:
+            tacotron_ckpt / waveglow_ckpt: 模型檔路徑（子行程各自載入）
+            num_workers: 子行程數
+            max_queue: 尚未完成的請求上限（含處理中），超過即拒絕
+            max_batch: 每個子行程一次最多合併處理的請求數
+            batch_wait_ms: 湊批次時最多等待的毫秒數
+            torch_threads: 每個子行程的 torch 執行緒數，預設依核心數平分
+            metrics_window: 統計服務時間的滑動視窗大小
+        """
+        self.tacotron_ckpt = tacotron_ckpt
+        self.waveglow_ckpt = waveglow_ckpt
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue = max(1, int(max_queue))
+        self.max_batch = max(1, int(max_batch))
+        self.batch_wait = max(0.0, batch_wait_ms / 1000.0)
+        if torch_threads is None:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.torch_threads = torch_threads
+
+        self.sample_rate = 22050
+        self._ctx = mp.get_context("spawn")
+        self._result_queue = None
+        self._task_queues: List = []
+        self._workers: List = []
+        self._worker_states: List[str] = []  # starting / ready / failed
+        self._assigned: List[int] = []       # 各子行程未完成件數
+        self._collector = None
+        self._started = False
+        self._closed = False
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._futures: Dict[int, Future] = {}
+        self._submitted_at: Dict[int, float] = {}
+        self._owners: Dict[int, int] = {}  # job_id → 子行程編號
+        self._ready = 0
+        self._restarts = 0
+        self._failed: List[str] = []
+        self._ready_event = threading.Event()
+
+        self._service_times = deque(maxlen=metrics_window)
+        self._latencies = deque(maxlen=metrics_window)
+        self._batch_sizes = deque(maxlen=metrics_window)
+        self._completed = 0
+        self._errors = 0
+        self._rejected = 0
+
+    # ------------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------------
+
+    def start(self, wait: bool = False, timeout: Optional[float] = None):
+        """啟動子行程（首次送件時也會自動啟動）"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SynthesisPool 已關閉")
+            if self._started:
+                return
+            self._result_queue = self._ctx.Queue()
+            for worker_id in range(self.num_workers):
+                self._task_queues.append(None)
+                self._workers.append(None)
+                self._worker_states.append("starting")
+                self._assigned.append(0)
+                self._spawn_worker(worker_id)
+            self._collector = threading.Thread(target=self._collect_results, daemon=True)
+            self._collector.start()
+            self._started = True
+            print(f"✓ 合成子行程池啟動: {self.num_workers} workers, 佇列上限 {self.max_queue}")
+        if wait:
+            self._ready_event.wait(timeout)
+
+    def _spawn_worker(self, worker_id: int):
+        """啟動（或替換）指定編號的子行程；換用新的工作佇列，舊佇列裡的件已由呼叫端處理（需持有 _lock）"""
+        task_queue = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.tacotron_ckpt, self.waveglow_ckpt,
+                  task_queue, self._result_queue,
+                  self.max_batch, self.batch_wait, self.torch_threads),
+            daemon=True,
+        )
+        proc.start()
+        self._task_queues[worker_id] = task_queue
+        self._workers[worker_id] = proc
+        self._worker_states[worker_id] = "starting"
+
+    def close(self, timeout: float = 5.0):
+        """通知子行程結束並回收"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            started = self._started
+            task_queues = list(self._task_queues)
+            workers = list(self._workers)
+        if not started:
+            return
+        for task_queue in task_queues:
+            task_queue.put(None)
+        for proc in workers:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join(timeout)
+        self._result_queue.put(("closed", -1, None))
+        self._fail_pending("合成子行程池已關閉")
+
+    # ------------------------------------------------------------------
+    # 送件
+    # ------------------------------------------------------------------
+
+    def is_saturated(self) -> bool:
+        """佇列是否已滿（供串流端點在開始回應前先回 503）"""
+        with self._lock:
+            return len(self._futures) >= self.max_queue
+
+    def submit(self, tlpa_text: str) -> Future:
+        """
+        送出一筆合成請求
+
+        Returns:
+            Future，結果為 int16 音訊陣列
+
+        Raises:
+            SynthesisQueueFull: 未完成請求已達上限
+        """
+        self.start()
+        with self._lock:
+            if all(state == "failed" for state in self._worker_states):
+                raise SynthesisWorkerError(f"所有合成子行程初始化失敗: {self._failed[0]}")
+            if len(self._futures) >= self.max_queue:
+                self._rejected += 1
+                raise SynthesisQueueFull(f"合成佇列已滿（{self.max_queue}）")
+            worker_id = self._pick_worker()
+            job_id = next(self._ids)
+            future = Future()
+            self._futures[job_id] = future
+            self._submitted_at[job_id] = time.time()
+            self._owners[job_id] = worker_id
+            self._assigned[worker_id] += 1
+            task_queue = self._task_queues[worker_id]
+        # 若此時子行程剛好異常結束，這件已在替換時標為失敗，放進舊佇列也不會被處理
+        task_queue.put((job_id, tlpa_text))
+        return future
+
+    def synthesize(self, tlpa_text: str, timeout: Optional[float] = 120.0) -> np.ndarray:
+        """同步合成，回傳 int16 音訊陣列；逾時則放棄這件並釋出佇列名額"""
+        future = self.submit(tlpa_text)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                for job_id, pending in self._futures.items():
+                    if pending is future:
+                        del self._futures[job_id]
+                        self._submitted_at.pop(job_id, None)
+                        break
+            raise
+
+    def _pick_worker(self) -> int:
+        """未完成件數最少、且未初始化失敗的子行程（需持有 _lock）"""
+        candidates = [worker_id for worker_id, state in enumerate(self._worker_states) if state != "failed"]
+        return min(candidates, key=lambda worker_id: self._assigned[worker_id])
+
+    def _release(self, job_id: int):
+        """結束一件的歸屬紀錄（需持有 _lock）"""
+        worker_id = self._owners.pop(job_id, None)
+        if worker_id is not None:
+            self._assigned[worker_id] -= 1
+
+    # ------------------------------------------------------------------
+    # 結果與指標
+    # ------------------------------------------------------------------
+
+    def _collect_results(self):
+        """背景執行緒：接收子行程結果並完成對應的 Future，每秒檢查一次子行程是否存活"""
+        last_check = time.time()
+        while True:
+            try:
+                kind, worker_id, payload = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                kind = None
+            except (EOFError, OSError):
+                break
+
+            if kind == "closed":
+                break
+            if kind is not None:
+                self._handle_message(kind, worker_id, payload)
+            if time.time() - last_check >= 1.0:
+                self._check_workers()
+                last_check = time.time()
+
+    def _handle_message(self, kind: str, worker_id: int, payload):
+        if kind == "ready":
+            with self._lock:
+                self._ready += 1
+                self._worker_states[worker_id] = "ready"
+                self.sample_rate = int(payload)
+            self._ready_event.set()
+            print(f"✓ 合成子行程 {worker_id} 就緒")
+            return
+        if kind == "failed":
+            with self._lock:
+                orphaned = self._mark_failed(worker_id, payload)
+            print(f"✗ 合成子行程 {worker_id} 初始化失敗: {payload}")
+            self._after_failure(orphaned, f"合成子行程 {worker_id} 初始化失敗: {payload}")
+            return
+
+        job_id, ok, result, service_time, batch_size = payload
+        with self._lock:
+            future = self._futures.pop(job_id, None)
+            submitted_at = self._submitted_at.pop(job_id, None)
+            self._release(job_id)
+            self._service_times.append(service_time)
+            self._batch_sizes.append(batch_size)
+            if submitted_at is not None:
+                self._latencies.append(time.time() - submitted_at)
+            if ok:
+                self._completed += 1
+            else:
+                self._errors += 1
+        if future is None:
+            return
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(SynthesisWorkerError(result))
+
+    def _orphan_jobs(self, worker_id: int) -> List[Future]:
+        """取出派給指定子行程、尚未完成的請求（需持有 _lock）"""
+        job_ids = [job_id for job_id, owner in self._owners.items() if owner == worker_id]
+        orphaned = []
+        for job_id in job_ids:
+            self._release(job_id)
+            self._submitted_at.pop(job_id, None)
+            future = self._futures.pop(job_id, None)
+            if future is not None:
+                orphaned.append(future)
+        return orphaned
+
+    def _mark_failed(self, worker_id: int, message: str) -> List[Future]:
+        """將子行程標為初始化失敗（重複回報只算一次），回傳派給它的請求（需持有 _lock）"""
+        if self._worker_states[worker_id] == "failed":
+            return []
+        self._worker_states[worker_id] = "failed"
+        self._failed.append(message)
+        return self._orphan_jobs(worker_id)
+
+    def _after_failure(self, orphaned: List[Future], message: str):
+        for future in orphaned:
+            if not future.done():
+                future.set_exception(SynthesisWorkerError(message))
+        with self._lock:
+            all_failed = all(state == "failed" for state in self._worker_states)
+        if all_failed:
+            self._ready_event.set()
+            self._fail_pending(f"所有合成子行程初始化失敗: {self._failed[-1]}")
+
+    def _check_workers(self):
+        """
+        子行程異常結束（OOM、torch 崩潰）時：派給它的請求立即失敗；
+        已就緒過的子行程重新啟動一個補上，初始化階段就結束的視為初始化失敗
+        """
+        if self._closed or not self._workers:
+            return
+        for worker_id in range(len(self._workers)):
+            with self._lock:
+                if self._closed:
+                    return
+                proc = self._workers[worker_id]
+                state = self._worker_states[worker_id]
+                if proc.is_alive() or state == "failed":
+                    continue
+                if state == "ready":
+                    self._ready -= 1
+                    orphaned = self._orphan_jobs(worker_id)
+                    self._restarts += 1
+                    self._spawn_worker(worker_id)
+                else:
+                    orphaned = self._mark_failed(worker_id, f"子行程初始化時異常結束 (exit code {proc.exitcode})")
+            message = f"合成子行程 {worker_id} 異常結束 (exit code {proc.exitcode})"
+            if state == "ready":
+                print(f"⚠ {message}，已重新啟動；{len(orphaned)} 件請求失敗")
+                for future in orphaned:
+                    if not future.done():
+                        future.set_exception(SynthesisWorkerError(message))
+            else:
+                print(f"✗ {message}")
+                self._after_failure(orphaned, message)
+
+    def _fail_pending(self, message: str):
+        with self._lock:
+            pending = list(self._futures.values())
+            self._futures.clear()
+            self._submitted_at.clear()
+            self._owners.clear()
+            self._assigned = [0] * len(self._assigned)
+        for future in pending:
+            if not future.done():
+                future.set_exception(SynthesisWorkerError(message))
+
+    @staticmethod
+    def _summary(values) -> Dict[str, float]:
+        if not values:
+            return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+        ordered = sorted(values)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 4),
+            "p50": round(ordered[len(ordered) // 2], 4),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        }
+
+    def metrics(self) -> Dict:
+        """佇列深度與服務時間統計"""
+        with self._lock:
+            in_flight = len(self._futures)
+            try:
+                queue_depth = sum(task_queue.qsize() for task_queue in self._task_queues)
+            except NotImplementedError:
+                # macOS 不支援 qsize，以未完成件數代替
+                queue_depth = in_flight
+            return {
+                "workers": self.num_workers,
+                "workers_ready": self._ready,
+                "workers_alive": sum(1 for proc in self._workers if proc.is_alive()),
+                "worker_restarts": self._restarts,
+                "max_queue": self.max_queue,
+                "queue_depth": queue_depth,
+                "in_flight": in_flight,
+                "completed": self._completed,
+                "errors": self._errors,
+                "rejected": self._rejected,
+                "service_time": self._summary(self._service_times),
+                "latency": self._summary(self._latencies),
+                "avg_batch_size": round(sum(self._batch_sizes) / len(self._batch_sizes), 2) if self._batch_sizes else 0.0,
+            }
@@ -200,6 +200,38 @@ class Encoder(nn.Module):
 
         return outputs
 
+    def inference_batch(self, x, input_lengths):
+        """ Batched encoder inference over padded inputs
+        PARAMS
+        ------
+        x: embedded inputs (B, embedding_dim, T_in), padded
+        input_lengths: valid length of each item (B,), any order
+
+        RETURNS
+        -------
+        outputs: encoder outputs (B, T_in, embedding_dim), zero past each length
+        """
+        # zero padded steps before every conv so each item sees the same
+        # zero padding as when it is run on its own
+        pad_mask = get_mask_from_lengths(input_lengths).unsqueeze(1)
+        for conv in self.convolutions:
+            x = x.masked_fill(~pad_mask, 0.0)
+            x = F.dropout(F.relu(conv(x)), 0.5, self.training)
+
+        x = x.transpose(1, 2)
+
+        x = nn.utils.rnn.pack_padded_sequence(
+            x, input_lengths.cpu().numpy(), batch_first=True,
+            enforce_sorted=False)
+
+        self.lstm.flatten_parameters()
+        outputs, _ = self.lstm(x)
+
+        outputs, _ = nn.utils.rnn.pad_packed_sequence(
+            outputs, batch_first=True)
+
+        return outputs
+
 
 class Decoder(nn.Module):
     def __init__(self, hparams):
@@ -453,6 +485,60 @@ class Decoder(nn.Module):
 
         return mel_outputs, gate_outputs, alignments
 
+    def inference_batch(self, memory, memory_lengths):
+        """ Batched decoder inference with a per-item stop gate
+        PARAMS
+        ------
+        memory: Encoder outputs (B, T_in, embedding_dim), padded
+        memory_lengths: Encoder output lengths for attention masking
+
+        RETURNS
+        -------
+        mel_outputs: padded mel outputs from the decoder
+        gate_outputs: gate outputs from the decoder
+        alignments: sequence of attention weights from the decoder
+        mel_lengths: number of mel frames produced by each item
+        """
+        B = memory.size(0)
+        decoder_input = self.get_go_frame(memory)
+
+        self.initialize_decoder_states(
+            memory, mask=~get_mask_from_lengths(memory_lengths))
+
+        mel_lengths = torch.zeros(B, dtype=torch.long, device=memory.device)
+        finished = torch.zeros(B, dtype=torch.bool, device=memory.device)
+
+        mel_outputs, gate_outputs, alignments = [], [], []
+        while True:
+            decoder_input = self.prenet(decoder_input)
+            mel_output, gate_output, alignment = self.decode(decoder_input)
+
+            mel_outputs += [mel_output.squeeze(1)]
+            gate_outputs += [gate_output]
+            alignments += [alignment]
+
+            # items that stop at this step keep their length; later steps
+            # are still computed for them but dropped by mel_lengths
+            stopped = torch.sigmoid(gate_output.data).view(B) > self.gate_threshold
+            newly_stopped = stopped & ~finished
+            mel_lengths[newly_stopped] = len(mel_outputs)
+            finished |= stopped
+
+            if bool(finished.all()):
+                break
+            elif len(mel_outputs) == self.max_decoder_steps:
+                print("Warning! Reached max decoder steps")
+                mel_lengths[~finished] = len(mel_outputs)
+                break
+
+            decoder_input = mel_output
+
+        mel_outputs, gate_outputs, alignments = self.parse_decoder_outputs(
+            mel_outputs, gate_outputs, alignments)
+
+        return mel_outputs, gate_outputs, alignments, \
+            mel_lengths * self.n_frames_per_step
+
 
 class Tacotron2(nn.Module):
     def __init__(self, hparams):
@@ -527,3 +613,35 @@ class Tacotron2(nn.Module):
             [mel_outputs, mel_outputs_postnet, gate_outputs, alignments])
 
         return outputs
+
+    def inference_batch(self, inputs, input_lengths):
+        """ Batched inference over several padded text sequences
+        PARAMS
+        ------
+        inputs: padded symbol ids (B, T_in)
+        input_lengths: valid length of each sequence (B,)
+
+        RETURNS
+        -------
+        list of (mel_outputs, mel_outputs_postnet, gate_outputs, alignments)
+        per item, each un-padded and shaped like the output of inference()
+        """
+        embedded_inputs = self.embedding(inputs).transpose(1, 2)
+        encoder_outputs = self.encoder.inference_batch(
+            embedded_inputs, input_lengths)
+        mel_outputs, gate_outputs, alignments, mel_lengths = \
+            self.decoder.inference_batch(encoder_outputs, input_lengths)
+
+        results = []
+        for i in range(inputs.size(0)):
+            n_frames = int(mel_lengths[i])
+            n_steps = n_frames // self.n_frames_per_step
+            mel = mel_outputs[i:i + 1, :, :n_frames]
+            # postnet runs per item so its convolutions never see padding
+            mel_postnet = mel + self.postnet(mel)
+            results.append((
+                mel, mel_postnet,
+                gate_outputs[i:i + 1, :n_steps],
+                alignments[i:i + 1, :n_steps, :int(input_lengths[i])]))
+
+        return results
@@ -72,7 +72,7 @@ class Invertible1x1Conv(torch.nn.Module):
                                     bias=False)
 
         # Sample a random orthonormal matrix to initialize weights
-        W = torch.qr(torch.FloatTensor(c, c).normal_())[0]
+        W = torch.linalg.qr(torch.FloatTensor(c, c).normal_())[0]
 
         # Ensure determinant is 1.0 not -1.0
         if torch.det(W) < 0:
@@ -291,6 +291,55 @@ class WaveGlow(torch.nn.Module):
         audio = audio.permute(0,2,1).contiguous().view(audio.size(0), -1).data
         return audio
 
+    def infer_batch(self, spects, sigma=1.0, max_batch=8, bucket_ratio=1.25,
+                    min_frames=4, postprocess=None):
+        """
+        Vocode many mels with one infer() per length bucket.
+
+        spects: list of mels, each (n_mel_channels, frames) or (1, n_mel_channels, frames)
+        max_batch: largest bucket size
+        bucket_ratio: a bucket's longest mel is at most this many times its shortest
+        min_frames: every mel is vocoded with at least this many frames
+        postprocess: optional callable applied to each bucket's padded audio
+            (batch x time) before trimming, e.g. the denoiser
+        returns: list of 1-D audio tensors, item i trimmed to frames_i * hop_length
+        """
+        hop_length = self.upsample.stride[0]
+        spects = [s[0] if s.dim() == 3 else s for s in spects]
+        frames = [int(s.size(-1)) for s in spects]
+        order = sorted(range(len(spects)), key=lambda i: frames[i])
+
+        # group by length so padding stays within bucket_ratio
+        buckets = []
+        for i in order:
+            if (buckets and len(buckets[-1]) < max_batch and
+                    max(frames[i], min_frames) <= bucket_ratio * max(frames[buckets[-1][0]], min_frames)):
+                buckets[-1].append(i)
+            else:
+                buckets.append([i])
+
+        audios = [None] * len(spects)
+        for bucket in buckets:
+            target = max(min_frames, max(frames[i] for i in bucket))
+            # pad to a multiple of n_group by repeating each mel's last frame
+            rem = target % self.n_group
+            if rem != 0:
+                target += self.n_group - rem
+            padded = []
+            for i in bucket:
+                spect = spects[i]
+                if spect.size(-1) < target:
+                    last = spect[:, -1:].repeat(1, target - spect.size(-1))
+                    spect = torch.cat([spect, last], dim=-1)
+                padded.append(spect)
+
+            audio = self.infer(torch.stack(padded), sigma=sigma)
+            if postprocess is not None:
+                audio = postprocess(audio)
+            for row, i in enumerate(bucket):
+                audios[i] = audio[row, :frames[i] * hop_length]
+        return audios
+
     @staticmethod
     def remove_weightnorm(model):
         waveglow = model
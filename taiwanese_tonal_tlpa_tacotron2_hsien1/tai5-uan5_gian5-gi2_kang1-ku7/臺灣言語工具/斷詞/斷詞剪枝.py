@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from heapq import nlargest
+from 臺灣言語工具.解析整理.參數錯誤 import 參數錯誤
+
+
+class 斷詞剪枝:
+    '''
+    辭典語言模型斷詞逐个所在的狀態剪枝（beam search）佮統計
+
+    束寬：逐个所在上濟保留幾个狀態，None就無限制
+    分數差：分數比仝所在上好的狀態低超過遮濟（log10）就剪掉，None就無限制
+    兩个攏是None就佮無剪枝仝款，猶原會算統計，會使提來比較剪枝了準確度差偌濟
+
+    一个物件的統計會一直累積，愛分開算就用新的物件
+    '''
+
+    def __init__(self, 束寬=None, 分數差=None):
+        if 束寬 is not None and 束寬 <= 0:
+            raise 參數錯誤('束寬愛是正整數，傳入來的是{0}'.format(束寬))
+        if 分數差 is not None and 分數差 < 0:
+            raise 參數錯誤('分數差袂使是負的，傳入來的是{0}'.format(分數差))
+        self.束寬 = 束寬
+        self.分數差 = 分數差
+        # 有提來試接落去的詞的狀態數
+        self.展開狀態數 = 0
+        # 剪掉的狀態數
+        self.剪掉狀態數 = 0
+        # 語言模型評分的次數（狀態×候選詞）
+        self.評分次數 = 0
+
+    def 有剪無(self):
+        return self.束寬 is not None or self.分數差 is not None
+
+    def 剪(self, 狀態表, 分組=None):
+        '''
+        狀態表={狀態:(分數, 頂一个分析, 詞物件)}，直接改狀態表，嘛轉傳伊
+        分組：狀態→組別，分數干焦佇仝組內底比，None就全部做一組
+        '''
+        if not self.有剪無() or len(狀態表) <= 1:
+            return 狀態表
+        組表 = {}
+        for 狀態, 分析 in 狀態表.items():
+            組別 = None if 分組 is None else 分組(狀態)
+            組表.setdefault(組別, []).append((狀態, 分析))
+        保留 = []
+        for 這組 in 組表.values():
+            保留.extend(self._剪一組(這組))
+        剪掉 = len(狀態表) - len(保留)
+        if 剪掉 > 0:
+            狀態表.clear()
+            狀態表.update(保留)
+            self.剪掉狀態數 += 剪掉
+        return 狀態表
+
+    def _剪一組(self, 這組):
+        if self.分數差 is not None:
+            上好分數 = max(分析[0] for _狀態, 分析 in 這組)
+            這組 = [
+                (狀態, 分析) for 狀態, 分析 in 這組
+                if 分析[0] >= 上好分數 - self.分數差
+            ]
+        if self.束寬 is not None and len(這組) > self.束寬:
+            這組 = nlargest(self.束寬, 這組, key=lambda 項: 項[1][0])
+        return 這組
+
+    def 統計(self):
+        return {
+            '束寬': self.束寬,
+            '分數差': self.分數差,
+            '展開狀態數': self.展開狀態數,
+            '剪掉狀態數': self.剪掉狀態數,
+            '評分次數': self.評分次數,
+        }
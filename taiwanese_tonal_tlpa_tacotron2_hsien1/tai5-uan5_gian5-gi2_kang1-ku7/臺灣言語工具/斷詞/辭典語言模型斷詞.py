@@ -13,15 +13,16 @@ from 臺灣言語工具.解析整理.拆文分析器 import 拆文分析器
 class 辭典語言模型斷詞:
 
     @classmethod
-    def 斷詞(cls, 辭典, 語言模型, 物件):
+    def 斷詞(cls, 辭典, 語言模型, 物件, 剪枝=None):
         # 字詞組集句=>句
         # 章=>章
-        return cls.斷詞分析(辭典, 語言模型, 物件)[0]
+        # 剪枝：斷詞剪枝物件，逐个所在限制保留的狀態數，None就全部保留
+        return cls.斷詞分析(辭典, 語言模型, 物件, 剪枝)[0]
 
     @classmethod
-    def 斷詞分析(cls, 辭典, 語言模型, 物件):
+    def 斷詞分析(cls, 辭典, 語言模型, 物件, 剪枝=None):
         if isinstance(物件, 章):
-            return cls._章斷詞(辭典, 語言模型, 物件)
+            return cls._章斷詞(辭典, 語言模型, 物件, 剪枝)
         if isinstance(物件, 字):
             詞物件 = 拆文分析器.建立詞物件('')
             詞物件.內底字.append(物件)
@@ -39,11 +40,11 @@ class 辭典語言模型斷詞:
             句物件.內底集.append(物件)
             物件 = 句物件
         if isinstance(物件, 句):
-            return cls._句斷詞(辭典, 語言模型, 物件)
+            return cls._句斷詞(辭典, 語言模型, 物件, 剪枝)
         cls._掠漏.毋是字詞組集句章的毋著(物件)
 
     @classmethod
-    def _字陣列斷詞(cls, 辭典, 語言模型, 頂一个狀態, 頂一个分析, 這馬字陣列):
+    def _字陣列斷詞(cls, 辭典, 語言模型, 頂一个狀態, 頂一个分析, 這馬字陣列, 剪枝=None):
         if hasattr(辭典, '空'):
             這馬字陣列 = cls._字陣列改數字(辭典, 這馬字陣列)
         頂一个上尾的詞, 頂一个上尾賰的字 = 頂一个狀態
@@ -57,9 +58,13 @@ class 辭典語言模型斷詞:
             結果表.append({})
         for 所在 in range(len(字陣列) + 1):
             if len(結果表[所在]) == 0:
-                cls._對前一个結果加一字產生這馬的結果(語言模型, 字陣列, 結果表, 所在)
+                cls._對前一个結果加一字產生這馬的結果(語言模型, 字陣列, 結果表, 所在, 剪枝)
+            if 剪枝 is not None:
+                # 這个所在的狀態攏算好矣，提去接後壁的詞進前先剪
+                剪枝.剪(結果表[所在])
+                剪枝.展開狀態數 += len(結果表[所在])
             if 所在 < len(字陣列):
-                cls._共詞提入來揣上好結果(語言模型, 斷詞結果, 結果表, 所在)
+                cls._共詞提入來揣上好結果(語言模型, 斷詞結果, 結果表, 所在, 剪枝)
         結果 = {}
         for 所在 in range(min(辭典.上濟字數(), len(結果表))):
             if 所在 == 0:
@@ -71,9 +76,11 @@ class 辭典語言模型斷詞:
         return 結果
 
     @classmethod
-    def _對前一个結果加一字產生這馬的結果(cls, 語言模型, 字陣列, 結果表, 所在):
+    def _對前一个結果加一字產生這馬的結果(cls, 語言模型, 字陣列, 結果表, 所在, 剪枝=None):
         詞物件 = 詞([字陣列[所在 - 1]])
         詞物件.屬性 = {'無佇辭典': True}
+        if 剪枝 is not None:
+            剪枝.評分次數 += len(結果表[所在 - 1])
         for 上尾的詞, 分析 in 結果表[所在 - 1].items():
             分數, _頂一个狀態, _頂一个詞 = 分析
             合做伙上尾詞 = (上尾的詞 + (詞物件,))
@@ -84,54 +91,62 @@ class 辭典語言模型斷詞:
                 這馬上尾詞 = 合做伙上尾詞
 
             結果表[所在][這馬上尾詞] = (
-                分數 + sum(
-                    語言模型.評詞陣列分(合做伙上尾詞, 開始的所在=len(上尾的詞))
-                ),
+                分數 + 語言模型.評狀態分(語言模型.狀態(上尾的詞), 詞物件),
                 分析,
                 詞物件
             )
 
     @classmethod
-    def _共詞提入來揣上好結果(cls, 語言模型, 斷詞結果, 結果表, 所在):
+    def _共詞提入來揣上好結果(cls, 語言模型, 斷詞結果, 結果表, 所在, 剪枝=None):
+        # 逐个狀態的評分狀態先算一擺，後壁逐个候選詞攏直接提來查分數
+        這馬狀態 = [
+            (上尾的詞, 分析, 語言模型.狀態(上尾的詞))
+            for 上尾的詞, 分析 in 結果表[所在].items()
+        ]
+        上濟詞數 = 語言模型.上濟詞數()
         for 斷詞集 in 斷詞結果[所在]:
             for 斷詞的候選詞 in 斷詞集:
                 斷詞長度 = len(斷詞的候選詞.內底字)
-                for 上尾的詞, 分析 in 結果表[所在].items():
-                    分數, _頂一个狀態, _頂一个詞 = 分析
+                if 剪枝 is not None:
+                    剪枝.評分次數 += len(這馬狀態)
+                後壁結果 = 結果表[所在 + 斷詞長度]
+                評分 = 語言模型.詞評分器(斷詞的候選詞)
+                for 上尾的詞, 分析, 評分狀態 in 這馬狀態:
+                    這馬分數 = 分析[0] + 評分(評分狀態)
                     合做伙上尾詞 = (上尾的詞 + (斷詞的候選詞,))
-                    這馬分數 = 分數 + sum(
-                        語言模型.評詞陣列分(合做伙上尾詞, 開始的所在=len(上尾的詞))
-                    )
 
-                    if len(合做伙上尾詞) >= 語言模型.上濟詞數():
-                        這馬上尾詞 = 合做伙上尾詞[-語言模型.上濟詞數():][1:]
+                    if len(合做伙上尾詞) >= 上濟詞數:
+                        這馬上尾詞 = 合做伙上尾詞[-上濟詞數:][1:]
                     else:
                         這馬上尾詞 = 合做伙上尾詞
 
-                    if (這馬上尾詞 not in 結果表[所在 + 斷詞長度] or
-                            這馬分數 > 結果表[所在 + 斷詞長度][這馬上尾詞][0]):
-                        結果表[所在 + 斷詞長度][這馬上尾詞] = (
+                    舊結果 = 後壁結果.get(這馬上尾詞)
+                    if 舊結果 is None or 這馬分數 > 舊結果[0]:
+                        後壁結果[這馬上尾詞] = (
                             這馬分數, 分析, 斷詞的候選詞
                         )
 
     @classmethod
-    def _集斷詞(cls, 辭典, 語言模型, 集物件, 頂一層結果):
+    def _集斷詞(cls, 辭典, 語言模型, 集物件, 頂一層結果, 剪枝=None):
         集物件結果 = {}
         for 狀態, 分析 in 頂一層結果.items():
             if len(集物件.內底組) == 0:
                 raise RuntimeError('無應該有空的集！！可能是辭典設計有問題！！請回報！！')
             for 組物件 in 集物件.內底組:
                 字陣列 = 組物件.篩出字物件()
-                結果 = cls._字陣列斷詞(辭典, 語言模型, 狀態, 分析, tuple(字陣列))
+                結果 = cls._字陣列斷詞(辭典, 語言模型, 狀態, 分析, tuple(字陣列), 剪枝)
                 for 這个狀態, 這个分析 in 結果.items():
                     這个分數, _這个頂一个狀態, _這个詞 = 這个分析
                     if (這个狀態 not in 集物件結果 or
                             這个分數 > 集物件結果[這个狀態][0]):
                         集物件結果[這个狀態] = 這个分析
+        if 剪枝 is not None:
+            # 賰的字數無仝，算分的字數就無仝，分開比
+            剪枝.剪(集物件結果, lambda 狀態: len(狀態[1]))
         return 集物件結果
 
     @classmethod
-    def _句斷詞(cls, 辭典, 語言模型, 句物件):
+    def _句斷詞(cls, 辭典, 語言模型, 句物件, 剪枝=None):
         # 結果={狀態:分析}
         #  狀態 = 頂一層上尾的詞, 頂一層上尾賰的字
         #  分析 = 分數, 頂一个狀態, 這个詞物件
@@ -140,11 +155,11 @@ class 辭典語言模型斷詞:
             (0, None, None)
         }
         for 集物件 in 句物件.內底集:
-            頂一層結果 = cls._集斷詞(辭典, 語言模型, 集物件, 頂一層結果)
+            頂一層結果 = cls._集斷詞(辭典, 語言模型, 集物件, 頂一層結果, 剪枝)
         return cls._結果揣上好(語言模型, 頂一層結果)
 
     @classmethod
-    def _章斷詞(cls, 辭典, 語言模型, 章物件):
+    def _章斷詞(cls, 辭典, 語言模型, 章物件, 剪枝=None):
         if not isinstance(章物件, 章):
             raise 型態錯誤('傳入來的毋是章物件：{0}'.format(str(章物件)))
         標好章 = 章()
@@ -152,7 +167,7 @@ class 辭典語言模型斷詞:
         總分 = 0
         總詞數 = 0
         for 一句 in 章物件.內底句:
-            斷好句物件, 分數, 詞數 = cls._句斷詞(辭典, 語言模型, 一句)
+            斷好句物件, 分數, 詞數 = cls._句斷詞(辭典, 語言模型, 一句, 剪枝)
             用好句.append(斷好句物件)
             總分 += 分數
             總詞數 += 詞數
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
 from 臺灣言語工具.基本物件.章 import 章
 from 臺灣言語工具.解析整理.參數錯誤 import 參數錯誤
 from math import log10
@@ -15,26 +16,114 @@ from 臺灣言語工具.語言模型.語言模型 import 語言模型
 
 
 class 實際語言模型(語言模型):
+    '''
+    評分免逐擺算數量：第一擺評分的時陣共看過的詞編號，條件機率的對數先算好囥佇表內底，
+    狀態是詞編號的tuple，評一个詞干焦查一擺表。評詞陣列分閣有LRU快取(歷史, 詞)的分數。
+    看新的物件了後表佮快取會清掉，後一擺評分才閣算。
+    '''
 
-    def __init__(self, 上濟詞數):
+    def __init__(self, 上濟詞數, 快取上限=100000):
         if 上濟詞數 <= 0:
             raise 參數錯誤('詞數愛是正整數，傳入來的是{0}'.format(上濟詞數))
         self._上濟詞數 = 上濟詞數
         self.總數表 = [0] * self.上濟詞數()
         self.語言模型表 = {}
+        self.快取上限 = 快取上限
+        self._清評分表()
 
     def 上濟詞數(self):
         return self._上濟詞數
 
     def 評詞陣列分(self, 詞陣列, 開始的所在=0):
         for 所在 in range(開始的所在, len(詞陣列)):
-            分數 = self.條件(詞陣列[max(0, 所在 + 1 - self.上濟詞數()):所在 + 1])[-1]
+            組合 = 詞陣列[max(0, 所在 + 1 - self.上濟詞數()):所在 + 1]
+            if 組合 == [self.開始()]:
+                分數 = self.對數(1.0)
+            else:
+                分數 = self.評詞分(tuple(組合[:-1]), 組合[-1])
             try:
                 分數 += 詞陣列[所在].屬性['機率']
             except (AttributeError, KeyError):
                 pass
             yield 分數
 
+    def 評詞分(self, 歷史, 詞物件):
+        '''詞物件接佇歷史（詞的tuple）後壁的條件機率對數，佮條件(歷史+(詞物件,))[-1]仝款'''
+        鍵 = (歷史, 詞物件)
+        快取 = self._分數快取
+        try:
+            分數 = 快取[鍵]
+        except KeyError:
+            分數 = self._查對數機率(self.狀態(歷史), 詞物件)
+            快取[鍵] = 分數
+            if len(快取) > self.快取上限:
+                快取.popitem(last=False)
+        else:
+            快取.move_to_end(鍵)
+        return 分數
+
+    def 狀態(self, 詞陣列):
+        '''詞陣列上尾（上濟詞數-1）个詞的編號；無看過的詞佮None攏是-1'''
+        詞編號表 = self._詞編號()
+        詞陣列 = tuple(詞陣列)
+        return tuple(
+            詞編號表.get(詞物件, -1)
+            for 詞物件 in 詞陣列[max(0, len(詞陣列) - self.上濟詞數() + 1):]
+        )
+
+    def 評狀態分(self, 狀態, 詞物件):
+        '''狀態愛是狀態()的結果；一擺查表，毋免閣算詞的hash佮數量'''
+        分數 = self._查對數機率(狀態, 詞物件)
+        try:
+            分數 += 詞物件.屬性['機率']
+        except (AttributeError, KeyError):
+            pass
+        return 分數
+
+    def 詞評分器(self, 詞物件):
+        '''詞的編號佮機率屬性先查好，逐个狀態評分干焦查一擺表'''
+        對數機率表 = self._對數機率()
+        無看過 = self.無看過
+        編號 = (self._詞編號表.get(詞物件, -1),)
+        try:
+            機率 = 詞物件.屬性['機率']
+        except (AttributeError, KeyError):
+            機率 = 0
+        return lambda 狀態: 對數機率表.get(狀態 + 編號, 無看過) + 機率
+
+    def _查對數機率(self, 狀態, 詞物件):
+        對數機率表 = self._對數機率()
+        return 對數機率表.get(狀態 + (self._詞編號表.get(詞物件, -1),), self.無看過)
+
+    def _清評分表(self):
+        self._詞編號表 = None
+        self._對數機率表 = None
+        self._分數快取 = OrderedDict()
+
+    def _詞編號(self):
+        if self._詞編號表 is None:
+            詞編號表 = {}
+            for 組合 in self.語言模型表:
+                for 詞物件 in 組合:
+                    if 詞物件 not in 詞編號表:
+                        詞編號表[詞物件] = len(詞編號表)
+            self._詞編號表 = 詞編號表
+        return self._詞編號表
+
+    def _對數機率(self):
+        '''(詞編號, ...) → 條件機率對數；無佇表內底的就是無看過'''
+        if self._對數機率表 is None:
+            詞編號表 = self._詞編號()
+            對數機率表 = {}
+            for 組合, 數 in self.語言模型表.items():
+                if len(組合) == 1:
+                    前 = self.總數表[0]
+                else:
+                    前 = self.語言模型表[組合[:-1]]
+                對數機率表[tuple(詞編號表[詞物件] for 詞物件 in 組合)] = self.對數(數 / 前)
+            self._對數機率表 = 對數機率表
+        return self._對數機率表
+
     def 總數(self):
         return self.總數表
 
@@ -79,6 +168,7 @@ class 實際語言模型(語言模型):
         if isinstance(物件, 章):
             self.看章物件(物件)
             return
+        self._清評分表()
         詞陣列 = [self.開始()] + 物件.網出詞物件() + [self.結束()]
         for 長度 in range(1, self.上濟詞數() + 1):
             for 所在 in range(len(詞陣列) - 長度 + 1):
@@ -33,6 +33,19 @@ class 語言模型(metaclass=ABCMeta):
         詞陣列 = [self.開始()] + 物件.網出詞物件() + [self.結束()]
         return self.評詞陣列分(詞陣列, 開始的所在=1)
 
+    def 狀態(self, 詞陣列):
+        '''評分用的歷史狀態：詞陣列上尾（上濟詞數-1）个詞，同一个狀態會使重複提來評無仝的詞'''
+        詞陣列 = tuple(詞陣列)
+        return 詞陣列[max(0, len(詞陣列) - self.上濟詞數() + 1):]
+
+    def 評狀態分(self, 狀態, 詞物件):
+        '''詞物件接佇狀態後壁的分數，佮評詞陣列分(狀態+(詞物件,), 開始的所在=len(狀態))仝款'''
+        return sum(self.評詞陣列分(tuple(狀態) + (詞物件,), 開始的所在=len(狀態)))
+
+    def 詞評分器(self, 詞物件):
+        '''轉傳 狀態→評狀態分(狀態, 詞物件) 的函式，仝一个詞愛評足濟狀態的時陣用'''
+        return lambda 狀態: self.評狀態分(狀態, 詞物件)
+
     def perplexity(self, 物件):
         long_tsong = 0.0
         for kui_e, hun_soo in enumerate(self.評分(物件)):
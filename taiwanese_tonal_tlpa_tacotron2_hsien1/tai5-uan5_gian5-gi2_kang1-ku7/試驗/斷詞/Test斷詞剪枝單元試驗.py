@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from unittest.case import TestCase
+
+
+from 臺灣言語工具.斷詞.斷詞剪枝 import 斷詞剪枝
+from 臺灣言語工具.解析整理.參數錯誤 import 參數錯誤
+
+
+class 斷詞剪枝單元試驗(TestCase):
+
+    def setUp(self):
+        self.狀態表 = {
+            '甲': (-1.0, None, None),
+            '乙': (-2.0, None, None),
+            '丙': (-30.0, None, None),
+            '丁': (-5.0, None, None),
+        }
+
+    def test_無限制就無剪(self):
+        剪枝 = 斷詞剪枝()
+        self.assertFalse(剪枝.有剪無())
+        剪枝.剪(self.狀態表)
+        self.assertEqual(len(self.狀態表), 4)
+        self.assertEqual(剪枝.剪掉狀態數, 0)
+
+    def test_束寬(self):
+        剪枝 = 斷詞剪枝(束寬=2)
+        剪了 = 剪枝.剪(self.狀態表)
+        self.assertIs(剪了, self.狀態表)
+        self.assertEqual(set(self.狀態表), {'甲', '乙'})
+        self.assertEqual(剪枝.剪掉狀態數, 2)
+
+    def test_分數差(self):
+        剪枝 = 斷詞剪枝(分數差=10)
+        剪枝.剪(self.狀態表)
+        self.assertEqual(set(self.狀態表), {'甲', '乙', '丁'})
+        self.assertEqual(剪枝.剪掉狀態數, 1)
+
+    def test_束寬佮分數差(self):
+        剪枝 = 斷詞剪枝(束寬=2, 分數差=3)
+        剪枝.剪(self.狀態表)
+        self.assertEqual(set(self.狀態表), {'甲', '乙'})
+
+    def test_分組比(self):
+        剪枝 = 斷詞剪枝(束寬=1)
+        剪枝.剪(self.狀態表, lambda 狀態: 狀態 in ('甲', '丙'))
+        self.assertEqual(set(self.狀態表), {'甲', '乙'})
+
+    def test_統計會累積(self):
+        剪枝 = 斷詞剪枝(束寬=3)
+        剪枝.剪(self.狀態表)
+        剪枝.剪({'戊': (0, None, None), '己': (-1, None, None), '庚': (-2, None, None), '辛': (-3, None, None)})
+        self.assertEqual(剪枝.統計()['剪掉狀態數'], 2)
+
+    def test_參數毋著(self):
+        with self.assertRaises(參數錯誤):
+            斷詞剪枝(束寬=0)
+        with self.assertRaises(參數錯誤):
+            斷詞剪枝(分數差=-1)
@@ -10,6 +10,7 @@ from 臺灣言語工具.基本物件.集 import 集
 from 臺灣言語工具.基本物件.句 import 句
 from 臺灣言語工具.基本物件.章 import 章
 from 臺灣言語工具.斷詞.辭典語言模型斷詞 import 辭典語言模型斷詞
+from 臺灣言語工具.斷詞.斷詞剪枝 import 斷詞剪枝
 from 臺灣言語工具.語言模型.實際語言模型 import 實際語言模型
 from 臺灣言語工具.語言模型.語言模型 import 語言模型
 
@@ -257,6 +258,53 @@ class 辭典語言模型斷詞單元試驗(TestCase):
         辭典.加詞(拆文分析器.對齊詞物件('有', 'iu2'))
         辭典語言模型斷詞.斷詞分析(辭典, 語言模型, self.型句)
 
+    def test_剪枝無限制佮原本仝款(self):
+        self.語言模型 = 實際語言模型(3)
+        self.加我有一張椅仔的資料()
+        self.字典.加詞(self.白我對齊詞)
+        self.字典.加詞(self.文我對齊詞)
+        self.字典.加詞(self.有對齊詞)
+        self.字典.加詞(self.一張對齊詞)
+        self.字典.加詞(self.椅仔對齊詞)
+        self.字典.加詞(self.驚對齊詞)
+        self.語言模型.看(self.白我有對齊組)
+        原本結果 = 辭典語言模型斷詞.斷詞分析(self.字典, self.語言模型, self.型句)
+        剪枝 = 斷詞剪枝()
+        剪枝結果 = 辭典語言模型斷詞.斷詞分析(self.字典, self.語言模型, self.型句, 剪枝)
+        self.assertEqual(剪枝結果, 原本結果)
+        self.assertEqual(剪枝.剪掉狀態數, 0)
+        self.assertGreater(剪枝.展開狀態數, 0)
+        self.assertGreater(剪枝.評分次數, 0)
+
+    def test_剪枝會減少展開的狀態(self):
+        self.語言模型 = 實際語言模型(3)
+        self.加我有一張椅仔的資料()
+        self.字典.加詞(self.白我對齊詞)
+        self.字典.加詞(self.文我對齊詞)
+        self.字典.加詞(self.有對齊詞)
+        self.字典.加詞(拆文分析器.對齊詞物件('有', 'iu2'))
+        self.字典.加詞(self.一張對齊詞)
+        self.字典.加詞(self.椅仔對齊詞)
+        self.字典.加詞(self.驚對齊詞)
+        self.語言模型.看(self.白我有對齊組)
+        無剪 = 斷詞剪枝()
+        原本結果 = 辭典語言模型斷詞.斷詞分析(self.字典, self.語言模型, self.型句, 無剪)
+        束寬一 = 斷詞剪枝(束寬=1)
+        剪枝結果 = 辭典語言模型斷詞.斷詞分析(self.字典, self.語言模型, self.型句, 束寬一)
+        self.assertEqual(剪枝結果, 原本結果)
+        self.assertGreater(束寬一.剪掉狀態數, 0)
+        self.assertLess(束寬一.展開狀態數, 無剪.展開狀態數)
+        self.assertLess(束寬一.評分次數, 無剪.評分次數)
+
+    def test_物件斷詞傳剪枝(self):
+        self.語言模型 = 實際語言模型(2)
+        self.加鞋仔的資料()
+        self.字典.加詞(self.鞋仔詞)
+        剪枝 = 斷詞剪枝(束寬=2, 分數差=50)
+        斷詞結果 = self.鞋仔一集句物件.斷詞(辭典語言模型斷詞, self.字典, self.語言模型, 剪枝=剪枝)
+        self.assertEqual(斷詞結果, self.孤詞鞋仔句)
+        self.assertGreater(剪枝.展開狀態數, 0)
+
     def 加我有一張椅仔的資料(self):
         self.白我對齊詞 = 拆文分析器.對齊詞物件('我', 'gua2')
         self.文我對齊詞 = 拆文分析器.對齊詞物件('我', 'ngoo2')
@@ -279,6 +279,63 @@ class 實際語言模型單元試驗(TestCase):
         self.assertLess(sum(self.語言模型.評分(self.柴)),
                         sum(self.語言模型.評分(self.桌仔垃圾)))
 
+    def test_評狀態分佮條件仝款(self):
+        語言模型 = self.型態(3)
+        語言模型.看(self.我請你物件)
+        語言模型.看(self.你請我物件)
+        詞陣列 = [語言模型.開始()] + self.我請你物件.內底詞 + [語言模型.結束()]
+        for 長度 in range(1, len(詞陣列)):
+            歷史 = 詞陣列[:長度]
+            for 詞物件 in 詞陣列[1:] + [self.今仔日物件]:
+                條件分 = 語言模型.條件(歷史[-2:] + [詞物件])[-1]
+                self.assertAlmostEqual(
+                    語言模型.評狀態分(語言模型.狀態(歷史), 詞物件), 條件分, delta=self.忍受
+                )
+                self.assertAlmostEqual(
+                    語言模型.詞評分器(詞物件)(語言模型.狀態(歷史)), 條件分, delta=self.忍受
+                )
+                self.assertAlmostEqual(
+                    sum(語言模型.評詞陣列分(歷史 + [詞物件], 開始的所在=長度)),
+                    條件分, delta=self.忍受
+                )
+
+    def test_評狀態分有算機率屬性(self):
+        語言模型 = self.型態(3)
+        語言模型.看(self.你物件)
+        詞物件 = 拆文分析器.對齊詞物件(self.你型, self.你音)
+        詞物件.屬性 = {'機率': -2.0}
+        狀態 = 語言模型.狀態([語言模型.開始()])
+        self.assertAlmostEqual(
+            語言模型.評狀態分(狀態, 詞物件), log10(1 / 1) - 2.0, delta=self.忍受
+        )
+        self.assertAlmostEqual(
+            語言模型.詞評分器(詞物件)(狀態), log10(1 / 1) - 2.0, delta=self.忍受
+        )
+
+    def test_看了評分愛更新(self):
+        語言模型 = self.型態(3)
+        語言模型.看(self.你物件)
+        詞陣列 = [語言模型.開始(), self.今仔日物件]
+        self.assertEqual(list(語言模型.評詞陣列分(詞陣列, 開始的所在=1)), [語言模型.無看過])
+        self.assertEqual(
+            語言模型.評狀態分(語言模型.狀態(詞陣列[:1]), self.今仔日物件), 語言模型.無看過
+        )
+        語言模型.看(self.今仔日物件)
+        self.assertEqual(
+            list(語言模型.評詞陣列分(詞陣列, 開始的所在=1)), [log10(1 / 2)]
+        )
+        self.assertEqual(
+            語言模型.評狀態分(語言模型.狀態(詞陣列[:1]), self.今仔日物件), log10(1 / 2)
+        )
+
+    def test_快取有上限(self):
+        語言模型 = self.型態(3, 快取上限=2)
+        語言模型.看(self.我請你物件)
+        for 詞物件 in self.我請你物件.內底詞:
+            語言模型.評詞分((語言模型.開始(),), 詞物件)
+        self.assertEqual(len(語言模型._分數快取), 2)
+        self.assertNotIn(((語言模型.開始(),), self.我請你物件.內底詞[0]), 語言模型._分數快取)
+
 # 	def test_評分(self):
 # 		語言模型 = self.型態(3)
 # 		語言模型.看(self.你物件)
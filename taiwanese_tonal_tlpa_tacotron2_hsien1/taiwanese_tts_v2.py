@@ -4,15 +4,18 @@ import os
 import re
 import sys
 import time
-import wave
-import tempfile
-import array
+import threading
 import unicodedata
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+
 # 臺灣言語工具路徑
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "tai5-uan5_gian5-gi2_kang1-ku7"))
 
+import audio_utils
+from synthesis_pool import SynthesisQueueFull
+
 class PunctuationHandler:
     """標點符號處理器"""
     
@@ -262,13 +265,11 @@ class TaiwaneseConverter:
         }
 
     def _init_taiwan_tools(self):
-        """初始化臺灣言語工具"""
+        """初始化臺灣言語工具（辭典本身在第一次轉換時才由共用服務載入）"""
         try:
-            from 臺灣言語工具.解析整理.拆文分析器 import 拆文分析器
-            from 臺灣言語工具.音標系統.閩南語.臺灣閩南語羅馬字拼音 import 臺灣閩南語羅馬字拼音
+            from tlpa_dictionary import get_dictionary_service
             
-            self.拆文分析器 = 拆文分析器
-            self.臺灣閩南語羅馬字拼音 = 臺灣閩南語羅馬字拼音
+            self._dictionary_service = get_dictionary_service
             self.use_taiwan_tools = True
             print("✓ 臺灣言語工具載入成功")
         except ImportError as e:
@@ -283,14 +284,9 @@ class TaiwaneseConverter:
             return self._basic_convert(text)
     
     def _advanced_convert(self, text: str) -> str:
-        """使用han2tts進行轉換"""
+        """以行程共用的台語辭典斷詞轉換，辭典查無讀音的詞退回基本字典"""
         try:
-            import han2tts
-            dictionary = han2tts.build_dictionary()
-            
-            result = han2tts.han_to_tlpa_number(text, dictionary)
-            return result
-            
+            return self._dictionary_service().han_to_tlpa(text, fallback=self._basic_convert)
         except Exception as e:
             print(f"進階轉換失敗，使用基本轉換: {e}")
             return self._basic_convert(text)
@@ -428,6 +424,19 @@ class TaiwaneseTextProcessor:
             self.chinese_converter = None
             self.converter_type = None
     
+    def reload_chinese_converter(self) -> bool:
+        """
+        重新讀取進階轉換器的 CSV 字典：新轉換器建好後才換上，轉換中的請求繼續用舊的
+        
+        Returns:
+            是否換上了新轉換器（基本轉換器或未啟用時不做事）
+        """
+        if self.converter_type != "advanced" or self.chinese_converter is None:
+            return False
+        from advanced_chinese_converter import AdvancedChineseToTaiwaneseConverter
+        self.chinese_converter = AdvancedChineseToTaiwaneseConverter(csv_path=self.chinese_converter.csv_path)
+        return True
+    
     def process_text(self, text: str, add_pauses: bool = True, convert_chinese: bool = True) -> str:
         """
         處理文字：華文字→台語漢字→台羅拼音並處理標點符號
@@ -492,8 +501,21 @@ class TaiwaneseTextProcessor:
 
 class TaiwaneseTextToSpeech:
     """台語文字轉語音系統"""
+
+    # 分段合成時每段首尾淡入淡出長度（段落快取存的是淡化後的 PCM，鍵需包含此值）
+    SEGMENT_FADE_MS = 10.0
     
-    def __init__(self, tacotron_model: str = None, waveglow_model: str = None, enable_chinese_conversion: bool = True):
+    def __init__(self, tacotron_model: str = None, waveglow_model: str = None, enable_chinese_conversion: bool = True,
+                 num_workers: int = 0, max_queue: int = 16, max_batch: int = 4, cache=None,
+                 segment_cache=None):
+        """
+        Args:
+            cache: SynthesisCache，整句合成結果依台羅與合成參數快取（None 表示不快取）
+            segment_cache: SynthesisCache，分段合成時快取每個子句淡入淡出後的 PCM
+            num_workers: >0 時改用常駐合成子行程池（每個子行程各自載入模型），0 為行程內單一合成器
+            max_queue: 子行程池未完成請求上限，超過即拋 SynthesisQueueFull
+            max_batch: 子行程一次最多合併處理的請求數
+        """
         self.text_processor = TaiwaneseTextProcessor(enable_chinese_conversion=enable_chinese_conversion)
         
         # 設定預設模型路徑
@@ -505,8 +527,16 @@ class TaiwaneseTextToSpeech:
         self.tacotron_model = tacotron_model
         self.waveglow_model = waveglow_model
         self.synthesizer = None
+        self.pool = None
+        self.cache = cache
+        self.segment_cache = segment_cache
+        # 行程內合成器非執行緒安全，多個請求執行緒需排隊使用
+        self._synth_lock = threading.Lock()
         
-        self._init_synthesizer()
+        if num_workers > 0:
+            self._init_pool(num_workers, max_queue, max_batch)
+        else:
+            self._init_synthesizer()
     
     def _init_synthesizer(self):
         """初始化語音合成器"""
@@ -516,6 +546,93 @@ class TaiwaneseTextToSpeech:
             print("✓ TTS合成器初始化成功")
         except Exception as e:
             print(f"⚠ TTS合成器初始化失敗: {e}")
+
+    def _init_pool(self, num_workers: int, max_queue: int, max_batch: int):
+        """初始化合成子行程池（子行程於首次合成時才啟動）"""
+        try:
+            from synthesis_pool import SynthesisPool
+            self.pool = SynthesisPool(self.tacotron_model, self.waveglow_model,
+                                      num_workers=num_workers, max_queue=max_queue, max_batch=max_batch)
+            print(f"✓ TTS合成子行程池已建立 ({num_workers} workers)")
+        except Exception as e:
+            print(f"⚠ TTS合成子行程池建立失敗: {e}")
+
+    @property
+    def available(self) -> bool:
+        """是否有可用的合成後端（行程內合成器或子行程池）"""
+        return self.synthesizer is not None or self.pool is not None
+
+    @property
+    def sample_rate(self) -> int:
+        if self.synthesizer is not None:
+            return self.synthesizer.hparams.sampling_rate
+        if self.pool is not None:
+            return self.pool.sample_rate
+        return 22050
+
+    @property
+    def synthesis_params(self) -> Tuple[float, float, int]:
+        """(sigma, 降噪強度, 取樣率)，子行程池模式下使用 han2tts 預設值（子行程的合成器即以此建立）"""
+        if self.synthesizer is not None:
+            return self.synthesizer.sigma, self.synthesizer.denoiser_strength, self.sample_rate
+        import han2tts
+        return han2tts.SIGMA, han2tts.DENOISER_STRENGTH, self.sample_rate
+
+    def cache_key(self, tlpa_text: str) -> str:
+        sigma, strength, sample_rate = self.synthesis_params
+        return self.cache.make_key(tlpa_text, sigma, strength, sample_rate)
+
+    def segment_cache_key(self, content: str) -> str:
+        sigma, strength, sample_rate = self.synthesis_params
+        return self.segment_cache.make_key(content, sigma, strength, sample_rate,
+                                           namespace=f"seg-fade{self.SEGMENT_FADE_MS:g}")
+
+    def needs_synthesis(self, tlpa_text: str, segmented: bool = False) -> bool:
+        """
+        是否有內容不在快取中而需要合成；全部命中時不佔用合成資源，API 可略過背壓檢查
+
+        Args:
+            segmented: True 時依 iter_segment_audio 的切段逐段查段落快取，否則查整句快取
+        """
+        if segmented:
+            if self.segment_cache is None:
+                return True
+            return any(not self.segment_cache.contains(self.segment_cache_key(content))
+                       for content, _ in self.split_tlpa_segments(tlpa_text) if content)
+        return self.cache is None or not self.cache.contains(self.cache_key(tlpa_text))
+
+    def _synthesize_array(self, tlpa_text: str) -> np.ndarray:
+        """以可用的後端合成台羅文本，回傳 int16 陣列（取樣率 self.sample_rate）"""
+        if self.pool is not None:
+            return self.pool.synthesize(tlpa_text)
+        if self.synthesizer is None:
+            raise RuntimeError("無可用的語音合成器")
+        with self._synth_lock:
+            return self.synthesizer.synthesize(tlpa_text)
+
+    def _synthesize_arrays(self, contents: List[str]) -> List[np.ndarray]:
+        """合成多段台羅；行程內合成器支援批次時整批一次合成"""
+        if (len(contents) > 1 and self.pool is None and self.synthesizer is not None
+                and hasattr(self.synthesizer, "synthesize_batch")):
+            with self._synth_lock:
+                return self.synthesizer.synthesize_batch(contents)
+        return [self._synthesize_array(content) for content in contents]
+
+    def synthesize_wav_bytes(self, tlpa_text: str) -> bytes:
+        """
+        台羅文本 → WAV bytes（經整句快取），供 HTTP 端點直接回傳，全程不落地暫存檔
+        """
+        key = self.cache_key(tlpa_text) if self.cache is not None else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                print("✓ 合成快取命中")
+                return cached
+
+        wav_bytes = audio_utils.to_wav_bytes(self._synthesize_array(tlpa_text), self.sample_rate)
+        if key:
+            self.cache.put(key, wav_bytes)
+        return wav_bytes
     
     def synthesize(self, text: str, output_path: str = None, convert_chinese: bool = True) -> Optional[str]:
         """
@@ -548,11 +665,16 @@ class TaiwaneseTextToSpeech:
             print(f"台羅文本（無需轉換）: {tlpa_text}")
         
         # 合成語音
-        if self.synthesizer:
+        if self.available:
             try:
-                self.synthesizer.tts(tlpa_text, output_path)
+                wav_bytes = self.synthesize_wav_bytes(tlpa_text)
+                with open(output_path, 'wb') as f:
+                    f.write(wav_bytes)
                 print(f"✓ 音檔已生成: {output_path}")
                 return output_path
+            except SynthesisQueueFull:
+                # 背壓交由呼叫端處理（API 回 503）
+                raise
             except Exception as e:
                 print(f"✗ 語音合成失敗: {e}")
                 return None
@@ -560,36 +682,79 @@ class TaiwaneseTextToSpeech:
             print("✗ 無可用的語音合成器")
             return None
 
-    def _apply_fade(self, pcm_bytes: bytes, params: wave._wave_params, fade_ms: float = 10.0) -> bytes:
-        """對 16bit PCM 做首尾淡入淡出，降低拼接時的雜音。"""
-        if params.sampwidth != 2 or not pcm_bytes:
-            return pcm_bytes
-
-        samples = array.array('h')
-        samples.frombytes(pcm_bytes)
-        fade_len = int(params.framerate * (fade_ms / 1000.0))
-        if fade_len <= 0:
-            return pcm_bytes
-        fade_len = min(fade_len, len(samples) // params.nchannels)
-        if fade_len <= 1:
-            return pcm_bytes
-
-        # 對每個聲道做線性淡入/淡出
-        for ch in range(params.nchannels):
-            # 淡入
-            idx = ch
-            for i in range(fade_len):
-                factor = i / float(fade_len)
-                samples[idx] = int(samples[idx] * factor)
-                idx += params.nchannels
-            # 淡出
-            idx = len(samples) - params.nchannels + ch
-            for i in range(fade_len):
-                factor = (fade_len - i) / float(fade_len)
-                samples[idx] = int(samples[idx] * factor)
-                idx -= params.nchannels
-
-        return samples.tobytes()
+    @staticmethod
+    def split_tlpa_segments(tlpa_text: str) -> List[Tuple[str, str]]:
+        """依標點切分台羅文本，回傳 (段落內容, 段尾標點) 列表。"""
+        pattern = r'([,.!?;:])'
+        parts = re.split(pattern, tlpa_text)
+        segments: List[Tuple[str, str]] = []
+        for i in range(0, len(parts), 2):
+            content = parts[i] if i < len(parts) else ''
+            punct = parts[i + 1] if i + 1 < len(parts) else ''
+            segments.append((content.strip(), punct))
+        return segments
+
+    def iter_segment_audio(self, tlpa_text: str, segment_pause_sec: float = 0.18, batch: bool = False):
+        """
+        逐段合成台羅文本，每段 WaveGlow 完成即 yield，供串流端點邊合成邊送出。
+
+        Args:
+            tlpa_text: 已轉好的台羅數字調文本（保留標點以便切段）
+            segment_pause_sec: 標點後附加的靜音秒數（直接接在該段音訊之後）
+            batch: True 時所有段落先批次合成再依序 yield（總耗時較短，但首段較晚）
+
+        Yields:
+            dict: index / tlpa / punct / samples（已淡入淡出、含停頓的 int16 陣列）/ sample_rate
+            （只有標點的段落 tlpa 為空字串，samples 只含停頓）
+        """
+        if not self.available:
+            raise RuntimeError("無可用的語音合成器")
+
+        # 只有標點的段落（「!?」、「，，」）不合成，但仍輸出該標點的停頓
+        segments = [(content, punct) for content, punct in self.split_tlpa_segments(tlpa_text) if content or punct]
+        sample_rate = self.sample_rate
+
+        # 先查段落快取，只有新的子句需要合成
+        faded: List[Optional[np.ndarray]] = [None if content else np.zeros(0, dtype=np.int16)
+                                             for content, _ in segments]
+        keys: List[Optional[str]] = [None] * len(segments)
+        if self.segment_cache is not None:
+            for i, (content, _) in enumerate(segments):
+                if not content:
+                    continue
+                keys[i] = self.segment_cache_key(content)
+                cached = self.segment_cache.get(keys[i])
+                if cached is not None:
+                    faded[i] = np.frombuffer(cached, dtype=np.int16)
+
+        synthesized: Dict[int, np.ndarray] = {}
+        missing = [i for i, samples in enumerate(faded) if samples is None]
+        if batch and missing:
+            synthesized = dict(zip(missing, self._synthesize_arrays([segments[i][0] for i in missing])))
+        spoken = sum(1 for content, _ in segments if content)
+        hits = spoken - len(missing)
+        if hits:
+            print(f"✓ 段落快取命中 {hits}/{spoken}")
+
+        pause_len = int(sample_rate * segment_pause_sec) if segment_pause_sec > 0 else 0
+        for index, (content, punct) in enumerate(segments):
+            seg = faded[index]
+            if seg is None:
+                seg = synthesized.pop(index) if index in synthesized else self._synthesize_array(content)
+                seg = audio_utils.fade(np.asarray(seg, dtype=np.int16), sample_rate, self.SEGMENT_FADE_MS, inplace=True)
+                if keys[index] is not None:
+                    self.segment_cache.put(keys[index], seg.tobytes())
+
+            # 標點後插入靜音以模擬停頓（一次配置含停頓的長度）
+            samples = audio_utils.concat([seg], [pause_len if punct else 0])
+
+            yield {
+                "index": index,
+                "tlpa": content,
+                "punct": punct,
+                "samples": samples,
+                "sample_rate": sample_rate,
+            }
 
     def synthesize_segmented(self, text: str, output_path: str = None, segment_pause_sec: float = 0.18,
                               convert_chinese: bool = True) -> Optional[str]:
@@ -602,7 +767,7 @@ class TaiwaneseTextToSpeech:
             segment_pause_sec: 標點後插入的靜音秒數
             convert_chinese: 是否啟用華文轉台文漢字預處理
         """
-        if self.synthesizer is None:
+        if not self.available:
             print("✗ 無可用的語音合成器")
             return None
 
@@ -615,55 +780,16 @@ class TaiwaneseTextToSpeech:
         tlpa_text = self.text_processor.process_text(text, add_pauses=False, convert_chinese=convert_chinese)
         print(f"台羅拼音（分段前）: {tlpa_text}")
 
-        # 2) 依標點切分，標點僅用來插入停頓，不再送入合成
-        pattern = r'([,.!?;:])'
-        parts = re.split(pattern, tlpa_text)
-        segments: list[Tuple[str, str]] = []
-        for i in range(0, len(parts), 2):
-            content = parts[i] if i < len(parts) else ''
-            punct = parts[i + 1] if i + 1 < len(parts) else ''
-            segments.append((content.strip(), punct))
+        # 2) 依標點切分後整批合成，標點僅用來插入停頓，不再送入合成
+        segments = list(self.iter_segment_audio(tlpa_text, segment_pause_sec=segment_pause_sec, batch=True))
+        chunks = [segment["samples"] for segment in segments]
 
-        params = None
-        merged_frames: list[bytes] = []
-
-        for content, punct in segments:
-            if content:
-                # 為每段生成臨時音檔後再合併
-                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_seg:
-                    temp_seg_path = temp_seg.name
-                try:
-                    self.synthesizer.tts(content, temp_seg_path)
-                    with wave.open(temp_seg_path, 'rb') as seg_wav:
-                        seg_params = seg_wav.getparams()
-                        seg_frames = seg_wav.readframes(seg_wav.getnframes())
-                        seg_frames = self._apply_fade(seg_frames, seg_params)
-                        if params is None:
-                            params = seg_params
-                        else:
-                            if (seg_params.sampwidth != params.sampwidth or
-                                    seg_params.nchannels != params.nchannels or
-                                    seg_params.framerate != params.framerate):
-                                raise RuntimeError("段落音檔參數不一致，無法合併")
-                        merged_frames.append(seg_frames)
-                finally:
-                    if os.path.exists(temp_seg_path):
-                        os.remove(temp_seg_path)
-
-            # 標點後插入靜音以模擬停頓
-            if punct and params and segment_pause_sec > 0:
-                pause_frames = int(params.framerate * segment_pause_sec)
-                merged_frames.append(b"\x00" * pause_frames * params.sampwidth * params.nchannels)
-
-        if not merged_frames or params is None:
+        if not any(segment["tlpa"] for segment in segments):
             print("✗ 無可合併的音訊段落")
             return None
 
-        # 3) 合併並輸出
-        with wave.open(output_path, 'wb') as out_wav:
-            out_wav.setparams(params)
-            for chunk in merged_frames:
-                out_wav.writeframes(chunk)
+        # 3) 一次配置整段長度後合併輸出
+        audio_utils.write_wav(output_path, audio_utils.concat(chunks), self.sample_rate)
 
         print(f"✓ 分段合併音檔已生成: {output_path}")
         return output_path
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+台語辭典服務
+整個行程只建一次、建好後唯讀共用的「漢字 → 台羅數字調」辭典：
+- 內建詞 + lexicon.tsv（+ ChhoeTaigi CSV，若存在）→ 斷詞辭典
+  快照可用時直接在 dictionary_snapshot 的 mmap 表上查詞（SnapshotLexicon），不必在每個行程
+  把整份詞表建成型音辭典（lexicon.tsv 約 1.6 萬詞就要約 2 秒、125 MB）；
+  快照無法使用、或遇到要以讀音比對的羅馬字輸入時，才解析來源檔建型音辭典（後者每個行程第一次遇到時建一次）
+- phrases.tsv → 整句硬指定讀法
+- end.tsv → 句尾語氣詞
+文字處理器、轉換器與 API 處理函式都取用同一份，第一次使用時才載入，並記錄載入時間與記憶體用量。
+
+用法:
+    service = get_dictionary_service()
+    tlpa = service.han_to_tlpa("今仔日天氣真好")   # kin1-a2-jit8 thinn1-khi3 tsin1 ho2
+    print(service.stats())
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+# 臺灣言語工具路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "tai5-uan5_gian5-gi2_kang1-ku7"))
+
+from 臺灣言語工具.基本物件.公用變數 import 無音
+from 臺灣言語工具.斷詞.拄好長度辭典揣詞 import 拄好長度辭典揣詞
+from 臺灣言語工具.斷詞.語言模型揀集內組 import 語言模型揀集內組
+from 臺灣言語工具.解析整理.拆文分析器 import 拆文分析器
+from 臺灣言語工具.解析整理.解析錯誤 import 解析錯誤
+from 臺灣言語工具.語言模型.實際語言模型 import 實際語言模型
+from 臺灣言語工具.辭典.型音辭典 import 型音辭典
+from 臺灣言語工具.辭典.文字辭典 import 文字辭典
+from 臺灣言語工具.音標系統.閩南語.臺灣閩南語羅馬字拼音 import 臺灣閩南語羅馬字拼音
+
+from dictionary_snapshot import SnapshotTable, reset_snapshots, snapshot_table, source_pairs
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+LEXICON_TSV = os.path.join(BASE, "lexicon.tsv")
+PHRASES_TSV = os.path.join(BASE, "phrases.tsv")
+END_TSV = os.path.join(BASE, "end.tsv")
+CHHOETAIGI_CSV = os.path.join(BASE, "ChhoeTaigi_KauiokpooTaigiSutian.csv")
+
+MAX_WORD_LEN = 6             # 辭典允許的最長詞長
+LM_ORDER = 2                 # 揀詞用的語言模型階數
+WORD_CACHE_SIZE = 65536      # SnapshotLexicon 快取的詞首數（含查無的）
+
+# 詞表空或缺檔時仍能轉出基本詞
+BUILTIN_PAIRS = [
+    ("電腦", "tian7-nau2"), ("會", "e7"), ("講", "kong2"), ("台語", "tai5-gi2"),
+    ("明仔載", "bing5-a2-tsai3"), ("開會", "khui1-hue7"), ("簡報", "kian2-po3"),
+    ("記得", "ki3-tit4"), ("今天", "kin1-a2-jit8"), ("明天", "bin5-a2-jit8"),
+    ("大家", "tak8-ke1"), ("好", "ho2"), ("我", "gua2"), ("是", "si7"), ("的", "e5"),
+    ("機器人", "ki1-khi3-lang5"),
+]
+
+_PUNCT_RE = re.compile(r"[，,。．.！？!?…⋯、；;：:~～「」『』（）()《》\s]+")
+_TRAIL_PUNCT_RE = re.compile(r"[.!?。！？]+$")
+_ROMAN_RE = re.compile(r"[A-Za-z\u00C0-\u024F\u1E00-\u1EFF]")
+
+
+def nfc(s: str) -> str:
+    """Unicode 正規化"""
+    return unicodedata.normalize("NFC", s)
+
+
+def _to_numeric(句物件) -> str:
+    """句物件轉台羅數字調，詞內音節以連字號相連、詞間空白"""
+    return 句物件.轉音(臺灣閩南語羅馬字拼音).看音()
+
+
+def _source_state(paths: Tuple[str, ...]) -> Tuple:
+    """來源檔的 (mtime_ns, size)，不存在為 None"""
+    state = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            state.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            state.append(None)
+    return tuple(state)
+
+
+def _rss_bytes() -> Optional[int]:
+    """目前行程常駐記憶體（Linux 讀 /proc，其他平台回傳 None）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# ============================================================================
+# 快照查詞
+# ============================================================================
+
+class SnapshotLexicon(文字辭典):
+    """
+    直接在辭典快照的排序表上查詞的斷詞辭典（查詞介面同型音辭典，可交給拄好長度辭典揣詞）
+    不預先建字典樹，每個詞首第一次查到時才建詞物件並以 LRU 快取；mmap 頁面由各行程共用。
+    快照表以寫法（型）為鍵；含羅馬字的片段型音辭典還會以讀音（音）比對，
+    這種查詢交給 full_lexicon() 建出的完整型音辭典（第一次遇到時才建，之後沿用）。
+    """
+
+    def __init__(self, 上濟字數: int, tables: Sequence[SnapshotTable],
+                 extra_pairs: Sequence[Tuple[str, str]] = (),
+                 full_lexicon: Callable[[], 型音辭典] = None):
+        self._上濟字數 = 上濟字數
+        self._tables = tuple(tables)
+        self._full_lexicon = full_lexicon
+        self._full: Optional[型音辭典] = None
+        self._full_lock = threading.Lock()
+        self._extra: Dict[str, List[str]] = {}
+        for han, lomaji in extra_pairs:
+            self._extra.setdefault(han, []).append(lomaji)
+        self._words = lru_cache(maxsize=WORD_CACHE_SIZE)(self._lookup)
+
+    def __len__(self) -> int:
+        return sum(len(table) for table in self._tables) + sum(len(v) for v in self._extra.values())
+
+    def full_lexicon_loaded(self) -> bool:
+        """是否已因羅馬字查詢建了完整型音辭典"""
+        return self._full is not None
+
+    def _full_dictionary(self) -> 型音辭典:
+        if self._full is None:
+            with self._full_lock:
+                if self._full is None:
+                    start = time.time()
+                    self._full = self._full_lexicon()
+                    print(f"✓ 羅馬字查詞改用完整型音辭典（建置 {time.time() - start:.2f} 秒）")
+        return self._full
+
+    def _lookup(self, han: str) -> FrozenSet:
+        """寫法為 han 的所有詞物件（讀音無法解析的詞條略過，同型音辭典建置時的處理）"""
+        readings = list(self._extra.get(han, ()))
+        for table in self._tables:
+            readings.extend(table.get_all(han))
+        words = set()
+        for lomaji in readings:
+            if not lomaji:
+                continue
+            try:
+                words.add(拆文分析器.建立詞物件(han, lomaji))
+            except 解析錯誤:
+                continue
+        return frozenset(words)
+
+    @staticmethod
+    def _same_chars(詞物件, 字陣列) -> bool:
+        if len(詞物件.內底字) != len(字陣列):
+            return False
+        for 字物件, 查詢字 in zip(詞物件.內底字, 字陣列):
+            if 查詢字.音 != 無音:
+                if 字物件 != 查詢字:
+                    return False
+            elif (字物件.型, 字物件.輕聲標記) != (查詢字.型, 查詢字.輕聲標記):
+                return False
+        return True
+
+    def 查詞(self, 詞物件):
+        """回傳第 i 格為「由開頭算 i+1 字長的詞」集合的陣列，與型音辭典.查詞 相同"""
+        字陣列 = 詞物件.內底字
+        if self._full_lexicon is not None and any(_ROMAN_RE.search(字物件.型) for 字物件 in 字陣列):
+            return self._full_dictionary().查詞(詞物件)
+        結果 = []
+        for 長度 in range(1, len(字陣列) + 1):
+            if 長度 > self._上濟字數:
+                結果.append(set())
+                continue
+            前綴 = 字陣列[:長度]
+            候選 = self._words("".join(字物件.型 for 字物件 in 前綴))
+            結果.append({詞 for 詞 in 候選 if self._same_chars(詞, 前綴)})
+        return 結果
+
+
+# ============================================================================
+# 辭典快照
+# ============================================================================
+
+class TaiwaneseDictionary:
+    """建好後不再修改的辭典快照；多執行緒同時查詢不需加鎖"""
+
+    def __init__(self, 辭典: 文字辭典, phrases: Dict[str, str], endings: List[str],
+                 entries: int, sources: Dict[str, int], load_seconds: float,
+                 memory_bytes: Optional[int], source_files: Tuple[str, ...] = ()):
+        self.辭典 = 辭典
+        self.phrases: Mapping[str, str] = MappingProxyType(phrases)
+        self.endings: Tuple[str, ...] = tuple(endings)
+        self.entries = entries
+        self.sources: Mapping[str, int] = MappingProxyType(sources)
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.source_files = tuple(source_files)
+        self.source_state = _source_state(self.source_files)
+
+    def han_to_tlpa(self, text: str, fallback: Callable[[str], str] = None) -> str:
+        """
+        漢字片段 → 台羅數字調
+
+        Args:
+            text: 不含斷句標點的漢字片段
+            fallback: 辭典查無讀音的詞交給此函式轉換（省略則略過該詞）
+        """
+        text = nfc(text.strip())
+        if not text:
+            return ""
+        phrase = self.phrases.get(_PUNCT_RE.sub("", text))
+        if phrase is not None:
+            return phrase
+
+        句物件 = (拆文分析器.建立句物件(text)
+               .揣詞(拄好長度辭典揣詞, self.辭典)
+               .揀(語言模型揀集內組, 實際語言模型(LM_ORDER))
+               .轉音(臺灣閩南語羅馬字拼音))
+        words = []
+        for 詞物件 in 句物件.網出詞物件():
+            字陣列 = 詞物件.篩出字物件()
+            if 字陣列 and all(字物件.有音() for 字物件 in 字陣列):
+                words.append(詞物件.看音())
+            elif fallback is not None:
+                converted = fallback("".join(字物件.型 for 字物件 in 字陣列)).strip()
+                if converted:
+                    words.append(converted)
+        return self._merge_ending(text, " ".join(words))
+
+    def _merge_ending(self, text: str, tlpa: str) -> str:
+        """句尾是語氣詞時把最後兩個詞以連字號相連（與 han2tlpa.merge_tail_if_ending 相同）"""
+        core = _PUNCT_RE.sub("", text)
+        if not any(core.endswith(key) for key in self.endings):
+            return tlpa
+        words = tlpa.split(" ")
+        if len(words) < 2:
+            return tlpa
+        return " ".join(words[:-2] + [words[-2] + "-" + words[-1]])
+
+    def sources_changed(self) -> bool:
+        """建立之後來源檔是否有變動（新增、刪除或 mtime / 大小改變）"""
+        return _source_state(self.source_files) != self.source_state
+
+    def stats(self) -> Dict:
+        """辭典規模、載入時間與記憶體"""
+        return {
+            "entries": self.entries,
+            "phrases": len(self.phrases),
+            "endings": len(self.endings),
+            "sources": dict(self.sources),
+            "load_seconds": round(self.load_seconds, 3),
+            "memory_mb": round(self.memory_bytes / 1024 / 1024, 1) if self.memory_bytes is not None else None,
+        }
+
+
+def _build_lexicon(sources: Dict[str, int], lexicon_tsv: str, chhoetaigi_csv: str) -> Tuple[型音辭典, int]:
+    """解析來源詞表並建成型音辭典（快照無法使用時的退路），回傳 (辭典, 詞數)"""
+    lex_pairs: List[Tuple[str, str]] = list(BUILTIN_PAIRS)
+    lexicon = [(han, lomaji) for han, lomaji in source_pairs("lexicon", lexicon_tsv) if lomaji]
+    lex_pairs.extend(lexicon)
+    sources["lexicon"] = len(lexicon)
+    chhoetaigi = source_pairs("chhoetaigi_kip", chhoetaigi_csv)
+    lex_pairs.extend(chhoetaigi)
+    sources["chhoetaigi"] = len(chhoetaigi)
+
+    辭典 = 型音辭典(MAX_WORD_LEN)
+    entries = 0
+    for han, lomaji in lex_pairs:
+        if not han or not lomaji:
+            continue
+        try:
+            辭典.加詞(拆文分析器.建立詞物件(han, lomaji))
+            entries += 1
+        except 解析錯誤:
+            continue
+    return 辭典, entries
+
+
+def load_dictionary(lexicon_tsv: str = LEXICON_TSV, phrases_tsv: str = PHRASES_TSV,
+                    end_tsv: str = END_TSV, chhoetaigi_csv: str = CHHOETAIGI_CSV) -> TaiwaneseDictionary:
+    """讀取所有詞表並建立辭典快照（耗時操作，一般經由 get_dictionary_service 只做一次）"""
+    start = time.time()
+    rss_before = _rss_bytes()
+
+    sources = {"builtin": len(BUILTIN_PAIRS)}
+    lexicon_table = snapshot_table("lexicon", lexicon_tsv)
+    chhoetaigi_table = snapshot_table("chhoetaigi_kip", chhoetaigi_csv)
+    if lexicon_table is not None and chhoetaigi_table is not None:
+        # 快照可用：直接在 mmap 表上查詞，不建字典樹
+        辭典 = SnapshotLexicon(MAX_WORD_LEN, (lexicon_table, chhoetaigi_table), BUILTIN_PAIRS,
+                             full_lexicon=lambda: _build_lexicon({}, lexicon_tsv, chhoetaigi_csv)[0])
+        sources["lexicon"] = len(lexicon_table)
+        sources["chhoetaigi"] = len(chhoetaigi_table)
+        entries = len(辭典)
+    else:
+        辭典, entries = _build_lexicon(sources, lexicon_tsv, chhoetaigi_csv)
+
+    # 整句讀法：先原樣對齊，不成功再去掉句尾標點（表中漢字常省略句點）
+    phrases = {}
+    for han, lomaji in source_pairs("phrases", phrases_tsv):
+        if not lomaji:
+            continue
+        for candidate in (lomaji, _TRAIL_PUNCT_RE.sub("", lomaji)):
+            try:
+                numeric = _to_numeric(拆文分析器.對齊句物件(han, candidate))
+            except 解析錯誤:
+                continue
+            phrases[_PUNCT_RE.sub("", han)] = numeric
+            break
+    sources["phrases"] = len(phrases)
+
+    endings = sorted({key for key, _ in source_pairs("endings", end_tsv)}, key=len, reverse=True)
+
+    rss_after = _rss_bytes()
+    memory = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    return TaiwaneseDictionary(辭典, phrases, endings, entries, sources, time.time() - start, memory,
+                               source_files=(lexicon_tsv, phrases_tsv, end_tsv, chhoetaigi_csv))
+
+
+# ============================================================================
+# 行程共用服務
+# ============================================================================
+
+_service: Optional[TaiwaneseDictionary] = None
+_service_lock = threading.Lock()
+_reload_lock = threading.Lock()
+
+
+def get_dictionary_service() -> TaiwaneseDictionary:
+    """取得行程共用的辭典（第一次呼叫時載入，之後直接回傳同一份）"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                service = load_dictionary()
+                stats = service.stats()
+                memory = f", {stats['memory_mb']} MB" if stats["memory_mb"] is not None else ""
+                print(f"✓ 台語辭典載入: {service.entries} 詞, {len(service.phrases)} 句, "
+                      f"{stats['load_seconds']} 秒{memory}")
+                _service = service
+    return _service
+
+
+def reload_dictionary_service(force: bool = False) -> bool:
+    """
+    來源檔變動時在呼叫端執行緒重建辭典，建好後一次換上
+    重建期間其他執行緒照常使用舊辭典，不會等待；尚未載入過則不做事
+
+    Returns:
+        是否換上了新辭典
+    """
+    global _service
+    with _reload_lock:
+        current = _service
+        if current is None or not (force or current.sources_changed()):
+            return False
+        reset_snapshots()
+        service = load_dictionary(*current.source_files)
+        _service = service
+        print(f"✓ 台語辭典重新載入: {service.entries} 詞, {len(service.phrases)} 句, "
+              f"{service.stats()['load_seconds']} 秒")
+        return True
+
+
+def dictionary_source_files() -> Tuple[str, ...]:
+    """辭典的來源檔（供檔案監看登記）"""
+    return LEXICON_TSV, PHRASES_TSV, END_TSV, CHHOETAIGI_CSV
+
+
+def dictionary_stats() -> Optional[Dict]:
+    """已載入時回傳辭典統計，尚未載入回傳 None（不會觸發載入）"""
+    return _service.stats() if _service is not None else None
@@ -5,6 +5,7 @@ import csv
 import os
 import re
 import sys
+import threading
 import time
 import unicodedata
 import warnings
@@ -27,6 +28,12 @@ from 臺灣言語工具.辭典.型音辭典 import 型音辭典
 from 臺灣言語工具.音標系統.閩南語.臺灣語言音標 import 臺灣語言音標
 from 臺灣言語工具.音標系統.閩南語.臺灣閩南語羅馬字拼音 import 臺灣閩南語羅馬字拼音
 
+# 編譯好的辭典快照（缺模組時照舊直接解析 CSV）
+try:
+    from dictionary_snapshot import snapshot_table
+except ImportError:
+    snapshot_table = None
+
 # 引入 TTS 相關模組
 try:
     import numpy as np
@@ -107,6 +114,13 @@ def load_chhoetaigi_dictionary() -> Dict[str, str]:
     manual_entries = {}
     dictionary.update(manual_entries)
     
+    # 有快照時直接取用已正規化的表，不必重新解析 CSV
+    table = snapshot_table("chhoetaigi_kip", CHHOETAIGI_CSV) if snapshot_table is not None else None
+    if table is not None:
+        dictionary.update(table.to_dict())
+        print(f"成功載入詞典（快照），共 {len(dictionary)} 個詞條")
+        return dictionary
+
     try:
         # 載入 CSV 辭典
         with open(CHHOETAIGI_CSV, 'r', encoding='utf-8') as f:
@@ -424,8 +438,31 @@ def next_out_path() -> str:
     stamp = time.strftime("%Y%m%d_%H%M%S")
     return os.path.join(OUT_DIR, f"{stamp}.wav")
 
+_DICTIONARY = None
+_PHRASES = None
+_DICTIONARY_LOCK = threading.Lock()
+
 def build_dictionary() -> 型音辭典:
-    """建立完整詞典"""
+    """建立完整詞典（行程內只建一次，之後回傳同一份唯讀辭典）"""
+    global _DICTIONARY
+    if _DICTIONARY is None:
+        with _DICTIONARY_LOCK:
+            if _DICTIONARY is None:
+                start = time.time()
+                _DICTIONARY = _build_dictionary()
+                print(f"詞典建立完成，耗時 {time.time() - start:.2f} 秒")
+    return _DICTIONARY
+
+def get_phrases() -> Dict[str, str]:
+    """片語表（行程內只讀一次）"""
+    global _PHRASES
+    if _PHRASES is None:
+        with _DICTIONARY_LOCK:
+            if _PHRASES is None:
+                _PHRASES = load_phrases(PHRASES_TSV)
+    return _PHRASES
+
+def _build_dictionary() -> 型音辭典:
     # 載入楚台辭典資料（優先使用）
     chhoetaigi_dict = load_chhoetaigi_dictionary()
     print(f"從 ChhoeTaigi_KauiokpooTaigiSutian.csv 載入了 {len(chhoetaigi_dict)} 個詞條")
@@ -579,8 +616,8 @@ def han_to_numeric_full(text_han: str, 辭典: 型音辭典) -> str:
     sentences = split_sentences_keep_punct(nfc(text_han.strip()))
     out_chunks = []
     
-    # 載入片語表，用於特殊情況處理
-    phrases = load_phrases(PHRASES_TSV)
+    # 片語表，用於特殊情況處理
+    phrases = get_phrases()
     
     for sent in sentences:
         # 檢查是否整句話在片語表中
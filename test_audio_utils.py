@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音訊工具測試（合成的正弦波與靜音，不需音檔）
+- 純 NumPy 多相重採樣與 scipy.signal.resample_poly 一致
+- 淡入淡出、串接、靜音的長度與型別
+- 峰值 / 響度正規化達到目標且不削波；聲道混合
+- WAV bytes 來回轉換
+- VAD：detect_speech / trim_silence / split_on_pauses 在「靜音 + 正弦波」上的切點
+
+執行: python -m unittest test_audio_utils -v
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "taiwanese_tonal_tlpa_tacotron2_hsien1"))
+
+import audio_utils  # noqa: E402
+
+try:
+    from scipy.signal import resample_poly
+except ImportError:
+    resample_poly = None
+
+SR = 16000
+
+
+def tone(seconds, amplitude=8000, freq=440.0, sample_rate=SR):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+def quiet(seconds, sample_rate=SR, seed=0):
+    """底噪約 -70 dBFS 的「靜音」"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(-10, 11, int(seconds * sample_rate)).astype(np.int16)
+
+
+class ResampleTest(unittest.TestCase):
+    @unittest.skipIf(resample_poly is None, "未安裝 scipy")
+    def test_numpy_polyphase_matches_scipy(self):
+        rng = np.random.default_rng(1)
+        x = rng.uniform(-1, 1, 4001)
+        for up, down in ((3, 2), (2, 3), (1, 3), (160, 147), (147, 160)):
+            expected = resample_poly(x, up, down)
+            actual = audio_utils._resample_poly_numpy(x, up, down)
+            self.assertEqual(actual.shape, expected.shape, (up, down))
+            np.testing.assert_allclose(actual, expected, atol=1e-5, err_msg=str((up, down)))
+
+    def test_resample_without_scipy_keeps_dtype_and_channels(self):
+        stereo = np.stack([tone(0.5), tone(0.5, freq=220.0)], axis=1)
+        with mock.patch.object(audio_utils, "_scipy_resample_poly", None):
+            out = audio_utils.resample(stereo, 48000, 16000)
+        self.assertEqual(out.dtype, np.int16)
+        self.assertEqual(out.shape, (-(-len(stereo) // 3), 2))
+        self.assertIs(audio_utils.resample(stereo, SR, SR), stereo)
+
+    def test_tone_survives_round_trip(self):
+        x = tone(0.5)
+        with mock.patch.object(audio_utils, "_scipy_resample_poly", None):
+            y = audio_utils.resample(audio_utils.resample(x, SR, 22050), 22050, SR)
+        self.assertEqual(len(y), len(x))
+        middle = slice(800, -800)  # 首尾受濾波器邊界影響
+        self.assertLess(np.max(np.abs(y[middle].astype(int) - x[middle])), 80)
+
+
+class ShapeTest(unittest.TestCase):
+    def test_fade_keeps_length_and_dtype(self):
+        x = np.full(SR, 10000, dtype=np.int16)
+        y = audio_utils.fade(x, SR, fade_in_ms=10, fade_out_ms=20)
+        self.assertEqual((len(y), y.dtype), (len(x), np.int16))
+        self.assertEqual(y[0], 0)
+        self.assertLess(y[-1], 100)
+        self.assertEqual(y[SR // 2], 10000)
+        self.assertEqual(np.count_nonzero(y < 10000), 160 + 320)
+        self.assertTrue((x == 10000).all())  # 預設不修改輸入
+
+    def test_fade_inplace_and_read_only(self):
+        x = np.full(1000, 1.0, dtype=np.float32)
+        self.assertIs(audio_utils.fade(x, SR, inplace=True), x)
+        self.assertEqual(x[0], 0.0)
+        x = np.full((1000, 2), 1000, dtype=np.int16)
+        x.flags.writeable = False
+        y = audio_utils.fade(x, SR, inplace=True)
+        self.assertIsNot(y, x)
+        self.assertEqual(y.shape, (1000, 2))
+        self.assertEqual(tuple(y[0]), (0, 0))
+
+    def test_fade_longer_than_signal(self):
+        self.assertEqual(len(audio_utils.fade(np.ones(10, dtype=np.int16), SR, fade_in_ms=100)), 10)
+
+    def test_concat_with_gaps(self):
+        out = audio_utils.concat([np.ones(3, dtype=np.int16), np.full(2, 2, dtype=np.int16)], gaps=[4, 1])
+        self.assertEqual(out.dtype, np.int16)
+        self.assertEqual(out.tolist(), [1, 1, 1, 0, 0, 0, 0, 2, 2, 0])
+        self.assertEqual(len(audio_utils.concat([])), 0)
+
+    def test_silence(self):
+        self.assertEqual(audio_utils.silence(0.18, 22050).shape, (3969,))
+        stereo = audio_utils.silence(0.5, SR, channels=2)
+        self.assertEqual((stereo.shape, stereo.dtype), ((8000, 2), np.int16))
+        self.assertEqual(len(audio_utils.silence(-1, SR)), 0)
+
+
+class LevelTest(unittest.TestCase):
+    def test_peak_normalize(self):
+        y = audio_utils.peak_normalize(tone(0.5, amplitude=1000))
+        self.assertEqual(y.dtype, np.int16)
+        self.assertAlmostEqual(np.max(np.abs(y)) / audio_utils.INT16_MAX, 0.95, places=3)
+        # 峰值低於 floor 時以 floor 計算增益，近乎靜音的訊號不會被放大到 0.95
+        near_silent = np.full(100, 1, dtype=np.int16)
+        self.assertLess(np.max(audio_utils.peak_normalize(near_silent)), 0.3 * audio_utils.INT16_MAX)
+
+    def test_loudness_reaches_target(self):
+        y = audio_utils.loudness_normalize(tone(0.5, amplitude=1000), target_dbfs=-20.0)
+        self.assertEqual(y.dtype, np.int16)
+        self.assertAlmostEqual(audio_utils.rms_dbfs(y), -20.0, delta=0.05)
+
+    def test_loudness_respects_peak_limit(self):
+        # 正弦波峰值比 RMS 高 3 dB，目標 -1 dBFS 會削波，改由峰值上限決定增益
+        y = audio_utils.loudness_normalize(tone(0.5, amplitude=1000), target_dbfs=-1.0, peak_limit=0.9)
+        self.assertAlmostEqual(np.max(np.abs(y)) / audio_utils.INT16_MAX, 0.9, places=3)
+
+    def test_loudness_gain_is_capped(self):
+        x = quiet(0.5)
+        y = audio_utils.loudness_normalize(x, target_dbfs=-20.0, max_gain_db=30.0)
+        self.assertAlmostEqual(audio_utils.rms_dbfs(y) - audio_utils.rms_dbfs(x), 30.0, delta=0.5)
+        zeros = np.zeros(100, dtype=np.int16)
+        self.assertTrue((audio_utils.loudness_normalize(zeros) == 0).all())
+        self.assertEqual(audio_utils.rms_dbfs(zeros), float("-inf"))
+
+    def test_to_mono_and_mix(self):
+        stereo = np.array([[100, 300], [-32768, -32768], [1, 2]], dtype=np.int16)
+        self.assertEqual(audio_utils.to_mono(stereo).tolist(), [200, -32768, 2])
+        self.assertEqual(audio_utils.to_mono(stereo, weights=[1.0, 0.0]).tolist(), [100, -32768, 1])
+        mixed = audio_utils.mix([np.full(3, 30000, dtype=np.int16), np.full(2, 10000, dtype=np.int16)])
+        self.assertEqual(mixed.tolist(), [32767, 32767, 30000])
+        self.assertEqual(audio_utils.mix([np.ones(2, dtype=np.float32)], gains=[0.5]).tolist(), [0.5, 0.5])
+
+
+class WavTest(unittest.TestCase):
+    def test_round_trip(self):
+        mono = tone(0.1)
+        data = audio_utils.to_wav_bytes(mono, SR)
+        self.assertEqual(len(data), 44 + 2 * len(mono))
+        samples, rate = audio_utils.from_wav_bytes(data)
+        self.assertEqual(rate, SR)
+        np.testing.assert_array_equal(samples, mono)
+
+        stereo = np.stack([mono, -mono], axis=1)
+        samples, rate = audio_utils.from_wav_bytes(audio_utils.to_wav_bytes(stereo, 22050))
+        self.assertEqual(rate, 22050)
+        np.testing.assert_array_equal(samples, stereo)
+
+    def test_pcm16_from_bytes_drops_partial_frame(self):
+        self.assertEqual(audio_utils.pcm16_from_bytes(b"\x01\x00\x02\x00\x03").tolist(), [1, 2])
+        self.assertEqual(audio_utils.pcm16_from_bytes(b"\x01\x00\x02\x00\x03", channels=2).shape, (1, 2))
+
+
+class VadTest(unittest.TestCase):
+    """0.5 秒靜音、1 秒語音、0.8 秒靜音、0.6 秒語音、0.5 秒靜音；音框 20 ms = 320 樣本"""
+
+    def setUp(self):
+        self.samples = np.concatenate([quiet(0.5, seed=1), tone(1.0), quiet(0.8, seed=2),
+                                       tone(0.6, freq=660.0), quiet(0.5, seed=3)])
+        self.pad = int(SR * 0.15)
+
+    def test_detect_speech(self):
+        self.assertEqual(audio_utils.detect_speech(self.samples, SR), [
+            (8000 - self.pad, 24000 + self.pad),
+            (36800 - self.pad, 46400 + self.pad),
+        ])
+
+    def test_short_pause_merged_and_click_dropped(self):
+        samples = np.concatenate([quiet(0.5), tone(0.4), quiet(0.2), tone(0.4),
+                                  quiet(0.5), tone(0.04), quiet(0.5)])
+        self.assertEqual(audio_utils.detect_speech(samples, SR), [(8000 - self.pad, 24000 + self.pad)])
+
+    def test_silence_only(self):
+        self.assertEqual(audio_utils.detect_speech(quiet(1.0), SR), [])
+        self.assertTrue(audio_utils.is_silent(np.zeros(SR, dtype=np.int16), SR))
+        self.assertEqual(audio_utils.detect_speech(np.zeros(0, dtype=np.int16), SR), [])
+        self.assertEqual(len(audio_utils.trim_silence(quiet(1.0), SR)), 0)
+
+    def test_trim_silence(self):
+        trimmed = audio_utils.trim_silence(self.samples, SR)
+        np.testing.assert_array_equal(trimmed, self.samples[8000 - self.pad:46400 + self.pad])
+
+    def test_split_on_pauses_cuts_between_segments(self):
+        self.assertEqual(audio_utils.split_on_pauses(self.samples, SR, max_chunk_sec=5.0),
+                         [(8000 - self.pad, 46400 + self.pad)])
+        self.assertEqual(audio_utils.split_on_pauses(self.samples, SR, max_chunk_sec=1.5),
+                         [(8000 - self.pad, 24000 + self.pad), (36800 - self.pad, 46400 + self.pad)])
+
+    def test_split_on_pauses_cuts_long_segment(self):
+        chunks = audio_utils.split_on_pauses(self.samples, SR, max_chunk_sec=0.5)
+        limit = int(0.5 * SR)
+        self.assertTrue(all(end - start <= limit for start, end in chunks))
+        self.assertEqual(chunks[0][0], 8000 - self.pad)
+        self.assertEqual(chunks[-1][1], 46400 + self.pad)
+        # 一口氣的語音內切開的片段首尾相接，不遺漏樣本
+        first_segment = [chunk for chunk in chunks if chunk[1] <= 24000 + self.pad]
+        for (_, end), (start, _) in zip(first_segment, first_segment[1:]):
+            self.assertEqual(end, start)
+        windows = audio_utils.overlap_windows(chunks, overlap=800)
+        self.assertEqual(windows[1][0], chunks[1][0] - 800)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
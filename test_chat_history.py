@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+對話歷史一致性測試（模擬 LLM，不需網路與金鑰）
+使用者訊息與回覆一起寫入歷史；LLM 失敗、逾時或客戶端中途離開時，
+歷史不留下沒有回覆的使用者訊息（下一輪才不會連送兩則使用者訊息）
+
+執行: python -m unittest test_chat_history -v
+"""
+
+import asyncio
+import base64
+import json
+import unittest
+import uuid
+from types import SimpleNamespace
+
+from starlette.testclient import TestClient
+
+import integrated_voice_chat_api as gateway
+import integrated_voice_chat_asgi as asgi_gateway
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class StubLLM:
+    """chat.completions.create(stream=True)：依序回傳 replies 中的片段；error 不為 None 時直接丟出"""
+
+    def __init__(self, replies=("你好，", "食飽未？"), error=None):
+        self.replies = replies
+        self.error = error
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages, **kwargs):
+        self.requests.append(messages)
+        if self.error is not None:
+            raise self.error
+        return iter([chunk(text) for text in self.replies])
+
+
+class AsyncStubLLM(StubLLM):
+    """AsyncOpenAI 版：每個片段之間等 delay 秒"""
+
+    def __init__(self, *args, delay=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+
+    async def _create(self, messages, **kwargs):
+        self.requests.append(messages)
+        if self.error is not None:
+            raise self.error
+
+        async def stream():
+            for text in self.replies:
+                await asyncio.sleep(self.delay)
+                yield chunk(text)
+        return stream()
+
+
+class ChatHistoryTestBase:
+    """兩個版本共用的情境；子類別提供 chat(message, stream=False)"""
+
+    def setUp(self):
+        self._saved = (gateway.llm_client, gateway.summarizer, gateway.speech, gateway.recognize_upload)
+        gateway.speech = object()
+        gateway.recognize_upload = self.recognize
+        self._saved_model = getattr(gateway, "FINE_TUNED_MODEL", None)
+        gateway.summarizer = None
+        gateway.FINE_TUNED_MODEL = "stub-model"  # 未設定 OpenAI 金鑰時模組不會定義
+        self.session_id = f"test-{uuid.uuid4().hex}"
+
+    def tearDown(self):
+        gateway.llm_client, gateway.summarizer, gateway.speech, gateway.recognize_upload = self._saved
+        if self._saved_model is None:
+            del gateway.FINE_TUNED_MODEL
+        else:
+            gateway.FINE_TUNED_MODEL = self._saved_model
+        gateway.session_store.delete(self.session_id)
+
+    @staticmethod
+    def recognize(audio, rate):
+        return {"provider": "google", "transcript": "你好", "confidence": 0.9}, {"chunks": 1}
+
+    def voice_body(self):
+        return {"audio": base64.b64encode(b"\0\0" * 1600).decode(), "session_id": self.session_id, "tts": False}
+
+    @staticmethod
+    def parse_sse(text):
+        events = []
+        for block in text.strip().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+            events.append((lines.get("event"), json.loads(lines.get("data", "{}"))))
+        return events
+
+    def use(self, llm):
+        gateway.llm_client = llm
+        return llm
+
+    def history(self):
+        session = gateway.session_store.get(self.session_id)
+        return [] if session is None else [(m["role"], m["content"]) for m in session["messages"][1:]]
+
+    def test_reply_is_saved_with_user_message(self):
+        llm = self.use(StubLLM())
+        self.chat("你好")
+        self.assertEqual(self.history(), [("user", "你好"), ("assistant", "你好，食飽未？")])
+        # 本輪輸入仍在送給 LLM 的訊息最後
+        self.assertEqual(llm.requests[-1][-1], {"role": "user", "content": "你好"})
+
+    def test_llm_error_leaves_no_orphan(self):
+        self.use(StubLLM(error=RuntimeError("LLM 掛了")))
+        self.chat("你好")
+        self.assertEqual(self.history(), [])
+        llm = self.use(StubLLM())
+        self.chat("閣一擺")
+        self.assertEqual([m["role"] for m in llm.requests[-1][1:]], ["user"])
+        self.assertEqual(self.history(), [("user", "閣一擺"), ("assistant", "你好，食飽未？")])
+
+    def test_voice_turn_saves_reply(self):
+        self.use(StubLLM())
+        events = self.voice_turn()
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(self.history(), [("user", "你好"), ("assistant", "你好，食飽未？")])
+
+    def test_voice_turn_llm_error_leaves_no_orphan(self):
+        self.use(StubLLM(error=RuntimeError("LLM 掛了")))
+        events = self.voice_turn()
+        self.assertIn(("error", "llm"), [(name, data.get("stage")) for name, data in events])
+        self.assertEqual(self.history(), [])
+
+
+class FlaskChatHistoryTest(ChatHistoryTestBase, unittest.TestCase):
+    def chat(self, message, stream=False):
+        return gateway.app.test_client().post(
+            "/api/chat", json={"message": message, "session_id": self.session_id, "stream": stream})
+
+    def voice_turn(self):
+        response = gateway.app.test_client().post("/api/voice_turn", json=self.voice_body())
+        return self.parse_sse(response.get_data(as_text=True))
+
+    def test_voice_turn_rejects_malformed_audio(self):
+        self.use(StubLLM())
+        client = gateway.app.test_client()
+        for body in ({"audio": "不是base64!"}, {**self.voice_body(), "sample_rate": "16k"}):
+            response = client.post("/api/voice_turn", json=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.get_json()["success"])
+
+    def test_voice_turn_disconnect_leaves_no_orphan(self):
+        self.use(StubLLM())
+        response = gateway.app.test_client().post("/api/voice_turn", json=self.voice_body(), buffered=False)
+        for data in response.response:  # 收到第一個回覆片段就離開
+            if b"event: delta" in data:
+                break
+        response.close()
+        self.assertEqual(self.history(), [])
+
+    def test_stream_error_leaves_no_orphan(self):
+        self.use(StubLLM(error=RuntimeError("LLM 掛了")))
+        response = self.chat("你好", stream=True)
+        self.assertIn("error", response.get_data(as_text=True))
+        self.assertEqual(self.history(), [])
+
+    def test_stream_disconnect_leaves_no_orphan(self):
+        self.use(StubLLM())
+        response = gateway.app.test_client().post(
+            "/api/chat", json={"message": "你好", "session_id": self.session_id, "stream": True},
+            buffered=False)
+        next(iter(response.response))  # 收到第一個片段就離開
+        response.close()
+        self.assertEqual(self.history(), [])
+
+
+class AsgiChatHistoryTest(ChatHistoryTestBase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self._saved_asgi = (asgi_gateway.async_llm_client, asgi_gateway.recognize_upload,
+                            asgi_gateway.LLM_TIMEOUT)
+        asgi_gateway.recognize_upload = self.arecognize
+
+    def tearDown(self):
+        (asgi_gateway.async_llm_client, asgi_gateway.recognize_upload,
+         asgi_gateway.LLM_TIMEOUT) = self._saved_asgi
+        super().tearDown()
+
+    async def arecognize(self, audio, rate):
+        return self.recognize(audio, rate)
+
+    def use(self, llm):
+        if not isinstance(llm, AsyncStubLLM):
+            llm = AsyncStubLLM(llm.replies, error=llm.error)
+        gateway.llm_client = llm
+        asgi_gateway.async_llm_client = llm
+        return llm
+
+    def chat(self, message, stream=False):
+        with TestClient(asgi_gateway.app) as client:
+            return client.post("/api/chat", json={"message": message, "session_id": self.session_id, "stream": stream})
+
+    def voice_turn(self):
+        with TestClient(asgi_gateway.app) as client:
+            return self.parse_sse(client.post("/api/voice_turn", json=self.voice_body()).text)
+
+    def test_voice_turn_rejects_malformed_audio(self):
+        self.use(AsyncStubLLM())
+        bodies = [
+            {"audio": "不是base64!", "session_id": self.session_id},
+            {**self.voice_body(), "sample_rate": "16k"},
+        ]
+        with TestClient(asgi_gateway.app, raise_server_exceptions=False) as client:
+            for body in bodies:
+                response = client.post("/api/voice_turn", json=body)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()["success"])
+        self.assertEqual(self.history(), [])
+
+    def test_timeout_leaves_no_orphan(self):
+        self.use(AsyncStubLLM(delay=0.5))
+        asgi_gateway.LLM_TIMEOUT = 0.2
+        self.assertEqual(self.chat("你好").status_code, 504)
+        self.assertEqual(self.history(), [])
+
+    def test_cancelled_stream_leaves_no_orphan(self):
+        self.use(AsyncStubLLM(delay=0.05))
+
+        async def run():
+            body = asgi_gateway._chat_stream(self.session_id, "你好", "sse").body_iterator
+            await body.__anext__()  # 收到第一個片段就取消
+            await body.aclose()
+        asyncio.run(run())
+        self.assertEqual(self.history(), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
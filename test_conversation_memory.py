@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+滾動摘要與會話裁切同時進行的測試（模擬 LLM，不需網路與金鑰）
+- 摘要期間舊對話已被裁切、又出現內容相同的新對話（「好」、「嗯」）時，只移除真正被摘要的那幾則
+- 套用摘要時持有 SessionStore 的鎖，與 commit 的裁切互斥
+
+執行: python -m unittest test_conversation_memory -v
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "wadija_llm"))
+
+from conversation_memory import ConversationSummarizer  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+
+class BlockingClient:
+    """chat.completions.create 等到 release 才回傳固定的筆記"""
+
+    def __init__(self, note="長輩今仔日心情好"):
+        self.note = note
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.note))])
+
+
+def turn(text):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": "好"}]
+
+
+class SummaryTrimRaceTest(unittest.TestCase):
+    def setUp(self):
+        self.client = BlockingClient()
+        self.summarizer = ConversationSummarizer(self.client, trigger_messages=6, keep_messages=2)
+        self.store = SessionStore(max_messages=7, max_history_tokens=None)
+        self.session = self.store.get_or_create("u", lambda: "系統")
+        self.session["messages"].extend(turn("好") + turn("嗯") + turn("好"))
+
+    def wait_applied(self, timeout=3.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline and self.summarizer.stats()["pending"]:
+            time.sleep(0.01)
+
+    def test_identical_newer_turns_survive_concurrent_trim(self):
+        messages = self.session["messages"]
+        self.assertTrue(self.summarizer.maybe_summarize(self.session, lock=self.store.lock))
+        self.assertTrue(self.client.started.wait(2))
+        older = messages[1:5]
+
+        # 摘要進行中：新對話內容與舊對話一模一樣，commit 依則數上限裁掉最舊的一輪
+        with self.store.lock:
+            messages.extend(turn("好") + turn("嗯"))
+        self.store.commit("u")
+        newer = [m for m in messages[1:] if all(m is not o for o in older)]
+        self.assertEqual(len(newer), 6)
+
+        self.client.release.set()
+        self.wait_applied()
+
+        self.assertEqual(self.session["summary"], self.client.note)
+        self.assertEqual(messages[0]["content"], "系統")
+        self.assertTrue(all(any(m is n for m in messages) for n in newer))
+        self.assertFalse(any(m is o for m in messages for o in older))
+        self.assertEqual(len(messages), 1 + len(newer))
+
+    def test_summary_waits_for_store_lock(self):
+        messages = self.session["messages"]
+        before = list(messages)
+        self.client.release.set()
+        with self.store.lock:
+            self.assertTrue(self.summarizer.maybe_summarize(self.session, lock=self.store.lock))
+            time.sleep(0.2)
+            # 持有鎖期間歷史與摘要都不會被改
+            self.assertEqual(messages, before)
+            self.assertNotIn("summary", self.session)
+        self.wait_applied()
+        self.assertEqual(self.session["summary"], self.client.note)
+        self.assertEqual(len(messages), 1 + self.summarizer.keep_messages)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+華文轉台語漢字對照表比對測試（不需教育部 CSV）
+- 單趟替換：某層的轉換結果含有另一層的鍵時，不會被再轉一次
+- 同一個鍵出現在多層時依層級優先：短語 > 詞彙 > 手工 > 單字
+
+執行: python -m unittest test_dict_matcher -v
+"""
+
+import contextlib
+import io
+import os
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "taiwanese_tonal_tlpa_tacotron2_hsien1"))
+
+from advanced_chinese_converter import AdvancedChineseToTaiwaneseConverter  # noqa: E402
+from dict_matcher import DictionaryMatcher  # noqa: E402
+
+
+class DictionaryMatcherTest(unittest.TestCase):
+    def test_output_is_not_rematched_by_other_tier(self):
+        matcher = DictionaryMatcher([
+            ("詞彙", {"記得": "會記得"}),
+            ("單字", {"會": "袂", "記": "記"}),
+        ])
+        result, matches = matcher.replace("我記得")
+        self.assertEqual(result, "我會記得")
+        self.assertEqual(matches, [("詞彙", "記得", "會記得")])
+
+    def test_output_is_not_rematched_by_same_tier(self):
+        matcher = DictionaryMatcher([("手工", {"記得": "會記得", "會記得": "袂記得"})])
+        self.assertEqual(matcher.replace("記得")[0], "會記得")
+        self.assertEqual(matcher.replace("會記得")[0], "袂記得")
+
+    def test_identical_key_uses_first_tier(self):
+        matcher = DictionaryMatcher([
+            ("短語", {"一起去": "做伙去"}),
+            ("詞彙", {"一起去": "鬥陣去"}),
+        ])
+        self.assertEqual(matcher.replace("一起去")[0], "做伙去")
+        self.assertEqual(matcher.longest_at("一起去", 0), (3, "做伙去", "短語"))
+
+    def test_longest_match_beats_tier_priority(self):
+        matcher = DictionaryMatcher([
+            ("短語", {"一起": "做伙"}),
+            ("單字", {"一起去": "鬥陣去"}),
+        ])
+        self.assertEqual(matcher.replace("一起去")[0], "鬥陣去")
+
+
+class ConverterTierTest(unittest.TestCase):
+    def setUp(self):
+        missing_csv = os.path.join(os.path.dirname(__file__), "no-such-dictionary.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.converter = AdvancedChineseToTaiwaneseConverter(csv_path=missing_csv)
+
+    def test_manual_output_is_not_rewritten_by_csv_tier(self):
+        converter = self.converter
+        converter.csv_dict.update({"會": "袂", "記": "紀"})
+        converter.rebuild_matcher()
+        self.assertEqual(converter.manual_dict["記得"], "會記得")
+        self.assertEqual(converter.convert("我記得"), "我會記得")
+
+    def test_tier_priority_on_identical_keys(self):
+        converter = self.converter
+        converter.phrase_dict["吃飯"] = "食飯"
+        converter.word_dict["吃飯"] = "呷飯"
+        converter.csv_dict["吃飯"] = "食糜"
+        converter.rebuild_matcher()
+        self.assertEqual(converter.convert("吃飯"), "食飯")
+        del converter.phrase_dict["吃飯"]
+        converter.rebuild_matcher()
+        self.assertEqual(converter.convert("吃飯"), "呷飯")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+辭典二進位快照測試（暫存目錄內的小詞表，不需 ChhoeTaigi CSV）
+- 來源檔 mtime / 大小改變時重建，內容跟著更新
+- 格式版本或建置版本不符時重建，而不是放棄快照
+- 快照檔權限 0644（其他帳號執行的服務也能讀）
+- SnapshotLexicon 直接查 mmap 表的斷詞結果與型音辭典相同；羅馬字輸入才建完整型音辭典
+
+執行: python -m unittest test_dictionary_snapshot -v
+"""
+
+import contextlib
+import io
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "taiwanese_tonal_tlpa_tacotron2_hsien1"))
+
+import dictionary_snapshot  # noqa: E402
+import tlpa_dictionary  # noqa: E402
+from dictionary_snapshot import load_snapshot, reset_snapshots  # noqa: E402
+from tlpa_dictionary import SnapshotLexicon, TaiwaneseDictionary  # noqa: E402
+
+LEXICON = [
+    ("今仔日", "kin-á-ji̍t"), ("天氣", "thinn-khì"), ("真", "tsin"), ("好", "hó"),
+    ("食飯", "tsia̍h-pn̄g"), ("食", "tsia̍h"), ("飯", "pn̄g"), ("相著", "sio-tio̍h"),
+    ("著", "tio̍h"), ("驚", "kiann"), ("破病", ""),
+]
+
+
+def write_tsv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write("\t".join(row) + "\n")
+
+
+class SnapshotTestBase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(reset_snapshots)
+        directory = self.tmp.name
+        self.sources = {
+            "chhoetaigi": os.path.join(directory, "missing.csv"),
+            "lexicon": os.path.join(directory, "lexicon.tsv"),
+            "phrases": os.path.join(directory, "phrases.tsv"),
+            "endings": os.path.join(directory, "end.tsv"),
+        }
+        write_tsv(self.sources["lexicon"], LEXICON)
+        write_tsv(self.sources["phrases"], [])
+        write_tsv(self.sources["endings"], [("啦", "--lah")])
+        self.path = os.path.join(directory, "dictionary.snapshot")
+
+    def load(self):
+        reset_snapshots()
+        with contextlib.redirect_stdout(io.StringIO()):
+            return load_snapshot(self.path, self.sources)
+
+
+class SnapshotRebuildTest(SnapshotTestBase):
+    def test_build_and_lookup(self):
+        snapshot = self.load()
+        self.assertEqual(snapshot.table("lexicon")["食飯"], "tsia̍h-pn̄g")
+        self.assertEqual(snapshot.table("endings").get_all("啦"), ["--lah"])
+        self.assertEqual(len(snapshot.table("chhoetaigi_kip")), 0)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o644)
+
+    def test_rebuilds_when_source_changes(self):
+        built_at = self.load().manifest["built_at"]
+        write_tsv(self.sources["lexicon"], LEXICON + [("電腦", "tiān-náu")])
+        snapshot = self.load()
+        self.assertGreater(snapshot.manifest["built_at"], built_at)
+        self.assertEqual(snapshot.table("lexicon")["電腦"], "tiān-náu")
+
+    def test_rebuilds_on_mtime_change_with_same_size(self):
+        built_at = self.load().manifest["built_at"]
+        st = os.stat(self.sources["lexicon"])
+        os.utime(self.sources["lexicon"], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertGreater(self.load().manifest["built_at"], built_at)
+
+    def test_unchanged_sources_reuse_snapshot(self):
+        built_at = self.load().manifest["built_at"]
+        self.assertEqual(self.load().manifest["built_at"], built_at)
+
+    def test_rebuilds_on_builder_version_mismatch(self):
+        built_at = self.load().manifest["built_at"]
+        with mock.patch.object(dictionary_snapshot, "BUILDER_VERSION", dictionary_snapshot.BUILDER_VERSION + 1):
+            snapshot = self.load()
+        self.assertGreater(snapshot.manifest["built_at"], built_at)
+        self.assertEqual(snapshot.manifest["builder"], dictionary_snapshot.BUILDER_VERSION + 1)
+
+    def test_rebuilds_on_format_version_mismatch(self):
+        self.load()
+        with open(self.path, "r+b") as f:
+            f.seek(4)
+            f.write((dictionary_snapshot.FORMAT_VERSION + 1).to_bytes(2, "little"))
+        snapshot = self.load()
+        self.assertIsNotNone(snapshot)
+        self.assertEqual(snapshot.table("lexicon")["好"], "hó")
+
+    def test_rebuilds_truncated_snapshot(self):
+        self.load()
+        with open(self.path, "r+b") as f:
+            f.truncate(6)
+        self.assertIsNotNone(self.load())
+
+
+class SnapshotLexiconTest(SnapshotTestBase):
+    def setUp(self):
+        super().setUp()
+        snapshot = self.load()
+        tables = (snapshot.table("lexicon"), snapshot.table("chhoetaigi_kip"))
+        pairs = [(han, lomaji) for han, lomaji in LEXICON if lomaji] + tlpa_dictionary.BUILTIN_PAIRS
+        self.full_builds = 0
+
+        def full_lexicon():
+            self.full_builds += 1
+            return self.trie(pairs)
+
+        self.lexicon = SnapshotLexicon(tlpa_dictionary.MAX_WORD_LEN, tables, tlpa_dictionary.BUILTIN_PAIRS,
+                                       full_lexicon=full_lexicon)
+        self.mmap_service = self.service(self.lexicon)
+        self.trie_service = self.service(self.trie(pairs))
+
+    @staticmethod
+    def trie(pairs):
+        辭典 = tlpa_dictionary.型音辭典(tlpa_dictionary.MAX_WORD_LEN)
+        for han, lomaji in pairs:
+            try:
+                辭典.加詞(tlpa_dictionary.拆文分析器.建立詞物件(han, lomaji))
+            except tlpa_dictionary.解析錯誤:
+                continue  # 同 load_dictionary：讀音對不齊的詞條略過
+        return 辭典
+
+    @staticmethod
+    def service(辭典):
+        return TaiwaneseDictionary(辭典, {}, [], 0, {}, 0.0, None)
+
+    def test_matches_trie_dictionary(self):
+        for text in ("今仔日天氣真好", "食飯", "我食飯", "驚著", "電腦會講台語", "破病", "好食"):
+            self.assertEqual(self.mmap_service.han_to_tlpa(text, fallback=lambda w: "?"),
+                             self.trie_service.han_to_tlpa(text, fallback=lambda w: "?"), text)
+        self.assertEqual(self.mmap_service.han_to_tlpa("今仔日天氣真好"), "kin1-a2-jit8 thinn1-khi3 tsin1 ho2")
+        self.assertFalse(self.lexicon.full_lexicon_loaded())
+
+    def test_romanized_input_uses_full_lexicon_once(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(2):
+                self.assertEqual(self.mmap_service.han_to_tlpa("sio-tio̍h 好"),
+                                 self.trie_service.han_to_tlpa("sio-tio̍h 好"))
+        self.assertTrue(self.lexicon.full_lexicon_loaded())
+        self.assertEqual(self.full_builds, 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+檔案監看與熱更新測試（暫存檔，直接呼叫 watcher.check()，不啟動背景執行緒）
+- 檔案變動後要連續兩次輪詢狀態相同才重新載入（編輯器分多次寫入時不會讀到一半）
+- force= 不論有無變動都重新載入
+- 重新載入失敗時保留舊資料，等檔案再次修改才重試
+- reload_changed_dictionaries() 換上新的 RAG 字典與詞彙索引
+
+執行: python -m unittest test_file_watcher -v
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / "wadija_llm"))
+sys.path.insert(0, str(ROOT / "taiwanese_tonal_tlpa_tacotron2_hsien1"))
+
+import rag_tools_v2  # noqa: E402
+from file_watcher import FileWatcher  # noqa: E402
+
+
+class WatcherTestBase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.mtime_ns = 10 ** 18
+
+    def write(self, name, data):
+        """寫入 JSON 並把 mtime 往後推一秒，不受檔案系統時間精度影響"""
+        path = os.path.join(self.dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data, ensure_ascii=False))
+        self.mtime_ns += 10 ** 9
+        os.utime(path, ns=(self.mtime_ns, self.mtime_ns))
+        return path
+
+    @staticmethod
+    def check(watcher, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return watcher.check(**kwargs)
+
+
+class FileWatcherTest(WatcherTestBase):
+    def setUp(self):
+        super().setUp()
+        self.path = self.write("profile.json", {"name": "阿伯"})
+        self.data = {"name": "阿伯"}
+        self.loads = 0
+
+        def reload():
+            with open(self.path, encoding="utf-8") as f:
+                new_data = json.load(f)
+            self.loads += 1
+            self.data = new_data
+
+        self.watcher = FileWatcher(interval=1)
+        self.watcher.watch("profile", [self.path], reload)
+
+    def test_unchanged_files_do_not_reload(self):
+        self.assertEqual(self.check(self.watcher), [])
+        self.assertEqual(self.loads, 0)
+
+    def test_reload_waits_for_two_identical_polls(self):
+        self.write("profile.json", {"name": "阿姆"})
+        self.assertEqual(self.check(self.watcher), [])
+        self.assertEqual(self.data, {"name": "阿伯"})
+        self.assertEqual(self.check(self.watcher), ["profile"])
+        self.assertEqual(self.data, {"name": "阿姆"})
+        self.assertEqual(self.check(self.watcher), [])
+        self.assertEqual(self.loads, 1)
+
+    def test_still_writing_delays_reload(self):
+        self.write("profile.json", '{"name": ')
+        self.assertEqual(self.check(self.watcher), [])
+        self.write("profile.json", {"name": "阿姆"})
+        self.assertEqual(self.check(self.watcher), [])
+        self.assertEqual(self.check(self.watcher), ["profile"])
+        self.assertEqual(self.data, {"name": "阿姆"})
+        self.assertEqual(self.watcher.stats()["watches"]["profile"]["errors"], 0)
+
+    def test_force_reloads_without_change(self):
+        self.assertEqual(self.check(self.watcher, force=["profile"]), ["profile"])
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.check(self.watcher, force=["other"]), [])
+
+    def test_failed_reload_keeps_old_data(self):
+        self.write("profile.json", '{"name": ')
+        self.check(self.watcher)
+        self.assertEqual(self.check(self.watcher), [])
+        self.assertEqual(self.data, {"name": "阿伯"})
+        stats = self.watcher.stats()["watches"]["profile"]
+        self.assertEqual((stats["reloads"], stats["errors"]), (0, 1))
+        self.assertIsNotNone(stats["last_error"])
+
+        # 同一份壞檔不會每次輪詢都重試；修好後照常載入
+        self.assertEqual(self.check(self.watcher), [])
+        self.assertEqual(self.watcher.stats()["watches"]["profile"]["errors"], 1)
+        self.write("profile.json", {"name": "阿姆"})
+        self.check(self.watcher)
+        self.assertEqual(self.check(self.watcher), ["profile"])
+        self.assertEqual(self.data, {"name": "阿姆"})
+        self.assertIsNone(self.watcher.stats()["watches"]["profile"]["last_error"])
+
+    def test_deleted_file_triggers_reload_attempt(self):
+        os.remove(self.path)
+        self.check(self.watcher)
+        self.assertEqual(self.check(self.watcher), [])
+        self.assertEqual(self.data, {"name": "阿伯"})
+        self.assertEqual(self.watcher.stats()["watches"]["profile"]["errors"], 1)
+
+
+class RagDictionaryReloadTest(WatcherTestBase):
+    KEY = "test_common_words"
+
+    def setUp(self):
+        super().setUp()
+        for cache in (rag_tools_v2._DICT_CACHE, rag_tools_v2._VOCAB_INDEX,
+                      rag_tools_v2._DICT_DIGEST, rag_tools_v2._DICT_SOURCE):
+            self.addCleanup(cache.pop, self.KEY, None)
+        path = self.write("common_words.json", {"vocabulary": {"醫生": "先生"}})
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.data = rag_tools_v2.load_json_with_cache(self.KEY, path)
+        self.watcher = FileWatcher(interval=1)
+        self.watcher.watch("rag_dictionaries", [rag_tools_v2.dictionary_files()[self.KEY]],
+                           rag_tools_v2.reload_changed_dictionaries)
+
+    def vocab(self, text):
+        return rag_tools_v2.retrieve_dynamic_vocab(text, rag_tools_v2._DICT_CACHE[self.KEY])
+
+    def test_reload_swaps_in_new_dictionary(self):
+        digest = rag_tools_v2._DICT_DIGEST[self.KEY]
+        self.assertEqual(self.vocab("看醫生"), "  • 醫生 → **先生**")
+        self.write("common_words.json", {"vocabulary": {"醫生": "先生", "吃飯": "食飯"}})
+        self.assertEqual(self.check(self.watcher), [])
+        self.assertEqual(self.check(self.watcher), ["rag_dictionaries"])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = rag_tools_v2.load_json_with_cache(self.KEY, "unused.json")
+        self.assertEqual(data["vocabulary"]["吃飯"], "食飯")
+        self.assertEqual(self.data["vocabulary"], {"醫生": "先生"})  # 舊物件不被就地修改
+        self.assertNotEqual(rag_tools_v2._DICT_DIGEST[self.KEY], digest)
+        self.assertEqual(self.vocab("吃飯"), "  • 吃飯 → **食飯**")
+
+    def test_broken_dictionary_keeps_old_data(self):
+        digest = rag_tools_v2._DICT_DIGEST[self.KEY]
+        self.write("common_words.json", '{"vocabulary": ')
+        self.check(self.watcher)
+        self.check(self.watcher)
+        self.assertIs(rag_tools_v2._DICT_CACHE[self.KEY], self.data)
+        self.assertEqual(rag_tools_v2._DICT_DIGEST[self.KEY], digest)
+        self.assertEqual(self.vocab("看醫生"), "  • 醫生 → **先生**")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+System Prompt 快取測試（暫存目錄內的小字典，不需網路與金鑰）
+- 個資與字典都沒變時，build_static_prompt 回傳快取中的同一個字串
+- 個資或任一字典檔改變時，prompt_content_hash 與 Prompt 都跟著改變
+- with_dynamic_vocab 把即時詞彙插在最後一則使用者訊息前，不修改傳入的歷史
+
+執行: python -m unittest test_rag_prompt_cache -v
+"""
+
+import contextlib
+import copy
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "wadija_llm"))
+
+import rag_tools_v2  # noqa: E402
+from rag_tools_v2 import build_static_prompt, prompt_content_hash, with_dynamic_vocab  # noqa: E402
+
+DICTIONARIES = {
+    "common_rules.json": {
+        "negatives": {"rules": ["不要 → 莫"]},
+        "pronouns": {"rules": ["我們 → 阮"]},
+        "particles": {"list": ["啦", "咧"]},
+    },
+    "japanese_loan.json": {"vocabulary": {"機車": "歐都拜"}},
+    "accents.json": {"mixed": {"name": "通行混合腔", "vocab": {"雞蛋": "雞卵"}}},
+    "common_words.json": {"vocabulary": {"醫生": "先生", "吃飯": "食飯"}},
+}
+
+PROFILE = {
+    "basic_info": {"name": "林旺伯", "age": 78, "location": "台南安平"},
+    "family_members": {"son": "阿明"},
+    "interests": ["泡茶"],
+}
+
+# 模組層級的快取，測試前清空、測試後還原
+CACHES = ("_DICT_CACHE", "_VOCAB_INDEX", "_DICT_DIGEST", "_DICT_SOURCE", "_STATIC_PROMPT_CACHE")
+
+
+def msg(role, content):
+    return {"role": role, "content": content}
+
+
+class PromptCacheTestBase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.mtime_ns = 10 ** 18
+        for filename, data in DICTIONARIES.items():
+            self.write(filename, data)
+
+        for name in ("DICT_DIR", "BASE_DIR"):
+            patcher = mock.patch.object(rag_tools_v2, name, self.dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name in CACHES:
+            cache = getattr(rag_tools_v2, name)
+            saved = dict(cache)
+            cache.clear()
+            self.addCleanup(self.restore, cache, saved)
+
+        stdout = contextlib.redirect_stdout(io.StringIO())
+        stdout.__enter__()
+        self.addCleanup(stdout.__exit__, None, None, None)
+
+    @staticmethod
+    def restore(cache, saved):
+        cache.clear()
+        cache.update(saved)
+
+    def write(self, filename, data):
+        path = os.path.join(self.dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        self.mtime_ns += 10 ** 9
+        os.utime(path, ns=(self.mtime_ns, self.mtime_ns))
+
+
+class StaticPromptTest(PromptCacheTestBase):
+    def test_unchanged_inputs_return_cached_string(self):
+        first = build_static_prompt(PROFILE)
+        self.assertIn("林旺伯", first)
+        self.assertIn("歐都拜", first)
+        self.assertIs(build_static_prompt(PROFILE), first)
+        # 內容相同、鍵順序不同的個資也算同一份
+        reordered = dict(reversed(list(copy.deepcopy(PROFILE).items())))
+        self.assertEqual(prompt_content_hash(reordered), prompt_content_hash(PROFILE))
+        self.assertIs(build_static_prompt(reordered), first)
+        self.assertEqual(len(rag_tools_v2._STATIC_PROMPT_CACHE), 1)
+
+    def test_profile_change_changes_hash_and_prompt(self):
+        before_hash = prompt_content_hash(PROFILE)
+        before = build_static_prompt(PROFILE)
+        changed = copy.deepcopy(PROFILE)
+        changed["interests"] = ["泡茶", "唱歌"]
+        self.assertNotEqual(prompt_content_hash(changed), before_hash)
+        after = build_static_prompt(changed)
+        self.assertNotEqual(after, before)
+        self.assertIn("唱歌", after)
+
+    def test_dictionary_change_changes_hash_and_prompt(self):
+        before_hash = prompt_content_hash(PROFILE)
+        before = build_static_prompt(PROFILE)
+        self.write("japanese_loan.json", {"vocabulary": {"機車": "歐都拜", "番茄": "柑仔蜜"}})
+        self.assertEqual(rag_tools_v2.reload_changed_dictionaries(), ["japanese_loan"])
+        self.assertNotEqual(prompt_content_hash(PROFILE), before_hash)
+        after = build_static_prompt(PROFILE)
+        self.assertNotEqual(after, before)
+        self.assertIn("柑仔蜜", after)
+        self.assertIs(build_static_prompt(PROFILE), after)
+
+    def test_dynamic_vocab_not_in_static_prompt(self):
+        self.assertNotIn("即時查詢詞彙", build_static_prompt(PROFILE))
+        full = rag_tools_v2.build_system_prompt(PROFILE, "我要去看醫生")
+        self.assertTrue(full.startswith(build_static_prompt(PROFILE)))
+        self.assertIn("醫生 → **先生**", full)
+
+
+class DynamicVocabMessageTest(PromptCacheTestBase):
+    def setUp(self):
+        super().setUp()
+        self.history = [msg("system", build_static_prompt(PROFILE)),
+                        msg("user", "你好"), msg("assistant", "食飽未？"),
+                        msg("user", "我要去看醫生")]
+        self.original = copy.deepcopy(self.history)
+
+    def test_inserted_before_last_user_turn(self):
+        messages = with_dynamic_vocab(self.history, "我要去看醫生")
+        self.assertEqual(len(messages), len(self.history) + 1)
+        self.assertEqual(messages[:3], self.history[:3])
+        self.assertEqual(messages[3]["role"], "system")
+        self.assertIn("醫生 → **先生**", messages[3]["content"])
+        self.assertEqual(messages[4], msg("user", "我要去看醫生"))
+        self.assertEqual(self.history, self.original)
+
+    def test_history_list_is_not_modified(self):
+        messages = with_dynamic_vocab(self.history, "今仔日欲吃飯")
+        self.assertIsNot(messages, self.history)
+        self.assertEqual(self.history, self.original)
+        self.assertIs(messages[0], self.history[0])  # System Prompt 原封不動，前綴逐字相同
+        messages.append(msg("assistant", "好"))
+        self.assertEqual(self.history, self.original)
+
+    def test_no_match_returns_copy(self):
+        messages = with_dynamic_vocab(self.history, "天氣真好")
+        self.assertEqual(messages, self.history)
+        self.assertIsNot(messages, self.history)
+
+    def test_appended_when_last_message_is_not_user(self):
+        history = self.history[:3]
+        messages = with_dynamic_vocab(history, "吃飯")
+        self.assertEqual(messages[:3], history)
+        self.assertEqual(messages[3]["role"], "system")
+        self.assertIn("吃飯 → **食飯**", messages[3]["content"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
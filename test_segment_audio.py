@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+逐段合成測試（模擬合成子行程池，不需模型）
+- 只有標點的段落（「!?」、「，，」）不送去合成，但仍輸出該標點的停頓
+- 只有這種段落時不視為需要合成（背壓檢查不會擋）
+
+執行: python -m unittest test_segment_audio -v
+"""
+
+import unittest
+
+import numpy as np
+
+import integrated_voice_chat_api as gateway
+from synthesis_cache import SynthesisCache
+
+SPEECH_LEN = 1000
+
+
+class StubPool:
+    sample_rate = 22050
+
+    def __init__(self):
+        self.texts = []
+
+    def is_saturated(self):
+        return False
+
+    def synthesize(self, text):
+        self.texts.append(text)
+        return np.full(SPEECH_LEN, 1000, dtype=np.int16)
+
+
+class SegmentAudioTest(unittest.TestCase):
+    def setUp(self):
+        tts = gateway.tts_system
+        self._saved = (tts.pool, tts.cache, tts.segment_cache)
+        self.pool = tts.pool = StubPool()
+        tts.cache = SynthesisCache(cache_dir=None)
+        tts.segment_cache = SynthesisCache(cache_dir=None)
+        self.tts = tts
+        self.pause = int(tts.sample_rate * 0.18)
+
+    def tearDown(self):
+        self.tts.pool, self.tts.cache, self.tts.segment_cache = self._saved
+
+    def segments(self, text, **kwargs):
+        return [(s["tlpa"], s["punct"], len(s["samples"])) for s in self.tts.iter_segment_audio(text, **kwargs)]
+
+    def test_punctuation_only_segments_keep_pause(self):
+        for batch in (False, True):
+            self.pool.texts.clear()
+            self.tts.segment_cache = SynthesisCache(cache_dir=None)
+            segments = self.segments("li2 ho2!? tsiah8 pa2 bue7,, ", batch=batch)
+            self.assertEqual(segments, [
+                ("li2 ho2", "!", SPEECH_LEN + self.pause),
+                ("", "?", self.pause),
+                ("tsiah8 pa2 bue7", ",", SPEECH_LEN + self.pause),
+                ("", ",", self.pause),
+            ])
+            self.assertEqual(self.pool.texts, ["li2 ho2", "tsiah8 pa2 bue7"])
+
+    def test_trailing_text_without_punctuation(self):
+        self.assertEqual(self.segments("li2 ho2. gua2", segment_pause_sec=0),
+                         [("li2 ho2", ".", SPEECH_LEN), ("gua2", "", SPEECH_LEN)])
+
+    def test_punctuation_only_needs_no_synthesis(self):
+        self.assertFalse(self.tts.needs_synthesis("!?,", segmented=True))
+        self.assertEqual(self.segments("!?"), [("", "!", self.pause), ("", "?", self.pause)])
+        self.assertEqual(self.pool.texts, [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+會話儲存測試（不需網路與金鑰）
+- 容量上限以 LRU 淘汰最久未互動的會話；閒置逾時的會話自動清除
+- SQLite 持久化：重啟後還原歷史與摘要，System Prompt 換成當下的版本
+- trim_history 保留 System Prompt 與最新一則，裁切後不以助理回覆開頭
+
+執行: python -m unittest test_session_store -v
+"""
+
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "wadija_llm"))
+
+import session_store  # noqa: E402
+from session_store import SessionStore, trim_history  # noqa: E402
+
+
+def msg(role, content):
+    return {"role": role, "content": content}
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class EvictionTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(session_store.time, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lru_evicts_least_recently_active(self):
+        store = SessionStore(max_sessions=2, idle_ttl=0)
+        store.get_or_create("a", lambda: "系統")
+        store.get_or_create("b", lambda: "系統")
+        store.get_or_create("a", lambda: "系統")  # a 變成最近互動
+        store.get_or_create("c", lambda: "系統")
+        self.assertIn("a", store)
+        self.assertNotIn("b", store)
+        self.assertIn("c", store)
+        self.assertEqual(store.stats()["evicted"], 1)
+
+    def test_get_does_not_refresh_order(self):
+        store = SessionStore(max_sessions=2, idle_ttl=0)
+        store.get_or_create("a", lambda: "系統")
+        store.get_or_create("b", lambda: "系統")
+        self.assertIsNotNone(store.get("a"))
+        store.get_or_create("c", lambda: "系統")
+        self.assertNotIn("a", store)
+        self.assertIn("b", store)
+
+    def test_idle_sessions_expire(self):
+        store = SessionStore(idle_ttl=10)
+        store.get_or_create("a", lambda: "系統")
+        self.clock.now += 5
+        store.get_or_create("b", lambda: "系統")
+        self.clock.now += 6  # a 閒置 11 秒、b 閒置 6 秒
+        store.get_or_create("c", lambda: "系統")
+        self.assertNotIn("a", store)
+        self.assertIn("b", store)
+        self.assertEqual(store.stats()["expired"], 1)
+
+    def test_commit_keeps_session_alive(self):
+        store = SessionStore(idle_ttl=10)
+        store.get_or_create("a", lambda: "系統")
+        self.clock.now += 8
+        store.commit("a")
+        self.clock.now += 8
+        store.get_or_create("b", lambda: "系統")
+        self.assertIn("a", store)
+
+    def test_zero_ttl_never_expires(self):
+        store = SessionStore(idle_ttl=0)
+        store.get_or_create("a", lambda: "系統")
+        self.clock.now += 10 ** 6
+        store.get_or_create("b", lambda: "系統")
+        self.assertIn("a", store)
+
+
+class PersistenceTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_path = os.path.join(tmp.name, "sessions.db")
+
+    def open_store(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            store = SessionStore(db_path=self.db_path, **kwargs)
+        self.addCleanup(store._db.close)
+        return store
+
+    def test_round_trip_reinjects_system_prompt(self):
+        store = self.open_store()
+        session = store.get_or_create("u", lambda: "舊的系統提示")
+        session["messages"] += [msg("user", "你好"), msg("assistant", "食飽未？")]
+        session["summary"] = "長輩今仔日心情好"
+        store.commit("u")
+
+        with contextlib.closing(sqlite3.connect(self.db_path)) as db:
+            data, = db.execute("SELECT data FROM sessions WHERE session_id = 'u'").fetchone()
+        self.assertNotIn("system", [m["role"] for m in json.loads(data)["messages"]])
+
+        restored = self.open_store().get_or_create("u", lambda: "新的系統提示")
+        self.assertEqual(restored["messages"], [
+            msg("system", "新的系統提示"), msg("user", "你好"), msg("assistant", "食飽未？")])
+        self.assertEqual(restored["summary"], "長輩今仔日心情好")
+        self.assertEqual(restored["created_at"], session["created_at"])
+
+    def test_evicted_session_restored_from_sqlite(self):
+        store = self.open_store(max_sessions=1)
+        store.get_or_create("a", lambda: "系統")["messages"].append(msg("user", "我是 a"))
+        store.commit("a")
+        store.get_or_create("b", lambda: "系統")
+        self.assertNotIn("a", store)
+        restored = store.get_or_create("a", lambda: "系統")
+        self.assertEqual(restored["messages"][-1], msg("user", "我是 a"))
+
+    def test_expired_row_not_restored(self):
+        clock = FakeClock()
+        with mock.patch.object(session_store.time, "time", clock):
+            store = self.open_store(idle_ttl=10)
+            store.get_or_create("u", lambda: "系統")["messages"].append(msg("user", "你好"))
+            store.commit("u")
+            clock.now += 11
+            restored = self.open_store(idle_ttl=10).get_or_create("u", lambda: "系統")
+        self.assertEqual(restored["messages"], [msg("system", "系統")])
+
+    def test_delete_removes_row(self):
+        store = self.open_store()
+        store.get_or_create("u", lambda: "系統")
+        store.commit("u")
+        self.assertTrue(store.delete("u"))
+        self.assertEqual(self.open_store().get_or_create("u", lambda: "系統")["messages"],
+                         [msg("system", "系統")])
+
+
+class TrimHistoryTest(unittest.TestCase):
+    def history(self, turns):
+        messages = [msg("system", "系統")]
+        for i in range(turns):
+            messages += [msg("user", f"問{i}"), msg("assistant", f"答{i}")]
+        return messages
+
+    def test_message_cap_never_starts_with_assistant(self):
+        messages = self.history(3)  # system + 3 輪
+        # 依則數只需刪 3 則，但剩下的第一則會是「答1」，所以再多刪一則
+        self.assertEqual(trim_history(messages, max_messages=4), 4)
+        self.assertEqual([m["content"] for m in messages], ["系統", "問2", "答2"])
+
+    def test_message_cap_on_turn_boundary(self):
+        messages = self.history(3)
+        self.assertEqual(trim_history(messages, max_messages=5), 2)
+        self.assertEqual([m["content"] for m in messages], ["系統", "問1", "答1", "問2", "答2"])
+
+    def test_token_budget_keeps_latest_message(self):
+        messages = self.history(2) + [msg("user", "很長的問題" * 100)]
+        trim_history(messages, max_messages=100, max_tokens=10)
+        self.assertEqual(messages, [msg("system", "系統"), msg("user", "很長的問題" * 100)])
+
+    def test_token_budget_skips_leading_assistant(self):
+        messages = self.history(3)
+        # 預算剛好容得下「答1」之後的內容，但不能以「答1」開頭
+        budget = session_store.estimate_message_tokens(messages[:1] + messages[-3:])
+        trim_history(messages, max_messages=100, max_tokens=budget)
+        self.assertEqual([m["content"] for m in messages], ["系統", "問2", "答2"])
+        self.assertEqual(messages[1]["role"], "user")
+
+    def test_without_system_prompt(self):
+        messages = [msg("assistant", "答0"), msg("user", "問1"), msg("assistant", "答1")]
+        trim_history(messages, max_messages=10)
+        self.assertEqual(messages[0], msg("user", "問1"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上傳音訊 VAD 與長錄音分段辨識測試（模擬 recognize_speech，不需網路與金鑰）
+- 全靜音上傳直接拒絕，不呼叫任何 STT
+- 首尾靜音不送出
+- 長錄音切成重疊視窗、同時辨識（總延遲約一個視窗），合併時去除重疊的重複文字
+- 同時辨識的視窗數不超過 STT_CHUNK_WORKERS
+
+執行: python -m unittest test_stt_chunking -v
+"""
+
+import asyncio
+import base64
+import threading
+import time
+import unittest
+
+import numpy as np
+
+import integrated_voice_chat_api as gateway
+import integrated_voice_chat_asgi as asgi_gateway
+
+RATE = 16000
+CHARS_PER_SEC = 4
+TEXT = "".join(chr(0x4E00 + i) for i in range(CHARS_PER_SEC * 120))  # 每 0.25 秒一個不重複的字
+
+_rng = np.random.default_rng(0)
+
+
+def speech(sec):
+    """語音音量的白雜訊（每段內容不同，可由位置反查時間）"""
+    return (_rng.normal(0, 0.1, int(RATE * sec)) * 32767).astype(np.int16)
+
+
+def silence(sec):
+    return np.zeros(int(RATE * sec), dtype=np.int16)
+
+
+class StubRecognizer:
+    """依視窗在原始音訊中的位置回傳對應的字；記錄呼叫次數與最大同時數"""
+
+    def __init__(self, audio: bytes, delay: float = 0.0):
+        self.audio = audio
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def transcript(self, chunk: bytes) -> str:
+        start = self.audio.find(chunk) // 2 / RATE
+        end = start + len(chunk) // 2 / RATE
+        first = int(np.ceil(start * CHARS_PER_SEC))
+        last = int(np.floor(end * CHARS_PER_SEC))
+        return TEXT[first:last]
+
+    def _enter(self):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def _leave(self):
+        with self._lock:
+            self.active -= 1
+
+    def sync(self, chunk, rate=RATE, routing=None):
+        self._enter()
+        try:
+            time.sleep(self.delay)
+            return {"provider": "google", "transcript": self.transcript(chunk), "confidence": 0.9}
+        finally:
+            self._leave()
+
+    async def async_(self, chunk, rate=RATE, routing=None):
+        self._enter()
+        try:
+            await asyncio.sleep(self.delay)
+            return {"provider": "google", "transcript": self.transcript(chunk), "confidence": 0.9}
+        finally:
+            self._leave()
+
+
+class MergeOverlapTest(unittest.TestCase):
+    def test_duplicate_text_is_removed(self):
+        self.assertEqual(gateway._merge_overlap("今仔日天氣真好，阮", "真好，阮欲去公園"), "今仔日天氣真好，阮欲去公園")
+
+    def test_partial_words_at_cut_are_dropped(self):
+        # 左視窗結尾與右視窗開頭各有切點上聽不完整的字
+        self.assertEqual(gateway._merge_overlap("阮欲去公園行", "去公園行路"), "阮欲去公園行路")
+        self.assertEqual(gateway._merge_overlap("阮欲去公園行X", "Y公園行路"), "阮欲去公園行路")
+
+    def test_no_common_text_is_joined(self):
+        self.assertEqual(gateway._merge_overlap("你好", "再會"), "你好再會")
+        self.assertEqual(gateway._merge_overlap("hello", "world"), "hello world")
+
+    def test_windows_without_overlap_are_not_deduplicated(self):
+        results = [{"provider": "google", "transcript": "好好", "confidence": 0.9},
+                   {"provider": "yating", "transcript": "好好", "confidence": None}]
+        merged = gateway.merge_stt_results(results, [[0.0, 5.0], [6.0, 9.0]])
+        self.assertEqual(merged, {"provider": "google+yating", "transcript": "好好好好", "confidence": 0.9})
+
+
+class ChunkedRecognitionTestBase:
+    """兩個版本共用的情境；子類別提供 recognize(audio) → (結果, vad, 耗時)"""
+
+    def setUp(self):
+        self._saved = (gateway.recognize_speech, asgi_gateway.recognize_speech,
+                       gateway.VAD_MAX_CHUNK_SEC, gateway.STT_CHUNK_OVERLAP_SEC)
+        gateway.VAD_MAX_CHUNK_SEC = 20
+        gateway.STT_CHUNK_OVERLAP_SEC = 1.0
+
+    def tearDown(self):
+        (gateway.recognize_speech, asgi_gateway.recognize_speech,
+         gateway.VAD_MAX_CHUNK_SEC, gateway.STT_CHUNK_OVERLAP_SEC) = self._saved
+
+    def use(self, audio: bytes, delay: float = 0.0) -> StubRecognizer:
+        stub = StubRecognizer(audio, delay)
+        gateway.recognize_speech = stub.sync
+        asgi_gateway.recognize_speech = stub.async_
+        return stub
+
+    def test_silent_upload_is_rejected_without_stt(self):
+        audio = silence(3).tobytes()
+        stub = self.use(audio)
+        result, vad, _ = self.recognize(audio)
+        self.assertIsNone(result)
+        self.assertEqual(vad["chunks"], 0)
+        self.assertEqual(stub.calls, 0)
+
+    def test_leading_and_trailing_silence_is_trimmed(self):
+        audio = np.concatenate([silence(2), speech(3), silence(2)]).tobytes()
+        stub = self.use(audio)
+        result, vad, _ = self.recognize(audio)
+        self.assertEqual(stub.calls, 1)
+        self.assertEqual(vad["input_sec"], 7.0)
+        self.assertLess(vad["speech_sec"], 3.5)
+
+    def test_long_speech_is_merged_without_duplicates(self):
+        audio = speech(50).tobytes()  # 一口氣不停：只能在語音中切開，視窗彼此重疊
+        stub = self.use(audio)
+        result, vad, _ = self.recognize(audio)
+        self.assertGreaterEqual(vad["chunks"], 3)
+        windows = vad["windows"]
+        self.assertTrue(all(b[0] < a[1] for a, b in zip(windows, windows[1:])))
+        self.assertTrue(all(end - start <= 21.0 for start, end in windows))
+        self.assertEqual(result["transcript"], TEXT[:50 * CHARS_PER_SEC])
+
+    def test_windows_are_recognized_concurrently(self):
+        audio = np.concatenate([np.concatenate([speech(15), silence(1)]) for _ in range(3)]).tobytes()
+        stub = self.use(audio, delay=0.5)
+        result, vad, elapsed = self.recognize(audio)
+        self.assertEqual(vad["chunks"], 3)
+        # 依序約 1.5 秒；同時辨識約一個視窗的 0.5 秒
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(stub.max_active, 3)
+
+    def test_concurrency_is_bounded(self):
+        audio = np.concatenate([np.concatenate([speech(15), silence(1)]) for _ in range(6)]).tobytes()
+        stub = self.use(audio, delay=0.2)
+        result, vad, _ = self.recognize(audio)
+        self.assertEqual(vad["chunks"], 6)
+        self.assertEqual(stub.max_active, gateway.STT_CHUNK_WORKERS)
+
+
+class FlaskChunkedTest(ChunkedRecognitionTestBase, unittest.TestCase):
+    def recognize(self, audio):
+        start = time.time()
+        result, vad = gateway.recognize_upload(audio, RATE)
+        return result, vad, time.time() - start
+
+    def test_stt_endpoint_rejects_silence(self):
+        stub = self.use(silence(2).tobytes())
+        saved, gateway.speech = gateway.speech, object()
+        try:
+            response = gateway.app.test_client().post(
+                "/api/stt", json={"audio": base64.b64encode(silence(2).tobytes()).decode()})
+        finally:
+            gateway.speech = saved
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "未偵測到語音")
+        self.assertEqual(stub.calls, 0)
+
+
+class AsgiChunkedTest(ChunkedRecognitionTestBase, unittest.TestCase):
+    def recognize(self, audio):
+        async def run():
+            start = time.time()
+            result, vad = await asgi_gateway.recognize_upload(audio, RATE)
+            return result, vad, time.time() - start
+        return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+STT 平行 / 對沖路由測試（本機模擬服務，不需網路與金鑰）
+以本機 HTTP 伺服器模擬 Google 辨識與 Yating token，以本機 WebSocket 伺服器模擬 Yating 串流辨識，
+分別驗證 Flask 版（執行緒）與 ASGI 版（asyncio）的 recognize_speech：
+- Google 高信心：採用 Google 並取消 Yating
+- Google 低信心：採用 Yating，總延遲約為兩者較慢者而非相加
+- 對沖延遲內 Google 已高信心：不送 Yating
+
+執行: python -m unittest test_stt_hedging -v
+"""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import requests
+import websockets
+
+import integrated_voice_chat_api as gateway
+import integrated_voice_chat_asgi as asgi_gateway
+from yating_client import YatingClient
+
+AUDIO = b"\0\0" * 3200  # 0.2 秒 16k/mono/16-bit
+
+
+class StubProviders:
+    """本機模擬 Google 辨識、Yating token 與 Yating WebSocket"""
+
+    def __init__(self):
+        self.google_delay = 0.0
+        self.google_confidence = 0.95
+        self.yating_delay = 0.0
+        self.yating_connections = 0
+        self.yating_finals = 0
+        self.yating_cancelled = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path.startswith("/google"):
+                    time.sleep(stub.google_delay)
+                    body = {"transcript": "你好", "confidence": stub.google_confidence}
+                else:
+                    body = {"auth_token": "stub-token"}
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.http_url = f"http://127.0.0.1:{self.http.server_address[1]}"
+
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.ws_server = asyncio.run_coroutine_threadsafe(self._serve(), self.loop).result()
+        self.ws_url = f"ws://127.0.0.1:{self.ws_server.sockets[0].getsockname()[1]}/ws/v1/"
+
+    async def _serve(self):
+        return await websockets.serve(self._yating, "127.0.0.1", 0)
+
+    async def _yating(self, ws):
+        self.yating_connections += 1
+        try:
+            async for message in ws:
+                if message == b"":
+                    break
+            # 收到 EOS 後經 yating_delay 送出最終結果；期間用戶端斷線即視為被取消
+            try:
+                await asyncio.wait_for(ws.wait_closed(), self.yating_delay)
+                self.yating_cancelled += 1
+                return
+            except asyncio.TimeoutError:
+                pass
+            await ws.send(json.dumps({"pipe": {"asr_final": True, "asr_sentence": "汝好"}}))
+            self.yating_finals += 1
+            await ws.wait_closed()
+        except websockets.ConnectionClosed:
+            self.yating_cancelled += 1
+
+    def google_sync(self, audio_bytes, rate=16000, max_seconds=55):
+        body = requests.post(f"{self.http_url}/google", data=b"x", timeout=10).json()
+        return body["transcript"], body["confidence"]
+
+    async def google_async(self, audio_bytes, rate=16000, max_seconds=55):
+        async with httpx.AsyncClient() as client:
+            body = (await client.post(f"{self.http_url}/google", content=b"x", timeout=10)).json()
+        return body["transcript"], body["confidence"]
+
+    def close(self):
+        self.http.shutdown()
+        self.ws_server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class STTRoutingTestBase:
+    """兩個版本共用的情境；子類別提供 timed(routing) → (結果, 辨識耗時)"""
+
+    def setUp(self):
+        self.stub = StubProviders()
+        self._saved = (gateway.speech, gateway.YATING_API_KEY, gateway.yating_client,
+                       gateway.STT_HEDGE_DELAY, gateway.google_stt_linear16,
+                       asgi_gateway.google_stt_linear16)
+        gateway.speech = object()
+        gateway.YATING_API_KEY = "stub-key"
+        gateway.yating_client = YatingClient("stub-key", token_url=f"{self.stub.http_url}/v1/token",
+                                             ws_url=self.stub.ws_url)
+        gateway.STT_HEDGE_DELAY = 0.5
+        gateway.google_stt_linear16 = self.stub.google_sync
+        asgi_gateway.google_stt_linear16 = self.stub.google_async
+
+    def tearDown(self):
+        (gateway.speech, gateway.YATING_API_KEY, gateway.yating_client,
+         gateway.STT_HEDGE_DELAY, gateway.google_stt_linear16,
+         asgi_gateway.google_stt_linear16) = self._saved
+        self.stub.close()
+
+    def wait_for(self, predicate, timeout=3.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline and not predicate():
+            time.sleep(0.02)
+        return predicate()
+
+    def test_confident_google_cancels_yating(self):
+        self.stub.google_delay = 0.3
+        self.stub.yating_delay = 2.0
+        result, elapsed = self.timed("parallel")
+        self.assertEqual(result["provider"], "google")
+        self.assertLess(elapsed, 1.0)
+        self.assertTrue(self.wait_for(lambda: self.stub.yating_cancelled == 1))
+        self.assertEqual(self.stub.yating_finals, 0)
+
+    def test_low_confidence_waits_for_slower_not_sum(self):
+        self.stub.google_delay = 0.8
+        self.stub.google_confidence = 0.3
+        self.stub.yating_delay = 0.6
+        result, elapsed = self.timed("parallel")
+        self.assertEqual(result["provider"], "yating")
+        self.assertEqual(result["transcript"], "汝好")
+        self.assertEqual(result["google_confidence"], 0.3)
+        # 依序呼叫約 0.8 + 0.6 秒；平行約為較慢的 0.8 秒
+        self.assertLess(elapsed, 1.3)
+
+    def test_sequential_pays_both_latencies(self):
+        self.stub.google_delay = 0.5
+        self.stub.google_confidence = 0.3
+        self.stub.yating_delay = 0.4
+        result, elapsed = self.timed("sequential")
+        self.assertEqual(result["provider"], "yating")
+        self.assertGreaterEqual(elapsed, 0.9)
+
+    def test_hedge_skips_yating_when_google_is_fast(self):
+        self.stub.google_delay = 0.1
+        result, _ = self.timed("hedged")
+        self.assertEqual(result["provider"], "google")
+        self.assertEqual(self.stub.yating_connections, 0)
+
+    def test_hedge_starts_yating_after_delay(self):
+        self.stub.google_delay = 0.9
+        self.stub.google_confidence = 0.3
+        self.stub.yating_delay = 0.1
+        result, elapsed = self.timed("hedged")
+        self.assertEqual(result["provider"], "yating")
+        self.assertEqual(self.stub.yating_connections, 1)
+        self.assertLess(elapsed, 1.4)
+
+
+class FlaskRoutingTest(STTRoutingTestBase, unittest.TestCase):
+    def timed(self, routing):
+        start = time.time()
+        result = gateway.recognize_speech(AUDIO, 16000, routing=routing)
+        return result, time.time() - start
+
+
+class AsgiRoutingTest(STTRoutingTestBase, unittest.TestCase):
+    def timed(self, routing):
+        async def run():
+            asgi_gateway.http_client = httpx.AsyncClient(timeout=10)
+            try:
+                start = time.time()
+                result = await asgi_gateway.recognize_speech(AUDIO, 16000, routing=routing)
+                return result, time.time() - start
+            finally:
+                await asgi_gateway.http_client.aclose()
+        return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成子行程池測試（子行程載入替身 han2tts.Synthesizer，不需模型檔）
+- 送件 / 收件、微批次（子行程忙碌時排隊的件併成一批）
+- 整批失敗時逐件重試，只有壞的那件失敗
+- 子行程被殺掉時，派給它的請求立即失敗、名額釋出，並啟動新的子行程補上
+- synthesize 逾時後釋出佇列名額；close() 讓未完成的請求失敗
+
+執行: python -m unittest test_synthesis_pool -v
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "taiwanese_tonal_tlpa_tacotron2_hsien1"))
+
+from synthesis_pool import SynthesisPool, SynthesisQueueFull, SynthesisWorkerError  # noqa: E402
+
+# 子行程以 spawn 啟動並沿用父行程的 sys.path，所以會先載入這個替身
+STUB_HAN2TTS = '''
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class Synthesizer:
+    """替身：輸出長度為文字長度，內容為該批件數；特定文字觸發延遲 / 錯誤 / 異常結束"""
+
+    def __init__(self, tacotron_ckpt, waveglow_ckpt):
+        self.hparams = SimpleNamespace(sampling_rate=16000)
+
+    def _run(self, text, batch_size):
+        if text.startswith("sleep"):
+            time.sleep(float(text.split()[1]))
+        if text == "die":
+            os._exit(3)
+        if text == "boom":
+            raise ValueError("boom")
+        return np.full(len(text), batch_size, dtype=np.int16)
+
+    def synthesize(self, text):
+        return self._run(text, 1)
+
+    def synthesize_batch(self, texts):
+        return [self._run(text, len(texts)) for text in texts]
+'''
+
+
+class SynthesisPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(cls.stub_dir.name, "han2tts.py"), "w", encoding="utf-8") as f:
+            f.write(STUB_HAN2TTS)
+        sys.path.insert(0, cls.stub_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.remove(cls.stub_dir.name)
+        cls.stub_dir.cleanup()
+
+    def make_pool(self, **kwargs):
+        kwargs.setdefault("torch_threads", 1)
+        pool = SynthesisPool("tacotron.pt", "waveglow.pt", **kwargs)
+        self.addCleanup(self.quiet, pool.close)
+        self.quiet(pool.start)
+        self.wait_for(lambda: pool.metrics()["workers_ready"] == pool.num_workers, timeout=60)
+        return pool
+
+    @staticmethod
+    def quiet(func, *args, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args, **kwargs)
+
+    def wait_for(self, condition, timeout=30.0):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                self.fail("等待逾時")
+            time.sleep(0.05)
+
+    def test_submit_and_collect(self):
+        pool = self.make_pool(num_workers=2)
+        self.assertEqual(pool.sample_rate, 16000)
+        futures = [pool.submit("x" * n) for n in range(1, 9)]
+        self.assertEqual([len(future.result(timeout=30)) for future in futures], list(range(1, 9)))
+        metrics = pool.metrics()
+        self.assertEqual(metrics["completed"], 8)
+        self.assertEqual(metrics["in_flight"], 0)
+
+    def test_queued_jobs_are_micro_batched(self):
+        pool = self.make_pool(num_workers=1, max_batch=4, batch_wait_ms=0)
+        busy = pool.submit("sleep 0.5")
+        time.sleep(0.2)  # 子行程已取走 sleep，其餘三件在佇列中排隊
+        futures = [pool.submit(text) for text in ("a", "bb", "ccc")]
+        self.assertEqual(busy.result(timeout=30).tolist(), [1] * 9)
+        for future in futures:
+            self.assertTrue((future.result(timeout=30) == 3).all())
+
+    def test_failed_batch_retries_each_item(self):
+        pool = self.make_pool(num_workers=1, max_batch=4, batch_wait_ms=0)
+        busy = pool.submit("sleep 0.5")
+        time.sleep(0.2)
+        good, bad, other = (pool.submit(text) for text in ("ok", "boom", "fine"))
+        busy.result(timeout=30)
+        self.assertEqual(good.result(timeout=30).tolist(), [1, 1])
+        self.assertEqual(other.result(timeout=30).tolist(), [1, 1, 1, 1])
+        with self.assertRaisesRegex(SynthesisWorkerError, "boom"):
+            bad.result(timeout=30)
+        self.assertEqual(pool.metrics()["errors"], 1)
+
+    def test_killed_worker_releases_slots_and_is_replaced(self):
+        pool = self.make_pool(num_workers=1, max_queue=2)
+        futures = [pool.submit("die"), pool.submit("later")]
+        with self.assertRaises(SynthesisQueueFull):
+            pool.submit("full")
+        for future in futures:
+            with self.assertRaisesRegex(SynthesisWorkerError, "異常結束"):
+                self.quiet(future.result, timeout=30)
+        self.assertEqual(pool.metrics()["in_flight"], 0)
+        self.assertEqual(pool.metrics()["worker_restarts"], 1)
+
+        # 新的子行程就緒後，兩個名額都可以再用
+        self.wait_for(lambda: pool.metrics()["workers_ready"] == 1)
+        self.assertEqual([len(f.result(timeout=30)) for f in (pool.submit("a"), pool.submit("bb"))], [1, 2])
+        self.assertEqual(pool.metrics()["workers_alive"], 1)
+
+    def test_killed_worker_does_not_affect_other_workers(self):
+        pool = self.make_pool(num_workers=2)
+        slow = pool.submit("sleep 1.0")  # 派給 worker 0
+        dying = pool.submit("die")       # 派給閒著的 worker 1
+        with self.assertRaises(SynthesisWorkerError):
+            self.quiet(dying.result, timeout=30)
+        self.assertEqual(len(slow.result(timeout=30)), 9)
+
+    def test_synthesize_timeout_releases_slot(self):
+        pool = self.make_pool(num_workers=1, max_queue=1)
+        with self.assertRaises(FutureTimeoutError):
+            pool.synthesize("sleep 0.5", timeout=0.05)
+        self.assertEqual(pool.metrics()["in_flight"], 0)
+        self.assertEqual(len(pool.synthesize("abc", timeout=30)), 3)
+
+    def test_close_fails_pending(self):
+        pool = self.make_pool(num_workers=1)
+        busy = pool.submit("sleep 0.3")
+        time.sleep(0.1)
+        pending = pool.submit("never")
+        self.quiet(pool.close, timeout=0.05)
+        with self.assertRaisesRegex(SynthesisWorkerError, "關閉"):
+            pending.result(timeout=5)
+        self.assertTrue(busy.done())
+        self.assertEqual(pool.metrics()["workers_alive"], 0)
+        with self.assertRaises(RuntimeError):
+            pool.start()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tacotron2 批次推論測試（CPU、小尺寸隨機權重，不需模型檔）
+- inference_batch 對長短不一、任意順序的輸入，每筆的 mel 長度與內容都同逐筆 inference
+
+執行: python -m unittest test_tacotron2_batch -v
+"""
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import torch
+import torch.nn.functional as F
+
+HSIEN1_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "taiwanese_tonal_tlpa_tacotron2_hsien1")
+sys.path.insert(0, HSIEN1_DIR)
+sys.path.insert(0, os.path.join(HSIEN1_DIR, "tacotron2"))
+
+from tacotron2 import model as tacotron2_model  # noqa: E402
+
+TACOTRON2_HPARAMS = dict(
+    mask_padding=True, fp16_run=False, n_mel_channels=20, n_frames_per_step=1,
+    n_symbols=30, symbols_embedding_dim=16,
+    encoder_kernel_size=5, encoder_n_convolutions=2, encoder_embedding_dim=16,
+    decoder_rnn_dim=32, prenet_dim=16, max_decoder_steps=40, gate_threshold=0.5,
+    p_attention_dropout=0.1, p_decoder_dropout=0.1,
+    attention_rnn_dim=32, attention_dim=8,
+    attention_location_n_filters=4, attention_location_kernel_size=5,
+    postnet_embedding_dim=16, postnet_kernel_size=5, postnet_n_convolutions=3,
+)
+
+
+def prenet_without_dropout(self, x):
+    """Prenet 推論時也固定開 dropout；比對逐筆與批次時改成確定性的版本"""
+    for linear in self.layers:
+        x = F.relu(linear(x))
+    return x
+
+
+class Tacotron2BatchTest(unittest.TestCase):
+    LENGTHS = (7, 3, 11, 5, 1)
+
+    def setUp(self):
+        patcher = mock.patch.object(tacotron2_model.Prenet, "forward", prenet_without_dropout)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        torch.set_grad_enabled(False)
+        self.addCleanup(torch.set_grad_enabled, True)
+
+        # 隨機權重下停止閘多半一步就停或跑到上限；挑一組讓各筆在不同步數停下、且有一筆跑到上限的種子
+        for seed in range(200):
+            torch.manual_seed(seed)
+            self.model = tacotron2_model.Tacotron2(SimpleNamespace(**TACOTRON2_HPARAMS)).double().eval()
+            gate = self.model.decoder.gate_layer.linear_layer
+            gate.weight.mul_(8)
+            gate.bias.fill_(-1.0)
+            self.sequences = [torch.randint(1, TACOTRON2_HPARAMS["n_symbols"], (n,)) for n in self.LENGTHS]
+            self.single = [self.model.inference(seq[None]) for seq in self.sequences]
+            lengths = {out[1].size(2) for out in self.single}
+            if len(lengths) >= 3 and TACOTRON2_HPARAMS["max_decoder_steps"] in lengths:
+                break
+        else:
+            self.skipTest("找不到停止步數不一的隨機種子")
+
+    def run_batch(self, order):
+        sequences = [self.sequences[i] for i in order]
+        lengths = torch.tensor([len(seq) for seq in sequences])
+        inputs = torch.zeros(len(sequences), int(lengths.max()), dtype=torch.long)
+        for row, seq in enumerate(sequences):
+            inputs[row, :len(seq)] = seq
+        return self.model.inference_batch(inputs, lengths)
+
+    def test_matches_per_item_inference(self):
+        batch = self.run_batch(range(len(self.sequences)))
+        self.assertEqual(len(batch), len(self.sequences))
+        for seq, single, batched in zip(self.sequences, self.single, batch):
+            mel, mel_postnet, gate, alignment = batched
+            self.assertEqual(mel_postnet.shape, single[1].shape)
+            self.assertEqual(gate.shape, single[2].shape)
+            self.assertEqual(alignment.shape, (1, single[1].size(2), len(seq)))
+            for got, expected in zip(batched, single):
+                torch.testing.assert_close(got, expected, rtol=0, atol=1e-9)
+
+    def test_ragged_lengths_any_order(self):
+        order = [4, 2, 0, 3, 1]
+        batch = self.run_batch(order)
+        mel_lengths = [out[1].size(2) for out in batch]
+        self.assertEqual(mel_lengths, [self.single[i][1].size(2) for i in order])
+        self.assertGreater(len(set(mel_lengths)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成背壓與快取測試（模擬已滿的合成子行程池，不需模型）
+- 池滿時，整句快取 / 段落快取已命中的文字照常回應，不回 503
+- 池滿且有未命中的內容時才回 503
+- 快取鍵的合成參數取自 han2tts（子行程池模式也與實際合成一致）
+
+執行: python -m unittest test_tts_backpressure -v
+"""
+
+import base64
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+from starlette.testclient import TestClient
+
+import integrated_voice_chat_api as gateway
+import integrated_voice_chat_asgi as asgi_gateway
+import audio_utils
+from synthesis_cache import SynthesisCache
+
+CACHED_TEXT = "li2 ho2"
+CACHED_STREAM = "li2 ho2, tsiah8 pa2 bue7?"
+
+
+class SaturatedPool:
+    sample_rate = 22050
+
+    def __init__(self):
+        self.calls = 0
+
+    def is_saturated(self):
+        return True
+
+    def synthesize(self, text):
+        self.calls += 1
+        raise gateway.SynthesisQueueFull("pool full")
+
+
+class BackpressureTestBase:
+    """兩個版本共用的情境；子類別提供 tts(text) 與 tts_stream(text) → (狀態碼, 內容)"""
+
+    def setUp(self):
+        tts = gateway.tts_system
+        self._saved = (tts.pool, tts.cache, tts.segment_cache)
+        self.pool = tts.pool = SaturatedPool()
+        tts.cache = SynthesisCache(cache_dir=None)
+        tts.segment_cache = SynthesisCache(cache_dir=None)
+        self.wav = audio_utils.to_wav_bytes(np.zeros(4000, dtype=np.int16), tts.sample_rate)
+        tts.cache.put(tts.cache_key(CACHED_TEXT), self.wav)
+        for content, _ in tts.split_tlpa_segments(CACHED_STREAM):
+            if content:
+                tts.segment_cache.put(tts.segment_cache_key(content), np.ones(800, dtype=np.int16).tobytes())
+
+    def tearDown(self):
+        tts = gateway.tts_system
+        tts.pool, tts.cache, tts.segment_cache = self._saved
+
+    def test_cached_utterance_is_served_when_saturated(self):
+        status, body = self.tts(CACHED_TEXT)
+        self.assertEqual(status, 200)
+        self.assertEqual(base64.b64decode(body["audio"]), self.wav)
+        self.assertEqual(self.pool.calls, 0)
+
+    def test_miss_is_rejected_when_saturated(self):
+        status, _ = self.tts("gua2 m7 tsai1")
+        self.assertEqual(status, 503)
+        self.assertEqual(self.pool.calls, 0)
+
+    def test_cached_segments_stream_when_saturated(self):
+        status, text = self.tts_stream(CACHED_STREAM)
+        self.assertEqual(status, 200)
+        self.assertIn("event: done", text)
+        self.assertEqual(self.pool.calls, 0)
+
+    def test_segment_miss_is_rejected_when_saturated(self):
+        status, _ = self.tts_stream(CACHED_STREAM + " gua2 m7 tsai1.")
+        self.assertEqual(status, 503)
+
+
+class FlaskBackpressureTest(BackpressureTestBase, unittest.TestCase):
+    def tts(self, text):
+        response = gateway.app.test_client().post("/api/tts", json={"text": text})
+        return response.status_code, response.get_json()
+
+    def tts_stream(self, text):
+        response = gateway.app.test_client().post("/api/tts_stream", json={"text": text})
+        return response.status_code, response.get_data(as_text=True)
+
+
+class AsgiBackpressureTest(BackpressureTestBase, unittest.TestCase):
+    def tts(self, text):
+        with TestClient(asgi_gateway.app) as client:
+            response = client.post("/api/tts", json={"text": text})
+        return response.status_code, response.json()
+
+    def tts_stream(self, text):
+        with TestClient(asgi_gateway.app) as client:
+            response = client.post("/api/tts_stream", json={"text": text})
+        return response.status_code, response.text
+
+
+class CacheKeyParamsTest(unittest.TestCase):
+    def test_pool_mode_uses_han2tts_defaults(self):
+        import han2tts
+        tts = SimpleNamespace(synthesizer=None, sample_rate=22050)
+        params = type(gateway.tts_system).synthesis_params.fget(tts)
+        self.assertEqual(params, (han2tts.SIGMA, han2tts.DENOISER_STRENGTH, 22050))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+動態詞彙檢索索引測試（不需網路與金鑰）
+VocabularyIndex.search 的結果與原本逐詞掃描字典的做法一致：
+- 完全匹配優先度為詞長 × 10；移除標點後才匹配（2 字以上）為詞長 × 5
+- 同分依字典中的先後排序，取前 max_results 個
+
+執行: python -m unittest test_vocab_index -v
+"""
+
+import random
+import re
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "wadija_llm"))
+
+from rag_tools_v2 import VocabularyIndex, retrieve_dynamic_vocab  # noqa: E402
+
+VOCAB = {
+    "車": "車",
+    "醫生": "先生",
+    "看醫生": "看先生",
+    "計程車": "計程仔",
+    "今天": "今仔日",
+    "天氣": "天氣",
+    "好": "好",
+    "吃飯": "食飯",
+    "很好": "真好",
+    "飯後": "食飽",
+    "去": "去",
+}
+
+
+def linear_scan(user_input, vocab_dict, max_results=20, enable_fuzzy=True):
+    """原本的做法：逐詞掃描整本字典，穩定排序保留同分詞條的字典順序"""
+    matches = []
+    for key in vocab_dict:
+        if key in user_input:
+            matches.append((key, len(key) * 10))
+        elif enable_fuzzy and len(key) >= 2:
+            clean_input = re.sub(r'[，。！？、]', '', user_input)
+            if key in clean_input:
+                matches.append((key, len(key) * 5))
+    matches.sort(key=lambda item: item[1], reverse=True)
+    return matches[:max_results]
+
+
+class VocabularyIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = VocabularyIndex(VOCAB)
+
+    def test_exact_and_fuzzy_priorities(self):
+        # 「吃，飯」要去掉標點才成詞，「今天」「天氣」原文就有
+        results = dict(self.index.search("今天天氣很好，吃，飯"))
+        self.assertEqual(results["今天"], 20)
+        self.assertEqual(results["天氣"], 20)
+        self.assertEqual(results["很好"], 20)
+        self.assertEqual(results["好"], 10)
+        self.assertEqual(results["吃飯"], 10)
+
+    def test_fuzzy_ties_with_shorter_exact(self):
+        # 「很好」模糊 2 × 5 與「好」完全 1 × 10 同分，依字典順序「好」在前
+        self.assertEqual(self.index.search("很、好"), [("好", 10), ("很好", 10)])
+        self.assertEqual(self.index.search("很、好", enable_fuzzy=False), [("好", 10)])
+
+    def test_exact_match_not_downgraded_by_fuzzy(self):
+        results = self.index.search("看醫生。看醫、生")
+        self.assertEqual(dict(results)["看醫生"], 30)
+        self.assertEqual([key for key, _ in results].count("看醫生"), 1)
+
+    def test_ties_keep_dictionary_order(self):
+        results = self.index.search("今天天氣很好，吃飯後去看醫生坐計程車")
+        twenties = [key for key, priority in results if priority == 20]
+        self.assertEqual(twenties, ["醫生", "今天", "天氣", "吃飯", "很好", "飯後"])
+        self.assertEqual(self.index.search("吃飯後去看醫生", max_results=2), [("看醫生", 30), ("醫生", 20)])
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(0)
+        alphabet = list("車醫生看計程今天氣好吃飯很後去我，。！？、")
+        inputs = ["", "我要去看醫生", "今天，天氣。很好！", "吃、飯，飯、後"]
+        inputs += ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 16))) for _ in range(500)]
+        for text in inputs:
+            for max_results in (3, 20):
+                for fuzzy in (True, False):
+                    self.assertEqual(self.index.search(text, max_results, fuzzy),
+                                     linear_scan(text, VOCAB, max_results, fuzzy), (text, max_results, fuzzy))
+
+    def test_retrieve_dynamic_vocab_format(self):
+        output = retrieve_dynamic_vocab("我要去看醫生", {"vocabulary": VOCAB}, max_results=2)
+        self.assertEqual(output, "  • 看醫生 → **看先生**\n  • 醫生 → **先生**")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WaveGlow 批次推論測試（CPU、小尺寸隨機權重，不需模型檔）
+- infer_batch 修剪後的音訊長度同逐筆 infer，填補只影響尾端
+- 分桶後補到 n_group 的倍數，每筆等於自己補到同長度後逐筆 infer 的結果
+
+執行: python -m unittest test_waveglow_batch -v
+"""
+
+import os
+import sys
+import unittest
+
+import torch
+
+HSIEN1_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "taiwanese_tonal_tlpa_tacotron2_hsien1")
+sys.path.insert(0, HSIEN1_DIR)
+sys.path.insert(0, os.path.join(HSIEN1_DIR, "tacotron2"))
+
+from tacotron2.waveglow.glow import WaveGlow  # noqa: E402
+
+
+class WaveGlowBatchTest(unittest.TestCase):
+    N_MEL = 8
+    N_GROUP = 8
+    FRAMES = (5, 9, 8, 16, 3, 11)
+    # max_batch=3、bucket_ratio=1.25、min_frames=4 時的分桶：{3, 5} {8, 9} {11} {16}，
+    # 各桶補到最長者再進位到 n_group 的倍數
+    BUCKET_TARGETS = {3: 8, 5: 8, 8: 16, 9: 16, 11: 16, 16: 16}
+
+    def setUp(self):
+        torch.set_grad_enabled(False)
+        self.addCleanup(torch.set_grad_enabled, True)
+        torch.manual_seed(0)
+        self.waveglow = WaveGlow(self.N_MEL, n_flows=4, n_group=self.N_GROUP, n_early_every=2, n_early_size=2,
+                                 WN_config=dict(n_layers=2, n_channels=8, kernel_size=3)).eval()
+        # 訓練初始值把 WN 最後一層設為 0（輸出恆為 0），這裡改成隨機值才比得出差異
+        for wn in self.waveglow.WN:
+            wn.end.weight.normal_(0, 0.1)
+            wn.end.bias.normal_(0, 0.1)
+        self.hop = self.waveglow.upsample.stride[0]
+        self.mels = [torch.randn(self.N_MEL, n) for n in self.FRAMES]
+
+    def pad_to(self, mel, target):
+        """與 infer_batch 相同的填補：重複最後一個 frame"""
+        return torch.cat([mel, mel[:, -1:].repeat(1, target - mel.size(1))], dim=1)
+
+    def test_trimmed_length_matches_infer(self):
+        audios = self.waveglow.infer_batch(self.mels, sigma=0.0, max_batch=3)
+        for mel, audio in zip(self.mels, audios):
+            single = self.waveglow.infer(mel[None], sigma=0.0)[0]
+            self.assertEqual(audio.shape, single.shape)
+            self.assertEqual(len(audio), mel.size(1) * self.hop)
+            # 填補只影響最後幾個 hop（upsample 的重疊區）
+            tail = self.waveglow.upsample.kernel_size[0]
+            torch.testing.assert_close(audio[:-tail], single[:-tail], rtol=0, atol=1e-5)
+
+    def test_bucket_padding_to_n_group(self):
+        shapes = []
+
+        def postprocess(audio):
+            shapes.append(tuple(audio.shape))
+            return audio
+
+        audios = self.waveglow.infer_batch(self.mels, sigma=0.0, max_batch=3, postprocess=postprocess)
+        self.assertEqual(sorted(shapes), sorted([(2, 8 * self.hop), (2, 16 * self.hop),
+                                                 (1, 16 * self.hop), (1, 16 * self.hop)]))
+
+        # 每筆都等於「自己補到所在桶的長度後逐筆 infer，再修剪」
+        for mel, audio in zip(self.mels, audios):
+            padded = self.pad_to(mel, self.BUCKET_TARGETS[mel.size(1)])
+            expected = self.waveglow.infer(padded[None], sigma=0.0)[0][:mel.size(1) * self.hop]
+            torch.testing.assert_close(audio, expected, rtol=0, atol=1e-5)
+
+    def test_short_mel_uses_min_frames(self):
+        widths = []
+        mel = torch.randn(self.N_MEL, 2)
+        audio, = self.waveglow.infer_batch([mel], sigma=0.0, min_frames=4,
+                                           postprocess=lambda a: widths.append(a.size(1)) or a)
+        self.assertEqual(len(audio), 2 * self.hop)
+        self.assertEqual(widths, [self.N_GROUP * self.hop])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
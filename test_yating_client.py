@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Yating 用戶端與即時串流辨識測試（本機模擬服務，不需網路與金鑰）
+以本機 HTTP 伺服器模擬 token 申請、本機 WebSocket 伺服器模擬 Yating 串流辨識：
+- token 快取、到期與被拒時換新
+- 錄音全速上傳（10 秒音檔不必花 10 秒）
+- ASGI 閘道 /api/stt_stream：音框即時轉送，說完後很快收到定稿
+
+執行: python -m unittest test_yating_client -v
+"""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import websockets
+from starlette.testclient import TestClient
+
+import integrated_voice_chat_api as gateway
+import integrated_voice_chat_asgi as asgi_gateway
+from yating_client import YatingClient, parse_message
+
+SECOND = b"\0\0" * 16000  # 1 秒 16k/mono/16-bit
+
+
+class StubYating:
+    """本機模擬 Yating：token 依序發放 tok-1, tok-2...；每收到一個音框回一筆部分結果，EOS 後回定稿"""
+
+    def __init__(self, expires_in=None):
+        self.expires_in = expires_in
+        self.issued = 0
+        self.rejected = set()
+        self.connections = 0
+        self.received_bytes = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                stub.issued += 1
+                body = {"success": True, "auth_token": f"tok-{stub.issued}"}
+                if stub.expires_in is not None:
+                    body["expires_in"] = stub.expires_in
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.token_url = f"http://127.0.0.1:{self.http.server_address[1]}/v1/token"
+
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.ws_server = asyncio.run_coroutine_threadsafe(self._serve(), self.loop).result()
+        self.ws_url = f"ws://127.0.0.1:{self.ws_server.sockets[0].getsockname()[1]}/ws/v1/"
+
+    async def _serve(self):
+        return await websockets.serve(self._handler, "127.0.0.1", 0, process_request=self._check_token)
+
+    def _check_token(self, connection, request):
+        token = request.path.split("token=")[-1]
+        if token in self.rejected:
+            return connection.respond(401, "token expired\n")
+        return None
+
+    async def _handler(self, ws):
+        self.connections += 1
+        frames = 0
+        try:
+            async for message in ws:
+                if message == b"":
+                    await ws.send(json.dumps({"pipe": {"asr_sentence": "汝好", "asr_final": True}}))
+                    break
+                frames += 1
+                self.received_bytes += len(message)
+                await ws.send(json.dumps({"pipe": {"asr_sentence": f"部分{frames}", "asr_final": False}}))
+            await ws.wait_closed()
+        except websockets.ConnectionClosed:
+            pass
+
+    def client(self, **kwargs):
+        return YatingClient("stub-key", token_url=self.token_url, ws_url=self.ws_url, **kwargs)
+
+    def close(self):
+        self.http.shutdown()
+        self.ws_server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class YatingClientTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubYating()
+
+    def tearDown(self):
+        self.stub.close()
+
+    def test_parse_message(self):
+        self.assertEqual(parse_message('{"pipe": {"asr_sentence": "汝好 ", "asr_final": true}}'), ("汝好", True))
+        self.assertEqual(parse_message('{"pipe": {"asr_sentence": "汝", "asr_final": false}}'), ("汝", False))
+        self.assertIsNone(parse_message('{"pipe": {"asr_state": "utterance_begin"}}'))
+        self.assertIsNone(parse_message(b"\0"))
+
+    def test_token_is_cached(self):
+        client = self.stub.client()
+        self.assertEqual(client.recognize(SECOND), "汝好")
+        self.assertEqual(client.recognize(SECOND), "汝好")
+        self.assertEqual(self.stub.issued, 1)
+        self.assertEqual(self.stub.connections, 2)
+        self.assertEqual(client.stats()["token_hits"], 1)
+
+    def test_short_expiry_fetches_new_token(self):
+        self.stub.expires_in = 1  # 比換新餘裕還短，每次都視為到期
+        client = self.stub.client()
+        client.recognize(SECOND)
+        client.recognize(SECOND)
+        self.assertEqual(self.stub.issued, 2)
+
+    def test_rejected_token_is_replaced(self):
+        client = self.stub.client()
+        client.recognize(SECOND)
+        self.stub.rejected.add("tok-1")
+        self.assertEqual(client.recognize(SECOND), "汝好")
+        self.assertEqual(self.stub.issued, 2)
+
+    def test_upload_is_not_paced(self):
+        client = self.stub.client()
+        start = time.time()
+        self.assertEqual(client.recognize(SECOND * 10), "汝好")
+        self.assertLess(time.time() - start, 2.0)
+        self.assertEqual(self.stub.received_bytes, len(SECOND) * 10)
+
+    def test_cancel_returns_empty(self):
+        client = self.stub.client()
+        cancel = threading.Event()
+        cancel.set()
+        self.assertEqual(client.recognize(SECOND, cancel=cancel), "")
+
+    def test_async_client_shares_token_cache(self):
+        client = self.stub.client()
+
+        async def run():
+            async with httpx.AsyncClient() as http:
+                first = await client.arecognize(SECOND * 10, http)
+                self.stub.rejected.add("tok-1")
+                second = await client.arecognize(SECOND, http)
+                return first, second
+
+        start = time.time()
+        self.assertEqual(asyncio.run(run()), ("汝好", "汝好"))
+        self.assertLess(time.time() - start, 2.0)
+        self.assertEqual(self.stub.issued, 2)
+
+    def test_concurrent_async_refresh_fetches_once(self):
+        client = self.stub.client()
+
+        async def run():
+            async with httpx.AsyncClient() as http:
+                await client.tokens.aget(http)
+                client.tokens.invalidate()  # 模擬到期
+                return await asyncio.gather(*(client.tokens.aget(http) for _ in range(10)))
+
+        self.assertEqual(asyncio.run(run()), ["tok-2"] * 10)
+        self.assertEqual(self.stub.issued, 2)
+        # 換了事件迴圈也能再用（鎖跟著迴圈換新）
+        client.tokens.invalidate()
+        self.assertEqual(asyncio.run(run()), ["tok-4"] * 10)
+
+    def test_concurrent_rejections_replace_token_once(self):
+        client = self.stub.client()
+
+        async def run():
+            async with httpx.AsyncClient() as http:
+                await client.arecognize(SECOND, http)
+                self.stub.rejected.add("tok-1")
+                return await asyncio.gather(*(client.arecognize(SECOND, http) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ["汝好"] * 5)
+        self.assertEqual(self.stub.issued, 2)
+
+
+class SttStreamEndpointTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubYating()
+        self._saved = gateway.yating_client
+        gateway.yating_client = self.stub.client()
+
+    def tearDown(self):
+        gateway.yating_client = self._saved
+        self.stub.close()
+
+    def stream(self, frames, sample_rate=16000):
+        events = []
+        with TestClient(asgi_gateway.app) as client:
+            with client.websocket_connect(f"/api/stt_stream?sample_rate={sample_rate}") as ws:
+                for frame in frames:
+                    ws.send_bytes(frame)
+                    events.append(ws.receive_json())  # 每個音框都先收到部分結果：音訊是即時轉送的
+                ended = time.time()
+                ws.send_text("end")
+                while True:
+                    event = ws.receive_json()
+                    events.append(event)
+                    if event["event"] in ("done", "error"):
+                        break
+        return events, time.time() - ended
+
+    def test_frames_are_forwarded_live(self):
+        frame = SECOND[:3200]  # 0.1 秒
+        events, after_end = self.stream([frame] * 5)
+        self.assertEqual([e["event"] for e in events], ["partial"] * 5 + ["final", "done"])
+        self.assertEqual(events[4]["text"], "部分5")
+        self.assertEqual(events[-1]["transcript"], "汝好")
+        self.assertLess(after_end, 1.0)
+        self.assertEqual(self.stub.received_bytes, len(frame) * 5)
+
+    def test_resamples_to_16k(self):
+        events, _ = self.stream([b"\0\0" * 4800] * 2, sample_rate=48000)
+        self.assertEqual(events[-1]["event"], "done")
+        self.assertEqual(self.stub.received_bytes, 2 * 1600 * 2)
+
+    def test_missing_key_reports_error(self):
+        gateway.yating_client = YatingClient("")
+        with TestClient(asgi_gateway.app) as client:
+            with client.websocket_connect("/api/stt_stream") as ws:
+                self.assertEqual(ws.receive_json()["event"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,196 @@
+"""
+Wadi+ Conversation Memory
+台語長輩陪伴系統 - 對話滾動摘要
+
+主要功能：
+1. Token 預算 (Token Budget): 對話歷史超過預算時才觸發摘要
+2. 滾動摘要 (Rolling Summary): 較舊的對話交給 LLM 濃縮成簡短的「記憶筆記」，
+   與先前的摘要合併；最近幾則對話保留原文
+3. 非同步 (Async): 摘要在背景執行緒進行，不拖慢當下這一輪的回應
+4. 快取友善 (Cache Friendly): 摘要放在 System Prompt 之後，內容只在摘要更新時改變
+
+作者: Wadi+ Team
+更新日期: 2025-12-01
+"""
+
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from session_store import estimate_message_tokens
+
+# ============================================================================
+# 摘要提示詞 (Summary Prompt)
+# ============================================================================
+
+SUMMARY_INSTRUCTIONS = """你負責整理長輩與子女的聊天記錄，寫成給子女看的「記憶筆記」。
+- 用繁體中文條列，最多 8 點，每點一句
+- 保留長輩提到的人、事、時間、身體狀況、情緒與約定 (例如要回診、孫子要回來)
+- 與舊筆記合併，重複或已過時的內容刪除
+- 不要寫寒暄與客套話，不要加入對話中沒有的內容"""
+
+SUMMARY_HEADER = "## 先前對話摘要 (記憶筆記)"
+
+
+def with_summary(messages: List[Dict[str, str]], summary: Optional[str]) -> List[Dict[str, str]]:
+    """
+    送給 API 的訊息：在 System Prompt 之後插入摘要 (不修改對話歷史)
+
+    Args:
+        messages: 對話歷史 (第一則為 System Prompt)
+        summary: 目前的記憶筆記 (None 或空字串則不插入)
+    """
+    if not summary:
+        return list(messages)
+    note = {"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"}
+    start = 1 if messages and messages[0].get("role") == "system" else 0
+    return messages[:start] + [note] + messages[start:]
+
+# ============================================================================
+# 滾動摘要 (Rolling Summarizer)
+# ============================================================================
+
+
+class ConversationSummarizer:
+    """
+    對話歷史超過 Token 預算時，在背景把較舊的對話濃縮進 session["summary"]
+
+    會話格式與 SessionStore 相同：{"messages": [...], "summary": str (選用)}。
+    每個會話同時最多一個摘要工作；摘要完成後只移除「已被摘要」的那幾則訊息，
+    期間新增的對話不受影響。
+
+    Example:
+        >>> summarizer = ConversationSummarizer(client, trigger_tokens=1500)
+        >>> summarizer.maybe_summarize(session)   # 每輪對話結束時呼叫，立即返回
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str = "gpt-4o-mini",
+        trigger_tokens: int = 1500,
+        trigger_messages: int = 14,
+        keep_messages: int = 6,
+        max_summary_tokens: int = 300,
+        max_workers: int = 2
+    ):
+        """
+        Args:
+            client: OpenAI client
+            model: 摘要使用的模型 (不必是對話用的微調模型)
+            trigger_tokens: 對話歷史 (不含 System Prompt) 超過多少 Token 時觸發摘要
+            trigger_messages: 對話歷史達到多少則時也觸發摘要 (應小於會話的歷史則數上限，
+                              避免舊對話先被裁切掉)
+            keep_messages: 保留原文的最近訊息則數
+            max_summary_tokens: 摘要長度上限
+            max_workers: 同時進行的摘要工作數
+        """
+        self.client = client
+        self.model = model
+        self.trigger_tokens = trigger_tokens
+        self.trigger_messages = trigger_messages
+        self.keep_messages = max(2, keep_messages)
+        self.max_summary_tokens = max_summary_tokens
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._completed = 0
+        self._failed = 0
+        self._summarized_messages = 0
+
+    def maybe_summarize(self, session: Dict[str, Any], on_done=None, lock=None) -> bool:
+        """
+        檢查 Token 預算，需要時送出背景摘要工作 (立即返回)
+
+        Args:
+            session: 會話 dict
+            on_done: 摘要套用後呼叫 (例如寫回 SQLite)
+            lock: 與裁切歷史共用的鎖 (例如 SessionStore.lock)；套用摘要時持有，
+                  避免與 commit 的裁切同時修改歷史
+
+        Returns:
+            bool: 是否送出了摘要工作
+        """
+        messages = session["messages"]
+        start = 1 if messages and messages[0].get("role") == "system" else 0
+        history = messages[start:]
+        if len(history) <= self.keep_messages:
+            return False
+        if (len(history) < self.trigger_messages and
+                estimate_message_tokens(history) <= self.trigger_tokens):
+            return False
+
+        # 保留的最近對話以使用者訊息開頭
+        cut = len(history) - self.keep_messages
+        while cut > 0 and history[cut].get("role") == "assistant":
+            cut -= 1
+        older = history[:cut]
+        if not older:
+            return False
+
+        key = id(session)
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        self._executor.submit(self._run, session, older, on_done, lock)
+        return True
+
+    def _run(self, session: Dict[str, Any], older: List[Dict[str, str]], on_done, lock=None):
+        try:
+            summary = self.summarize(session.get("summary"), older)
+            if not summary:
+                return
+            # 先換上摘要再移除舊對話：同時組 Prompt 的請求不會兩邊都看不到。
+            # 依物件身分移除 (內容相同的新對話如「好」、「嗯」不受影響)，已被裁切掉的訊息自然略過
+            with lock if lock is not None else nullcontext():
+                session["summary"] = summary
+                summarized = {id(m) for m in older}
+                messages = session["messages"]
+                messages[:] = [m for m in messages if id(m) not in summarized]
+            with self._lock:
+                self._completed += 1
+                self._summarized_messages += len(older)
+            print(f"[Memory] ✓ 對話摘要更新: 濃縮 {len(older)} 則訊息 ({len(summary)} 字)")
+            if on_done is not None:
+                on_done()
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            print(f"[Memory] ✗ 對話摘要失敗 (保留原本歷史): {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(id(session))
+
+    def summarize(self, previous: Optional[str], messages: List[Dict[str, str]]) -> str:
+        """把舊筆記與一段對話合併成新的記憶筆記 (同步呼叫 LLM)"""
+        speaker = {"user": "長輩", "assistant": "子女"}
+        transcript = "\n".join(
+            f"{speaker.get(m.get('role'), m.get('role'))}: {m.get('content', '')}"
+            for m in messages if m.get("role") in speaker
+        )
+        content = f"舊筆記:\n{previous or '(無)'}\n\n新的對話:\n{transcript}"
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                {"role": "user", "content": content},
+            ],
+            temperature=0.3,
+            max_tokens=self.max_summary_tokens
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model,
+                "trigger_tokens": self.trigger_tokens,
+                "trigger_messages": self.trigger_messages,
+                "keep_messages": self.keep_messages,
+                "pending": len(self._pending),
+                "completed": self._completed,
+                "failed": self._failed,
+                "summarized_messages": self._summarized_messages,
+            }
@@ -14,11 +14,15 @@ Wadi+ Main Application
 
 import os
 import sys
+import threading
 from openai import OpenAI
 from dotenv import load_dotenv
 
 # 匯入 RAG 工具模組
-from rag_tools_v2 import load_elder_profile, build_system_prompt
+from rag_tools_v2 import (load_elder_profile, build_system_prompt, with_dynamic_vocab,
+                          reload_changed_dictionaries)
+from conversation_memory import ConversationSummarizer, with_summary
+from session_store import trim_history
 
 # ============================================================================
 # 初始設定 (Initialization)
@@ -35,6 +39,11 @@ DEFAULT_TEMPERATURE = 0.8      # 人性化程度 (0-2)
 DEFAULT_MAX_TOKENS = 50       # 單次回應長度限制
 DEFAULT_PRESENCE_PENALTY = 0.4  # 鼓勵多樣性 
 
+# 記憶管理
+MAX_HISTORY_LENGTH = 20         # 保留最近 20 則對話 (含 System Prompt)
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")  # 滾動摘要使用的模型
+SUMMARY_TRIGGER_TOKENS = 1500   # 對話歷史超過此 Token 數時，背景濃縮較舊的對話
+
 # ============================================================================
 # 主程式邏輯 (Main Logic)
 # ============================================================================
@@ -75,13 +84,21 @@ def main():
     # RAG 步驟 B: 增強提示詞 (Augment)
     # ========================================================================
     
-    # 初始化時不傳入 user_input，使用基礎 Prompt
+    # 初始化時不傳入 user_input：靜態 Prompt 依內容雜湊快取，整段對話維持逐字相同 (可命中 Prompt Caching)
     system_prompt_with_rag = build_system_prompt(profile_data)
     
-    # 建立對話歷史 (Memory)
+    # 建立對話歷史 (Memory)：較舊的對話由背景摘要濃縮進 session["summary"]
     messages = [
         {"role": "system", "content": system_prompt_with_rag}
     ]
+    session = {"messages": messages}
+    history_lock = threading.Lock()  # 背景摘要套用時與本迴圈的新增、裁切互斥
+    summarizer = ConversationSummarizer(
+        client,
+        model=SUMMARY_MODEL,
+        trigger_tokens=SUMMARY_TRIGGER_TOKENS,
+        trigger_messages=MAX_HISTORY_LENGTH - 6
+    )
     
     print("\n[系統] RAG 初始化完成，開始對話\n")
 
@@ -109,18 +126,20 @@ def main():
             conversation_count += 1
             
             # 加入使用者訊息到歷史
-            messages.append({"role": "user", "content": user_input})
+            with history_lock:
+                messages.append({"role": "user", "content": user_input})
+            
+            # 字典檔有修改時熱更新 (只比對 mtime，未修改時幾乎無成本)
+            if reload_changed_dictionaries():
+                messages[0] = {"role": "system", "content": build_system_prompt(profile_data)}
             
-            # ★ 動態更新 System Prompt (根據當前對話內容)
-            if conversation_count % 5 == 1:  # 每 5 輪重新檢索一次
-                print("[RAG] 動態更新知識庫...")
-                updated_prompt = build_system_prompt(profile_data, user_input)
-                messages[0] = {"role": "system", "content": updated_prompt}
+            # ★ 每輪動態檢索：只重算即時詞彙，附在本輪訊息前，System Prompt 不變
+            request_messages = with_dynamic_vocab(with_summary(messages, session.get("summary")), user_input)
 
             # 呼叫 OpenAI API
             response = client.chat.completions.create(
                 model=FINE_TUNED_MODEL,
-                messages=messages,
+                messages=request_messages,
                 temperature=DEFAULT_TEMPERATURE,
                 max_tokens=DEFAULT_MAX_TOKENS,
                 presence_penalty=DEFAULT_PRESENCE_PENALTY
@@ -136,13 +155,15 @@ def main():
             print(f"[Debug] Tokens: {tokens_used}")
 
             # 加入 AI 回應到歷史紀錄
-            messages.append({"role": "assistant", "content": ai_reply})
+            with history_lock:
+                messages.append({"role": "assistant", "content": ai_reply})
             
-            # 記憶體管理：限制對話歷史長度 (避免 Token 超限)
-            MAX_HISTORY_LENGTH = 20  # 保留最近 20 輪對話
-            if len(messages) > MAX_HISTORY_LENGTH:
-                # 保留 System Prompt + 最近的對話
-                messages = [messages[0]] + messages[-(MAX_HISTORY_LENGTH-1):]
+            # 記憶體管理：超過 Token 預算時背景摘要舊對話 (不阻塞下一輪輸入)，
+            # 則數上限作為保險，就地裁切以免與摘要工作持有的列表脫鉤
+            summarizer.maybe_summarize(session, lock=history_lock)
+            with history_lock:
+                trimmed = trim_history(messages, MAX_HISTORY_LENGTH)
+            if trimmed:
                 print("[系統] 已清理舊對話記錄")
 
         except KeyboardInterrupt:
@@ -12,10 +12,12 @@ Wadi+ RAG Tools v2.0
 更新日期: 2025-12-01
 """
 
+import hashlib
+import heapq
 import json
 import os
 import re
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Tuple
 
 # ============================================================================
 # 路徑設定 (Path Configuration)
@@ -38,6 +40,15 @@ _DICT_CACHE: Dict[str, Optional[Dict[str, Any]]] = {
     "common_words": None
 }
 
+# 詞彙子字串索引：與 _DICT_CACHE 同鍵，載入含 "vocabulary" 的字典時一併建立
+_VOCAB_INDEX: Dict[str, "VocabularyIndex"] = {}
+
+# 字典檔內容雜湊 (SHA-256)：與 _DICT_CACHE 同鍵，作為 System Prompt 快取鍵的一部分
+_DICT_DIGEST: Dict[str, str] = {}
+
+# 字典檔來源：{快取鍵: (路徑, (mtime_ns, size))}，供 reload_changed_dictionaries 比對
+_DICT_SOURCE: Dict[str, Tuple[str, Optional[Tuple[int, int]]]] = {}
+
 # ============================================================================
 # 資料載入函式 (Data Loading Functions)
 # ============================================================================
@@ -72,19 +83,11 @@ def load_json_with_cache(key: str, filename: str) -> Dict[str, Any]:
 
     # 快取未命中 (Cache Miss) - 讀取檔案
     try:
-        # 優先從 dictionaries/ 資料夾讀取
-        path = os.path.join(DICT_DIR, filename)
-        
-        # 向下相容：如果找不到，嘗試從根目錄讀取
-        if not os.path.exists(path):
-            path = os.path.join(BASE_DIR, filename)
-            
+        path = resolve_dict_path(filename)
         if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                _DICT_CACHE[key] = data
-                print(f"[RAG] ✓ 已載入字典: {filename} ({len(str(data))} bytes)")
-                return data
+            data = _read_dictionary(key, path)
+            print(f"[RAG] ✓ 已載入字典: {filename} ({len(str(data))} bytes)")
+            return data
         else:
             print(f"[RAG] ✗ Warning: 找不到字典檔 {filename}")
             print(f"[RAG]   預期路徑: {path}")
@@ -99,6 +102,71 @@ def load_json_with_cache(key: str, filename: str) -> Dict[str, Any]:
         print(f"[RAG]   詳細訊息: {e}")
         return {}
 
+def resolve_dict_path(filename: str) -> str:
+    """字典檔路徑：優先 dictionaries/ 資料夾，找不到時向下相容讀根目錄"""
+    path = os.path.join(DICT_DIR, filename)
+    if not os.path.exists(path):
+        path = os.path.join(BASE_DIR, filename)
+    return path
+
+def _file_state(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+def _read_dictionary(key: str, path: str) -> Dict[str, Any]:
+    """
+    讀檔、建索引，全部完成後才換進快取 (解析失敗時丟出例外，舊快取不受影響)
+    
+    換入順序為 索引 → 資料 → 雜湊：讀到新雜湊的執行緒一定也讀得到新資料，
+    靜態 Prompt 快取不會把舊內容記在新雜湊底下。
+    """
+    state = _file_state(path)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw.decode('utf-8'))
+    vocab = data.get("vocabulary") if isinstance(data, dict) else None
+    if isinstance(vocab, dict) and vocab:
+        _VOCAB_INDEX[key] = VocabularyIndex(vocab)
+    else:
+        _VOCAB_INDEX.pop(key, None)
+    _DICT_CACHE[key] = data
+    _DICT_DIGEST[key] = hashlib.sha256(raw).hexdigest()
+    _DICT_SOURCE[key] = (path, state)
+    return data
+
+def dictionary_files() -> Dict[str, str]:
+    """已載入字典的 {快取鍵: 路徑} (供檔案監看登記)"""
+    return {key: path for key, (path, _) in _DICT_SOURCE.items()}
+
+def reload_changed_dictionaries() -> List[str]:
+    """
+    重新讀取 mtime 或大小有變動的字典 (熱更新，不需重啟)
+    
+    新資料與索引在旁邊建好才換上，對話中的請求繼續使用舊資料；
+    System Prompt 快取以內容雜湊為鍵，字典一變自然改用新的 Prompt。
+    
+    Returns:
+        List[str]: 已重新載入的快取鍵
+    """
+    reloaded = []
+    for key, (path, state) in list(_DICT_SOURCE.items()):
+        if _file_state(path) == state:
+            continue
+        try:
+            _read_dictionary(key, path)
+        except (OSError, ValueError) as e:
+            # 檔案寫到一半或格式錯誤：保留舊資料，記下新狀態避免每次都重試
+            _DICT_SOURCE[key] = (path, _file_state(path))
+            print(f"[RAG] ✗ Error: 重新載入 {os.path.basename(path)} 失敗，沿用舊資料")
+            print(f"[RAG]   詳細訊息: {e}")
+            continue
+        reloaded.append(key)
+        print(f"[RAG] ✓ 已重新載入字典: {os.path.basename(path)}")
+    return reloaded
+
 def load_elder_profile(filename: str = "profile_db.json") -> Optional[Dict[str, Any]]:
     """
     讀取長輩個資 (Profile Database)
@@ -179,6 +247,100 @@ def determine_accent(location: Optional[str]) -> str:
     # 預設：通行混合腔 (台南、高雄等優勢腔)
     return "mixed"
 
+# ============================================================================
+# 詞彙索引 (Vocabulary Index)
+# ============================================================================
+
+# 模糊匹配前移除的標點
+_FUZZY_PUNCT_RE = re.compile(r'[，。！？、]')
+_TRIE_END = ""  # 節點中標記詞尾的鍵（一般鍵都是單一字元，不會衝突）
+
+
+class VocabularyIndex:
+    """
+    華語詞彙的字元 Trie 索引
+    
+    建立一次之後，查詢只需從輸入的每個位置往下走 Trie，
+    時間與「輸入長度 × 最長詞長」成正比，與字典大小無關，
+    詞庫擴充到數萬詞 (700 詞 PDF、常用詞 PDF 與更大的辭典) 也不會變慢。
+    
+    Example:
+        >>> index = VocabularyIndex({"醫生": "先生", "看醫生": "看先生"})
+        >>> index.find_all("我要去看醫生")
+        {'醫生', '看醫生'}
+    """
+
+    def __init__(self, vocab_dict: Dict[str, str]):
+        self.source = vocab_dict
+        self.size = len(vocab_dict)
+        self.max_key_len = 0
+        # 詞條在原字典中的順序 (同分時維持原本的先後)
+        self.order: Dict[str, int] = {}
+        self._root: Dict[str, Any] = {}
+        for order, key in enumerate(vocab_dict):
+            if not key:
+                continue
+            node = self._root
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[_TRIE_END] = key
+            self.order[key] = order
+            self.max_key_len = max(self.max_key_len, len(key))
+
+    def is_current(self, vocab_dict: Dict[str, str]) -> bool:
+        """索引是否仍對應這份字典 (同一物件且詞數未變)"""
+        return self.source is vocab_dict and self.size == len(vocab_dict)
+
+    def find_all(self, text: str) -> Set[str]:
+        """找出所有出現在 text 中的詞條 (允許重疊)"""
+        found: Set[str] = set()
+        root = self._root
+        for start in range(len(text)):
+            node = root.get(text[start])
+            pos = start + 1
+            while node is not None:
+                key = node.get(_TRIE_END)
+                if key is not None:
+                    found.add(key)
+                if pos >= len(text):
+                    break
+                node = node.get(text[pos])
+                pos += 1
+        return found
+
+    def search(self, user_input: str, max_results: int = 20,
+               enable_fuzzy: bool = True) -> List[Tuple[str, int]]:
+        """
+        回傳依優先度排序的前 max_results 個 (詞條, 優先度)
+        
+        優先度與原本逐詞掃描相同：
+        - 完全匹配: 詞長 × 10
+        - 移除標點後才匹配 (2 字以上): 詞長 × 5
+        """
+        exact = self.find_all(user_input)
+        scored = [(key, len(key) * 10) for key in exact]
+        if enable_fuzzy:
+            clean_input = _FUZZY_PUNCT_RE.sub('', user_input)
+            if clean_input != user_input:
+                scored.extend(
+                    (key, len(key) * 5)
+                    for key in self.find_all(clean_input)
+                    if len(key) >= 2 and key not in exact
+                )
+        return heapq.nsmallest(max_results, scored,
+                               key=lambda item: (-item[1], self.order[item[0]]))
+
+
+def get_vocab_index(vocab_dict: Dict[str, str]) -> "VocabularyIndex":
+    """
+    取得字典對應的索引：已由 load_json_with_cache 建好的直接沿用，
+    其他字典 (例如測試或外部傳入) 則臨時建立
+    """
+    for index in _VOCAB_INDEX.values():
+        if index.is_current(vocab_dict):
+            return index
+    return VocabularyIndex(vocab_dict)
+
 # ============================================================================
 # 動態檢索 (Dynamic Retrieval) - 核心優化
 # ============================================================================
@@ -205,8 +367,8 @@ def retrieve_dynamic_vocab(
         str: 格式化的詞彙清單 (Markdown 格式)
     
     Performance:
-        - 時間複雜度: O(n)，n 為字典大小
-        - 實測效能: ~2-5ms (3000 詞以內)
+        - 時間複雜度: O(m × L)，m 為輸入長度、L 為最長詞長 (與字典大小無關)
+        - 索引於 load_json_with_cache 載入字典時建立一次
         - Token 節省: 平均減少 60-80% (相比於直接塞入整本字典)
     
     Example:
@@ -220,30 +382,12 @@ def retrieve_dynamic_vocab(
     if not vocab_dict:
         return ""
     
-    relevant_matches: List[tuple] = []  # (mandarin, taiwanese, priority)
-    
-    # 掃描字典 (Python 字串比對極快，3000 詞以內都是毫秒級)
-    for mandarin_key, taiwanese_val in vocab_dict.items():
-        priority = 0
-        
-        # 完全匹配 (最高優先)
-        if mandarin_key in user_input:
-            priority = len(mandarin_key) * 10  # 較長的詞優先 (如「計程車」優於「車」)
-            relevant_matches.append((mandarin_key, taiwanese_val, priority))
-        
-        # 模糊匹配 (選用) - 用於處理變形詞
-        elif enable_fuzzy and len(mandarin_key) >= 2:
-            # 移除標點符號後再比對
-            clean_input = re.sub(r'[，。！？、]', '', user_input)
-            if mandarin_key in clean_input:
-                priority = len(mandarin_key) * 5  # 優先度較低
-                relevant_matches.append((mandarin_key, taiwanese_val, priority))
-    
-    # 按優先度排序 (較重要的詞排在前面)
-    relevant_matches.sort(key=lambda x: x[2], reverse=True)
-    
-    # 限制數量，避免 Prompt 塞爆
-    relevant_matches = relevant_matches[:max_results]
+    # 以預建的 Trie 索引查詢，只走過輸入字串，不掃描整本字典
+    index = get_vocab_index(vocab_dict)
+    relevant_matches = [
+        (mandarin_key, vocab_dict[mandarin_key], priority)
+        for mandarin_key, priority in index.search(user_input, max_results, enable_fuzzy)
+    ]
     
     # 格式化輸出
     if relevant_matches:
@@ -259,6 +403,84 @@ def retrieve_dynamic_vocab(
 # Prompt 工程 (Prompt Engineering) - 主邏輯
 # ============================================================================
 
+# 靜態段落快取：{內容雜湊: Prompt}，個資與字典不變時直接沿用
+_STATIC_PROMPT_CACHE: Dict[str, str] = {}
+_STATIC_PROMPT_CACHE_MAX = 8
+
+# 個資缺漏時的基礎 Prompt
+FALLBACK_SYSTEM_PROMPT = "你是使用道地台語聊天的孝順子女。請使用台語漢字回應。"
+
+# 知識庫字典 (快取鍵, 檔名)
+KNOWLEDGE_FILES = [
+    ("common_rules", "common_rules.json"),
+    ("japanese_loan", "japanese_loan.json"),
+    ("accents", "accents.json"),
+    ("common_words", "common_words.json"),
+]
+
+
+def prompt_content_hash(profile_data: Dict[str, Any]) -> str:
+    """
+    System Prompt 靜態段落的內容雜湊
+    
+    由個資內容 (正規化 JSON) 與各字典檔的 SHA-256 組成；
+    任一項改變都會得到新的雜湊，舊的快取自然失效。
+    """
+    for key, filename in KNOWLEDGE_FILES:
+        load_json_with_cache(key, filename)
+    h = hashlib.sha256()
+    h.update(json.dumps(profile_data, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    for key, _ in KNOWLEDGE_FILES:
+        h.update(b"\0" + key.encode('utf-8') + b"=" + _DICT_DIGEST.get(key, "").encode('ascii'))
+    return h.hexdigest()
+
+
+def build_static_prompt(profile_data: Optional[Dict[str, Any]]) -> str:
+    """
+    System Prompt 的靜態部分 (只取決於個資與字典)，依內容雜湊快取
+    
+    每輪對話都回傳逐字相同的字串，可作為 OpenAI Prompt Caching 的穩定前綴；
+    與當前對話相關的詞彙請另外用 build_dynamic_section 產生並放在其後。
+    
+    Performance:
+        - Cache Hit: 只計算個資雜湊 (~0.05ms)
+        - Cache Miss: 組裝完整 Markdown (~1ms)
+    """
+    if not profile_data:
+        print("[RAG] ⚠ Warning: 個資為空，使用基礎 Prompt")
+        return FALLBACK_SYSTEM_PROMPT
+
+    digest = prompt_content_hash(profile_data)
+    cached = _STATIC_PROMPT_CACHE.get(digest)
+    if cached is not None:
+        return cached
+
+    prompt = _render_static_prompt(profile_data)
+    if len(_STATIC_PROMPT_CACHE) >= _STATIC_PROMPT_CACHE_MAX:
+        _STATIC_PROMPT_CACHE.pop(next(iter(_STATIC_PROMPT_CACHE)))
+    _STATIC_PROMPT_CACHE[digest] = prompt
+    print(f"[RAG] ✓ System Prompt 靜態段落已快取 (共 {len(prompt)} 字元, hash {digest[:12]})")
+    return prompt
+
+
+def build_dynamic_section(user_input: Optional[str], max_results: int = 20) -> str:
+    """
+    與當前對話相關的即時詞彙段落 (每輪重新計算，無相關詞彙時回傳空字串)
+    
+    Args:
+        user_input: 使用者輸入
+        max_results: 最多列出幾個詞彙
+    """
+    common_words = load_json_with_cache("common_words", "common_words.json")
+    dynamic_vocab_str = retrieve_dynamic_vocab(user_input, common_words, max_results=max_results)
+    if not dynamic_vocab_str:
+        print("[RAG] ℹ 動態檢索: 未找到相關詞彙 (使用通用規則)")
+        return ""
+    print(f"[RAG] ✓ 動態檢索: 找到 {len(dynamic_vocab_str.splitlines())} 個相關詞彙")
+    return f"""## 即時查詢詞彙 (針對目前對話)
+{dynamic_vocab_str}"""
+
+
 def build_system_prompt(
     profile_data: Optional[Dict[str, Any]], 
     user_input: Optional[str] = None
@@ -273,6 +495,9 @@ def build_system_prompt(
     4. 日語借詞 (Japanese Loanwords): 長輩習慣用語
     5. 動態詞彙 (Dynamic Vocab): 僅抓取與當前對話相關的詞
     
+    1-4 為靜態段落 (build_static_prompt，依內容雜湊快取)，
+    5 接在最後 (build_dynamic_section)，因此不同輪次的 Prompt 共用同一段前綴。
+    
     Args:
         profile_data: 長輩個資字典
         user_input: 使用者輸入 (用於動態檢索)
@@ -289,11 +514,40 @@ def build_system_prompt(
         - 動態詞彙: ~200-400 tokens (視對話內容而定)
         - 總計: ~1000-1200 tokens
     """
-    # Fallback: 如果個資讀取失敗，回傳基礎 Prompt
-    if not profile_data:
-        print("[RAG] ⚠ Warning: 個資為空，使用基礎 Prompt")
-        return "你是使用道地台語聊天的孝順子女。請使用台語漢字回應。"
+    static_prompt = build_static_prompt(profile_data)
+    if not profile_data or not user_input:
+        return static_prompt
+    dynamic_section = build_dynamic_section(user_input)
+    if not dynamic_section:
+        return static_prompt
+    return f"{static_prompt}\n\n---\n\n{dynamic_section}"
+
+
+def with_dynamic_vocab(
+    messages: List[Dict[str, str]],
+    user_input: Optional[str]
+) -> List[Dict[str, str]]:
+    """
+    送給 API 的訊息列表：在最後一則使用者訊息前插入本輪的即時詞彙 (system)
+    
+    對話歷史本身不被修改，System Prompt 與歷史維持逐字相同，
+    OpenAI Prompt Caching 可以命中到最後一則使用者訊息之前。
+    
+    Args:
+        messages: 對話歷史 (第一則為 build_static_prompt 的 System Prompt)
+        user_input: 本輪使用者輸入
+    """
+    dynamic_section = build_dynamic_section(user_input) if user_input else ""
+    if not dynamic_section:
+        return list(messages)
+    insert_at = len(messages)
+    if messages and messages[-1].get("role") == "user":
+        insert_at -= 1
+    return messages[:insert_at] + [{"role": "system", "content": dynamic_section}] + messages[insert_at:]
 
+
+def _render_static_prompt(profile_data: Dict[str, Any]) -> str:
+    """組裝靜態段落 (個資、通用規則、腔調、日語借詞)；動態詞彙另由 build_dynamic_section 產生"""
     # ========================================================================
     # 階段 1: 載入長輩個資 (Load Profile Data)
     # ========================================================================
@@ -311,7 +565,6 @@ def build_system_prompt(
     common_rules = load_json_with_cache("common_rules", "common_rules.json")
     japanese_loan = load_json_with_cache("japanese_loan", "japanese_loan.json")
     accents_data = load_json_with_cache("accents", "accents.json")
-    common_words = load_json_with_cache("common_words", "common_words.json")
 
     # ========================================================================
     # 階段 3: 腔調適配 (Accent Adaptation)
@@ -346,19 +599,6 @@ def build_system_prompt(
     accent_vocab = target_accent.get("vocab", {})
     accent_vocab_str = "\n".join([f"  • {k} → **{v}**" for k, v in accent_vocab.items()])
     
-    # D. ★ 動態檢索 (Dynamic Retrieval) - 核心優化 ★
-    dynamic_vocab_str = retrieve_dynamic_vocab(user_input, common_words, max_results=20)
-    dynamic_section = ""
-    if dynamic_vocab_str:
-        print(f"[RAG] ✓ 動態檢索: 找到 {len(dynamic_vocab_str.splitlines())} 個相關詞彙")
-        dynamic_section = f"""
-
-### 4. 即時查詢詞彙 (針對目前對話)
-{dynamic_vocab_str}
-"""
-    else:
-        print("[RAG] ℹ 動態檢索: 未找到相關詞彙 (使用通用規則)")
-    
     # ========================================================================
     # 階段 5: 組裝最終 System Prompt (Final Assembly)
     # ========================================================================
@@ -413,7 +653,6 @@ def build_system_prompt(
 
 ### 3. 在地腔調用詞 ({accent_name})
 {accent_vocab_str}
-{dynamic_section}
 
 ---
 
@@ -439,5 +678,4 @@ def build_system_prompt(
 **現在開始，請用道地的台語跟 {info.get('name')} 聊天吧！**
 """
     
-    print(f"[RAG] ✓ System Prompt 組裝完成 (共 {len(rag_prompt)} 字元)")
     return rag_prompt.strip()
\ No newline at end of file
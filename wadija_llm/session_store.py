@@ -0,0 +1,319 @@
+"""
+Wadi+ Session Store
+台語長輩陪伴系統 - 對話會話管理
+
+主要功能：
+1. 容量上限 (LRU): 會話數超過上限時，淘汰最久沒有互動的會話
+2. 閒置逾時 (Idle TTL): 超過指定時間沒有互動的會話自動清除
+3. 歷史上限 (History Cap): 依則數與 Token 預算裁切舊對話，每輪送出的 Token 有上限
+4. 持久化 (SQLite, 選用): 會話寫入 SQLite，服務重啟後可接續對話
+
+作者: Wadi+ Team
+更新日期: 2025-12-01
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# 選用：精確的 Token 計算 (未安裝時以字元數估算)
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+# ============================================================================
+# Token 估算 (Token Estimation)
+# ============================================================================
+
+# 中日韓文字：約 1 字 1 token
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿豈-﫿\U00020000-\U0003ffff]')
+# 每則訊息的固定開銷 (role 與分隔符)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文字的 Token 數
+
+    有 tiktoken 時精確計算；否則中日韓文字以 1 字 1 token、其餘以 4 字元 1 token 估算
+    (對台語漢字為主的對話略為高估，用於預算控制剛好偏保守)。
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """估算訊息列表的 Token 總數"""
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def trim_history(
+    messages: List[Dict[str, str]],
+    max_messages: int = 20,
+    max_tokens: Optional[int] = None
+) -> int:
+    """
+    就地裁切對話歷史 (保留開頭的 System Prompt 與最新的一則訊息)
+
+    先依則數、再依 Token 預算從最舊的對話開始刪除，
+    並確保保留下來的第一則對話是使用者訊息 (不以孤立的助理回覆開頭)。
+
+    Args:
+        messages: 對話歷史 (第一則為 system)
+        max_messages: 含 System Prompt 的則數上限
+        max_tokens: Token 預算 (None 表示不限)
+
+    Returns:
+        int: 刪除的則數
+    """
+    start = 1 if messages and messages[0].get("role") == "system" else 0
+    drop = max(0, len(messages) - max(max_messages, start + 1))
+
+    if max_tokens is not None:
+        total = estimate_message_tokens(messages)
+        for m in messages[start:start + drop]:
+            total -= estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+        while total > max_tokens and start + drop < len(messages) - 1:
+            m = messages[start + drop]
+            total -= estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+            drop += 1
+
+    # 不以助理回覆開頭
+    while start + drop < len(messages) - 1 and messages[start + drop].get("role") == "assistant":
+        drop += 1
+
+    if drop:
+        del messages[start:start + drop]
+    return drop
+
+# ============================================================================
+# 會話儲存 (Session Store)
+# ============================================================================
+
+
+class SessionStore:
+    """
+    有容量上限與閒置逾時的會話儲存
+
+    會話為 dict：{"messages": [...], "created_at": float, "last_active": float}，
+    與原本 conversation_sessions 的格式相容。
+    記憶體中以 OrderedDict 依最近互動排序：最前面的就是最久未互動的會話，
+    淘汰與逾時檢查都只看開頭幾筆，成本與會話總數無關。
+
+    Example:
+        >>> store = SessionStore(max_sessions=1000, idle_ttl=3600)
+        >>> session = store.get_or_create("user-1", lambda: "你是孝順的子女")
+        >>> session["messages"].append({"role": "user", "content": "你好"})
+        >>> store.commit("user-1")
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        idle_ttl: float = 3600.0,
+        max_messages: int = 20,
+        max_history_tokens: Optional[int] = 3000,
+        db_path: Optional[str] = None
+    ):
+        """
+        Args:
+            max_sessions: 記憶體中最多保留的會話數 (LRU 淘汰)
+            idle_ttl: 閒置多少秒後清除會話 (0 表示不逾時)
+            max_messages: 每個會話含 System Prompt 的歷史則數上限
+            max_history_tokens: 每個會話的歷史 Token 預算 (None 表示只限則數)
+            db_path: SQLite 檔案路徑 (None 表示只存在記憶體)
+        """
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_ttl = float(idle_ttl)
+        self.max_messages = max(2, int(max_messages))
+        self.max_history_tokens = max_history_tokens
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._evicted = 0
+        self._expired = 0
+        self._trimmed = 0
+        self._last_db_sweep = 0.0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_active REAL NOT NULL)"
+            )
+            self._db.commit()
+            print(f"[Session] ✓ 會話持久化: {db_path}")
+
+    # ------------------------------------------------------------------
+    # 存取
+    # ------------------------------------------------------------------
+
+    def get_or_create(self, session_id: str, system_prompt: Callable[[], str]) -> Dict[str, Any]:
+        """
+        取得會話 (記憶體 → SQLite → 新建)，並標記為最近互動
+
+        Args:
+            system_prompt: 產生 System Prompt 的函式；新建或從 SQLite 還原時呼叫，
+                           還原的會話一律換上目前的 Prompt
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id, now)
+                if session is not None:
+                    session["messages"].insert(0, {"role": "system", "content": system_prompt()})
+                else:
+                    session = {
+                        "messages": [{"role": "system", "content": system_prompt()}],
+                        "created_at": now,
+                    }
+                self._sessions[session_id] = session
+                self._evict()
+            else:
+                self._sessions.move_to_end(session_id)
+            session["last_active"] = now
+            return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """只查記憶體中的會話 (不新建、不改變淘汰順序)"""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def commit(self, session_id: str) -> int:
+        """
+        一輪對話結束：裁切歷史並寫入 SQLite
+
+        Returns:
+            int: 裁切掉的則數
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return 0
+            dropped = trim_history(session["messages"], self.max_messages, self.max_history_tokens)
+            self._trimmed += dropped
+            session["last_active"] = time.time()
+            self._save(session_id, session)
+            return dropped
+
+    @property
+    def lock(self):
+        """保護會話內容的鎖：在背景修改歷史 (例如套用摘要) 時持有，與 commit 的裁切互斥"""
+        return self._lock
+
+    def delete(self, session_id: str) -> bool:
+        """刪除會話 (含 SQLite)"""
+        with self._lock:
+            existed = self._sessions.pop(session_id, None) is not None
+            if self._db is not None:
+                cur = self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._db.commit()
+                existed = existed or cur.rowcount > 0
+            return existed
+
+    def sessions(self) -> List[Dict[str, Any]]:
+        """記憶體中所有會話的快照 (供批次更新 System Prompt)"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    # ------------------------------------------------------------------
+    # 淘汰與逾時
+    # ------------------------------------------------------------------
+
+    def _evict(self):
+        """超過容量時淘汰最久未互動的會話 (SQLite 中的紀錄保留，之後可還原)"""
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._evicted += 1
+
+    def _expire(self, now: float):
+        """清除閒置逾時的會話：依互動順序排列，只需檢查開頭"""
+        if self.idle_ttl <= 0:
+            return
+        deadline = now - self.idle_ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.get("last_active", session["created_at"]) >= deadline:
+                break
+            del self._sessions[session_id]
+            self._expired += 1
+        # SQLite 中逾時的紀錄每分鐘清一次
+        if self._db is not None and now - self._last_db_sweep > 60:
+            self._last_db_sweep = now
+            self._db.execute("DELETE FROM sessions WHERE last_active < ?", (deadline,))
+            self._db.commit()
+
+    # ------------------------------------------------------------------
+    # SQLite
+    # ------------------------------------------------------------------
+
+    def _load(self, session_id: str, now: float) -> Optional[Dict[str, Any]]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT data, created_at, last_active FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, created_at, last_active = row
+        if self.idle_ttl > 0 and last_active < now - self.idle_ttl:
+            return None
+        try:
+            session = json.loads(data)
+        except ValueError:
+            return None
+        session["created_at"] = created_at
+        return session
+
+    def _save(self, session_id: str, session: Dict[str, Any]):
+        if self._db is None:
+            return
+        # System Prompt 不落地：還原時換上當下的版本
+        data = {k: v for k, v in session.items() if k not in ("created_at", "last_active")}
+        data["messages"] = [m for m in session["messages"] if m.get("role") != "system"]
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, created_at, last_active) VALUES (?, ?, ?, ?)",
+            (session_id, json.dumps(data, ensure_ascii=False), session["created_at"], session["last_active"])
+        )
+        self._db.commit()
+
+    # ------------------------------------------------------------------
+    # 統計
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            history = [len(s["messages"]) for s in self._sessions.values()]
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_ttl": self.idle_ttl,
+                "max_messages": self.max_messages,
+                "max_history_tokens": self.max_history_tokens,
+                "avg_history": round(sum(history) / len(history), 1) if history else 0.0,
+                "evicted": self._evicted,
+                "expired": self._expired,
+                "trimmed_messages": self._trimmed,
+                "persistent": self._db is not None,
+            }
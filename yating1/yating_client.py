@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Yating 台語 STT 用戶端
+- token 快取：同一把 token 在到期前重複使用（回應有 expires_in 時依其設定，否則用 token_ttl），
+  WebSocket 握手被拒時自動換新 token 重試一次
+- 錄好的音訊全速上傳，不再依錄音長度 sleep；10 秒音檔不必花 10 秒上傳
+- 同步（Flask 執行緒）與 asyncio（ASGI 閘道、即時串流轉送）兩種介面；
+  token 到期時同時進來的請求只送一次申請，其餘等它換好後沿用
+- WebSocket 不重複使用：Yating 一條連線只辨識一段語音，送出 EOS、回傳 asr_final 後即由伺服器關閉，
+  所以每次辨識各開一條；可重複使用的是 token 與申請 token 的 HTTP 連線池
+
+用法:
+    client = YatingClient(api_key)
+    text = client.recognize(pcm16k)                      # 同步
+    text = await client.arecognize(pcm16k, http_client)  # asyncio（httpx.AsyncClient）
+    ws = await client.aconnect(http_client)              # 即時串流：自行逐框送出並讀取 parse_message
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Optional, Tuple
+
+import requests
+from websocket import create_connection, ABNF, WebSocketBadStatusException, WebSocketTimeoutException
+
+try:
+    import websockets
+except ImportError:  # 只有 asyncio 介面需要
+    websockets = None
+
+DEFAULT_PIPELINE = "asr-zh-en-nan"
+DEFAULT_TOKEN_URL = "https://asr.api.yating.tw/v1/token"
+DEFAULT_WS_URL = "wss://asr.api.yating.tw/ws/v1/"
+
+
+def parse_message(message) -> Optional[Tuple[str, bool]]:
+    """
+    解析 Yating 回傳的文字訊息
+
+    Returns:
+        (辨識文字, 是否為 asr_final)；非辨識結果（或二進位訊息）回傳 None
+    """
+    if isinstance(message, bytes):
+        return None
+    try:
+        pipe = json.loads(message).get("pipe", {})
+    except (ValueError, AttributeError):
+        return None
+    if "asr_sentence" not in pipe and not pipe.get("asr_final"):
+        return None
+    return (pipe.get("asr_sentence") or "").strip(), bool(pipe.get("asr_final"))
+
+
+class YatingTokenCache:
+    """Yating auth_token 快取（到期前 margin 秒即換新）"""
+
+    def __init__(self, api_key: str, pipeline: str = DEFAULT_PIPELINE, token_url: str = DEFAULT_TOKEN_URL,
+                 token_ttl: float = 300.0, margin: float = 30.0):
+        self.api_key = api_key
+        self.pipeline = pipeline
+        self.token_url = token_url
+        self.token_ttl = token_ttl
+        self.margin = margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._alock: Optional[asyncio.Lock] = None
+        self._alock_loop = None
+        self.fetches = 0
+        self.hits = 0
+
+    @property
+    def valid(self) -> bool:
+        return bool(self._token) and time.time() < self._expires_at - self.margin
+
+    def cached(self) -> Optional[str]:
+        """仍在有效期內的 token，沒有則 None"""
+        if self.valid:
+            self.hits += 1
+            return self._token
+        return None
+
+    def invalidate(self, token: Optional[str] = None):
+        """
+        作廢快取的 token
+
+        Args:
+            token: 被拒的 token；快取已換成別把（其他請求先換新了）時不作廢
+        """
+        if token is not None and token != self._token:
+            return
+        self._token = None
+        self._expires_at = 0.0
+
+    def _request(self):
+        if not self.api_key:
+            raise RuntimeError("缺少 YATING_API_KEY")
+        return {
+            "headers": {"key": self.api_key, "Content-Type": "application/json"},
+            "json": {"pipeline": self.pipeline},
+            "timeout": 10,
+        }
+
+    def _store(self, body: dict) -> str:
+        token = body.get("auth_token")
+        if not token:
+            raise RuntimeError("Yating 無 auth_token 回應")
+        try:
+            ttl = float(body.get("expires_in") or self.token_ttl)
+        except (TypeError, ValueError):
+            ttl = self.token_ttl
+        self._token = token
+        self._expires_at = time.time() + ttl
+        self.fetches += 1
+        return token
+
+    def get(self, session: requests.Session = None) -> str:
+        """同步取得 token（快取失效時以 session 重新申請）"""
+        token = self.cached()
+        if token:
+            return token
+        with self._lock:
+            token = self.cached()
+            if token:
+                return token
+            r = (session or requests).post(self.token_url, **self._request())
+            r.raise_for_status()
+            return self._store(r.json())
+
+    def _async_lock(self) -> asyncio.Lock:
+        """目前事件迴圈的 asyncio.Lock（鎖綁定事件迴圈，換了迴圈就換一把）"""
+        loop = asyncio.get_running_loop()
+        if self._alock is None or self._alock_loop is not loop:
+            self._alock = asyncio.Lock()
+            self._alock_loop = loop
+        return self._alock
+
+    async def aget(self, http_client) -> str:
+        """asyncio 取得 token（http_client 為 httpx.AsyncClient）；同時到期的協程只申請一次"""
+        token = self.cached()
+        if token:
+            return token
+        async with self._async_lock():
+            token = self.cached()
+            if token:
+                return token
+            r = await http_client.post(self.token_url, **self._request())
+            r.raise_for_status()
+            return self._store(r.json())
+
+
+class YatingClient:
+    """Yating WebSocket STT（token 快取、全速上傳）"""
+
+    def __init__(self, api_key: str, pipeline: str = DEFAULT_PIPELINE, token_url: str = DEFAULT_TOKEN_URL,
+                 ws_url: str = DEFAULT_WS_URL, token_ttl: float = 300.0, chunk_bytes: int = 32000):
+        """
+        Args:
+            token_ttl: 回應未提供 expires_in 時 token 的有效秒數
+            chunk_bytes: 上傳時每個 WebSocket 訊息的大小（預設 1 秒 16k/16-bit）
+        """
+        self.tokens = YatingTokenCache(api_key, pipeline, token_url, token_ttl)
+        self.ws_url = ws_url
+        self.chunk_bytes = max(2, chunk_bytes)
+        self._session = requests.Session()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.tokens.api_key)
+
+    # ------------------------------------------------------------------
+    # 同步介面
+    # ------------------------------------------------------------------
+
+    def connect(self, timeout: float = 10.0):
+        """開啟 WebSocket；快取的 token 被拒時換新 token 重試一次"""
+        token = self.tokens.get(self._session)
+        try:
+            return create_connection(f"{self.ws_url}?token={token}", timeout=timeout)
+        except WebSocketBadStatusException:
+            self.tokens.invalidate(token)
+            token = self.tokens.get(self._session)
+            return create_connection(f"{self.ws_url}?token={token}", timeout=timeout)
+
+    def recognize(self, pcm16k: bytes, cancel: threading.Event = None, final_timeout: float = 6.0) -> str:
+        """
+        全速上傳 16k/mono/16-bit 音訊並等待 asr_final
+
+        Args:
+            cancel: 設定後中止上傳與等待並回傳空字串
+            final_timeout: 送出 EOS 後等待最終結果的秒數
+        """
+        cancel = cancel or threading.Event()
+        ws = self.connect()
+        try:
+            for i in range(0, len(pcm16k), self.chunk_bytes):
+                if cancel.is_set():
+                    return ""
+                ws.send(pcm16k[i:i + self.chunk_bytes], opcode=ABNF.OPCODE_BINARY)
+
+            # EOS x2（伺服器可能已回結果並關閉，第二次失敗不影響讀取）
+            ws.send(b"", opcode=ABNF.OPCODE_BINARY)
+            try:
+                ws.send(b"", opcode=ABNF.OPCODE_BINARY)
+            except Exception:
+                pass
+
+            # 等待最終 asr_final（短逾時輪詢，以便及時回應取消）
+            ws.settimeout(0.5)
+            deadline = time.time() + final_timeout
+            while time.time() < deadline:
+                if cancel.is_set():
+                    return ""
+                try:
+                    frame = ws.recv_frame()
+                except WebSocketTimeoutException:
+                    continue
+                except Exception:
+                    break
+                if frame is None or frame.opcode != ABNF.OPCODE_TEXT:
+                    continue
+                parsed = parse_message(frame.data.decode("utf-8"))
+                if parsed and parsed[1]:
+                    return parsed[0]
+            return ""
+        finally:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # asyncio 介面
+    # ------------------------------------------------------------------
+
+    async def aconnect(self, http_client, open_timeout: float = 10.0):
+        """開啟 WebSocket（websockets 連線）；快取的 token 被拒時換新 token 重試一次"""
+        if websockets is None:
+            raise RuntimeError("缺少 websockets 套件")
+        token = await self.tokens.aget(http_client)
+        try:
+            return await websockets.connect(f"{self.ws_url}?token={token}", open_timeout=open_timeout)
+        except websockets.InvalidHandshake:
+            self.tokens.invalidate(token)
+            token = await self.tokens.aget(http_client)
+            return await websockets.connect(f"{self.ws_url}?token={token}", open_timeout=open_timeout)
+
+    @staticmethod
+    async def asend_eos(ws):
+        """送出 EOS x2（伺服器可能已回結果並關閉，第二次失敗不影響讀取）"""
+        await ws.send(b"")
+        try:
+            await ws.send(b"")
+        except websockets.ConnectionClosed:
+            pass
+
+    async def arecognize(self, pcm16k: bytes, http_client, final_timeout: float = 6.0) -> str:
+        """全速上傳並等待 asr_final（取消此協程即中止辨識並關閉連線）"""
+        ws = await self.aconnect(http_client)
+        try:
+            for i in range(0, len(pcm16k), self.chunk_bytes):
+                await ws.send(pcm16k[i:i + self.chunk_bytes])
+            await self.asend_eos(ws)
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + final_timeout
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return ""
+                try:
+                    message = await asyncio.wait_for(ws.recv(), remaining)
+                except (asyncio.TimeoutError, websockets.ConnectionClosed):
+                    return ""
+                parsed = parse_message(message)
+                if parsed and parsed[1]:
+                    return parsed[0]
+        finally:
+            await ws.close()
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.configured,
+            "token_fetches": self.tokens.fetches,
+            "token_hits": self.tokens.hits,
+            "token_valid": self.tokens.valid,
+        }